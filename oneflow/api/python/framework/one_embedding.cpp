@@ -19,8 +19,8 @@ limitations under the License.
 #include <pybind11/operators.h>
 #include "oneflow/api/python/of_api_registry.h"
 #include "oneflow/core/embedding/embedding_manager.h"
-#include "oneflow/core/embedding/persistent_table.h"
-#include "oneflow/core/embedding/hash_functions.cuh"
+#include "oneflow/core/embedding/persistent_table_bulk_io.h"
+#include "oneflow/core/embedding/value_codec.h"
 #include "oneflow/core/framework/dtype.h"
 
 namespace py = pybind11;
@@ -38,31 +38,64 @@ class OneEmbeddingHandler final {
   }
 
   void LoadSnapshot(const std::string& snapshot_name) {
-#ifdef WITH_CUDA
     Global<embedding::EmbeddingManager>::Get()->LoadSnapshot(embedding_name_, local_rank_id_,
                                                              rank_id_, snapshot_name);
-#else
-    UNIMPLEMENTED() << "Only Support with CUDA";
-#endif
   }
 
   void SaveSnapshot(const std::string& snapshot_name) {
-#ifdef WITH_CUDA
     Global<embedding::EmbeddingManager>::Get()->SaveSnapshot(embedding_name_, local_rank_id_,
                                                              rank_id_, snapshot_name);
-#else
-    UNIMPLEMENTED() << "Only Support with CUDA";
-#endif
+  }
+
+  py::dict GetStats() {
+    embedding::EmbeddingManager* manager = Global<embedding::EmbeddingManager>::Get();
+    embedding::KeyValueStoreStats store_stats;
+    manager->GetKeyValueStore(embedding_name_, rank_id_)->GetStats(&store_stats);
+    const embedding::EmbeddingStats* embedding_stats =
+        manager->GetEmbeddingStats(embedding_name_, rank_id_);
+    py::list caches;
+    for (const auto& cache_stats : store_stats.cache_stats) {
+      py::dict cache;
+      cache["lookups"] = cache_stats.num_lookups;
+      cache["hits"] = cache_stats.num_hits;
+      cache["misses"] = cache_stats.num_misses;
+      cache["evictions"] = cache_stats.num_evictions;
+      cache["write_backs"] = cache_stats.num_write_backs;
+      caches.append(cache);
+    }
+    const embedding::PersistentTableStats& table_stats = store_stats.persistent_table_stats;
+    py::dict persistent_table;
+    persistent_table["read_keys"] = table_stats.num_read_keys;
+    persistent_table["read_bytes"] = table_stats.num_read_bytes;
+    persistent_table["read_ops"] = table_stats.num_read_ops;
+    persistent_table["write_keys"] = table_stats.num_write_keys;
+    persistent_table["write_bytes"] = table_stats.num_write_bytes;
+    persistent_table["write_ops"] = table_stats.num_write_ops;
+    persistent_table["keys"] = table_stats.num_keys;
+    persistent_table["disk_rows"] = table_stats.num_disk_rows;
+    persistent_table["compacted_chunks"] = table_stats.num_compacted_chunks;
+    persistent_table["disk_amplification"] = table_stats.disk_amplification;
+    persistent_table["expired_keys"] = table_stats.num_expired_keys;
+    py::dict stats;
+    stats["batches"] = embedding_stats->NumBatches();
+    stats["unique_ids"] = embedding_stats->NumUniqueIds();
+    stats["max_unique_ids_per_batch"] = embedding_stats->MaxNumUniqueIds();
+    const embedding::AdmissionFilter* admission_filter =
+        manager->GetAdmissionFilter(embedding_name_, rank_id_);
+    stats["rejected_ids"] = admission_filter == nullptr ? 0 : admission_filter->NumRejected();
+    stats["caches"] = caches;
+    stats["persistent_table"] = persistent_table;
+    return stats;
+  }
+
+  void ResetStats() {
+    Global<embedding::EmbeddingManager>::Get()->ResetStats(embedding_name_, rank_id_);
   }
 
  private:
   void CreateKeyValueStore(const embedding::KeyValueStoreOptions& key_value_store_options) {
-#ifdef WITH_CUDA
     Global<embedding::EmbeddingManager>::Get()->CreateKeyValueStore(
         key_value_store_options, local_rank_id_, rank_id_, world_size_);
-#else
-    UNIMPLEMENTED() << "Only Support with CUDA";
-#endif
   }
 
   std::string embedding_name_;
@@ -73,6 +106,30 @@ class OneEmbeddingHandler final {
 
 namespace embedding {
 
+namespace {
+
+PersistentTableBulkOptions GetBulkOptions(const std::vector<std::string>& paths,
+                                          const std::string& snapshot_name,
+                                          const Symbol<DType>& key_type,
+                                          const Symbol<DType>& value_type, uint32_t storage_dim,
+                                          uint64_t target_chunk_size_mb,
+                                          uint16_t physical_block_size, uint32_t num_threads,
+                                          const std::string& storage_dtype, uint32_t size_factor) {
+  CHECK(value_type->data_type() == DataType::kFloat) << "Only float values are supported";
+  PersistentTableBulkOptions options;
+  options.paths = paths;
+  options.snapshot_name = snapshot_name;
+  options.key_type = key_type->data_type();
+  options.value_size =
+      GetEncodedValueSize(ParseStorageDataType(storage_dtype), storage_dim, size_factor);
+  options.target_chunk_size_mb = target_chunk_size_mb;
+  options.physical_block_size = physical_block_size;
+  options.num_threads = num_threads;
+  return options;
+}
+
+}  // namespace
+
 class PersistentTableWriter {
  public:
   OF_DISALLOW_COPY_AND_MOVE(PersistentTableWriter);
@@ -83,108 +140,75 @@ class PersistentTableWriter {
   virtual void Close() = 0;
 };
 
-template<typename Key, typename Value>
+template<typename Key>
 class PersistentTableWriterImpl : public PersistentTableWriter {
  public:
   OF_DISALLOW_COPY_AND_MOVE(PersistentTableWriterImpl);
-  PersistentTableWriterImpl(const std::vector<std::string>& paths, const std::string& snapshot_name,
-                            uint32_t storage_dim, uint64_t target_chunk_size_mb,
-                            uint16_t physical_block_size)
-      : closed_(false), snapshot_name_(snapshot_name), storage_dim_(storage_dim) {
-    tables_.resize(paths.size());
-    for (size_t i = 0; i < paths.size(); ++i) {
-      PersistentTableOptions options;
-      options.path = paths[i];
-      options.key_size = sizeof(Key);
-      options.value_size = storage_dim * sizeof(Value);
-      options.target_chunk_size_mb = target_chunk_size_mb;
-      options.physical_block_size = physical_block_size;
-      tables_[i] = NewPersistentTable(options);
-    }
-  }
+  PersistentTableWriterImpl(const PersistentTableBulkOptions& options,
+                            std::unique_ptr<ValueCodec>&& codec)
+      : writer_(NewPersistentTableBulkWriter(options)), codec_(std::move(codec)) {}
   ~PersistentTableWriterImpl() override { CloseImpl(); }
 
   void Write(const py::array& keys, const py::array& values) override {
-    pybind11::dtype::of<int32_t>().equal(pybind11::dtype::of<int64_t>());
-    CHECK(!closed_) << "Write on closed table";
+    CHECK(writer_) << "Write on closed table";
     CHECK_EQ(keys.ndim(), 1);
     CHECK_EQ(values.ndim(), 2);
     CHECK_EQ(keys.shape(0), values.shape(0));
-    CHECK_EQ(values.shape(1), storage_dim_);
+    CHECK_EQ(values.shape(1), codec_->LineSize());
     CHECK(keys.dtype().equal(py::dtype::of<Key>()));
-    CHECK(values.dtype().equal(py::dtype::of<Value>()));
-    const size_t n = keys.size();
-    std::vector<std::vector<Key>> keys_buffers(tables_.size());
-    std::vector<std::vector<char>> values_buffers(tables_.size());
-    for (size_t i = 0; i < n; ++i) {
-      const Key key = *(reinterpret_cast<const Key*>(keys.template data(i)));
-      const uint32_t shard = ShardingHash()(key) % tables_.size();
-      keys_buffers[shard].push_back(key);
-      const size_t values_offset = values_buffers[shard].size();
-      values_buffers[shard].resize(values_offset + storage_dim_ * sizeof(Value));
-      for (size_t j = 0; j < values.shape(1); ++j) {
-        std::memcpy(values_buffers[shard].data() + values_offset + j * values.itemsize(),
-                    values.template data(i, j), values.itemsize());
-      }
-    }
-    for (size_t shard = 0; shard < tables_.size(); ++shard) {
-      tables_[shard]->Put(keys_buffers[shard].size(), keys_buffers[shard].data(),
-                          values_buffers[shard].data());
+    CHECK(values.dtype().equal(py::dtype::of<float>()));
+    // Copies the arrays only if they are not contiguous.
+    auto keys_arr = py::array_t<Key, py::array::c_style>::ensure(keys);
+    auto values_arr = py::array_t<float, py::array::c_style>::ensure(values);
+    const uint64_t num_keys = keys_arr.size();
+    const Key* keys_ptr = keys_arr.data();
+    const float* values_ptr = values_arr.data();
+    py::gil_scoped_release release;
+    if (codec_->StorageDataType() == DataType::kFloat) {
+      writer_->Write(num_keys, keys_ptr, values_ptr);
+    } else {
+      encoded_buffer_.resize(num_keys * codec_->EncodedValueSize());
+      codec_->Encode(num_keys, values_ptr, encoded_buffer_.data());
+      writer_->Write(num_keys, keys_ptr, encoded_buffer_.data());
     }
   }
 
-  void Close() override { CloseImpl(); }
+  void Close() override {
+    py::gil_scoped_release release;
+    CloseImpl();
+  }
 
  private:
   void CloseImpl() {
-    if (!closed_) {
-      for (auto& table : tables_) {
-        table->SaveSnapshot(snapshot_name_);
-        table.reset();
-      }
+    if (writer_) {
+      writer_->Close();
+      writer_.reset();
     }
-    closed_ = true;
   }
 
-  bool closed_;
-  std::string snapshot_name_;
-  std::vector<std::unique_ptr<PersistentTable>> tables_;
-  uint32_t storage_dim_;
+  std::unique_ptr<PersistentTableBulkWriter> writer_;
+  std::unique_ptr<ValueCodec> codec_;
+  std::vector<char> encoded_buffer_;
 };
 
-template<typename Key>
-std::shared_ptr<PersistentTableWriter> NewPersistentTableWriter(
-    const std::vector<std::string>& paths, const std::string& snapshot_name,
-    const Symbol<DType>& key_type, const Symbol<DType>& value_type, uint32_t storage_dim,
-    uint64_t target_chunk_size_mb, uint16_t physical_block_size) {
-  if (value_type->data_type() == DataType::kFloat) {
-    return std::shared_ptr<PersistentTableWriter>(new PersistentTableWriterImpl<Key, float>(
-        paths, snapshot_name, storage_dim, target_chunk_size_mb, physical_block_size));
-  } else {
-    UNIMPLEMENTED();
-  }
-}
-
 std::shared_ptr<PersistentTableWriter> NewPersistentTableWriter(
     const std::vector<std::string>& paths, const std::string& snapshot_name,
     const Symbol<DType>& key_type, const Symbol<DType>& value_type, uint32_t storage_dim,
-    uint64_t target_chunk_size_mb, uint16_t physical_block_size) {
+    uint64_t target_chunk_size_mb, uint16_t physical_block_size, uint32_t num_threads,
+    const std::string& storage_dtype, uint32_t size_factor) {
+  const PersistentTableBulkOptions options =
+      GetBulkOptions(paths, snapshot_name, key_type, value_type, storage_dim, target_chunk_size_mb,
+                     physical_block_size, num_threads, storage_dtype, size_factor);
+  std::unique_ptr<ValueCodec> codec =
+      NewValueCodec(ParseStorageDataType(storage_dtype), storage_dim, size_factor);
   if (key_type->data_type() == DataType::kInt32) {
-    return NewPersistentTableWriter<int32_t>(paths, snapshot_name, key_type, value_type,
-                                             storage_dim, target_chunk_size_mb,
-                                             physical_block_size);
+    return std::make_shared<PersistentTableWriterImpl<int32_t>>(options, std::move(codec));
   } else if (key_type->data_type() == DataType::kUInt32) {
-    return NewPersistentTableWriter<uint32_t>(paths, snapshot_name, key_type, value_type,
-                                              storage_dim, target_chunk_size_mb,
-                                              physical_block_size);
+    return std::make_shared<PersistentTableWriterImpl<uint32_t>>(options, std::move(codec));
   } else if (key_type->data_type() == DataType::kInt64) {
-    return NewPersistentTableWriter<int64_t>(paths, snapshot_name, key_type, value_type,
-                                             storage_dim, target_chunk_size_mb,
-                                             physical_block_size);
+    return std::make_shared<PersistentTableWriterImpl<int64_t>>(options, std::move(codec));
   } else if (key_type->data_type() == DataType::kUInt64) {
-    return NewPersistentTableWriter<uint64_t>(paths, snapshot_name, key_type, value_type,
-                                              storage_dim, target_chunk_size_mb,
-                                              physical_block_size);
+    return std::make_shared<PersistentTableWriterImpl<uint64_t>>(options, std::move(codec));
   } else {
     UNIMPLEMENTED();
     return std::shared_ptr<embedding::PersistentTableWriter>(nullptr);
@@ -201,109 +225,86 @@ class PersistentTableReader {
   virtual void Close() = 0;
 };
 
-template<typename Key, typename Value>
+template<typename Key>
 class PersistentTableReaderImpl : public PersistentTableReader {
  public:
-  constexpr static uint32_t kBatchSize = 65536;
   OF_DISALLOW_COPY_AND_MOVE(PersistentTableReaderImpl);
-  PersistentTableReaderImpl(const std::vector<std::string>& paths, const std::string& snapshot_name,
-                            uint32_t storage_dim, uint64_t target_chunk_size_mb,
-                            uint16_t physical_block_size)
-      : closed_(false),
-        snapshot_name_(snapshot_name),
-        storage_dim_(storage_dim),
-        current_table_(0) {
-    tables_.resize(paths.size());
-    iterators_.resize(paths.size());
-    for (size_t i = 0; i < paths.size(); ++i) {
-      PersistentTableOptions options;
-      options.path = paths[i];
-      options.key_size = sizeof(Key);
-      options.value_size = storage_dim * sizeof(Value);
-      options.target_chunk_size_mb = target_chunk_size_mb;
-      options.physical_block_size = physical_block_size;
-      tables_[i] = NewPersistentTable(options);
-      iterators_[i] =
-          std::unique_ptr<PersistentTable::Iterator>(tables_[i]->ReadSnapshot(snapshot_name));
-    }
-    keys_buffer_.resize(kBatchSize);
-    values_buffer_.resize(kBatchSize * storage_dim_);
-  }
+  PersistentTableReaderImpl(const PersistentTableBulkOptions& options,
+                            std::unique_ptr<ValueCodec>&& codec)
+      : reader_(NewPersistentTableBulkReader(options)), codec_(std::move(codec)) {}
   ~PersistentTableReaderImpl() override { CloseImpl(); }
 
   std::tuple<py::object, py::object> Next() override {
-    while (current_table_ < tables_.size()) {
-      uint32_t n_result = 0;
-      iterators_[current_table_]->Next(kBatchSize, &n_result, keys_buffer_.data(),
-                                       values_buffer_.data());
-      if (n_result != 0) {
-        py::array_t<Key> keys_arr(py::array::ShapeContainer({n_result}));
-        py::array_t<Value> values_arr(py::array::ShapeContainer({n_result, storage_dim_}));
-        std::memcpy(keys_arr.mutable_data(), keys_buffer_.data(), n_result * sizeof(Key));
-        std::memcpy(values_arr.mutable_data(), values_buffer_.data(),
-                    n_result * storage_dim_ * sizeof(Value));
-        return std::make_tuple(keys_arr, values_arr);
-      } else {
-        current_table_ += 1;
-        continue;
-      }
+    if (!reader_) { throw py::stop_iteration(); }
+    uint32_t n_result = 0;
+    bool has_next = false;
+    {
+      py::gil_scoped_release release;
+      has_next = reader_->Next(&n_result, &keys_buffer_, &values_buffer_);
+    }
+    if (!has_next) { throw py::stop_iteration(); }
+    const uint32_t line_size = codec_->LineSize();
+    py::array_t<Key> keys_arr(py::array::ShapeContainer({n_result}));
+    py::array_t<float> values_arr(py::array::ShapeContainer({n_result, line_size}));
+    Key* keys_ptr = keys_arr.mutable_data();
+    float* values_ptr = values_arr.mutable_data();
+    {
+      py::gil_scoped_release release;
+      std::memcpy(keys_ptr, keys_buffer_.data(), n_result * sizeof(Key));
+      codec_->Decode(n_result, values_buffer_.data(), values_ptr);
     }
-    throw py::stop_iteration();
+    return std::make_tuple(keys_arr, values_arr);
   }
 
   void Close() override { CloseImpl(); }
 
  private:
-  void CloseImpl() {
-    if (!closed_) {
-      for (auto& table : tables_) { table.reset(); }
-    }
-    closed_ = true;
-  }
+  void CloseImpl() { reader_.reset(); }
 
-  bool closed_;
-  std::string snapshot_name_;
-  std::vector<std::unique_ptr<PersistentTable>> tables_;
-  std::vector<std::unique_ptr<PersistentTable::Iterator>> iterators_;
-  uint32_t storage_dim_;
-  size_t current_table_;
-  std::vector<Key> keys_buffer_;
-  std::vector<Value> values_buffer_;
+  std::unique_ptr<PersistentTableBulkReader> reader_;
+  std::unique_ptr<ValueCodec> codec_;
+  std::vector<char> keys_buffer_;
+  std::vector<char> values_buffer_;
 };
 
 template<typename Key>
 std::shared_ptr<PersistentTableReader> NewPersistentTableReader(
-    const std::vector<std::string>& paths, const std::string& snapshot_name,
-    const Symbol<DType>& key_type, const Symbol<DType>& value_type, uint32_t storage_dim,
-    uint64_t target_chunk_size_mb, uint16_t physical_block_size) {
-  if (value_type->data_type() == DataType::kFloat) {
-    return std::shared_ptr<PersistentTableReader>(new PersistentTableReaderImpl<Key, float>(
-        paths, snapshot_name, storage_dim, target_chunk_size_mb, physical_block_size));
-  } else {
-    UNIMPLEMENTED();
+    PersistentTableBulkOptions* options, std::unique_ptr<ValueCodec>&& codec,
+    const py::object& key_range, const py::object& shard) {
+  if (!key_range.is_none()) {
+    const auto range = key_range.cast<std::tuple<Key, Key>>();
+    options->filter.has_key_range = true;
+    options->filter.key_begin = static_cast<uint64_t>(std::get<0>(range));
+    options->filter.key_end = static_cast<uint64_t>(std::get<1>(range));
   }
+  if (!shard.is_none()) {
+    const auto shard_tuple = shard.cast<std::tuple<uint32_t, uint32_t>>();
+    options->filter.shard_id = std::get<0>(shard_tuple);
+    options->filter.num_shards = std::get<1>(shard_tuple);
+  }
+  return std::make_shared<PersistentTableReaderImpl<Key>>(*options, std::move(codec));
 }
 
 std::shared_ptr<PersistentTableReader> NewPersistentTableReader(
     const std::vector<std::string>& paths, const std::string& snapshot_name,
     const Symbol<DType>& key_type, const Symbol<DType>& value_type, uint32_t storage_dim,
-    uint64_t target_chunk_size_mb, uint16_t physical_block_size) {
+    uint64_t target_chunk_size_mb, uint16_t physical_block_size, uint32_t num_threads,
+    uint32_t batch_size, const py::object& key_range, const py::object& shard,
+    const std::string& storage_dtype, uint32_t size_factor) {
+  PersistentTableBulkOptions options =
+      GetBulkOptions(paths, snapshot_name, key_type, value_type, storage_dim, target_chunk_size_mb,
+                     physical_block_size, num_threads, storage_dtype, size_factor);
+  options.batch_size = batch_size;
+  std::unique_ptr<ValueCodec> codec =
+      NewValueCodec(ParseStorageDataType(storage_dtype), storage_dim, size_factor);
   if (key_type->data_type() == DataType::kInt32) {
-    return NewPersistentTableReader<int32_t>(paths, snapshot_name, key_type, value_type,
-                                             storage_dim, target_chunk_size_mb,
-                                             physical_block_size);
+    return NewPersistentTableReader<int32_t>(&options, std::move(codec), key_range, shard);
   } else if (key_type->data_type() == DataType::kUInt32) {
-    return NewPersistentTableReader<uint32_t>(paths, snapshot_name, key_type, value_type,
-                                              storage_dim, target_chunk_size_mb,
-                                              physical_block_size);
+    return NewPersistentTableReader<uint32_t>(&options, std::move(codec), key_range, shard);
   } else if (key_type->data_type() == DataType::kInt64) {
-    return NewPersistentTableReader<int64_t>(paths, snapshot_name, key_type, value_type,
-                                             storage_dim, target_chunk_size_mb,
-                                             physical_block_size);
+    return NewPersistentTableReader<int64_t>(&options, std::move(codec), key_range, shard);
   } else if (key_type->data_type() == DataType::kUInt64) {
-    return NewPersistentTableReader<uint64_t>(paths, snapshot_name, key_type, value_type,
-                                              storage_dim, target_chunk_size_mb,
-                                              physical_block_size);
+    return NewPersistentTableReader<uint64_t>(&options, std::move(codec), key_range, shard);
   } else {
     UNIMPLEMENTED();
     return std::shared_ptr<embedding::PersistentTableReader>(nullptr);
@@ -320,17 +321,20 @@ ONEFLOW_API_PYBIND11_MODULE("", m) {
                                                      rank_id, world_size);
       }))
       .def("SaveSnapshot", &OneEmbeddingHandler::SaveSnapshot)
-      .def("LoadSnapshot", &OneEmbeddingHandler::LoadSnapshot);
+      .def("LoadSnapshot", &OneEmbeddingHandler::LoadSnapshot)
+      .def("GetStats", &OneEmbeddingHandler::GetStats)
+      .def("ResetStats", &OneEmbeddingHandler::ResetStats);
 
   py::class_<embedding::PersistentTableWriter, std::shared_ptr<embedding::PersistentTableWriter>>(
       m, "PersistentTableWriter")
       .def(py::init([](const std::vector<std::string>& paths, const std::string& snapshot_name,
                        const Symbol<DType>& key_type, const Symbol<DType>& value_type,
                        uint32_t storage_dim, uint64_t target_chunk_size_mb,
-                       uint16_t physical_block_size) {
-        return embedding::NewPersistentTableWriter(paths, snapshot_name, key_type, value_type,
-                                                   storage_dim, target_chunk_size_mb,
-                                                   physical_block_size);
+                       uint16_t physical_block_size, uint32_t num_threads,
+                       const std::string& storage_dtype, uint32_t size_factor) {
+        return embedding::NewPersistentTableWriter(
+            paths, snapshot_name, key_type, value_type, storage_dim, target_chunk_size_mb,
+            physical_block_size, num_threads, storage_dtype, size_factor);
       }))
       .def("__enter__", [](embedding::PersistentTableWriter* writer) { return writer; })
       .def("__exit__", [](embedding::PersistentTableWriter* writer, const py::object& exc_type,
@@ -343,10 +347,13 @@ ONEFLOW_API_PYBIND11_MODULE("", m) {
       .def(py::init([](const std::vector<std::string>& paths, const std::string& snapshot_name,
                        const Symbol<DType>& key_type, const Symbol<DType>& value_type,
                        uint32_t storage_dim, uint64_t target_chunk_size_mb,
-                       uint16_t physical_block_size) {
-        return embedding::NewPersistentTableReader(paths, snapshot_name, key_type, value_type,
-                                                   storage_dim, target_chunk_size_mb,
-                                                   physical_block_size);
+                       uint16_t physical_block_size, uint32_t num_threads, uint32_t batch_size,
+                       const py::object& key_range, const py::object& shard,
+                       const std::string& storage_dtype, uint32_t size_factor) {
+        return embedding::NewPersistentTableReader(
+            paths, snapshot_name, key_type, value_type, storage_dim, target_chunk_size_mb,
+            physical_block_size, num_threads, batch_size, key_range, shard, storage_dtype,
+            size_factor);
       }))
       .def("__next__", &embedding::PersistentTableReader::Next)
       .def("__iter__", [](embedding::PersistentTableReader* reader) { return reader; })
@@ -354,6 +361,23 @@ ONEFLOW_API_PYBIND11_MODULE("", m) {
       .def("__exit__", [](embedding::PersistentTableReader* reader, const py::object& exc_type,
                           const py::object& exc_val, const py::object& exc_tb) { reader->Close(); })
       .def("close", &embedding::PersistentTableReader::Close);
+
+  m.def("ReshardPersistentTables",
+        [](const std::vector<std::string>& src_paths, const std::string& src_snapshot_name,
+           const std::vector<std::string>& dst_paths, const std::string& dst_snapshot_name,
+           const Symbol<DType>& key_type, const Symbol<DType>& value_type, uint32_t storage_dim,
+           uint64_t target_chunk_size_mb, uint16_t physical_block_size, uint32_t num_threads,
+           uint32_t batch_size, const std::string& storage_dtype, uint32_t size_factor) {
+          embedding::PersistentTableBulkOptions src_options = embedding::GetBulkOptions(
+              src_paths, src_snapshot_name, key_type, value_type, storage_dim,
+              target_chunk_size_mb, physical_block_size, num_threads, storage_dtype, size_factor);
+          src_options.batch_size = batch_size;
+          const embedding::PersistentTableBulkOptions dst_options = embedding::GetBulkOptions(
+              dst_paths, dst_snapshot_name, key_type, value_type, storage_dim,
+              target_chunk_size_mb, physical_block_size, num_threads, storage_dtype, size_factor);
+          py::gil_scoped_release release;
+          embedding::ReshardPersistentTables(src_options, dst_options);
+        });
 }
 
 }  // namespace oneflow
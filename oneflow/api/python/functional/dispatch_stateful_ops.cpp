@@ -52,6 +52,7 @@ ONEFLOW_FUNCTION_LIBRARY(m) {
       [](const std::shared_ptr<OpExpr>& op, const std::string& data_dir, int32_t data_part_num,
          const std::string& part_name_prefix, int32_t part_name_suffix_length, int32_t batch_size,
          int32_t shuffle_buffer_size, bool random_shuffle, bool shuffle_after_epoch, int64_t seed,
+         bool use_index, int64_t start_sample_offset,
          const Optional<Symbol<Device>>& device) -> Maybe<Tensor> {
         MutableAttrMap attrs;
         JUST(attrs.SetAttr("data_dir", data_dir));
@@ -63,6 +64,8 @@ ONEFLOW_FUNCTION_LIBRARY(m) {
         JUST(attrs.SetAttr("random_shuffle", random_shuffle));
         JUST(attrs.SetAttr("shuffle_after_epoch", shuffle_after_epoch));
         JUST(attrs.SetAttr("seed", seed));
+        JUST(attrs.SetAttr("use_index", use_index));
+        JUST(attrs.SetAttr("start_sample_offset", start_sample_offset));
         return OpInterpUtil::Dispatch<Tensor>(*op, {}, OpExprInterpContext(attrs, JUST(device)));
       });
   m.add_functor(
@@ -70,6 +73,7 @@ ONEFLOW_FUNCTION_LIBRARY(m) {
       [](const std::shared_ptr<OpExpr>& op, const std::string& data_dir, int32_t data_part_num,
          const std::string& part_name_prefix, int32_t part_name_suffix_length, int32_t batch_size,
          int32_t shuffle_buffer_size, bool random_shuffle, bool shuffle_after_epoch, int64_t seed,
+         bool use_index, int64_t start_sample_offset,
          const Symbol<ParallelDesc>& placement,
          const std::vector<Symbol<SbpParallel>>& sbp_tuple) -> Maybe<Tensor> {
         MutableAttrMap attrs;
@@ -82,6 +86,8 @@ ONEFLOW_FUNCTION_LIBRARY(m) {
         JUST(attrs.SetAttr("random_shuffle", random_shuffle));
         JUST(attrs.SetAttr("shuffle_after_epoch", shuffle_after_epoch));
         JUST(attrs.SetAttr("seed", seed));
+        JUST(attrs.SetAttr("use_index", use_index));
+        JUST(attrs.SetAttr("start_sample_offset", start_sample_offset));
         JUST(attrs.SetAttr("nd_sbp", *JUST(GetNdSbpStrList(sbp_tuple))));
         auto nd_sbp = JUST(GetNdSbp(sbp_tuple));
         return OpInterpUtil::Dispatch<Tensor>(*op, {},
@@ -184,6 +190,31 @@ ONEFLOW_FUNCTION_LIBRARY(m) {
         JUST(attrs.SetAttr("random_aspect_ratio", random_aspect_ratio));
         return OpInterpUtil::Dispatch<Tensor>(*op, {input}, attrs);
       });
+  m.add_functor(
+      "DispatchOfrecordImageDecoderRandomCropResizeNormalize",
+      [](const std::shared_ptr<OpExpr>& op, const std::shared_ptr<Tensor>& input,
+         const std::string& name, int64_t target_width, int64_t target_height,
+         const std::string& color_space, bool random_crop, const std::vector<float>& random_area,
+         const std::vector<float>& random_aspect_ratio, int32_t num_attempts, int64_t seed,
+         bool has_seed, const std::string& interpolation_type, const std::vector<float>& mean,
+         const std::vector<float>& std, const std::string& output_layout) -> Maybe<Tensor> {
+        MutableAttrMap attrs;
+        JUST(attrs.SetAttr("name", name));
+        JUST(attrs.SetAttr("target_width", target_width));
+        JUST(attrs.SetAttr("target_height", target_height));
+        JUST(attrs.SetAttr("color_space", color_space));
+        JUST(attrs.SetAttr("random_crop", random_crop));
+        JUST(attrs.SetAttr("random_area", random_area));
+        JUST(attrs.SetAttr("random_aspect_ratio", random_aspect_ratio));
+        JUST(attrs.SetAttr("num_attempts", num_attempts));
+        JUST(attrs.SetAttr("seed", seed));
+        JUST(attrs.SetAttr("has_seed", has_seed));
+        JUST(attrs.SetAttr("interpolation_type", interpolation_type));
+        JUST(attrs.SetAttr("mean", mean));
+        JUST(attrs.SetAttr("std", std));
+        JUST(attrs.SetAttr("output_layout", output_layout));
+        return OpInterpUtil::Dispatch<Tensor>(*op, {input}, attrs);
+      });
   m.add_functor("DispatchOfrecordImageDecoder",
                 [](const std::shared_ptr<OpExpr>& op, const std::shared_ptr<Tensor>& input,
                    const std::string& name, const std::string& color_space) -> Maybe<Tensor> {
@@ -67,6 +67,11 @@ void set_num_threads(int num) {
     num = cpu_logic_core;
   }
 
+  // CpuDeviceManager::GetDevice resets the number of threads of the device to the one of the
+  // manager, so it is set to both, or the streams created later would run with one thread.
+  auto* cpu_device_manager = static_cast<ep::CpuDeviceManager*>(
+      Global<ep::DeviceManagerRegistry>::Get()->GetDeviceManager(DeviceType::kCPU));
+  cpu_device_manager->SetDeviceNumThreads(num);
   auto cpu_device = std::static_pointer_cast<ep::CpuDevice>(
       Global<ep::DeviceManagerRegistry>::Get()->GetDevice(DeviceType::kCPU, 0));
   cpu_device->SetNumThreads(num);
@@ -0,0 +1,143 @@
+/*
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+*/
+#include "oneflow/core/embedding/admission_filter.h"
+#include "oneflow/core/embedding/hash_functions.cuh"
+#include <limits>
+
+namespace oneflow {
+
+namespace embedding {
+
+namespace {
+
+// All the counters are halved after this number of additions per sketch column, so that the keys
+// that are no longer seen stop counting towards their admission.
+constexpr uint64_t kAgingPeriodPerColumn = 10;
+constexpr uint32_t kMaxSketchDepth = 16;
+// The batches of a graph without embedding_put, e.g. for inference, are never ended, only the
+// rejected keys of the last ones are kept.
+constexpr size_t kMaxPendingBatches = 8;
+
+}  // namespace
+
+AdmissionFilter::AdmissionFilter(const AdmissionFilterOptions& options)
+    : width_(options.sketch_width),
+      depth_(options.sketch_depth),
+      aging_period_(static_cast<uint64_t>(options.sketch_width) * kAgingPeriodPerColumn),
+      num_additions_(0),
+      num_rejected_(0) {
+  CHECK_GT(width_, 0);
+  CHECK_GT(depth_, 0);
+  CHECK_LE(depth_, kMaxSketchDepth);
+  counters_.resize(static_cast<uint64_t>(width_) * depth_);
+}
+
+void AdmissionFilter::BeginBatch() {
+  std::lock_guard<std::mutex> lock(mutex_);
+  if (pending_rejected_keys_.size() == kMaxPendingBatches) { pending_rejected_keys_.pop_front(); }
+  pending_rejected_keys_.emplace_back();
+}
+
+void AdmissionFilter::Admit(uint32_t num_keys, const uint64_t* keys,
+                            const uint32_t* min_frequencies, bool count, bool* admitted) {
+  std::lock_guard<std::mutex> lock(mutex_);
+  CHECK(!pending_rejected_keys_.empty()) << "Admit is called before BeginBatch";
+  if (!count) {
+    for (uint32_t i = 0; i < num_keys; ++i) {
+      admitted[i] = min_frequencies[i] <= 1 || !IsPendingRejected(keys[i]);
+    }
+    return;
+  }
+  HashSet<uint64_t>* rejected_keys = &pending_rejected_keys_.back();
+  uint64_t num_rejected = 0;
+  for (uint32_t i = 0; i < num_keys; ++i) {
+    admitted[i] = min_frequencies[i] <= 1 || Add(keys[i]) >= min_frequencies[i];
+    if (admitted[i]) { continue; }
+    rejected_keys->insert(keys[i]);
+    num_rejected += 1;
+  }
+  num_rejected_ += num_rejected;
+}
+
+void AdmissionFilter::IsRejected(uint32_t num_keys, const uint64_t* keys, bool last,
+                                 bool* rejected) const {
+  std::lock_guard<std::mutex> lock(mutex_);
+  if (pending_rejected_keys_.empty()) {
+    std::fill(rejected, rejected + num_keys, false);
+    return;
+  }
+  const HashSet<uint64_t>& rejected_keys =
+      last ? pending_rejected_keys_.back() : pending_rejected_keys_.front();
+  for (uint32_t i = 0; i < num_keys; ++i) { rejected[i] = rejected_keys.count(keys[i]) != 0; }
+}
+
+void AdmissionFilter::EndBatch() {
+  std::lock_guard<std::mutex> lock(mutex_);
+  if (!pending_rejected_keys_.empty()) { pending_rejected_keys_.pop_front(); }
+}
+
+bool AdmissionFilter::IsPendingRejected(uint64_t key) const {
+  for (const auto& rejected_keys : pending_rejected_keys_) {
+    if (rejected_keys.count(key) != 0) { return true; }
+  }
+  return false;
+}
+
+uint32_t AdmissionFilter::Estimate(uint64_t key) const {
+  std::lock_guard<std::mutex> lock(mutex_);
+  const uint64_t hash = AdmissionSketchHash()(key);
+  const uint32_t h0 = static_cast<uint32_t>(hash);
+  const uint32_t h1 = static_cast<uint32_t>(hash >> 32);
+  uint32_t estimate = std::numeric_limits<uint32_t>::max();
+  for (uint32_t row = 0; row < depth_; ++row) {
+    const uint64_t column = (h0 + static_cast<uint64_t>(row) * h1) % width_;
+    estimate = std::min(estimate, counters_[static_cast<uint64_t>(row) * width_ + column]);
+  }
+  return estimate;
+}
+
+uint32_t AdmissionFilter::Add(uint64_t key) {
+  // Rows are indexed by double hashing, and only the smallest counters are incremented
+  // (conservative update), which keeps the overestimation of the rare keys low.
+  const uint64_t hash = AdmissionSketchHash()(key);
+  const uint32_t h0 = static_cast<uint32_t>(hash);
+  const uint32_t h1 = static_cast<uint32_t>(hash >> 32);
+  uint32_t* counters[kMaxSketchDepth];
+  uint32_t estimate = std::numeric_limits<uint32_t>::max();
+  for (uint32_t row = 0; row < depth_; ++row) {
+    const uint64_t column = (h0 + static_cast<uint64_t>(row) * h1) % width_;
+    counters[row] = &counters_[static_cast<uint64_t>(row) * width_ + column];
+    estimate = std::min(estimate, *counters[row]);
+  }
+  if (estimate != std::numeric_limits<uint32_t>::max()) {
+    for (uint32_t row = 0; row < depth_; ++row) {
+      if (*counters[row] == estimate) { *counters[row] += 1; }
+    }
+    estimate += 1;
+  }
+  num_additions_ += 1;
+  if (num_additions_ == aging_period_) { Age(); }
+  return estimate;
+}
+
+void AdmissionFilter::Age() {
+  for (auto& counter : counters_) { counter >>= 1; }
+  num_additions_ = 0;
+}
+
+}  // namespace embedding
+
+}  // namespace oneflow
@@ -0,0 +1,86 @@
+/*
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+*/
+#ifndef ONEFLOW_CORE_EMBEDDING_ADMISSION_FILTER_H_
+#define ONEFLOW_CORE_EMBEDDING_ADMISSION_FILTER_H_
+
+#include "oneflow/core/common/util.h"
+#include "oneflow/core/common/hash_container.h"
+#include <deque>
+
+namespace oneflow {
+
+namespace embedding {
+
+struct AdmissionFilterOptions {
+  uint32_t sketch_width = 1 << 20;
+  uint32_t sketch_depth = 4;
+};
+
+// Decides which of the keys missing from a store get a row in it. The occurrences of the missing
+// keys are counted with a count-min sketch and a key is admitted once its count reaches the
+// min_frequency of its table. The keys that are not admitted are remembered per batch until the
+// values of their batch are put, so that these values are not written to the store. A prefetch
+// can run ahead of the put of the previous batches, so several batches can be pending.
+class AdmissionFilter final {
+ public:
+  OF_DISALLOW_COPY_AND_MOVE(AdmissionFilter);
+  explicit AdmissionFilter(const AdmissionFilterOptions& options);
+  ~AdmissionFilter() = default;
+
+  // Starts a batch, called by its first query, i.e. its prefetch or its lookup if it has none.
+  void BeginBatch();
+
+  // Sets admitted[i] to whether keys[i] gets a row. The first query of a batch counts one
+  // occurrence of every key. The lookup following a prefetch does not count them again, its
+  // missing keys were rejected by the prefetch.
+  void Admit(uint32_t num_keys, const uint64_t* keys, const uint32_t* min_frequencies,
+             bool count, bool* admitted);
+
+  // Sets rejected[i] to whether keys[i] is rejected by the first batch that is not put yet, or
+  // by the last batch begun if last is true.
+  void IsRejected(uint32_t num_keys, const uint64_t* keys, bool last, bool* rejected) const;
+
+  // Forgets the keys rejected by the first batch that is not put yet, called once its values are
+  // put.
+  void EndBatch();
+
+  // The estimated number of occurrences of the key.
+  uint32_t Estimate(uint64_t key) const;
+
+  uint64_t NumRejected() const { return num_rejected_; }
+  void ResetStats() { num_rejected_ = 0; }
+
+ private:
+  uint32_t Add(uint64_t key);
+  bool IsPendingRejected(uint64_t key) const;
+  void Age();
+
+  uint32_t width_;
+  uint32_t depth_;
+  uint64_t aging_period_;
+  uint64_t num_additions_;
+  std::vector<uint32_t> counters_;
+  // The keys rejected by each batch that is not put yet, the oldest batch first.
+  std::deque<HashSet<uint64_t>> pending_rejected_keys_;
+  mutable std::mutex mutex_;
+  std::atomic<uint64_t> num_rejected_;
+};
+
+}  // namespace embedding
+
+}  // namespace oneflow
+
+#endif  // ONEFLOW_CORE_EMBEDDING_ADMISSION_FILTER_H_
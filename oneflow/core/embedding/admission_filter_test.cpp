@@ -0,0 +1,129 @@
+/*
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+*/
+#include "oneflow/core/embedding/admission_filter.h"
+#include <gtest/gtest.h>
+
+namespace oneflow {
+
+namespace embedding {
+
+namespace {
+
+bool AdmitKey(AdmissionFilter* filter, uint64_t key, uint32_t min_frequency, bool count) {
+  bool admitted = false;
+  filter->Admit(1, &key, &min_frequency, count, &admitted);
+  return admitted;
+}
+
+bool IsKeyRejected(AdmissionFilter* filter, uint64_t key, bool last) {
+  bool rejected = false;
+  filter->IsRejected(1, &key, last, &rejected);
+  return rejected;
+}
+
+TEST(AdmissionFilter, MinFrequency) {
+  AdmissionFilterOptions options;
+  options.sketch_width = 4096;
+  AdmissionFilter filter(options);
+  const uint32_t min_frequency = 3;
+  for (uint32_t i = 1; i < min_frequency; ++i) {
+    filter.BeginBatch();
+    ASSERT_FALSE(AdmitKey(&filter, 42, min_frequency, true));
+    ASSERT_TRUE(IsKeyRejected(&filter, 42, false));
+    // A lookup of the same batch does not count the key again.
+    ASSERT_FALSE(AdmitKey(&filter, 42, min_frequency, false));
+    filter.EndBatch();
+    ASSERT_FALSE(IsKeyRejected(&filter, 42, false));
+  }
+  ASSERT_EQ(filter.Estimate(42), min_frequency - 1);
+  filter.BeginBatch();
+  ASSERT_TRUE(AdmitKey(&filter, 42, min_frequency, true));
+  ASSERT_FALSE(IsKeyRejected(&filter, 42, false));
+  // Tables without an admission policy admit every key.
+  ASSERT_TRUE(AdmitKey(&filter, 43, 0, true));
+  ASSERT_EQ(filter.NumRejected(), min_frequency - 1);
+}
+
+TEST(AdmissionFilter, Batch) {
+  AdmissionFilterOptions options;
+  options.sketch_width = 1 << 16;
+  AdmissionFilter filter(options);
+  const uint32_t num_keys = 1000;
+  std::vector<uint64_t> keys(num_keys);
+  std::iota(keys.begin(), keys.end(), 0);
+  std::vector<uint32_t> min_frequencies(num_keys, 2);
+  std::unique_ptr<bool[]> admitted(new bool[num_keys]);
+  filter.BeginBatch();
+  filter.Admit(num_keys, keys.data(), min_frequencies.data(), true, admitted.get());
+  filter.EndBatch();
+  for (uint32_t i = 0; i < num_keys; ++i) { ASSERT_FALSE(admitted[i]); }
+  // The second occurrence of the even keys admits them, the odd keys are seen for the first time.
+  for (uint32_t i = 0; i < num_keys; ++i) { keys[i] = i % 2 == 0 ? i : num_keys + i; }
+  filter.BeginBatch();
+  filter.Admit(num_keys, keys.data(), min_frequencies.data(), true, admitted.get());
+  std::unique_ptr<bool[]> rejected(new bool[num_keys]);
+  filter.IsRejected(num_keys, keys.data(), false, rejected.get());
+  for (uint32_t i = 0; i < num_keys; ++i) {
+    ASSERT_EQ(admitted[i], i % 2 == 0);
+    ASSERT_EQ(rejected[i], !admitted[i]);
+  }
+}
+
+TEST(AdmissionFilter, PrefetchAheadOfPut) {
+  AdmissionFilterOptions options;
+  options.sketch_width = 4096;
+  AdmissionFilter filter(options);
+  const uint32_t min_frequency = 3;
+  // Batch 0 and batch 1 both have the key 42, batch 1 also has the key 43. The prefetch of
+  // batch 1 runs before the values of batch 0 are put, like in a pipelined graph.
+  filter.BeginBatch();
+  ASSERT_FALSE(AdmitKey(&filter, 42, min_frequency, true));
+  ASSERT_FALSE(AdmitKey(&filter, 42, min_frequency, false));
+  filter.BeginBatch();
+  ASSERT_FALSE(AdmitKey(&filter, 42, min_frequency, true));
+  ASSERT_FALSE(AdmitKey(&filter, 43, min_frequency, true));
+  ASSERT_TRUE(IsKeyRejected(&filter, 43, true));
+  // The put of batch 0 only drops the keys rejected by batch 0.
+  ASSERT_TRUE(IsKeyRejected(&filter, 42, false));
+  ASSERT_FALSE(IsKeyRejected(&filter, 43, false));
+  filter.EndBatch();
+  // The lookup of batch 1 after the put of batch 0 still sees the keys its prefetch rejected,
+  // and does not count them again.
+  ASSERT_FALSE(AdmitKey(&filter, 42, min_frequency, false));
+  ASSERT_FALSE(AdmitKey(&filter, 43, min_frequency, false));
+  ASSERT_TRUE(IsKeyRejected(&filter, 42, false));
+  ASSERT_TRUE(IsKeyRejected(&filter, 43, false));
+  filter.EndBatch();
+  ASSERT_EQ(filter.Estimate(42), 2);
+  ASSERT_EQ(filter.Estimate(43), 1);
+  ASSERT_EQ(filter.NumRejected(), 3);
+
+  // The third batch admits 42, even though it is prefetched before batch 1 is put.
+  filter.BeginBatch();
+  ASSERT_FALSE(AdmitKey(&filter, 43, min_frequency, true));
+  filter.BeginBatch();
+  ASSERT_TRUE(AdmitKey(&filter, 42, min_frequency, true));
+  ASSERT_FALSE(IsKeyRejected(&filter, 42, true));
+  filter.EndBatch();
+  ASSERT_FALSE(IsKeyRejected(&filter, 42, false));
+  ASSERT_FALSE(IsKeyRejected(&filter, 43, false));
+}
+
+}  // namespace
+
+}  // namespace embedding
+
+}  // namespace oneflow
@@ -22,11 +22,24 @@ namespace oneflow {
 namespace embedding {
 
 std::unique_ptr<Cache> NewCache(const CacheOptions& options) {
-#ifdef WITH_CUDA
   CHECK_GT(options.key_size, 0);
   CHECK_GT(options.value_size, 0);
   CHECK_GT(options.capacity, 0);
-  if (options.policy == CacheOptions::Policy::kLRU) {
+  if (options.device_type == DeviceType::kCPU) {
+    if (options.policy == CacheOptions::Policy::kLRU
+        || options.policy == CacheOptions::Policy::kLFU) {
+      return NewCpuLruCache(options);
+    } else if (options.policy == CacheOptions::Policy::kFull) {
+      return NewCpuFullCache(options);
+    } else {
+      UNIMPLEMENTED();
+      return nullptr;
+    }
+  }
+#ifdef WITH_CUDA
+  CHECK_EQ(options.device_type, DeviceType::kCUDA);
+  if (options.policy == CacheOptions::Policy::kLRU
+      || options.policy == CacheOptions::Policy::kLFU) {
     return NewLruCache(options);
   } else if (options.policy == CacheOptions::Policy::kFull) {
     return NewFullCache(options);
@@ -35,7 +48,7 @@ std::unique_ptr<Cache> NewCache(const CacheOptions& options) {
     return nullptr;
   }
 #else
-  UNIMPLEMENTED();
+  UNIMPLEMENTED() << "Only cpu caches are supported without CUDA";
   return nullptr;
 #endif  // WITH_CUDA
 }
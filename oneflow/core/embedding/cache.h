@@ -18,6 +18,7 @@ limitations under the License.
 
 #include "oneflow/core/embedding/kv_iterator.h"
 #include "oneflow/core/common/util.h"
+#include "oneflow/core/common/device_type.h"
 #include "oneflow/core/ep/include/stream.h"
 
 namespace oneflow {
@@ -28,6 +29,7 @@ struct CacheOptions {
   enum class Policy {
     kLRU,
     kFull,
+    kLFU,
   };
   enum class MemoryKind {
     kDevice,
@@ -35,6 +37,7 @@ struct CacheOptions {
   };
   Policy policy = Policy::kLRU;
   MemoryKind value_memory_kind = MemoryKind::kDevice;
+  DeviceType device_type = DeviceType::kCUDA;
   uint64_t capacity{};
   uint32_t key_size{};
   uint32_t value_size{};
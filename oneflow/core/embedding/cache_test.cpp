@@ -236,8 +236,209 @@ TEST(Cache, LruCache) {
   TestCache(cache.get(), line_size);
 }
 
+TEST(Cache, LfuCache) {
+  if (!HasCudaDevice()) { return; }
+
+  CacheOptions options{};
+  options.policy = CacheOptions::Policy::kLFU;
+  const uint32_t line_size = 128;
+  options.value_size = 512;
+  options.capacity = 65536;
+  options.key_size = 8;
+  options.value_memory_kind = CacheOptions::MemoryKind::kDevice;
+
+  std::unique_ptr<Cache> cache(NewCache(options));
+  cache->ReserveQueryLength(65536);
+  TestCache(cache.get(), line_size);
+}
+
 #endif  // WITH_CUDA
 
+void TestCpuCache(Cache* cache, uint32_t line_size) {
+  std::unique_ptr<ep::DeviceManagerRegistry> device_manager_registry(
+      new ep::DeviceManagerRegistry());
+  auto device = device_manager_registry->GetDevice(DeviceType::kCPU, 0);
+  ep::Stream* stream = device->CreateStream();
+
+  std::unordered_set<int64_t> in_cache;
+  const size_t n_iter = 32;
+  const uint32_t n_keys = 1024;
+  std::vector<int64_t> keys(n_keys);
+  uint32_t n_missing = 0;
+  std::vector<int64_t> missing_keys(n_keys);
+  std::vector<uint32_t> missing_indices(n_keys);
+  std::vector<float> values(n_keys * line_size);
+  uint32_t n_evicted = 0;
+  std::vector<int64_t> evicted_keys(n_keys);
+  std::vector<float> evicted_values(n_keys * line_size);
+  std::vector<int64_t> random_keys(n_keys * 32);
+  std::iota(random_keys.begin(), random_keys.end(), 1);
+  std::random_device rd;
+  std::mt19937 g(rd());
+  for (size_t iter = 0; iter < n_iter; ++iter) {
+    std::shuffle(random_keys.begin(), random_keys.end(), g);
+    std::copy(random_keys.begin(), random_keys.begin() + n_keys, keys.begin());
+    std::unordered_set<int64_t> expect_missing_keys_set;
+    std::unordered_set<int64_t> keys_set;
+    for (size_t i = 0; i < n_keys; ++i) {
+      keys_set.emplace(keys[i]);
+      if (in_cache.count(keys[i]) == 0) { expect_missing_keys_set.emplace(keys[i]); }
+    }
+    // test
+    cache->Test(stream, n_keys, keys.data(), &n_missing, missing_keys.data(),
+                missing_indices.data());
+    ASSERT_EQ(n_missing, expect_missing_keys_set.size());
+    std::unordered_set<int64_t> test_missing_keys_set;
+    for (size_t i = 0; i < n_missing; ++i) {
+      test_missing_keys_set.emplace(missing_keys[i]);
+      ASSERT_EQ(keys[missing_indices[i]], missing_keys[i]);
+    }
+    ASSERT_EQ(test_missing_keys_set, expect_missing_keys_set);
+
+    // get
+    cache->Get(stream, n_keys, keys.data(), values.data(), &n_missing, missing_keys.data(),
+               missing_indices.data());
+    ASSERT_EQ(n_missing, expect_missing_keys_set.size());
+    std::unordered_set<int64_t> get_missing_keys_set;
+    for (size_t i = 0; i < n_missing; ++i) {
+      get_missing_keys_set.emplace(missing_keys[i]);
+      ASSERT_EQ(keys[missing_indices[i]], missing_keys[i]);
+    }
+    ASSERT_EQ(get_missing_keys_set, expect_missing_keys_set);
+    for (size_t i = 0; i < n_keys; ++i) {
+      if (get_missing_keys_set.count(keys[i]) == 0) {
+        for (size_t j = 0; j < line_size; ++j) {
+          ASSERT_EQ(values[i * line_size + j], static_cast<float>(keys[i] * line_size + j))
+              << "iter " << iter << " i " << i << " j " << j;
+        }
+      }
+    }
+
+    // put
+    for (size_t i = 0; i < n_keys; ++i) {
+      for (size_t j = 0; j < line_size; ++j) {
+        values[i * line_size + j] = static_cast<float>(keys[i] * line_size + j);
+      }
+    }
+    cache->Put(stream, n_keys, keys.data(), values.data(), &n_evicted, evicted_keys.data(),
+               evicted_values.data());
+    for (size_t i = 0; i < n_evicted; ++i) {
+      ASSERT_TRUE(in_cache.count(evicted_keys[i]) > 0 || keys_set.count(evicted_keys[i]) > 0);
+      for (size_t j = 0; j < line_size; ++j) {
+        ASSERT_EQ(evicted_values[i * line_size + j],
+                  static_cast<float>(evicted_keys[i] * line_size + j));
+      }
+    }
+    for (size_t i = 0; i < n_keys; ++i) { in_cache.emplace(keys[i]); }
+    for (size_t i = 0; i < n_evicted; ++i) { in_cache.erase(evicted_keys[i]); }
+  }
+  const uint64_t dump_capacity = cache->DumpCapacity();
+  for (size_t start_key_index = 0; start_key_index < dump_capacity; start_key_index += n_keys) {
+    cache->Dump(stream, start_key_index, std::min(start_key_index + n_keys, dump_capacity),
+                &n_evicted, evicted_keys.data(), evicted_values.data());
+    for (size_t i = 0; i < n_evicted; ++i) {
+      ASSERT_TRUE(in_cache.count(evicted_keys[i]) > 0);
+      in_cache.erase(evicted_keys[i]);
+      for (size_t j = 0; j < line_size; ++j) {
+        ASSERT_EQ(evicted_values[i * line_size + j],
+                  static_cast<float>(evicted_keys[i] * line_size + j));
+      }
+    }
+  }
+  CHECK_EQ(in_cache.size(), 0);
+  device->DestroyStream(stream);
+}
+
+TEST(Cache, CpuFullCache) {
+  CacheOptions options{};
+  options.policy = CacheOptions::Policy::kFull;
+  const uint32_t line_size = 128;
+  options.value_size = 512;
+  options.capacity = 65536;
+  options.key_size = 8;
+  options.value_memory_kind = CacheOptions::MemoryKind::kHost;
+  options.device_type = DeviceType::kCPU;
+  std::unique_ptr<Cache> cache(NewCache(options));
+  cache->ReserveQueryLength(65536);
+  TestCpuCache(cache.get(), line_size);
+}
+
+TEST(Cache, CpuLruCache) {
+  CacheOptions options{};
+  options.policy = CacheOptions::Policy::kLRU;
+  const uint32_t line_size = 128;
+  options.value_size = 512;
+  options.capacity = 65536;
+  options.key_size = 8;
+  options.value_memory_kind = CacheOptions::MemoryKind::kHost;
+  options.device_type = DeviceType::kCPU;
+  std::unique_ptr<Cache> cache(NewCache(options));
+  cache->ReserveQueryLength(65536);
+  TestCpuCache(cache.get(), line_size);
+}
+
+TEST(Cache, CpuLfuCache) {
+  CacheOptions options{};
+  options.policy = CacheOptions::Policy::kLFU;
+  const uint32_t line_size = 128;
+  options.value_size = 512;
+  options.capacity = 65536;
+  options.key_size = 8;
+  options.value_memory_kind = CacheOptions::MemoryKind::kHost;
+  options.device_type = DeviceType::kCPU;
+  std::unique_ptr<Cache> cache(NewCache(options));
+  cache->ReserveQueryLength(65536);
+  TestCpuCache(cache.get(), line_size);
+}
+
+uint32_t CountHotKeysAfterScan(CacheOptions::Policy policy) {
+  std::unique_ptr<ep::DeviceManagerRegistry> device_manager_registry(
+      new ep::DeviceManagerRegistry());
+  auto device = device_manager_registry->GetDevice(DeviceType::kCPU, 0);
+  ep::Stream* stream = device->CreateStream();
+  CacheOptions options{};
+  options.policy = policy;
+  options.value_size = 16;
+  // a single set of 32 ways
+  options.capacity = 32;
+  options.key_size = 8;
+  options.value_memory_kind = CacheOptions::MemoryKind::kHost;
+  options.device_type = DeviceType::kCPU;
+  std::unique_ptr<Cache> cache(NewCache(options));
+  const uint32_t n_hot_keys = 16;
+  const uint32_t n_scan_keys = 8;
+  cache->ReserveQueryLength(n_hot_keys);
+  std::vector<int64_t> hot_keys(n_hot_keys);
+  std::iota(hot_keys.begin(), hot_keys.end(), 1);
+  std::vector<char> values(n_hot_keys * options.value_size);
+  uint32_t n_evicted = 0;
+  std::vector<int64_t> evicted_keys(n_hot_keys);
+  std::vector<char> evicted_values(n_hot_keys * options.value_size);
+  for (size_t iter = 0; iter < 8; ++iter) {
+    cache->Put(stream, n_hot_keys, hot_keys.data(), values.data(), &n_evicted, evicted_keys.data(),
+               evicted_values.data());
+  }
+  // a scan of keys that are accessed only once
+  std::vector<int64_t> scan_keys(n_scan_keys);
+  for (size_t iter = 0; iter < 64; ++iter) {
+    std::iota(scan_keys.begin(), scan_keys.end(), 1000 + iter * n_scan_keys);
+    cache->Put(stream, n_scan_keys, scan_keys.data(), values.data(), &n_evicted,
+               evicted_keys.data(), evicted_values.data());
+  }
+  uint32_t n_missing = 0;
+  std::vector<int64_t> missing_keys(n_hot_keys);
+  std::vector<uint32_t> missing_indices(n_hot_keys);
+  cache->Test(stream, n_hot_keys, hot_keys.data(), &n_missing, missing_keys.data(),
+              missing_indices.data());
+  device->DestroyStream(stream);
+  return n_hot_keys - n_missing;
+}
+
+TEST(Cache, CpuLfuCacheKeepsHotKeys) {
+  ASSERT_EQ(CountHotKeysAfterScan(CacheOptions::Policy::kLRU), 0);
+  ASSERT_EQ(CountHotKeysAfterScan(CacheOptions::Policy::kLFU), 16);
+}
+
 }  // namespace
 
 }  // namespace embedding
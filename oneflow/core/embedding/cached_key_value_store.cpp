@@ -0,0 +1,274 @@
+/*
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+*/
+#include "oneflow/core/embedding/cached_key_value_store.h"
+#include "oneflow/core/ep/include/device_manager_registry.h"
+#include "oneflow/core/common/hash_container.h"
+
+namespace oneflow {
+
+namespace embedding {
+
+namespace {
+
+uint64_t LoadKey(const void* keys, uint32_t key_size, uint32_t i) {
+  uint64_t key = 0;
+  std::memcpy(&key, static_cast<const char*>(keys) + i * key_size, key_size);
+  return key;
+}
+
+class CacheKeyValueStoreImpl : public KeyValueStore {
+ public:
+  OF_DISALLOW_COPY_AND_MOVE(CacheKeyValueStoreImpl);
+  CacheKeyValueStoreImpl(std::unique_ptr<KeyValueStore>&& store, std::unique_ptr<Cache>&& cache,
+                         bool track_dirty_keys)
+      : store_(std::move(store)),
+        cache_(std::move(cache)),
+        synced_(true),
+        max_query_length_(0),
+        track_dirty_keys_(track_dirty_keys) {
+    CHECK_EQ(store_->KeySize(), cache_->KeySize());
+    CHECK_EQ(store_->ValueSize(), cache_->ValueSize());
+  }
+  ~CacheKeyValueStoreImpl() override {
+    cache_.reset();
+    store_.reset();
+  }
+
+  uint32_t KeySize() const override { return store_->KeySize(); }
+  uint32_t ValueSize() const override { return store_->ValueSize(); }
+  uint32_t MaxQueryLength() const override { return max_query_length_; }
+
+  void ReserveQueryLength(uint32_t query_length) override {
+    if (query_length <= max_query_length_) { return; }
+    if (query_length > cache_->MaxQueryLength()) { cache_->ReserveQueryLength(query_length); }
+    if (query_length > store_->MaxQueryLength()) { store_->ReserveQueryLength(query_length); }
+    keys_buffer_.resize(query_length * store_->KeySize());
+    values_buffer_.resize(query_length * store_->ValueSize());
+    indices_buffer0_.resize(query_length);
+    indices_buffer1_.resize(query_length);
+    max_query_length_ = query_length;
+  }
+
+  void Get(ep::Stream* stream, uint32_t num_keys, const void* keys, void* values,
+           uint32_t* n_missing, uint32_t* missing_indices) override {
+    Get(stream, num_keys, keys, values, n_missing, missing_indices, true);
+  }
+  void GetUncounted(ep::Stream* stream, uint32_t num_keys, const void* keys, void* values,
+                    uint32_t* n_missing, uint32_t* missing_indices) override {
+    Get(stream, num_keys, keys, values, n_missing, missing_indices, false);
+  }
+  void Put(ep::Stream* stream, uint32_t num_keys, const void* keys, const void* values) override;
+  bool SnapshotExists(const std::string& name) override;
+  void LoadSnapshot(const std::string& name) override;
+  void SaveSnapshot(const std::string& name) override;
+  void LoadSnapshot(const std::string& name,
+                    const std::function<void(KVIterator* iter)>& Hook) override;
+
+  void GetStats(KeyValueStoreStats* stats) const override {
+    stats->cache_stats.emplace_back();
+    stats_counter_.Load(&stats->cache_stats.back());
+    store_->GetStats(stats);
+  }
+
+  void ResetStats() override {
+    stats_counter_.Reset();
+    store_->ResetStats();
+  }
+
+ private:
+  void Get(ep::Stream* stream, uint32_t num_keys, const void* keys, void* values,
+           uint32_t* n_missing, uint32_t* missing_indices, bool count_stats);
+  void SyncCacheToStore();
+
+  std::unique_ptr<KeyValueStore> store_;
+  std::unique_ptr<Cache> cache_;
+
+  std::vector<char> keys_buffer_;
+  std::vector<char> values_buffer_;
+  std::vector<uint32_t> indices_buffer0_;
+  std::vector<uint32_t> indices_buffer1_;
+  std::recursive_mutex mutex_;
+  bool synced_;
+  uint32_t max_query_length_;
+  CacheStatsCounter stats_counter_;
+  // Keys put into the cache and not written to the store since the last sync, only these are
+  // written back when the cache is synced. They are only tracked for the incremental snapshots,
+  // otherwise the whole cache is written back.
+  const bool track_dirty_keys_;
+  HashSet<uint64_t> dirty_keys_;
+};
+
+void CacheKeyValueStoreImpl::Get(ep::Stream* stream, uint32_t num_keys, const void* keys,
+                                 void* values, uint32_t* n_missing, uint32_t* missing_indices,
+                                 bool count_stats) {
+  std::lock_guard<std::recursive_mutex> lock(mutex_);
+  if (count_stats) { stats_counter_.num_lookups += num_keys; }
+  if (cache_->Policy() == CacheOptions::Policy::kFull) {
+    cache_->Get(stream, num_keys, keys, values, n_missing, keys_buffer_.data(), missing_indices);
+    if (count_stats) {
+      stats_counter_.num_hits += num_keys - *n_missing;
+      stats_counter_.num_misses += *n_missing;
+    }
+    return;
+  }
+  uint32_t num_cache_missing = 0;
+  cache_->Get(stream, num_keys, keys, values, &num_cache_missing, keys_buffer_.data(),
+              indices_buffer0_.data());
+  if (count_stats) {
+    stats_counter_.num_hits += num_keys - num_cache_missing;
+    stats_counter_.num_misses += num_cache_missing;
+  }
+  if (num_cache_missing == 0) {
+    *n_missing = 0;
+    return;
+  }
+  if (count_stats) {
+    store_->Get(stream, num_cache_missing, keys_buffer_.data(), values_buffer_.data(), n_missing,
+                indices_buffer1_.data());
+  } else {
+    store_->GetUncounted(stream, num_cache_missing, keys_buffer_.data(), values_buffer_.data(),
+                         n_missing, indices_buffer1_.data());
+  }
+  const uint32_t value_size = store_->ValueSize();
+  for (uint32_t i = 0; i < num_cache_missing; ++i) {
+    std::memcpy(static_cast<char*>(values) + indices_buffer0_[i] * value_size,
+                values_buffer_.data() + i * value_size, value_size);
+  }
+  for (uint32_t i = 0; i < *n_missing; ++i) {
+    missing_indices[i] = indices_buffer0_[indices_buffer1_[i]];
+  }
+}
+
+void CacheKeyValueStoreImpl::Put(ep::Stream* stream, uint32_t num_keys, const void* keys,
+                                 const void* values) {
+  std::lock_guard<std::recursive_mutex> lock(mutex_);
+  synced_ = false;
+  const uint32_t key_size = store_->KeySize();
+  if (track_dirty_keys_) {
+    for (uint32_t i = 0; i < num_keys; ++i) { dirty_keys_.insert(LoadKey(keys, key_size, i)); }
+  }
+  uint32_t num_evicted = 0;
+  cache_->Put(stream, num_keys, keys, values, &num_evicted, keys_buffer_.data(),
+              values_buffer_.data());
+  stats_counter_.num_evictions += num_evicted;
+  if (cache_->Policy() == CacheOptions::Policy::kFull) { return; }
+  stats_counter_.num_write_backs += num_evicted;
+  if (track_dirty_keys_) {
+    for (uint32_t i = 0; i < num_evicted; ++i) {
+      dirty_keys_.erase(LoadKey(keys_buffer_.data(), key_size, i));
+    }
+  }
+  store_->Put(stream, num_evicted, keys_buffer_.data(), values_buffer_.data());
+}
+
+bool CacheKeyValueStoreImpl::SnapshotExists(const std::string& name) {
+  return store_->SnapshotExists(name);
+}
+
+void CacheKeyValueStoreImpl::LoadSnapshot(const std::string& name) {
+  LoadSnapshot(name, nullptr);
+}
+
+void CacheKeyValueStoreImpl::LoadSnapshot(const std::string& name,
+                                          const std::function<void(KVIterator* iter)>& Hook) {
+  std::lock_guard<std::recursive_mutex> lock(mutex_);
+  CHECK_GT(max_query_length_, 0);
+  cache_->Clear();
+  dirty_keys_.clear();
+  auto device = Global<ep::DeviceManagerRegistry>::Get()->GetDevice(DeviceType::kCPU, 0);
+  CHECK(device);
+  auto* stream = device->CreateStream();
+  store_->LoadSnapshot(name, [&](KVIterator* iter) {
+    if (cache_->Policy() == CacheOptions::Policy::kFull) {
+      while (true) {
+        uint32_t num_keys = 0;
+        iter->NextN(stream, max_query_length_, &num_keys, keys_buffer_.data(),
+                    values_buffer_.data());
+        if (num_keys == 0) { break; }
+        uint32_t num_evicted = 0;
+        cache_->Put(stream, num_keys, keys_buffer_.data(), values_buffer_.data(), &num_evicted,
+                    nullptr, nullptr);
+        CHECK_EQ(num_evicted, 0);
+      }
+    }
+    if (Hook) {
+      iter->Reset();
+      Hook(iter);
+    }
+  });
+  device->DestroyStream(stream);
+  store_->LoadSnapshot(name);
+}
+
+void CacheKeyValueStoreImpl::SaveSnapshot(const std::string& name) {
+  std::lock_guard<std::recursive_mutex> lock(mutex_);
+  SyncCacheToStore();
+  store_->SaveSnapshot(name);
+}
+
+void CacheKeyValueStoreImpl::SyncCacheToStore() {
+  if (synced_) { return; }
+  auto device = Global<ep::DeviceManagerRegistry>::Get()->GetDevice(DeviceType::kCPU, 0);
+  CHECK(device);
+  auto* stream = device->CreateStream();
+  const uint64_t dump_capacity = cache_->DumpCapacity();
+  const uint32_t key_size = store_->KeySize();
+  const uint32_t value_size = store_->ValueSize();
+  CHECK_GT(max_query_length_, 0);
+  for (uint64_t start_key_index = 0; start_key_index < dump_capacity;
+       start_key_index += max_query_length_) {
+    uint32_t num_dumped = 0;
+    cache_->Dump(stream, start_key_index,
+                 std::min(start_key_index + max_query_length_, dump_capacity), &num_dumped,
+                 keys_buffer_.data(), values_buffer_.data());
+    if (!track_dirty_keys_) {
+      if (num_dumped == 0) { continue; }
+      stats_counter_.num_write_backs += num_dumped;
+      store_->Put(stream, num_dumped, keys_buffer_.data(), values_buffer_.data());
+      continue;
+    }
+    uint32_t num_dirty = 0;
+    for (uint32_t i = 0; i < num_dumped; ++i) {
+      if (dirty_keys_.count(LoadKey(keys_buffer_.data(), key_size, i)) == 0) { continue; }
+      if (num_dirty != i) {
+        std::memcpy(keys_buffer_.data() + num_dirty * key_size, keys_buffer_.data() + i * key_size,
+                    key_size);
+        std::memcpy(values_buffer_.data() + num_dirty * value_size,
+                    values_buffer_.data() + i * value_size, value_size);
+      }
+      num_dirty += 1;
+    }
+    if (num_dirty == 0) { continue; }
+    stats_counter_.num_write_backs += num_dirty;
+    store_->Put(stream, num_dirty, keys_buffer_.data(), values_buffer_.data());
+  }
+  device->DestroyStream(stream);
+  dirty_keys_.clear();
+  synced_ = true;
+}
+
+}  // namespace
+
+std::unique_ptr<KeyValueStore> NewCpuCachedKeyValueStore(std::unique_ptr<KeyValueStore>&& store,
+                                                         std::unique_ptr<Cache>&& cache,
+                                                         bool track_dirty_keys) {
+  return std::unique_ptr<KeyValueStore>(
+      new CacheKeyValueStoreImpl(std::move(store), std::move(cache), track_dirty_keys));
+}
+
+}  // namespace embedding
+
+}  // namespace oneflow
@@ -89,7 +89,13 @@ class CacheKeyValueStoreImpl : public KeyValueStore {
   }
 
   void Get(ep::Stream* stream, uint32_t num_keys, const void* keys, void* values,
-           uint32_t* n_missing, uint32_t* missing_indices) override;
+           uint32_t* n_missing, uint32_t* missing_indices) override {
+    Get(stream, num_keys, keys, values, n_missing, missing_indices, true);
+  }
+  void GetUncounted(ep::Stream* stream, uint32_t num_keys, const void* keys, void* values,
+                    uint32_t* n_missing, uint32_t* missing_indices) override {
+    Get(stream, num_keys, keys, values, n_missing, missing_indices, false);
+  }
   void Put(ep::Stream* stream, uint32_t num_keys, const void* keys, const void* values) override;
   bool SnapshotExists(const std::string& name) override;
   void LoadSnapshot(const std::string& name) override;
@@ -97,7 +103,20 @@ class CacheKeyValueStoreImpl : public KeyValueStore {
   void LoadSnapshot(const std::string& name,
                     const std::function<void(KVIterator* iter)>& Hook) override;
 
+  void GetStats(KeyValueStoreStats* stats) const override {
+    stats->cache_stats.emplace_back();
+    stats_counter_.Load(&stats->cache_stats.back());
+    store_->GetStats(stats);
+  }
+
+  void ResetStats() override {
+    stats_counter_.Reset();
+    store_->ResetStats();
+  }
+
  private:
+  void Get(ep::Stream* stream, uint32_t num_keys, const void* keys, void* values,
+           uint32_t* n_missing, uint32_t* missing_indices, bool count_stats);
   void SyncCacheToStore();
 
   std::unique_ptr<KeyValueStore> store_;
@@ -114,16 +133,24 @@ class CacheKeyValueStoreImpl : public KeyValueStore {
   uint32_t num_elems_per_value_{};
   std::recursive_mutex mutex_;
   bool synced_;
+  CacheStatsCounter stats_counter_;
 };
 
 template<typename Key, typename Elem>
 void CacheKeyValueStoreImpl<Key, Elem>::Get(ep::Stream* stream, uint32_t num_keys, const void* keys,
                                             void* values, uint32_t* n_missing,
-                                            uint32_t* missing_indices) {
+                                            uint32_t* missing_indices, bool count_stats) {
   std::lock_guard<std::recursive_mutex> lock(mutex_);
   auto cuda_stream = stream->As<ep::CudaStream>();
+  if (count_stats) { stats_counter_.num_lookups += num_keys; }
   if (cache_->Policy() == CacheOptions::Policy::kFull) {
     cache_->Get(stream, num_keys, keys, values, n_missing, keys_buffer_, missing_indices);
+    if (!count_stats) { return; }
+    OF_CUDA_CHECK(cudaMemcpyAsync(host_num_buffer_, n_missing, sizeof(uint32_t), cudaMemcpyDefault,
+                                  cuda_stream->cuda_stream()));
+    CHECK_JUST(cuda_stream->Sync());
+    stats_counter_.num_hits += num_keys - *host_num_buffer_;
+    stats_counter_.num_misses += *host_num_buffer_;
     return;
   } else {
     cache_->Get(stream, num_keys, keys, values, num_buffer_, keys_buffer_, indices_buffer0_);
@@ -132,12 +159,22 @@ void CacheKeyValueStoreImpl<Key, Elem>::Get(ep::Stream* stream, uint32_t num_key
                                 cuda_stream->cuda_stream()));
   CHECK_JUST(cuda_stream->Sync());
   const uint32_t num_cache_missing = *host_num_buffer_;
+  if (count_stats) {
+    stats_counter_.num_hits += num_keys - num_cache_missing;
+    stats_counter_.num_misses += num_cache_missing;
+  }
   if (num_cache_missing == 0) {
     OF_CUDA_CHECK(cudaMemsetAsync(n_missing, 0, sizeof(uint32_t),
                                   stream->As<ep::CudaStream>()->cuda_stream()));
     return;
   }
-  store_->Get(stream, num_cache_missing, keys_buffer_, values_buffer_, n_missing, indices_buffer1_);
+  if (count_stats) {
+    store_->Get(stream, num_cache_missing, keys_buffer_, values_buffer_, n_missing,
+                indices_buffer1_);
+  } else {
+    store_->GetUncounted(stream, num_cache_missing, keys_buffer_, values_buffer_, n_missing,
+                         indices_buffer1_);
+  }
   OF_CUDA_CHECK(cudaMemcpyAsync(host_num_buffer_, n_missing, sizeof(uint32_t), cudaMemcpyDefault,
                                 cuda_stream->cuda_stream()));
   CHECK_JUST(cuda_stream->Sync());
@@ -158,6 +195,8 @@ void CacheKeyValueStoreImpl<Key, Elem>::Put(ep::Stream* stream, uint32_t num_key
   OF_CUDA_CHECK(cudaMemcpyAsync(host_num_buffer_, num_buffer_, sizeof(uint32_t), cudaMemcpyDefault,
                                 cuda_stream->cuda_stream()));
   CHECK_JUST(cuda_stream->Sync());
+  stats_counter_.num_evictions += *host_num_buffer_;
+  stats_counter_.num_write_backs += *host_num_buffer_;
   store_->Put(stream, *host_num_buffer_, keys_buffer_, values_buffer_);
 }
 
@@ -237,6 +276,7 @@ void CacheKeyValueStoreImpl<Key, Elem>::SyncCacheToStore() {
                                   cudaMemcpyDefault, cuda_stream->cuda_stream()));
     CHECK_JUST(stream->Sync());
     if (*host_num_buffer_ == 0) { continue; }
+    stats_counter_.num_write_backs += *host_num_buffer_;
     store_->Put(stream, *host_num_buffer_, keys_buffer_, values_buffer_);
     CHECK_JUST(stream->Sync());
   }
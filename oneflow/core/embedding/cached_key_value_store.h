@@ -23,9 +23,42 @@ namespace oneflow {
 
 namespace embedding {
 
+struct CacheStatsCounter {
+  CacheStatsCounter()
+      : num_lookups(0), num_hits(0), num_misses(0), num_evictions(0), num_write_backs(0) {}
+
+  void Load(CacheStats* stats) const {
+    stats->num_lookups = num_lookups;
+    stats->num_hits = num_hits;
+    stats->num_misses = num_misses;
+    stats->num_evictions = num_evictions;
+    stats->num_write_backs = num_write_backs;
+  }
+
+  void Reset() {
+    num_lookups = 0;
+    num_hits = 0;
+    num_misses = 0;
+    num_evictions = 0;
+    num_write_backs = 0;
+  }
+
+  std::atomic<uint64_t> num_lookups;
+  std::atomic<uint64_t> num_hits;
+  std::atomic<uint64_t> num_misses;
+  std::atomic<uint64_t> num_evictions;
+  std::atomic<uint64_t> num_write_backs;
+};
+
 std::unique_ptr<KeyValueStore> NewCachedKeyValueStore(std::unique_ptr<KeyValueStore>&& store,
                                                       std::unique_ptr<Cache>&& cache);
 
+// With track_dirty_keys, only the keys put since the last sync are written back to the store when
+// the cache is synced, which keeps the incremental snapshots of the persistent table small.
+std::unique_ptr<KeyValueStore> NewCpuCachedKeyValueStore(std::unique_ptr<KeyValueStore>&& store,
+                                                         std::unique_ptr<Cache>&& cache,
+                                                         bool track_dirty_keys = false);
+
 }  // namespace embedding
 
 }  // namespace oneflow
@@ -17,14 +17,37 @@ limitations under the License.
 #include "oneflow/core/embedding/persistent_table_key_value_store.h"
 #include "oneflow/core/ep/include/device_manager_registry.h"
 #include "oneflow/core/embedding/cached_key_value_store.h"
+#include "oneflow/core/embedding/reduced_precision_key_value_store.h"
 
 namespace oneflow {
 
 namespace embedding {
 
+constexpr size_t kDefaultMaxQueryLength = 65536;
+
+namespace {
+
+class EmbeddingDeviceGuard final {
+ public:
+  OF_DISALLOW_COPY_AND_MOVE(EmbeddingDeviceGuard);
+  EmbeddingDeviceGuard(DeviceType device_type, int64_t local_rank_id) {
 #ifdef WITH_CUDA
+    if (device_type == DeviceType::kCUDA) {
+      cuda_guard_.reset(new CudaCurrentDeviceGuard(local_rank_id));
+    }
+#else
+    CHECK_EQ(device_type, DeviceType::kCPU) << "Only cpu embeddings are supported without CUDA";
+#endif  // WITH_CUDA
+  }
+  ~EmbeddingDeviceGuard() = default;
 
-constexpr size_t kDefaultMaxQueryLength = 65536;
+ private:
+#ifdef WITH_CUDA
+  std::unique_ptr<CudaCurrentDeviceGuard> cuda_guard_;
+#endif  // WITH_CUDA
+};
+
+}  // namespace
 
 KeyValueStore* EmbeddingManager::GetKeyValueStore(const std::string& embedding_name,
                                                   int64_t rank_id) {
@@ -36,10 +59,44 @@ KeyValueStore* EmbeddingManager::GetKeyValueStore(const std::string& embedding_n
   return it->second.get();
 }
 
+EmbeddingStats* EmbeddingManager::GetEmbeddingStats(const std::string& embedding_name,
+                                                    int64_t rank_id) {
+  std::pair<std::string, int64_t> map_key = std::make_pair(embedding_name, rank_id);
+  std::unique_lock<std::mutex> lock(mutex_);
+  auto it = embedding_stats_map_.find(map_key);
+  CHECK(it != embedding_stats_map_.end())
+      << "Can not find embedding: " << embedding_name << "-" << rank_id;
+  return it->second.get();
+}
+
+AdmissionFilter* EmbeddingManager::GetAdmissionFilter(const std::string& embedding_name,
+                                                      int64_t rank_id) {
+  std::pair<std::string, int64_t> map_key = std::make_pair(embedding_name, rank_id);
+  std::unique_lock<std::mutex> lock(mutex_);
+  CHECK(key_value_store_map_.find(map_key) != key_value_store_map_.end())
+      << "Can not find embedding: " << embedding_name << "-" << rank_id;
+  auto it = admission_filter_map_.find(map_key);
+  if (it == admission_filter_map_.end()) { return nullptr; }
+  return it->second.get();
+}
+
+void EmbeddingManager::ResetStats(const std::string& embedding_name, int64_t rank_id) {
+  std::pair<std::string, int64_t> map_key = std::make_pair(embedding_name, rank_id);
+  std::unique_lock<std::mutex> lock(mutex_);
+  auto it = key_value_store_map_.find(map_key);
+  CHECK(it != key_value_store_map_.end())
+      << "Can not find embedding: " << embedding_name << "-" << rank_id;
+  it->second->ResetStats();
+  embedding_stats_map_.at(map_key)->Reset();
+  auto admission_it = admission_filter_map_.find(map_key);
+  if (admission_it != admission_filter_map_.end()) { admission_it->second->ResetStats(); }
+}
+
 void EmbeddingManager::CreateKeyValueStore(const KeyValueStoreOptions& key_value_store_options,
                                            int64_t local_rank_id, int64_t rank_id,
                                            int64_t world_size) {
-  CudaCurrentDeviceGuard guard(local_rank_id);
+  const DeviceType device_type = key_value_store_options.GetDeviceType();
+  EmbeddingDeviceGuard guard(device_type, local_rank_id);
   const std::string& name = key_value_store_options.Name();
   const uint32_t line_size = key_value_store_options.LineSize();
   std::pair<std::string, int64_t> map_key = std::make_pair(name, rank_id);
@@ -51,42 +108,73 @@ void EmbeddingManager::CreateKeyValueStore(const KeyValueStoreOptions& key_value
       key_value_store_options.PersistentTablePaths();
   CHECK_EQ(persistent_table_paths.size(), world_size);
   options.table_options.path = persistent_table_paths.at(rank_id);
-  options.table_options.value_size = line_size * key_value_store_options.ValueTypeSize();
+  options.table_options.value_size = key_value_store_options.StorageValueSize();
   options.table_options.key_size = key_value_store_options.KeyTypeSize();
   options.table_options.physical_block_size =
       key_value_store_options.PersistentTablePhysicalBlockSize();
   options.table_options.target_chunk_size_mb = 4 * 1024;
   options.table_options.capacity_hint = key_value_store_options.PersistentTableCapacityHint();
-  store = NewPersistentTableKeyValueStore(options);
+  options.table_options.compaction_threshold =
+      key_value_store_options.PersistentTableCompactionThreshold();
+  options.table_options.max_incremental_snapshots =
+      key_value_store_options.PersistentTableMaxIncrementalSnapshots();
+  options.table_options.ttl_seconds = key_value_store_options.PersistentTableTtlSeconds();
   const std::vector<CacheOptions>& cache_options = key_value_store_options.GetCachesOptions();
-  for (int i = cache_options.size() - 1; i >= 0; --i) {
-    std::unique_ptr<Cache> cache = NewCache(cache_options.at(i));
-    store = NewCachedKeyValueStore(std::move(store), std::move(cache));
+  if (device_type == DeviceType::kCPU) {
+    store = NewCpuPersistentTableKeyValueStore(options);
+    for (int i = cache_options.size() - 1; i >= 0; --i) {
+      std::unique_ptr<Cache> cache = NewCache(cache_options.at(i));
+      store = NewCpuCachedKeyValueStore(std::move(store), std::move(cache),
+                                        options.table_options.max_incremental_snapshots > 0);
+    }
+    if (key_value_store_options.StorageDataType() != DataType::kFloat) {
+      store = NewCpuReducedPrecisionKeyValueStore(
+          std::move(store), NewValueCodec(key_value_store_options.StorageDataType(), line_size,
+                                          key_value_store_options.SizeFactor()));
+    }
+  } else {
+#ifdef WITH_CUDA
+    CHECK(key_value_store_options.StorageDataType() == DataType::kFloat)
+        << "storage_dtype is only supported by the cpu kv_store";
+    store = NewPersistentTableKeyValueStore(options);
+    for (int i = cache_options.size() - 1; i >= 0; --i) {
+      std::unique_ptr<Cache> cache = NewCache(cache_options.at(i));
+      store = NewCachedKeyValueStore(std::move(store), std::move(cache));
+    }
+#else
+    UNIMPLEMENTED() << "Only cpu embeddings are supported without CUDA";
+#endif  // WITH_CUDA
   }
   store->ReserveQueryLength(kDefaultMaxQueryLength);
   CHECK(key_value_store_map_.emplace(map_key, std::move(store)).second)
       << "Can't create an embedding with same name of an existing embedding, the name: " << name;
+  device_type_map_[map_key] = device_type;
+  embedding_stats_map_[map_key].reset(new EmbeddingStats());
+  if (key_value_store_options.HasAdmission()) {
+    admission_filter_map_[map_key].reset(
+        new AdmissionFilter(key_value_store_options.GetAdmissionOptions()));
+  }
 }
 
 void EmbeddingManager::SaveSnapshot(const std::string& embedding_name, int64_t local_rank_id,
                                     int64_t rank_id, const std::string& snapshot_name) {
-  CudaCurrentDeviceGuard guard(local_rank_id);
   std::pair<std::string, int64_t> map_key = std::make_pair(embedding_name, rank_id);
   std::unique_lock<std::mutex> lock(mutex_);
 
   auto it = key_value_store_map_.find(map_key);
   CHECK(it != key_value_store_map_.end())
       << "Can not find embedding: " << embedding_name << "-" << rank_id;
+  EmbeddingDeviceGuard guard(device_type_map_.at(map_key), local_rank_id);
   it->second->SaveSnapshot(snapshot_name);
 }
 
 void EmbeddingManager::LoadSnapshot(const std::string& embedding_name, int64_t local_rank_id,
                                     int64_t rank_id, const std::string& snapshot_name) {
-  CudaCurrentDeviceGuard guard(local_rank_id);
   std::pair<std::string, int64_t> map_key = std::make_pair(embedding_name, rank_id);
   auto it = key_value_store_map_.find(map_key);
   CHECK(it != key_value_store_map_.end())
       << "Can not find embedding: " << embedding_name << "-" << rank_id;
+  EmbeddingDeviceGuard guard(device_type_map_.at(map_key), local_rank_id);
   if (it->second->SnapshotExists(snapshot_name)) {
     it->second->LoadSnapshot(snapshot_name);
   } else {
@@ -95,8 +183,6 @@ void EmbeddingManager::LoadSnapshot(const std::string& embedding_name, int64_t l
   }
 }
 
-#endif  // WITH_CUDA
-
 }  // namespace embedding
 
 }  // namespace oneflow
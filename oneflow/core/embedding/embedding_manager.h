@@ -20,12 +20,41 @@ limitations under the License.
 
 #include "oneflow/core/embedding/key_value_store.h"
 #include "oneflow/core/embedding/key_value_store_options.h"
+#include "oneflow/core/embedding/admission_filter.h"
 
 namespace oneflow {
 
 namespace embedding {
 
-#ifdef WITH_CUDA
+class EmbeddingStats final {
+ public:
+  OF_DISALLOW_COPY_AND_MOVE(EmbeddingStats);
+  EmbeddingStats() : num_batches_(0), num_unique_ids_(0), max_num_unique_ids_(0) {}
+  ~EmbeddingStats() = default;
+
+  void AddBatch(uint32_t num_unique_ids) {
+    num_batches_ += 1;
+    num_unique_ids_ += num_unique_ids;
+    uint64_t max_num_unique_ids = max_num_unique_ids_;
+    while (num_unique_ids > max_num_unique_ids
+           && !max_num_unique_ids_.compare_exchange_weak(max_num_unique_ids, num_unique_ids)) {}
+  }
+
+  void Reset() {
+    num_batches_ = 0;
+    num_unique_ids_ = 0;
+    max_num_unique_ids_ = 0;
+  }
+
+  uint64_t NumBatches() const { return num_batches_; }
+  uint64_t NumUniqueIds() const { return num_unique_ids_; }
+  uint64_t MaxNumUniqueIds() const { return max_num_unique_ids_; }
+
+ private:
+  std::atomic<uint64_t> num_batches_;
+  std::atomic<uint64_t> num_unique_ids_;
+  std::atomic<uint64_t> max_num_unique_ids_;
+};
 
 class EmbeddingManager final {
  public:
@@ -38,17 +67,22 @@ class EmbeddingManager final {
                     const std::string& snapshot_name);
 
   KeyValueStore* GetKeyValueStore(const std::string& embedding_name, int64_t rank_id);
+  EmbeddingStats* GetEmbeddingStats(const std::string& embedding_name, int64_t rank_id);
+  // Returns nullptr if none of the tables of the embedding has an admission policy.
+  AdmissionFilter* GetAdmissionFilter(const std::string& embedding_name, int64_t rank_id);
+  void ResetStats(const std::string& embedding_name, int64_t rank_id);
 
   void CreateKeyValueStore(const KeyValueStoreOptions& options, int64_t local_rank_id,
                            int64_t rank_id, int64_t world_size);
 
  private:
   HashMap<std::pair<std::string, int64_t>, std::unique_ptr<KeyValueStore>> key_value_store_map_;
+  HashMap<std::pair<std::string, int64_t>, DeviceType> device_type_map_;
+  HashMap<std::pair<std::string, int64_t>, std::unique_ptr<EmbeddingStats>> embedding_stats_map_;
+  HashMap<std::pair<std::string, int64_t>, std::unique_ptr<AdmissionFilter>> admission_filter_map_;
   std::mutex mutex_;
 };
 
-#endif  // WITH_CUDA
-
 }  // namespace embedding
 }  // namespace oneflow
 
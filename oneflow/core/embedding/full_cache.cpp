@@ -0,0 +1,315 @@
+/*
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+*/
+#include "oneflow/core/embedding/full_cache.h"
+#include "oneflow/core/embedding/hash_functions.cuh"
+#include "oneflow/core/ep/cpu/cpu_stream.h"
+#include <atomic>
+
+namespace oneflow {
+
+namespace embedding {
+
+namespace {
+
+constexpr size_t kKeysPerThreadChunk = 1024;
+
+template<typename Key, typename Index>
+bool TryGetOrInsert(std::atomic<Key>* entry_key, std::atomic<Index>* entry_index,
+                    std::atomic<Index>* table_size, Key key, Index* out) {
+  const Key key_hi = (key | 0x1);
+  const Key key_lo = (key & 0x1);
+  Key old_entry_key = 0;
+  if (entry_key->compare_exchange_strong(old_entry_key, key_hi)) {
+    const Index index_plus_one = table_size->fetch_add(1) + 1;
+    entry_index->store(((index_plus_one << 1U) | key_lo), std::memory_order_release);
+    *out = index_plus_one;
+    return true;
+  } else if (old_entry_key == key_hi) {
+    while (true) {
+      const Index entry_index_val = entry_index->load(std::memory_order_acquire);
+      if (entry_index_val == 0) {
+        // the owner of the slot has not published its index yet
+        continue;
+      } else if ((entry_index_val & 0x1) == key_lo) {
+        *out = (entry_index_val >> 1U);
+        return true;
+      } else {
+        return false;
+      }
+    }
+  }
+  return false;
+}
+
+// Host counterpart of the OrdinalEncoder in full_cache.cu, an open addressing hash table with
+// linear probing that maps every key to a dense row index. Lookups are lock free and inserts
+// claim slots with CAS, so both are safe to run from many threads at once.
+template<typename Key, typename Index>
+class OrdinalEncoder {
+ public:
+  OF_DISALLOW_COPY_AND_MOVE(OrdinalEncoder);
+  explicit OrdinalEncoder(uint64_t capacity, float load_factor)
+      : capacity_(capacity),
+        table_capacity_(capacity / load_factor),
+        table_keys_(new std::atomic<Key>[table_capacity_]),
+        table_indices_(new std::atomic<Index>[table_capacity_]) {
+    Clear();
+  }
+  ~OrdinalEncoder() = default;
+
+  bool GetOrInsertOne(Key key, Index* out) {
+    const size_t start_idx = FullCacheHash()(key) % table_capacity_;
+    for (size_t count = 0; count < table_capacity_; ++count) {
+      const size_t idx = (start_idx + count) % table_capacity_;
+      if (TryGetOrInsert<Key, Index>(table_keys_.get() + idx, table_indices_.get() + idx,
+                                     &table_size_, key, out)) {
+        return true;
+      }
+    }
+    return false;
+  }
+
+  Index GetOne(Key key) const {
+    const Key key_hi = (key | 0x1);
+    const Key key_lo = (key & 0x1);
+    const size_t start_idx = FullCacheHash()(key) % table_capacity_;
+    for (size_t count = 0; count < table_capacity_; ++count) {
+      const size_t idx = (start_idx + count) % table_capacity_;
+      const Key entry_key = table_keys_[idx].load(std::memory_order_acquire);
+      if (entry_key == 0) { break; }
+      if (entry_key == key_hi) {
+        const Index entry_index = table_indices_[idx].load(std::memory_order_acquire);
+        if ((entry_index & 0x1) == key_lo) { return (entry_index >> 1U); }
+      }
+    }
+    return 0;
+  }
+
+  template<bool insert>
+  void Encode(ep::CpuStream* stream, uint32_t num_keys, const Key* keys, Index* context) {
+    stream->ParallelFor(
+        0, num_keys,
+        [&](int64_t start, int64_t end) {
+          for (int64_t i = start; i < end; ++i) {
+            if (insert) {
+              CHECK(GetOrInsertOne(keys[i], context + i));
+            } else {
+              context[i] = GetOne(keys[i]);
+            }
+          }
+        },
+        kKeysPerThreadChunk);
+    if (insert) {
+      CHECK_LT(table_size_.load(), capacity_)
+          << "The number of key is larger than cache size, please enlarge cache_memory_budget. ";
+    }
+  }
+
+  void Dump(uint64_t start_key_index, uint64_t end_key_index, uint32_t* n_dumped, Key* keys,
+            Index* context) const {
+    uint32_t count = 0;
+    for (uint64_t i = start_key_index; i < end_key_index; ++i) {
+      const Key entry_key = table_keys_[i].load(std::memory_order_relaxed);
+      const Index entry_index = table_indices_[i].load(std::memory_order_relaxed);
+      if (entry_index != 0) {
+        keys[count] = ((entry_key ^ 0x1) | (entry_index & 0x1));
+        context[count] = (entry_index >> 1U);
+        count += 1;
+      }
+    }
+    *n_dumped = count;
+  }
+
+  void Clear() {
+    table_size_.store(0);
+    for (uint64_t i = 0; i < table_capacity_; ++i) {
+      table_keys_[i].store(0, std::memory_order_relaxed);
+      table_indices_[i].store(0, std::memory_order_relaxed);
+    }
+  }
+
+  uint64_t TableCapacity() const { return table_capacity_; }
+
+ private:
+  uint64_t capacity_;
+  uint64_t table_capacity_;
+  std::unique_ptr<std::atomic<Key>[]> table_keys_;
+  std::unique_ptr<std::atomic<Index>[]> table_indices_;
+  std::atomic<Index> table_size_{};
+};
+
+template<typename Key, typename Index>
+class CacheImpl : public Cache {
+ public:
+  OF_DISALLOW_COPY_AND_MOVE(CacheImpl);
+  explicit CacheImpl(const CacheOptions& options)
+      : encoder_(options.capacity, options.load_factor),
+        options_(options),
+        values_(new char[options.capacity * options.value_size]),
+        max_query_length_(0) {}
+  ~CacheImpl() override = default;
+
+  uint64_t Capacity() const override { return options_.capacity; }
+  uint64_t DumpCapacity() const override { return encoder_.TableCapacity(); }
+  uint32_t KeySize() const override { return options_.key_size; }
+  uint32_t ValueSize() const override { return options_.value_size; }
+  uint32_t MaxQueryLength() const override { return max_query_length_; }
+
+  void ReserveQueryLength(uint32_t query_length) override {
+    if (query_length <= max_query_length_) { return; }
+    encoding_buffer_.resize(query_length);
+    max_query_length_ = query_length;
+  }
+
+  CacheOptions::Policy Policy() const override { return CacheOptions::Policy::kFull; }
+
+  void Test(ep::Stream* stream, uint32_t n_keys, const void* keys, uint32_t* n_missing,
+            void* missing_keys, uint32_t* missing_indices) override {
+    Lookup<false>(stream, n_keys, keys, nullptr, n_missing, missing_keys, missing_indices);
+  }
+
+  void Get(ep::Stream* stream, uint32_t n_keys, const void* keys, void* values, uint32_t* n_missing,
+           void* missing_keys, uint32_t* missing_indices) override {
+    Lookup<true>(stream, n_keys, keys, values, n_missing, missing_keys, missing_indices);
+  }
+
+  void Put(ep::Stream* stream, uint32_t n_keys, const void* keys, const void* values,
+           uint32_t* n_evicted, void* evicted_keys, void* evicted_values) override;
+  void Dump(ep::Stream* stream, uint64_t start_key_index, uint64_t end_key_index,
+            uint32_t* n_dumped, void* keys, void* values) override;
+  void Clear() override { encoder_.Clear(); }
+
+ private:
+  template<bool return_value>
+  void Lookup(ep::Stream* stream, uint32_t n_keys, const void* keys, void* values,
+              uint32_t* n_missing, void* missing_keys, uint32_t* missing_indices);
+
+  OrdinalEncoder<Key, Index> encoder_;
+  CacheOptions options_;
+  std::unique_ptr<char[]> values_;
+  std::vector<Index> encoding_buffer_;
+  uint32_t max_query_length_;
+};
+
+template<typename Key, typename Index>
+template<bool return_value>
+void CacheImpl<Key, Index>::Lookup(ep::Stream* stream, uint32_t n_keys, const void* keys,
+                                   void* values, uint32_t* n_missing, void* missing_keys,
+                                   uint32_t* missing_indices) {
+  *n_missing = 0;
+  if (n_keys == 0) { return; }
+  CHECK_LE(n_keys, max_query_length_);
+  auto* cpu_stream = stream->As<ep::CpuStream>();
+  const Key* keys_ptr = static_cast<const Key*>(keys);
+  Index* context = encoding_buffer_.data();
+  encoder_.template Encode<false>(cpu_stream, n_keys, keys_ptr, context);
+  const uint32_t value_size = options_.value_size;
+  std::atomic<uint32_t> missing_count(0);
+  cpu_stream->ParallelFor(
+      0, n_keys,
+      [&](int64_t start, int64_t end) {
+        std::vector<uint32_t> chunk_missing;
+        for (int64_t i = start; i < end; ++i) {
+          const Index ctx = context[i];
+          if (ctx == 0) {
+            chunk_missing.push_back(i);
+          } else if (return_value) {
+            std::memcpy(static_cast<char*>(values) + i * value_size,
+                        values_.get() + (ctx - 1) * value_size, value_size);
+          }
+        }
+        if (chunk_missing.empty()) { return; }
+        const uint32_t offset = missing_count.fetch_add(chunk_missing.size());
+        for (size_t j = 0; j < chunk_missing.size(); ++j) {
+          static_cast<Key*>(missing_keys)[offset + j] = keys_ptr[chunk_missing[j]];
+          missing_indices[offset + j] = chunk_missing[j];
+        }
+      },
+      kKeysPerThreadChunk);
+  *n_missing = missing_count.load();
+}
+
+template<typename Key, typename Index>
+void CacheImpl<Key, Index>::Put(ep::Stream* stream, uint32_t n_keys, const void* keys,
+                                const void* values, uint32_t* n_evicted, void* evicted_keys,
+                                void* evicted_values) {
+  *n_evicted = 0;
+  if (n_keys == 0) { return; }
+  CHECK_LE(n_keys, max_query_length_);
+  auto* cpu_stream = stream->As<ep::CpuStream>();
+  Index* context = encoding_buffer_.data();
+  encoder_.template Encode<true>(cpu_stream, n_keys, static_cast<const Key*>(keys), context);
+  const uint32_t value_size = options_.value_size;
+  cpu_stream->ParallelFor(
+      0, n_keys,
+      [&](int64_t start, int64_t end) {
+        for (int64_t i = start; i < end; ++i) {
+          std::memcpy(values_.get() + (context[i] - 1) * value_size,
+                      static_cast<const char*>(values) + i * value_size, value_size);
+        }
+      },
+      kKeysPerThreadChunk);
+}
+
+template<typename Key, typename Index>
+void CacheImpl<Key, Index>::Dump(ep::Stream* stream, uint64_t start_key_index,
+                                 uint64_t end_key_index, uint32_t* n_dumped, void* keys,
+                                 void* values) {
+  CHECK_LE(end_key_index - start_key_index, max_query_length_);
+  Index* context = encoding_buffer_.data();
+  encoder_.Dump(start_key_index, end_key_index, n_dumped, static_cast<Key*>(keys), context);
+  const uint32_t value_size = options_.value_size;
+  stream->As<ep::CpuStream>()->ParallelFor(
+      0, *n_dumped,
+      [&](int64_t start, int64_t end) {
+        for (int64_t i = start; i < end; ++i) {
+          std::memcpy(static_cast<char*>(values) + i * value_size,
+                      values_.get() + (context[i] - 1) * value_size, value_size);
+        }
+      },
+      kKeysPerThreadChunk);
+}
+
+template<typename Index>
+std::unique_ptr<Cache> DispatchKeyType(const CacheOptions& options) {
+  if (options.key_size == sizeof(uint32_t)) {
+    return std::unique_ptr<Cache>(new CacheImpl<uint32_t, Index>(options));
+  } else if (options.key_size == sizeof(uint64_t)) {
+    return std::unique_ptr<Cache>(new CacheImpl<uint64_t, Index>(options));
+  } else {
+    UNIMPLEMENTED();
+    return nullptr;
+  }
+}
+
+std::unique_ptr<Cache> DispatchIndexType(const CacheOptions& options) {
+  const int64_t table_capacity = static_cast<double>(options.capacity) / options.load_factor;
+  if (table_capacity >= (1ULL << 31ULL)) {
+    return DispatchKeyType<uint64_t>(options);
+  } else {
+    return DispatchKeyType<uint32_t>(options);
+  }
+}
+
+}  // namespace
+
+std::unique_ptr<Cache> NewCpuFullCache(const CacheOptions& options) {
+  return DispatchIndexType(options);
+}
+
+}  // namespace embedding
+
+}  // namespace oneflow
@@ -23,6 +23,8 @@ namespace oneflow {
 
 namespace embedding {
 
+std::unique_ptr<Cache> NewCpuFullCache(const CacheOptions& options);
+
 #ifdef WITH_CUDA
 
 std::unique_ptr<Cache> NewFullCache(const CacheOptions& options);
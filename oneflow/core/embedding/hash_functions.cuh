@@ -65,6 +65,7 @@ static const size_t kLocalUniqueHashSeed = 2;
 static const size_t kGlobalUniqueHashSeed = 3;
 static const size_t kFullCacheHashSeed = 4;
 static const size_t kLruCacheHashSeed = 5;
+static const size_t kAdmissionSketchHashSeed = 6;
 
 }  // namespace
 
@@ -95,6 +96,12 @@ struct LruCacheHash {
   OF_DEVICE_FUNC size_t operator()(uint64_t v) { return xxh64_uint64(v, kLruCacheHashSeed); }
 };
 
+struct AdmissionSketchHash {
+  OF_DEVICE_FUNC size_t operator()(uint64_t v) {
+    return xxh64_uint64(v, kAdmissionSketchHashSeed);
+  }
+};
+
 }  // namespace embedding
 }  // namespace oneflow
 #endif  // ONEFLOW_CORE_EMBEDDING_HASH_FUNCTION_H_
@@ -17,6 +17,7 @@ limitations under the License.
 #define ONEFLOW_CORE_EMBEDDING_KEY_VALUE_STORE_H_
 
 #include "oneflow/core/embedding/kv_iterator.h"
+#include "oneflow/core/embedding/persistent_table.h"
 #include "oneflow/core/common/util.h"
 #include "oneflow/core/ep/include/stream.h"
 
@@ -24,6 +25,20 @@ namespace oneflow {
 
 namespace embedding {
 
+struct CacheStats {
+  uint64_t num_lookups = 0;
+  uint64_t num_hits = 0;
+  uint64_t num_misses = 0;
+  uint64_t num_evictions = 0;
+  uint64_t num_write_backs = 0;
+};
+
+struct KeyValueStoreStats {
+  // One entry per cache level, the first one is the level that the kernels query.
+  std::vector<CacheStats> cache_stats;
+  PersistentTableStats persistent_table_stats;
+};
+
 class KeyValueStore {
  public:
   OF_DISALLOW_COPY_AND_MOVE(KeyValueStore);
@@ -37,12 +52,20 @@ class KeyValueStore {
 
   virtual void Get(ep::Stream* stream, uint32_t num_keys, const void* keys, void* values,
                    uint32_t* n_missing, uint32_t* missing_indices) = 0;
+  // Same as Get, but the keys are not counted in the cache stats. The lookup that follows a
+  // prefetch queries the keys the prefetch has already counted.
+  virtual void GetUncounted(ep::Stream* stream, uint32_t num_keys, const void* keys, void* values,
+                            uint32_t* n_missing, uint32_t* missing_indices) {
+    Get(stream, num_keys, keys, values, n_missing, missing_indices);
+  }
   virtual void Put(ep::Stream* stream, uint32_t num_keys, const void* keys, const void* values) = 0;
   virtual bool SnapshotExists(const std::string& name) = 0;
   virtual void LoadSnapshot(const std::string& name) = 0;
   virtual void LoadSnapshot(const std::string& name,
                             const std::function<void(KVIterator* iter)>& Hook) = 0;
   virtual void SaveSnapshot(const std::string& name) = 0;
+  virtual void GetStats(KeyValueStoreStats* stats) const = 0;
+  virtual void ResetStats() = 0;
 };
 
 }  // namespace embedding
@@ -18,6 +18,8 @@ limitations under the License.
 #include "nlohmann/json.hpp"
 #include "oneflow/core/job/resource_desc.h"
 #include "oneflow/core/embedding/cache.h"
+#include "oneflow/core/embedding/admission_filter.h"
+#include "oneflow/core/embedding/value_codec.h"
 
 namespace oneflow {
 namespace embedding {
@@ -34,6 +36,8 @@ void ParseCacheOptions(const nlohmann::json& cache_obj, CacheOptions* cache_opti
     cache_options->policy = CacheOptions::Policy::kLRU;
   } else if (policy == "full") {
     cache_options->policy = CacheOptions::Policy::kFull;
+  } else if (policy == "lfu") {
+    cache_options->policy = CacheOptions::Policy::kLFU;
   } else {
     UNIMPLEMENTED() << "Unsupported cache policy";
   }
@@ -97,13 +101,47 @@ class KeyValueStoreOptions final {
     CHECK(json_object.contains("kv_store"));
     auto kv_store = json_object["kv_store"];
 
+    if (kv_store.contains("device")) {
+      CHECK(kv_store["device"].is_string());
+      const std::string device = kv_store["device"].get<std::string>();
+      if (device == "cuda") {
+        device_type_ = DeviceType::kCUDA;
+      } else if (device == "cpu") {
+        device_type_ = DeviceType::kCPU;
+      } else {
+        UNIMPLEMENTED() << "Unsupported kv_store device " << device;
+      }
+    } else {
+#ifdef WITH_CUDA
+      device_type_ = DeviceType::kCUDA;
+#else
+      device_type_ = DeviceType::kCPU;
+#endif  // WITH_CUDA
+    }
+
+    if (json_object.contains("size_factor")) {
+      CHECK(json_object["size_factor"].is_number());
+      size_factor_ = json_object["size_factor"].get<int64_t>();
+    } else {
+      size_factor_ = 1;
+    }
+    storage_data_type_ = DataType::kFloat;
+    if (kv_store.contains("storage_dtype")) {
+      CHECK(kv_store["storage_dtype"].is_string());
+      storage_data_type_ = ParseStorageDataType(kv_store["storage_dtype"].get<std::string>());
+    }
+    if (storage_data_type_ != DataType::kFloat) {
+      CHECK_EQ(value_type_size_, sizeof(float)) << "storage_dtype requires float values";
+    }
+
     auto caches = kv_store["caches"];
     if (caches != nlohmann::detail::value_t::null && caches.size() > 0) {
       CHECK(caches.is_array());
       cache_options_.resize(caches.size());
       for (int i = 0; i < caches.size(); ++i) {
         cache_options_.at(i).key_size = key_type_size_;
-        cache_options_.at(i).value_size = value_type_size_ * line_size_;
+        cache_options_.at(i).value_size = StorageValueSize();
+        cache_options_.at(i).device_type = device_type_;
         ParseCacheOptions(caches.at(i), &cache_options_.at(i));
       }
     }
@@ -140,16 +178,67 @@ class KeyValueStoreOptions final {
     } else {
       persistent_table_capacity_hint_ = 0;
     }
+    if (persistent_table.contains("compaction_threshold")) {
+      CHECK(persistent_table["compaction_threshold"].is_number());
+      persistent_table_compaction_threshold_ =
+          persistent_table["compaction_threshold"].get<float>();
+    } else {
+      persistent_table_compaction_threshold_ = 0;
+    }
+    if (persistent_table.contains("max_incremental_snapshots")) {
+      CHECK(persistent_table["max_incremental_snapshots"].is_number());
+      persistent_table_max_incremental_snapshots_ =
+          persistent_table["max_incremental_snapshots"].get<int64_t>();
+    } else {
+      persistent_table_max_incremental_snapshots_ = 0;
+    }
+    if (persistent_table.contains("ttl_seconds")) {
+      CHECK(persistent_table["ttl_seconds"].is_number());
+      persistent_table_ttl_seconds_ = persistent_table["ttl_seconds"].get<int64_t>();
+    } else {
+      persistent_table_ttl_seconds_ = 0;
+    }
+
+    has_admission_ = json_object.contains("admission");
+    if (has_admission_) {
+      auto admission = json_object["admission"];
+      if (admission.contains("sketch_width")) {
+        CHECK(admission["sketch_width"].is_number());
+        admission_options_.sketch_width = admission["sketch_width"].get<int64_t>();
+      }
+      if (admission.contains("sketch_depth")) {
+        CHECK(admission["sketch_depth"].is_number());
+        admission_options_.sketch_depth = admission["sketch_depth"].get<int64_t>();
+      }
+    }
   }
   ~KeyValueStoreOptions() = default;
   int64_t KeyTypeSize() const { return key_type_size_; }
   int64_t ValueTypeSize() const { return value_type_size_; }
   const std::string& Name() const { return name_; }
   int64_t LineSize() const { return line_size_; }
+  // The data type of the values in the caches and the persistent table, the kernels always see
+  // values of ValueTypeSize.
+  DataType StorageDataType() const { return storage_data_type_; }
+  int64_t SizeFactor() const { return size_factor_; }
+  int64_t StorageValueSize() const {
+    if (storage_data_type_ == DataType::kFloat) { return value_type_size_ * line_size_; }
+    return GetEncodedValueSize(storage_data_type_, line_size_, size_factor_);
+  }
+  DeviceType GetDeviceType() const { return device_type_; }
   const std::vector<CacheOptions>& GetCachesOptions() const { return cache_options_; }
   const std::vector<std::string>& PersistentTablePaths() const { return persistent_table_paths_; }
   int64_t PersistentTablePhysicalBlockSize() const { return persistent_table_physical_block_size_; }
   int64_t PersistentTableCapacityHint() const { return persistent_table_capacity_hint_; }
+  float PersistentTableCompactionThreshold() const {
+    return persistent_table_compaction_threshold_;
+  }
+  int64_t PersistentTableMaxIncrementalSnapshots() const {
+    return persistent_table_max_incremental_snapshots_;
+  }
+  int64_t PersistentTableTtlSeconds() const { return persistent_table_ttl_seconds_; }
+  bool HasAdmission() const { return has_admission_; }
+  const AdmissionFilterOptions& GetAdmissionOptions() const { return admission_options_; }
   bool IsFullCache() const {
     if (cache_options_.size() > 0 && cache_options_.at(0).policy == CacheOptions::Policy::kFull) {
       return true;
@@ -162,10 +251,18 @@ class KeyValueStoreOptions final {
   int64_t value_type_size_;
   std::string name_;
   int64_t line_size_;
+  int64_t size_factor_;
+  DataType storage_data_type_;
+  DeviceType device_type_;
   std::vector<std::string> persistent_table_paths_;
   int64_t persistent_table_physical_block_size_;
   int64_t persistent_table_capacity_hint_;
+  float persistent_table_compaction_threshold_;
+  int64_t persistent_table_max_incremental_snapshots_;
+  int64_t persistent_table_ttl_seconds_;
   std::vector<CacheOptions> cache_options_;
+  bool has_admission_;
+  AdmissionFilterOptions admission_options_;
 };
 
 }  // namespace embedding
@@ -15,6 +15,7 @@ limitations under the License.
 */
 #include "oneflow/core/embedding/persistent_table_key_value_store.h"
 #include "oneflow/core/embedding/cached_key_value_store.h"
+#include "oneflow/core/embedding/reduced_precision_key_value_store.h"
 #include "oneflow/core/embedding/mock_key_value_store.h"
 #include "oneflow/core/embedding/cache.h"
 #include "oneflow/core/device/cuda_util.h"
@@ -28,8 +29,6 @@ namespace embedding {
 
 namespace {
 
-#ifdef WITH_CUDA
-
 std::string CreateTempDirectory() {
   const char* tmp_env = getenv("TMPDIR");
   const char* tmp_dir = tmp_env == nullptr ? "/tmp" : tmp_env;
@@ -39,6 +38,8 @@ std::string CreateTempDirectory() {
   return std::string(path);
 }
 
+#ifdef WITH_CUDA
+
 bool HasCudaDevice() {
   int device_count = 0;
   if (cudaGetDeviceCount(&device_count) != cudaSuccess) { return false; }
@@ -263,6 +264,205 @@ TEST(MockKeyValueStore, Mock) {
 
 #endif  // WITH_CUDA
 
+TEST(CachedKeyValueStore, CpuStats) {
+  Global<ep::DeviceManagerRegistry>::New();
+  auto device = Global<ep::DeviceManagerRegistry>::Get()->GetDevice(DeviceType::kCPU, 0);
+  ep::Stream* stream = device->CreateStream();
+  PersistentTableKeyValueStoreOptions store_options{};
+  std::string path = CreateTempDirectory();
+  store_options.table_options.path = path;
+  const uint32_t value_length = 4;
+  store_options.table_options.value_size = value_length * sizeof(float);
+  store_options.table_options.key_size = GetSizeOfDataType(DataType::kUInt64);
+  store_options.table_options.physical_block_size = 512;
+  std::unique_ptr<KeyValueStore> store = NewCpuPersistentTableKeyValueStore(store_options);
+  CacheOptions cache_options{};
+  cache_options.policy = CacheOptions::Policy::kLRU;
+  cache_options.value_memory_kind = CacheOptions::MemoryKind::kHost;
+  cache_options.value_size = value_length * sizeof(float);
+  cache_options.capacity = 64;
+  cache_options.key_size = 8;
+  cache_options.device_type = DeviceType::kCPU;
+  std::unique_ptr<Cache> cache = NewCache(cache_options);
+  std::unique_ptr<KeyValueStore> cached_store =
+      NewCpuCachedKeyValueStore(std::move(store), std::move(cache));
+  const uint32_t num_keys = 128;
+  cached_store->ReserveQueryLength(num_keys);
+  std::vector<uint64_t> keys(num_keys);
+  std::iota(keys.begin(), keys.end(), 1);
+  std::vector<float> values(num_keys * value_length, 1.0);
+  std::vector<uint32_t> missing_indices(num_keys);
+  uint32_t n_missing = 0;
+
+  cached_store->Get(stream, num_keys, keys.data(), values.data(), &n_missing,
+                    missing_indices.data());
+  ASSERT_EQ(n_missing, num_keys);
+  cached_store->Put(stream, num_keys, keys.data(), values.data());
+  cached_store->Get(stream, num_keys, keys.data(), values.data(), &n_missing,
+                    missing_indices.data());
+  ASSERT_EQ(n_missing, 0);
+
+  KeyValueStoreStats stats;
+  cached_store->GetStats(&stats);
+  ASSERT_EQ(stats.cache_stats.size(), 1);
+  const CacheStats& cache_stats = stats.cache_stats.at(0);
+  ASSERT_EQ(cache_stats.num_lookups, num_keys * 2);
+  ASSERT_EQ(cache_stats.num_hits + cache_stats.num_misses, num_keys * 2);
+  ASSERT_GE(cache_stats.num_evictions, num_keys - cache_options.capacity);
+  ASSERT_EQ(cache_stats.num_write_backs, cache_stats.num_evictions);
+  const PersistentTableStats& table_stats = stats.persistent_table_stats;
+  ASSERT_EQ(table_stats.num_write_keys, cache_stats.num_evictions);
+  // The first query misses every key, the keys missed by the second one were evicted to the table.
+  ASSERT_EQ(table_stats.num_read_keys, cache_stats.num_misses - num_keys);
+  ASSERT_EQ(table_stats.num_read_ops, table_stats.num_read_keys);
+  ASSERT_GE(table_stats.num_read_bytes, table_stats.num_read_keys * cache_options.value_size);
+
+  // Saving a snapshot writes the rest of the keys back, every key is written back once.
+  cached_store->SaveSnapshot("stats");
+  stats = KeyValueStoreStats();
+  cached_store->GetStats(&stats);
+  ASSERT_EQ(stats.cache_stats.at(0).num_write_backs, num_keys);
+  ASSERT_EQ(stats.persistent_table_stats.num_write_keys, num_keys);
+
+  cached_store->ResetStats();
+  stats = KeyValueStoreStats();
+  cached_store->GetStats(&stats);
+  ASSERT_EQ(stats.cache_stats.at(0).num_lookups, 0);
+  ASSERT_EQ(stats.cache_stats.at(0).num_write_backs, 0);
+  ASSERT_EQ(stats.persistent_table_stats.num_read_keys, 0);
+  ASSERT_EQ(stats.persistent_table_stats.num_write_bytes, 0);
+
+  cached_store.reset();
+  device->DestroyStream(stream);
+  PosixFile::RecursiveDelete(path);
+  Global<ep::DeviceManagerRegistry>::Delete();
+}
+
+TEST(CachedKeyValueStore, CpuSyncDirtyKeys) {
+  Global<ep::DeviceManagerRegistry>::New();
+  auto device = Global<ep::DeviceManagerRegistry>::Get()->GetDevice(DeviceType::kCPU, 0);
+  ep::Stream* stream = device->CreateStream();
+  PersistentTableKeyValueStoreOptions store_options{};
+  std::string path = CreateTempDirectory();
+  store_options.table_options.path = path;
+  const uint32_t value_length = 4;
+  store_options.table_options.value_size = value_length * sizeof(float);
+  store_options.table_options.key_size = GetSizeOfDataType(DataType::kUInt64);
+  store_options.table_options.physical_block_size = 512;
+  store_options.table_options.max_incremental_snapshots = 4;
+  std::unique_ptr<KeyValueStore> store = NewCpuPersistentTableKeyValueStore(store_options);
+  CacheOptions cache_options{};
+  cache_options.policy = CacheOptions::Policy::kFull;
+  cache_options.value_memory_kind = CacheOptions::MemoryKind::kHost;
+  cache_options.value_size = value_length * sizeof(float);
+  cache_options.capacity = 256;
+  cache_options.key_size = 8;
+  cache_options.device_type = DeviceType::kCPU;
+  std::unique_ptr<Cache> cache = NewCache(cache_options);
+  std::unique_ptr<KeyValueStore> cached_store =
+      NewCpuCachedKeyValueStore(std::move(store), std::move(cache), true);
+  const uint32_t num_keys = 128;
+  const uint32_t num_dirty_keys = 8;
+  cached_store->ReserveQueryLength(num_keys);
+  std::vector<uint64_t> keys(num_keys);
+  std::iota(keys.begin(), keys.end(), 1);
+  std::vector<float> values(num_keys * value_length, 1.0);
+  cached_store->Put(stream, num_keys, keys.data(), values.data());
+  cached_store->SaveSnapshot("full");
+  std::fill(values.begin(), values.end(), 2.0);
+  cached_store->Put(stream, num_dirty_keys, keys.data(), values.data());
+  cached_store->ResetStats();
+  // Only the keys put since the last snapshot are written back to the table.
+  cached_store->SaveSnapshot("incremental");
+  KeyValueStoreStats stats;
+  cached_store->GetStats(&stats);
+  ASSERT_EQ(stats.cache_stats.at(0).num_write_backs, num_dirty_keys);
+  ASSERT_EQ(stats.persistent_table_stats.num_write_keys, num_dirty_keys);
+
+  cached_store->LoadSnapshot("incremental");
+  std::vector<uint32_t> missing_indices(num_keys);
+  uint32_t n_missing = 0;
+  cached_store->Get(stream, num_keys, keys.data(), values.data(), &n_missing,
+                    missing_indices.data());
+  ASSERT_EQ(n_missing, 0);
+  for (uint32_t i = 0; i < num_keys * value_length; ++i) {
+    ASSERT_EQ(values.at(i), i < num_dirty_keys * value_length ? 2.0 : 1.0);
+  }
+
+  cached_store.reset();
+  device->DestroyStream(stream);
+  PosixFile::RecursiveDelete(path);
+  Global<ep::DeviceManagerRegistry>::Delete();
+}
+
+TEST(ReducedPrecisionKeyValueStore, Cpu) {
+  Global<ep::DeviceManagerRegistry>::New();
+  auto device = Global<ep::DeviceManagerRegistry>::Get()->GetDevice(DeviceType::kCPU, 0);
+  ep::Stream* stream = device->CreateStream();
+  const uint32_t value_length = 8;
+  const uint32_t num_segments = 2;
+  for (DataType storage_data_type : {DataType::kFloat16, DataType::kBFloat16, DataType::kInt8}) {
+    PersistentTableKeyValueStoreOptions store_options{};
+    std::string path = CreateTempDirectory();
+    store_options.table_options.path = path;
+    store_options.table_options.value_size =
+        GetEncodedValueSize(storage_data_type, value_length, num_segments);
+    store_options.table_options.key_size = GetSizeOfDataType(DataType::kUInt64);
+    store_options.table_options.physical_block_size = 512;
+    std::unique_ptr<KeyValueStore> store = NewCpuReducedPrecisionKeyValueStore(
+        NewCpuPersistentTableKeyValueStore(store_options),
+        NewValueCodec(storage_data_type, value_length, num_segments));
+    ASSERT_EQ(store->ValueSize(), value_length * sizeof(float));
+    const uint32_t num_keys = 128;
+    store->ReserveQueryLength(num_keys);
+    std::vector<uint64_t> keys(num_keys);
+    std::iota(keys.begin(), keys.end(), 1);
+    // The second segment is much smaller than the first one, like an optimizer state.
+    auto Magnitude = [&](uint32_t i) {
+      return i % value_length < value_length / num_segments ? 1.0f : 1e-3f;
+    };
+    std::vector<float> values(num_keys * value_length);
+    for (uint32_t i = 0; i < values.size(); ++i) {
+      values[i] = Magnitude(i) * (static_cast<int>(i % 7) - 3);
+    }
+    store->Put(stream, num_keys, keys.data(), values.data());
+    store->SaveSnapshot("reduced");
+    store->LoadSnapshot("reduced");
+    std::vector<float> read_values(num_keys * value_length);
+    std::vector<uint32_t> missing_indices(num_keys);
+    uint32_t n_missing = 0;
+    store->Get(stream, num_keys, keys.data(), read_values.data(), &n_missing,
+               missing_indices.data());
+    ASSERT_EQ(n_missing, 0);
+    // int8 has the largest error, less than its scale with the stochastic rounding, and the scale
+    // of a segment is max(abs) / 127.
+    for (uint32_t i = 0; i < values.size(); ++i) {
+      ASSERT_NEAR(read_values[i], values[i], Magnitude(i) * 3 / 127 * 1.01);
+    }
+    uint32_t n_iterated = 0;
+    store->LoadSnapshot("reduced", [&](KVIterator* iter) {
+      std::vector<uint64_t> iter_keys(num_keys);
+      std::vector<float> iter_values(num_keys * value_length);
+      uint32_t n_result = 0;
+      do {
+        iter->NextN(stream, num_keys, &n_result, iter_keys.data(), iter_values.data());
+        for (uint32_t i = 0; i < n_result; ++i) {
+          const uint64_t key = iter_keys[i];
+          for (uint32_t j = 0; j < value_length; ++j) {
+            ASSERT_EQ(iter_values[i * value_length + j], read_values[(key - 1) * value_length + j]);
+          }
+        }
+        n_iterated += n_result;
+      } while (n_result != 0);
+    });
+    ASSERT_EQ(n_iterated, num_keys);
+    store.reset();
+    PosixFile::RecursiveDelete(path);
+  }
+  device->DestroyStream(stream);
+  Global<ep::DeviceManagerRegistry>::Delete();
+}
+
 }  // namespace
 
 }  // namespace embedding
@@ -0,0 +1,337 @@
+/*
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+*/
+#include "oneflow/core/embedding/lru_cache.h"
+#include "oneflow/core/embedding/hash_functions.cuh"
+#include "oneflow/core/ep/cpu/cpu_stream.h"
+#include <atomic>
+#include <limits>
+
+namespace oneflow {
+
+namespace embedding {
+
+namespace {
+
+// Same layout as lru_cache.cu: the cache is split into 32-way sets, every way holds an age in
+// [1, kNumWays] with kNumWays being the most recently used one and 0 marking an empty way. The
+// kLFU policy also keeps an access frequency per way, see SetContext::Touch.
+constexpr uint32_t kNumWays = 32;
+constexpr uint8_t kMaxFrequency = 255;
+constexpr size_t kKeysPerThreadChunk = 256;
+
+template<typename Key>
+class SetContext {
+ public:
+  SetContext(Key* keys, uint8_t* ages, uint8_t* freqs, char* lines, std::atomic<int32_t>* mutex,
+             uint32_t line_size)
+      : keys_(keys),
+        ages_(ages),
+        freqs_(freqs),
+        lines_(lines),
+        mutex_(mutex),
+        line_size_(line_size) {}
+
+  int Lookup(Key key) const {
+    for (uint32_t way = 0; way < kNumWays; ++way) {
+      if (ages_[way] != 0 && keys_[way] == key) { return way; }
+    }
+    return -1;
+  }
+
+  void Read(int way, char* line) const {
+    std::memcpy(line, lines_ + way * line_size_, line_size_);
+  }
+
+  void Write(int way, const char* line) {
+    std::memcpy(lines_ + way * line_size_, line, line_size_);
+  }
+
+  int InsertWithoutEvicting(Key key) {
+    int insert_way = Lookup(key);
+    if (insert_way >= 0) {
+      Touch(insert_way);
+    } else {
+      uint32_t n_valid = 0;
+      while (n_valid < kNumWays && ages_[n_valid] != 0) { n_valid += 1; }
+      if (n_valid == kNumWays) { return -1; }
+      insert_way = n_valid;
+      keys_[insert_way] = key;
+      if (freqs_ != nullptr) { freqs_[insert_way] = 1; }
+    }
+    MakeYoungest(insert_way);
+    return insert_way;
+  }
+
+  int Evict(Key key, Key* evicted_key) {
+    int evicted_way = -1;
+    if (freqs_ == nullptr) {
+      for (uint32_t way = 0; way < kNumWays; ++way) {
+        if (ages_[way] == 1) { evicted_way = way; }
+      }
+    } else {
+      // the least frequently used way, the oldest one among ways with the same frequency
+      uint32_t min_score = std::numeric_limits<uint32_t>::max();
+      for (uint32_t way = 0; way < kNumWays; ++way) {
+        const uint32_t score = (static_cast<uint32_t>(freqs_[way]) << 8) | ages_[way];
+        if (score < min_score) {
+          min_score = score;
+          evicted_way = way;
+        }
+      }
+      freqs_[evicted_way] = 1;
+    }
+    CHECK_GE(evicted_way, 0);
+    *evicted_key = keys_[evicted_way];
+    keys_[evicted_way] = key;
+    MakeYoungest(evicted_way);
+    return evicted_way;
+  }
+
+  void Lock() {
+    int32_t expected = 0;
+    while (!mutex_->compare_exchange_weak(expected, 1, std::memory_order_acquire)) {
+      expected = 0;
+    }
+  }
+
+  void Unlock() { mutex_->store(0, std::memory_order_release); }
+
+ private:
+  void MakeYoungest(int way) {
+    const uint8_t way_age = ages_[way];
+    for (uint32_t i = 0; i < kNumWays; ++i) {
+      if (ages_[i] > way_age) { ages_[i] -= 1; }
+    }
+    ages_[way] = kNumWays;
+  }
+
+  // Counts an access to a cached key under kLFU. Once a frequency saturates all the frequencies of
+  // the set are halved, so keys that were hot a long time ago do not stay in the cache forever.
+  void Touch(int way) {
+    if (freqs_ == nullptr) { return; }
+    if (freqs_[way] == kMaxFrequency) {
+      for (uint32_t i = 0; i < kNumWays; ++i) { freqs_[i] >>= 1; }
+    }
+    freqs_[way] += 1;
+  }
+
+  Key* keys_;
+  uint8_t* ages_;
+  uint8_t* freqs_;
+  char* lines_;
+  std::atomic<int32_t>* mutex_;
+  uint32_t line_size_;
+};
+
+template<typename Key>
+class LruCache : public Cache {
+ public:
+  OF_DISALLOW_COPY_AND_MOVE(LruCache);
+  explicit LruCache(const CacheOptions& options)
+      : policy_(options.policy),
+        n_set_((options.capacity - 1 + kNumWays) / kNumWays),
+        line_size_(options.value_size),
+        max_query_length_(0),
+        keys_(new Key[n_set_ * kNumWays]),
+        ages_(new uint8_t[n_set_ * kNumWays]),
+        lines_(new char[n_set_ * kNumWays * line_size_]),
+        mutex_(new std::atomic<int32_t>[n_set_]) {
+    CHECK_EQ(options.key_size, sizeof(Key));
+    CHECK(policy_ == CacheOptions::Policy::kLRU || policy_ == CacheOptions::Policy::kLFU);
+    if (policy_ == CacheOptions::Policy::kLFU) { freqs_.reset(new uint8_t[n_set_ * kNumWays]); }
+    for (uint64_t i = 0; i < n_set_; ++i) { mutex_[i].store(0); }
+    Clear();
+  }
+  ~LruCache() override = default;
+
+  uint32_t KeySize() const override { return sizeof(Key); }
+  uint32_t ValueSize() const override { return line_size_; }
+  uint64_t Capacity() const override { return n_set_ * kNumWays; }
+  uint32_t MaxQueryLength() const override { return max_query_length_; }
+
+  void ReserveQueryLength(uint32_t query_length) override {
+    if (query_length < max_query_length_) { return; }
+    query_keys_buffer_.resize(query_length);
+    query_indices_buffer_.resize(query_length);
+    max_query_length_ = query_length;
+  }
+
+  CacheOptions::Policy Policy() const override { return policy_; }
+
+  void Test(ep::Stream* stream, uint32_t n_keys, const void* keys, uint32_t* n_missing,
+            void* missing_keys, uint32_t* missing_indices) override {
+    Lookup<true>(stream, n_keys, keys, nullptr, n_missing, missing_keys, missing_indices);
+  }
+
+  void Get(ep::Stream* stream, uint32_t n_keys, const void* keys, void* values, uint32_t* n_missing,
+           void* missing_keys, uint32_t* missing_indices) override {
+    Lookup<false>(stream, n_keys, keys, values, n_missing, missing_keys, missing_indices);
+  }
+
+  void Put(ep::Stream* stream, uint32_t n_keys, const void* keys, const void* values,
+           uint32_t* n_evicted, void* evicted_keys, void* evicted_values) override;
+  void Dump(ep::Stream* stream, uint64_t start_key_index, uint64_t end_key_index,
+            uint32_t* n_dumped, void* keys, void* values) override;
+
+  void Clear() override {
+    std::memset(keys_.get(), 0, n_set_ * kNumWays * sizeof(Key));
+    std::memset(ages_.get(), 0, n_set_ * kNumWays * sizeof(uint8_t));
+    if (freqs_) { std::memset(freqs_.get(), 0, n_set_ * kNumWays * sizeof(uint8_t)); }
+  }
+
+ private:
+  SetContext<Key> SetContext4Key(Key key) {
+    const uint64_t set_id = LruCacheHash()(key) % n_set_;
+    return SetContext<Key>(keys_.get() + set_id * kNumWays, ages_.get() + set_id * kNumWays,
+                           freqs_ ? freqs_.get() + set_id * kNumWays : nullptr,
+                           lines_.get() + set_id * kNumWays * line_size_, mutex_.get() + set_id,
+                           line_size_);
+  }
+
+  template<bool test_only>
+  void Lookup(ep::Stream* stream, uint32_t n_keys, const void* keys, void* values,
+              uint32_t* n_missing, void* missing_keys, uint32_t* missing_indices);
+
+  CacheOptions::Policy policy_;
+  uint64_t n_set_;
+  uint32_t line_size_;
+  uint32_t max_query_length_;
+  std::unique_ptr<Key[]> keys_;
+  std::unique_ptr<uint8_t[]> ages_;
+  std::unique_ptr<char[]> lines_;
+  std::unique_ptr<uint8_t[]> freqs_;
+  std::unique_ptr<std::atomic<int32_t>[]> mutex_;
+  std::vector<Key> query_keys_buffer_;
+  std::vector<uint32_t> query_indices_buffer_;
+};
+
+template<typename Key>
+template<bool test_only>
+void LruCache<Key>::Lookup(ep::Stream* stream, uint32_t n_keys, const void* keys, void* values,
+                           uint32_t* n_missing, void* missing_keys, uint32_t* missing_indices) {
+  CHECK_LE(n_keys, max_query_length_);
+  *n_missing = 0;
+  if (n_keys == 0) { return; }
+  const Key* keys_ptr = static_cast<const Key*>(keys);
+  std::atomic<uint32_t> missing_count(0);
+  stream->As<ep::CpuStream>()->ParallelFor(
+      0, n_keys,
+      [&](int64_t start, int64_t end) {
+        std::vector<uint32_t> chunk_missing;
+        for (int64_t i = start; i < end; ++i) {
+          SetContext<Key> set_ctx = SetContext4Key(keys_ptr[i]);
+          const int way = set_ctx.Lookup(keys_ptr[i]);
+          if (way < 0) {
+            chunk_missing.push_back(i);
+          } else if (!test_only) {
+            set_ctx.Read(way, static_cast<char*>(values) + i * line_size_);
+          }
+        }
+        if (chunk_missing.empty()) { return; }
+        const uint32_t offset = missing_count.fetch_add(chunk_missing.size());
+        for (size_t j = 0; j < chunk_missing.size(); ++j) {
+          static_cast<Key*>(missing_keys)[offset + j] = keys_ptr[chunk_missing[j]];
+          missing_indices[offset + j] = chunk_missing[j];
+        }
+      },
+      kKeysPerThreadChunk);
+  *n_missing = missing_count.load();
+}
+
+template<typename Key>
+void LruCache<Key>::Put(ep::Stream* stream, uint32_t n_keys, const void* keys, const void* values,
+                        uint32_t* n_evicted, void* evicted_keys, void* evicted_values) {
+  CHECK_LE(n_keys, max_query_length_);
+  *n_evicted = 0;
+  if (n_keys == 0) { return; }
+  auto* cpu_stream = stream->As<ep::CpuStream>();
+  const Key* keys_ptr = static_cast<const Key*>(keys);
+  const char* values_ptr = static_cast<const char*>(values);
+  std::atomic<uint32_t> missing_count(0);
+  // first fill the free ways, keys of full sets are evicted below once all of them are inserted
+  cpu_stream->ParallelFor(
+      0, n_keys,
+      [&](int64_t start, int64_t end) {
+        std::vector<uint32_t> chunk_missing;
+        for (int64_t i = start; i < end; ++i) {
+          SetContext<Key> set_ctx = SetContext4Key(keys_ptr[i]);
+          set_ctx.Lock();
+          const int insert_way = set_ctx.InsertWithoutEvicting(keys_ptr[i]);
+          if (insert_way >= 0) {
+            set_ctx.Write(insert_way, values_ptr + i * line_size_);
+          } else {
+            chunk_missing.push_back(i);
+          }
+          set_ctx.Unlock();
+        }
+        if (chunk_missing.empty()) { return; }
+        const uint32_t offset = missing_count.fetch_add(chunk_missing.size());
+        for (size_t j = 0; j < chunk_missing.size(); ++j) {
+          query_keys_buffer_[offset + j] = keys_ptr[chunk_missing[j]];
+          query_indices_buffer_[offset + j] = chunk_missing[j];
+        }
+      },
+      kKeysPerThreadChunk);
+  const uint32_t num_evict = missing_count.load();
+  cpu_stream->ParallelFor(
+      0, num_evict,
+      [&](int64_t start, int64_t end) {
+        for (int64_t i = start; i < end; ++i) {
+          const Key key = query_keys_buffer_[i];
+          SetContext<Key> set_ctx = SetContext4Key(key);
+          set_ctx.Lock();
+          Key evicted_key = 0;
+          const int evicted_way = set_ctx.Evict(key, &evicted_key);
+          static_cast<Key*>(evicted_keys)[i] = evicted_key;
+          set_ctx.Read(evicted_way, static_cast<char*>(evicted_values) + i * line_size_);
+          set_ctx.Write(evicted_way, values_ptr + query_indices_buffer_[i] * line_size_);
+          set_ctx.Unlock();
+        }
+      },
+      kKeysPerThreadChunk);
+  *n_evicted = num_evict;
+}
+
+template<typename Key>
+void LruCache<Key>::Dump(ep::Stream* stream, uint64_t start_key_index, uint64_t end_key_index,
+                         uint32_t* n_dumped, void* keys, void* values) {
+  uint32_t count = 0;
+  for (uint64_t i = start_key_index; i < end_key_index; ++i) {
+    if (ages_[i] == 0) { continue; }
+    static_cast<Key*>(keys)[count] = keys_[i];
+    std::memcpy(static_cast<char*>(values) + count * line_size_, lines_.get() + i * line_size_,
+                line_size_);
+    count += 1;
+  }
+  *n_dumped = count;
+}
+
+}  // namespace
+
+std::unique_ptr<Cache> NewCpuLruCache(const CacheOptions& options) {
+  if (options.key_size == sizeof(uint32_t)) {
+    return std::unique_ptr<Cache>(new LruCache<uint32_t>(options));
+  } else if (options.key_size == sizeof(uint64_t)) {
+    return std::unique_ptr<Cache>(new LruCache<uint64_t>(options));
+  } else {
+    UNIMPLEMENTED();
+    return nullptr;
+  }
+}
+
+}  // namespace embedding
+
+}  // namespace oneflow
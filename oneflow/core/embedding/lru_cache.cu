@@ -36,6 +36,7 @@ constexpr int kWarpSize = 32;
 constexpr int kNumWarpPerBlock = 4;
 constexpr int kBlockSize = kNumWarpPerBlock * kWarpSize;
 constexpr uint32_t kFullMask = 0xFFFFFFFFU;
+constexpr int kMaxFrequency = 255;
 
 ep::CudaLaunchConfig GetLaunchConfig(uint32_t n_keys) {
   return ep::CudaLaunchConfig((n_keys + kNumWarpPerBlock - 1) / kNumWarpPerBlock,
@@ -111,6 +112,8 @@ struct LruCacheContext {
   Key* keys;
   Elem* lines;
   uint8_t* ages;
+  // access frequencies of the kLFU policy, nullptr for kLRU
+  uint8_t* freqs;
   void* mutex;
   uint64_t n_set;
   uint32_t line_size;
@@ -131,6 +134,9 @@ template<typename Key, typename Elem>
 void ClearLruCacheContext(LruCacheContext<Key, Elem>* ctx) {
   OF_CUDA_CHECK(cudaMemset(ctx->keys, 0, ctx->n_set * kWarpSize * sizeof(Key)));
   OF_CUDA_CHECK(cudaMemset(ctx->ages, 0, ctx->n_set * kWarpSize * sizeof(uint8_t)));
+  if (ctx->freqs != nullptr) {
+    OF_CUDA_CHECK(cudaMemset(ctx->freqs, 0, ctx->n_set * kWarpSize * sizeof(uint8_t)));
+  }
   InitCacheSetMutex<<<(ctx->n_set - 1 + 256) / 256, 256>>>(ctx->n_set, ctx->mutex);
 }
 
@@ -180,6 +186,12 @@ void InitLruCacheContext(const CacheOptions& options, LruCacheContext<Key, Elem>
   ctx->value_memory_kind = options.value_memory_kind;
   const size_t ages_size = n_set * ages_size_per_set;
   OF_CUDA_CHECK(cudaMalloc(&(ctx->ages), ages_size));
+  if (options.policy == CacheOptions::Policy::kLFU) {
+    OF_CUDA_CHECK(cudaMalloc(&(ctx->freqs), ages_size));
+  } else {
+    CHECK(options.policy == CacheOptions::Policy::kLRU);
+    ctx->freqs = nullptr;
+  }
   const size_t mutex_size = n_set * mutex_size_per_set;
   OF_CUDA_CHECK(cudaMalloc(&(ctx->mutex), mutex_size));
 
@@ -197,6 +209,7 @@ void DestroyLruCacheContext(LruCacheContext<Key, Elem>* ctx) {
     UNIMPLEMENTED();
   }
   OF_CUDA_CHECK(cudaFree(ctx->ages));
+  if (ctx->freqs != nullptr) { OF_CUDA_CHECK(cudaFree(ctx->freqs)); }
   OF_CUDA_CHECK(cudaFree(ctx->mutex));
 }
 
@@ -211,6 +224,7 @@ struct SetContext {
       : keys(ctx.keys + set_id * kWarpSize),
         mutex(reinterpret_cast<WarpMutex*>(ctx.mutex) + set_id),
         ages(ctx.ages + set_id * kWarpSize),
+        freqs(ctx.freqs == nullptr ? nullptr : ctx.freqs + set_id * kWarpSize),
         lines(ctx.lines + set_id * kWarpSize * ctx.line_size) {}
 
   __device__ int Lookup(const ThreadContext& thread_ctx, Key key) {
@@ -247,6 +261,7 @@ struct SetContext {
       } else if (thread_ctx.lane_id == insert_way) {
         lane_age = kWarpSize;
       }
+      Touch(thread_ctx, insert_way);
       __syncwarp();
     }
     if (insert_way == -1) {
@@ -258,6 +273,7 @@ struct SetContext {
         } else if (thread_ctx.lane_id == insert_way) {
           lane_age = kWarpSize;
           keys[insert_way] = key;
+          if (freqs != nullptr) { freqs[insert_way] = 1; }
         }
         __syncwarp();
       }
@@ -270,12 +286,25 @@ struct SetContext {
                         const ThreadContext& thread_ctx, Key key, int* way, Key* evicted_key) {
     const Key lane_key = keys[thread_ctx.lane_id];
     int lane_age = ages[thread_ctx.lane_id];
-    const int insert_way = __ffs(__ballot_sync(kFullMask, lane_age == 1)) - 1;
+    int insert_way = -1;
+    if (freqs == nullptr) {
+      insert_way = __ffs(__ballot_sync(kFullMask, lane_age == 1)) - 1;
+    } else {
+      // the least frequently used way, the oldest one among ways with the same frequency
+      const int lane_score = (static_cast<int>(freqs[thread_ctx.lane_id]) << 8) | lane_age;
+      int min_score = lane_score;
+      for (int offset = kWarpSize / 2; offset > 0; offset /= 2) {
+        min_score = min(min_score, __shfl_xor_sync(kFullMask, min_score, offset));
+      }
+      insert_way = __ffs(__ballot_sync(kFullMask, lane_score == min_score)) - 1;
+    }
+    const int insert_way_age = __shfl_sync(kFullMask, lane_age, insert_way);
     *evicted_key = __shfl_sync(kFullMask, lane_key, insert_way);
     if (thread_ctx.lane_id == insert_way) {
       keys[insert_way] = key;
       lane_age = kWarpSize;
-    } else if (lane_age > 1) {
+      if (freqs != nullptr) { freqs[insert_way] = 1; }
+    } else if (lane_age > insert_way_age) {
       lane_age -= 1;
     }
     __syncwarp();
@@ -283,6 +312,18 @@ struct SetContext {
     *way = insert_way;
   }
 
+  // Counts an access to a cached key under kLFU. Once a frequency saturates all the frequencies of
+  // the set are halved, so keys that were hot a long time ago do not stay in the cache forever.
+  __device__ void Touch(const ThreadContext& thread_ctx, int way) {
+    if (freqs == nullptr) { return; }
+    int lane_freq = freqs[thread_ctx.lane_id];
+    const int way_freq = __shfl_sync(kFullMask, lane_freq, way);
+    if (way_freq == kMaxFrequency) { lane_freq >>= 1; }
+    if (thread_ctx.lane_id == way) { lane_freq += 1; }
+    __syncwarp();
+    freqs[thread_ctx.lane_id] = lane_freq;
+  }
+
   __device__ void Write(const LruCacheContext<Key, Elem>& cache_ctx,
                         const ThreadContext& thread_ctx, int way, const Elem* line) {
     Elem* to_line = lines + way * cache_ctx.line_size;
@@ -298,6 +339,7 @@ struct SetContext {
   Key* keys;
   Elem* lines;
   uint8_t* ages;
+  uint8_t* freqs;
   WarpMutex* mutex;
 };
 
@@ -496,7 +538,8 @@ class LruCache : public Cache {
       : device_index_{},
         max_query_length_(0),
         query_indices_buffer_(nullptr),
-        query_keys_buffer_(nullptr) {
+        query_keys_buffer_(nullptr),
+        policy_(options.policy) {
     OF_CUDA_CHECK(cudaGetDevice(&device_index_));
     InitLruCacheContext(options, &ctx_);
   }
@@ -526,7 +569,7 @@ class LruCache : public Cache {
     max_query_length_ = query_length;
   }
 
-  CacheOptions::Policy Policy() const override { return CacheOptions::Policy::kLRU; }
+  CacheOptions::Policy Policy() const override { return policy_; }
 
   void Test(ep::Stream* stream, uint32_t n_keys, const void* keys, uint32_t* n_missing,
             void* missing_keys, uint32_t* missing_indices) override {
@@ -587,6 +630,7 @@ class LruCache : public Cache {
   LruCacheContext<Key, Elem> ctx_;
   uint32_t* query_indices_buffer_;
   Key* query_keys_buffer_;
+  CacheOptions::Policy policy_;
 };
 
 template<typename Key>
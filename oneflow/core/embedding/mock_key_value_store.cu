@@ -137,6 +137,10 @@ class KeyValueStoreImpl : public KeyValueStore {
                     const std::function<void(KVIterator* iter)>& Hook) override;
   void SaveSnapshot(const std::string& name) override;
 
+  // The mock store lives in memory and has no cache or persistent table to report.
+  void GetStats(KeyValueStoreStats* stats) const override {}
+  void ResetStats() override {}
+
  private:
   int device_index_;
   uint32_t max_query_length_;
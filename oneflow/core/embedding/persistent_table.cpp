@@ -25,10 +25,15 @@ limitations under the License.
 #include <robin_hood.h>
 #include <fcntl.h>
 #include <sys/mman.h>
+#include <sys/stat.h>
 #include <dirent.h>
 #include <sys/syscall.h>
 #include <linux/aio_abi.h>
 #include <unistd.h>
+#include <condition_variable>
+#include <unordered_set>
+#include <random>
+#include <ctime>
 #ifdef WITH_LIBURING
 #include <liburing.h>
 #endif  // WITH_LIBURING
@@ -60,7 +65,11 @@ constexpr char const* kKeysDirName = "keys";
 constexpr char const* kValuesDirName = "values";
 constexpr char const* kSnapshotsDirName = "snapshots";
 constexpr char const* kSnapshotListFileName = "LIST";
+constexpr char const* kSnapshotBaseFileName = "BASE";
+constexpr char const* kSnapshotIdFileName = "ID";
 constexpr size_t kParallelForStride = 256;
+constexpr uint64_t kCompactionBatchSize = 65536;
+constexpr size_t kLoadSnapshotBatchSize = 65536;
 
 template<typename T>
 T* BytesOffset(T* ptr, size_t bytes) {
@@ -120,6 +129,38 @@ void ListChunkFiles(const std::string& base, const std::string& prefix,
   PCHECK(closedir(dir) == 0);
 }
 
+void ListSnapshotChunks(const std::string& snapshots_dir, std::unordered_set<uint64_t>* chunks) {
+  chunks->clear();
+  DIR* dir = opendir(snapshots_dir.c_str());
+  if (dir == nullptr) {
+    PCHECK(errno == ENOENT);
+    return;
+  }
+  struct dirent* ent = nullptr;
+  while ((ent = readdir(dir)) != nullptr) {
+    if (strcmp(ent->d_name, ".") == 0 || strcmp(ent->d_name, "..") == 0) { continue; }
+    const std::string snapshot_dir = PosixFile::JoinPath(snapshots_dir, ent->d_name);
+    std::ifstream list_if(PosixFile::JoinPath(snapshot_dir, kSnapshotListFileName));
+    std::string index_filename;
+    while (std::getline(list_if, index_filename)) {
+      chunks->insert(GetChunkId(index_filename, kIndexFileNamePrefix));
+    }
+  }
+  PCHECK(closedir(dir) == 0);
+}
+
+std::string NewSnapshotId() {
+  std::random_device rd;
+  return std::to_string((static_cast<uint64_t>(rd()) << 32) | rd());
+}
+
+std::string ReadSnapshotId(const std::string& snapshot_dir) {
+  std::ifstream id_if(PosixFile::JoinPath(snapshot_dir, kSnapshotIdFileName));
+  std::string id;
+  std::getline(id_if, id);
+  return id;
+}
+
 uint32_t GetLogicalBlockSize(uint32_t physical_block_size, uint32_t value_size) {
   return physical_block_size >= value_size ? physical_block_size
                                            : RoundUp(value_size, physical_block_size);
@@ -359,6 +400,9 @@ class PersistentTableImpl : public PersistentTable {
                     const std::function<void(Iterator* iter)>& Hook) override;
   void SaveSnapshot(const std::string& name) override;
   Iterator* ReadSnapshot(const std::string& name) override;
+  void Compact() override;
+  void GetStats(PersistentTableStats* stats) const override;
+  void ResetStats() override;
 
  private:
   friend class SnapshotIteratorImpl<Key, Engine>;
@@ -367,9 +411,23 @@ class PersistentTableImpl : public PersistentTable {
   std::string IndexFilePath(const std::string& name, uint64_t chunk_id) const;
   std::string SnapshotDirPath(const std::string& name) const;
   std::string SnapshotListFilePath(const std::string& name) const;
-  void LoadSnapshotImpl(const std::string& name);
+  std::vector<std::string> GetSnapshotChain(const std::string& name) const;
+  void LoadSnapshotRows(const std::string& name, bool replace,
+                        robin_hood::unordered_flat_map<Key, uint64_t>* mapping,
+                        std::vector<uint64_t>* chunk_num_live_rows,
+                        const std::function<void(Iterator* iter)>& Hook);
+  void GroupRowsByChunk(const robin_hood::unordered_flat_map<Key, uint64_t>& mapping,
+                        std::vector<std::pair<uint64_t, std::vector<uint64_t>>>* chunk_rows);
+  void IterateChunk(uint64_t chunk_id, size_t n_entries, const Key* keys, const uint64_t* indices,
+                    const std::function<void(Iterator* iter)>& Hook);
+  void LoadSnapshotImpl(const std::string& name, const std::function<void(Iterator* iter)>& Hook);
   void SaveSnapshotImpl(const std::string& name);
   void ParallelFor(size_t total, const ForRange<Engine>& for_range);
+  bool IsChunkExpired(uint64_t chunk_id) const;
+  bool IsCompactionCandidate(uint64_t chunk_id);
+  void ScheduleCompaction();
+  void CompactChunk(uint64_t chunk_id);
+  void CompactionLoop();
 
   std::string root_dir_;
   std::string keys_dir_;
@@ -388,13 +446,41 @@ class PersistentTableImpl : public PersistentTable {
   std::vector<uint32_t> offsets_buffer_;
   AlignedBuffer blocks_buffer_;
 
-  std::recursive_mutex mutex_;
+  mutable std::recursive_mutex mutex_;
   uint64_t physical_table_size_;
   robin_hood::unordered_flat_map<Key, uint64_t> row_id_mapping_;
   std::vector<PosixFile> value_files_;
   PosixFile writable_key_file_;
   uint64_t writable_key_file_chunk_id_;
   PosixFileLockGuard lock_;
+
+  uint32_t max_incremental_snapshots_;
+  std::string last_snapshot_name_;
+  uint64_t last_snapshot_table_size_;
+  // An incremental snapshot can't remove keys from its base, so the next snapshot after keys
+  // expire is a full one.
+  bool keys_expired_since_last_snapshot_;
+
+  float compaction_threshold_;
+  uint64_t ttl_seconds_;
+  std::vector<uint64_t> chunk_num_live_rows_;
+  std::vector<int64_t> chunk_write_times_;
+  std::unordered_set<uint64_t> snapshot_chunks_;
+  uint64_t num_reclaimed_rows_;
+  std::mutex compaction_mutex_;
+  std::mutex compaction_signal_mutex_;
+  std::condition_variable compaction_cv_;
+  bool compaction_pending_;
+  bool compaction_shutdown_;
+  std::thread compaction_thread_;
+
+  std::atomic<uint64_t> num_read_keys_;
+  std::atomic<uint64_t> num_read_bytes_;
+  std::atomic<uint64_t> num_write_keys_;
+  std::atomic<uint64_t> num_write_bytes_;
+  std::atomic<uint64_t> num_write_ops_;
+  std::atomic<uint64_t> num_compacted_chunks_;
+  std::atomic<uint64_t> num_expired_keys_;
 };
 
 template<typename Key, typename Engine>
@@ -405,7 +491,24 @@ PersistentTableImpl<Key, Engine>::PersistentTableImpl(const PersistentTableOptio
       physical_block_size_(options.physical_block_size),
       logical_block_size_(GetLogicalBlockSize(options.physical_block_size, value_size_)),
       blocks_buffer_(options.physical_block_size),
-      writable_key_file_chunk_id_(-1) {
+      writable_key_file_chunk_id_(-1),
+      max_incremental_snapshots_(options.max_incremental_snapshots),
+      last_snapshot_table_size_(0),
+      keys_expired_since_last_snapshot_(false),
+      compaction_threshold_(options.compaction_threshold),
+      ttl_seconds_(options.ttl_seconds),
+      num_reclaimed_rows_(0),
+      compaction_pending_(false),
+      compaction_shutdown_(false),
+      num_read_keys_(0),
+      num_read_bytes_(0),
+      num_write_keys_(0),
+      num_write_bytes_(0),
+      num_write_ops_(0),
+      num_compacted_chunks_(0),
+      num_expired_keys_(0) {
+  CHECK_GE(compaction_threshold_, 0);
+  CHECK_LT(compaction_threshold_, 1);
   const uint64_t capacity_hint = ParseIntegerFromEnv(
       "ONEFLOW_ONE_EMBEDDING_PERSISTENT_TABLE_CAPACITY_HINT", options.capacity_hint);
   if (capacity_hint > 0) { row_id_mapping_.reserve(capacity_hint); }
@@ -452,10 +555,34 @@ PersistentTableImpl<Key, Engine>::PersistentTableImpl(const PersistentTableOptio
   } else {
     physical_table_size_ = 0;
   }
+  for (auto& value_file : value_files_) {
+    if (value_file.fd() == -1) { num_reclaimed_rows_ += num_values_per_chunk_; }
+  }
+  chunk_num_live_rows_.resize(value_files_.size());
+  // The chunks written before the table is opened are aged by the modification time of their files.
+  chunk_write_times_.resize(value_files_.size());
+  for (size_t chunk_id = 0; chunk_id < value_files_.size(); ++chunk_id) {
+    if (!value_files_.at(chunk_id).IsOpen()) { continue; }
+    struct stat sb {};
+    PCHECK(fstat(value_files_.at(chunk_id).fd(), &sb) == 0);
+    chunk_write_times_.at(chunk_id) = sb.st_mtime;
+  }
+  ListSnapshotChunks(snapshots_dir_, &snapshot_chunks_);
+  if (compaction_threshold_ > 0 || ttl_seconds_ > 0) {
+    compaction_thread_ = std::thread(&PersistentTableImpl<Key, Engine>::CompactionLoop, this);
+  }
 }
 
 template<typename Key, typename Engine>
 PersistentTableImpl<Key, Engine>::~PersistentTableImpl() {
+  if (compaction_thread_.joinable()) {
+    {
+      std::lock_guard<std::mutex> lock(compaction_signal_mutex_);
+      compaction_shutdown_ = true;
+    }
+    compaction_cv_.notify_one();
+    compaction_thread_.join();
+  }
   for (uint32_t tid = 0; tid < workers_.size(); ++tid) { workers_.at(tid)->Shutdown(); }
 }
 
@@ -469,6 +596,7 @@ void PersistentTableImpl<Key, Engine>::GetBlocks(uint32_t num_keys, const void*
                                                  uint32_t* offsets) {
   std::lock_guard<std::recursive_mutex> lock(mutex_);
   ParallelFor(num_keys, [&](Engine* engine, size_t start, size_t end) {
+    uint64_t num_read_keys = 0;
     for (uint64_t i = start; i < end; ++i) {
       const Key key = static_cast<const Key*>(keys)[i];
       auto it = row_id_mapping_.find(key);
@@ -486,8 +614,11 @@ void PersistentTableImpl<Key, Engine>::GetBlocks(uint32_t num_keys, const void*
         offsets[i] = offset_in_block;
         engine->AsyncPread(file.fd(), BytesOffset(blocks, i * logical_block_size_),
                            logical_block_size_, block_offset);
+        num_read_keys += 1;
       }
     }
+    num_read_keys_ += num_read_keys;
+    num_read_bytes_ += num_read_keys * logical_block_size_;
   });
 }
 
@@ -566,14 +697,43 @@ void PersistentTableImpl<Key, Engine>::PutBlocks(uint32_t num_keys, const void*
       PCHECK(pwrite(writable_key_file_.fd(), BytesOffset(keys, written_blocks * block_keys_size),
                     keys_bytes, keys_offset_in_file)
              == keys_bytes);
+      num_write_bytes_ += values_bytes + keys_bytes;
+      num_write_ops_ += 2;
       written_blocks += blocks_to_write;
     }
     bc.Decrease();
   });
+  if (num_keys > 0) {
+    const uint64_t last_chunk_id = (start_index + num_keys - 1) / num_values_per_chunk_;
+    if (chunk_num_live_rows_.size() <= last_chunk_id) {
+      chunk_num_live_rows_.resize(last_chunk_id + 1);
+      chunk_write_times_.resize(last_chunk_id + 1);
+    }
+    const int64_t now = std::time(nullptr);
+    for (uint64_t chunk_id = start_index / num_values_per_chunk_; chunk_id <= last_chunk_id;
+         ++chunk_id) {
+      chunk_write_times_[chunk_id] = now;
+    }
+  }
   for (uint64_t i = 0; i < num_keys; ++i) {
-    row_id_mapping_[static_cast<const Key*>(keys)[i]] = start_index + i;
+    const uint64_t row_id = start_index + i;
+    auto it = row_id_mapping_.emplace(static_cast<const Key*>(keys)[i], row_id);
+    if (!it.second) {
+      chunk_num_live_rows_[it.first->second / num_values_per_chunk_] -= 1;
+      it.first->second = row_id;
+    }
+    chunk_num_live_rows_[row_id / num_values_per_chunk_] += 1;
   }
+  num_write_keys_ += num_keys;
   bc.WaitForeverUntilCntEqualZero();
+  if (compaction_threshold_ > 0 || ttl_seconds_ > 0) {
+    for (uint64_t chunk_id = 0; chunk_id < value_files_.size(); ++chunk_id) {
+      if (IsCompactionCandidate(chunk_id)) {
+        ScheduleCompaction();
+        break;
+      }
+    }
+  }
 }
 
 template<typename Key, typename Engine>
@@ -600,6 +760,35 @@ void PersistentTableImpl<Key, Engine>::Put(uint32_t num_keys, const void* keys,
   PutBlocks(num_keys, keys, blocks_ptr);
 }
 
+template<typename Key, typename Engine>
+void PersistentTableImpl<Key, Engine>::GetStats(PersistentTableStats* stats) const {
+  std::lock_guard<std::recursive_mutex> lock(mutex_);
+  stats->num_read_keys = num_read_keys_;
+  stats->num_read_bytes = num_read_bytes_;
+  // Every key that is found in the table is read with its own pread of a logical block.
+  stats->num_read_ops = num_read_keys_;
+  stats->num_write_keys = num_write_keys_;
+  stats->num_write_bytes = num_write_bytes_;
+  stats->num_write_ops = num_write_ops_;
+  stats->num_keys = row_id_mapping_.size();
+  stats->num_disk_rows = physical_table_size_ - num_reclaimed_rows_;
+  stats->num_compacted_chunks = num_compacted_chunks_;
+  stats->num_expired_keys = num_expired_keys_;
+  stats->disk_amplification =
+      stats->num_keys == 0 ? 0 : static_cast<double>(stats->num_disk_rows) / stats->num_keys;
+}
+
+template<typename Key, typename Engine>
+void PersistentTableImpl<Key, Engine>::ResetStats() {
+  num_read_keys_ = 0;
+  num_read_bytes_ = 0;
+  num_write_keys_ = 0;
+  num_write_bytes_ = 0;
+  num_write_ops_ = 0;
+  num_compacted_chunks_ = 0;
+  num_expired_keys_ = 0;
+}
+
 template<typename Key, typename Engine>
 std::string PersistentTableImpl<Key, Engine>::KeyFilePath(uint64_t chunk_id) const {
   return PosixFile::JoinPath(keys_dir_, kKeyFileNamePrefix + GetChunkName(chunk_id));
@@ -627,43 +816,197 @@ std::string PersistentTableImpl<Key, Engine>::SnapshotListFilePath(const std::st
 }
 
 template<typename Key, typename Engine>
-void PersistentTableImpl<Key, Engine>::LoadSnapshotImpl(const std::string& name) {
-  std::lock_guard<std::recursive_mutex> lock(mutex_);
+std::vector<std::string> PersistentTableImpl<Key, Engine>::GetSnapshotChain(
+    const std::string& name) const {
+  std::vector<std::string> chain;
+  std::string current = name;
+  while (true) {
+    CHECK(std::find(chain.begin(), chain.end(), current) == chain.end());
+    chain.push_back(current);
+    const std::string base_file =
+        PosixFile::JoinPath(SnapshotDirPath(current), kSnapshotBaseFileName);
+    if (!PosixFile::FileExists(base_file)) { break; }
+    std::ifstream base_if(base_file);
+    std::string base_name;
+    std::string base_id;
+    std::getline(base_if, base_name);
+    std::getline(base_if, base_id);
+    CHECK(PosixFile::FileExists(SnapshotListFilePath(base_name)))
+        << "The base snapshot " << base_name << " of snapshot " << current << " does not exist";
+    CHECK_EQ(ReadSnapshotId(SnapshotDirPath(base_name)), base_id)
+        << "The base snapshot " << base_name << " of snapshot " << current
+        << " has been overwritten";
+    current = base_name;
+  }
+  std::reverse(chain.begin(), chain.end());
+  return chain;
+}
+
+template<typename Key, typename Engine>
+void PersistentTableImpl<Key, Engine>::LoadSnapshotRows(
+    const std::string& name, bool replace, robin_hood::unordered_flat_map<Key, uint64_t>* mapping,
+    std::vector<uint64_t>* chunk_num_live_rows, const std::function<void(Iterator* iter)>& Hook) {
   const std::string snapshot_base = SnapshotDirPath(name);
   const std::string snapshot_list = SnapshotListFilePath(name);
-  row_id_mapping_.clear();
+  std::vector<uint64_t> chunk_ids;
+  std::vector<PosixMappedFile> index_files;
+  uint64_t num_entries = 0;
   std::ifstream list_if(snapshot_list);
   std::string index_filename;
   while (std::getline(list_if, index_filename)) {
-    const uint64_t chunk_id = GetChunkId(index_filename, kIndexFileNamePrefix);
     PosixFile index_file(PosixFile::JoinPath(snapshot_base, index_filename), O_RDONLY, 0644);
     const size_t index_file_size = index_file.Size();
     CHECK_EQ(index_file_size % sizeof(uint64_t), 0);
-    if (index_file_size == 0) { return; }
-    const size_t n_entries = index_file_size / sizeof(uint64_t);
-    PosixMappedFile mapped_index(std::move(index_file), index_file_size, PROT_READ);
+    if (index_file_size == 0) { continue; }
+    chunk_ids.push_back(GetChunkId(index_filename, kIndexFileNamePrefix));
+    index_files.emplace_back(std::move(index_file), index_file_size, PROT_READ);
+    num_entries += index_file_size / sizeof(uint64_t);
+  }
+  // Sized once for the whole snapshot, growing it chunk by chunk would rehash it over and over.
+  mapping->reserve(mapping->size() + num_entries);
+  std::vector<Key> keys_buffers[2];
+  for (size_t i = 0; i < chunk_ids.size(); ++i) {
+    const uint64_t chunk_id = chunk_ids.at(i);
+    const size_t n_entries = index_files.at(i).file().Size() / sizeof(uint64_t);
     PosixFile key_file(KeyFilePath(chunk_id), O_RDONLY, 0644);
-    PosixMappedFile mapped_key(std::move(key_file), key_file.Size(), PROT_READ);
-    const uint64_t* indices = static_cast<const uint64_t*>(mapped_index.ptr());
+    const size_t key_file_size = key_file.Size();
+    PosixMappedFile mapped_key(std::move(key_file), key_file_size, PROT_READ);
+    const uint64_t* indices = static_cast<const uint64_t*>(index_files.at(i).ptr());
     const Key* keys = static_cast<const Key*>(mapped_key.ptr());
     const uint64_t chunk_start_index = chunk_id * num_values_per_chunk_;
-    row_id_mapping_.reserve(row_id_mapping_.size() + n_entries);
-    for (size_t i = 0; i < n_entries; ++i) {
-      CHECK(row_id_mapping_.emplace(keys[indices[i] - chunk_start_index], indices[i]).second);
+    // The workers read the keys of the next batch out of the mapped files while this thread
+    // inserts the current batch into the map.
+    auto GatherKeys = [&](size_t start, size_t end, Key* batch_keys) {
+      ParallelFor(end - start, [&](Engine* engine, size_t batch_start, size_t batch_end) {
+        for (size_t j = batch_start; j < batch_end; ++j) {
+          batch_keys[j] = keys[indices[start + j] - chunk_start_index];
+        }
+      });
+    };
+    const size_t batch_size = std::min<size_t>(n_entries, kLoadSnapshotBatchSize);
+    keys_buffers[0].resize(batch_size);
+    keys_buffers[1].resize(batch_size);
+    GatherKeys(0, batch_size, keys_buffers[0].data());
+    for (size_t start = 0, batch = 0; start < n_entries; start += batch_size, ++batch) {
+      const size_t end = std::min(start + batch_size, n_entries);
+      std::thread gather_thread;
+      if (end < n_entries) {
+        gather_thread = std::thread(GatherKeys, end, std::min(end + batch_size, n_entries),
+                                    keys_buffers[(batch + 1) % 2].data());
+      }
+      const Key* batch_keys = keys_buffers[batch % 2].data();
+      for (size_t j = start; j < end; ++j) {
+        auto it = mapping->emplace(batch_keys[j - start], indices[j]);
+        if (!it.second) {
+          CHECK(replace);
+          if (chunk_num_live_rows != nullptr) {
+            chunk_num_live_rows->at(it.first->second / num_values_per_chunk_) -= 1;
+          }
+          it.first->second = indices[j];
+        }
+      }
+      if (gather_thread.joinable()) { gather_thread.join(); }
     }
+    if (chunk_num_live_rows != nullptr) { chunk_num_live_rows->at(chunk_id) += n_entries; }
+    if (Hook) { IterateChunk(chunk_id, n_entries, keys, indices, Hook); }
+  }
+}
+
+template<typename Key, typename Engine>
+void PersistentTableImpl<Key, Engine>::GroupRowsByChunk(
+    const robin_hood::unordered_flat_map<Key, uint64_t>& mapping,
+    std::vector<std::pair<uint64_t, std::vector<uint64_t>>>* chunk_rows) {
+  std::vector<std::vector<uint64_t>> rows(value_files_.size());
+  for (const auto& pair : mapping) {
+    rows.at(pair.second / num_values_per_chunk_).push_back(pair.second);
+  }
+  chunk_rows->clear();
+  for (uint64_t chunk_id = 0; chunk_id < rows.size(); ++chunk_id) {
+    if (rows.at(chunk_id).empty()) { continue; }
+    std::sort(rows.at(chunk_id).begin(), rows.at(chunk_id).end());
+    chunk_rows->emplace_back(chunk_id, std::move(rows.at(chunk_id)));
   }
 }
 
+template<typename Key, typename Engine>
+void PersistentTableImpl<Key, Engine>::IterateChunk(
+    uint64_t chunk_id, size_t n_entries, const Key* keys, const uint64_t* indices,
+    const std::function<void(Iterator* iter)>& Hook) {
+  PosixFile value_file(ValueFilePath(chunk_id), O_RDONLY, 0644);
+  const size_t value_file_size = value_file.Size();
+  PosixMappedFile mapped_value(std::move(value_file), value_file_size, PROT_READ);
+  ChunkIteratorImpl<Key> chunk_iterator(value_size_, logical_block_size_, num_values_per_block_,
+                                        num_values_per_chunk_, chunk_id, n_entries, keys, indices,
+                                        mapped_value.ptr());
+  Hook(&chunk_iterator);
+}
+
+template<typename Key, typename Engine>
+void PersistentTableImpl<Key, Engine>::LoadSnapshotImpl(
+    const std::string& name, const std::function<void(Iterator* iter)>& Hook) {
+  std::lock_guard<std::recursive_mutex> lock(mutex_);
+  row_id_mapping_.clear();
+  chunk_num_live_rows_.assign(value_files_.size(), 0);
+  // An incremental snapshot only has the rows written after its base snapshot, the chain is merged
+  // from the full snapshot at its root.
+  const std::vector<std::string> chain = GetSnapshotChain(name);
+  for (size_t i = 0; i < chain.size(); ++i) {
+    LoadSnapshotRows(chain.at(i), i > 0, &row_id_mapping_, &chunk_num_live_rows_,
+                     chain.size() == 1 ? Hook : nullptr);
+  }
+  if (Hook && chain.size() > 1) {
+    std::vector<std::pair<uint64_t, std::vector<uint64_t>>> chunk_rows;
+    GroupRowsByChunk(row_id_mapping_, &chunk_rows);
+    for (const auto& rows : chunk_rows) {
+      PosixFile key_file(KeyFilePath(rows.first), O_RDONLY, 0644);
+      const size_t key_file_size = key_file.Size();
+      PosixMappedFile mapped_key(std::move(key_file), key_file_size, PROT_READ);
+      IterateChunk(rows.first, rows.second.size(), static_cast<const Key*>(mapped_key.ptr()),
+                   rows.second.data(), Hook);
+    }
+  }
+  last_snapshot_name_ = name;
+  last_snapshot_table_size_ = physical_table_size_;
+  keys_expired_since_last_snapshot_ = false;
+}
+
 template<typename Key, typename Engine>
 void PersistentTableImpl<Key, Engine>::SaveSnapshotImpl(const std::string& name) {
   std::lock_guard<std::recursive_mutex> lock(mutex_);
-  PosixFile::RecursiveCreateDirectory(SnapshotDirPath(name), 0755);
+  const std::string snapshot_dir = SnapshotDirPath(name);
+  PosixFile::RecursiveCreateDirectory(snapshot_dir, 0755);
+  // The rows of the keys written after the last snapshot was saved or loaded are at the end of the
+  // table, an incremental snapshot only indexes them and points to the last snapshot as its base.
+  std::string base_name;
+  uint64_t min_row_id = 0;
+  if (max_incremental_snapshots_ > 0 && !keys_expired_since_last_snapshot_
+      && !last_snapshot_name_.empty() && last_snapshot_name_ != name
+      && PosixFile::FileExists(SnapshotListFilePath(last_snapshot_name_))
+      && !ReadSnapshotId(SnapshotDirPath(last_snapshot_name_)).empty()) {
+    const std::vector<std::string> base_chain = GetSnapshotChain(last_snapshot_name_);
+    if (base_chain.size() <= max_incremental_snapshots_
+        && std::find(base_chain.begin(), base_chain.end(), name) == base_chain.end()) {
+      base_name = last_snapshot_name_;
+      min_row_id = last_snapshot_table_size_;
+    }
+  }
+  const std::string base_file = PosixFile::JoinPath(snapshot_dir, kSnapshotBaseFileName);
+  if (base_name.empty()) {
+    if (PosixFile::FileExists(base_file)) { PCHECK(unlink(base_file.c_str()) == 0); }
+  } else {
+    std::ofstream base_ofs(base_file);
+    base_ofs << base_name << std::endl << ReadSnapshotId(SnapshotDirPath(base_name)) << std::endl;
+  }
+  {
+    std::ofstream id_ofs(PosixFile::JoinPath(snapshot_dir, kSnapshotIdFileName));
+    id_ofs << NewSnapshotId() << std::endl;
+  }
   std::ofstream list_ofs(SnapshotListFilePath(name));
-  if (row_id_mapping_.empty()) { return; }
   std::vector<PosixMappedFile> index_files(value_files_.size());
   std::vector<uint64_t> counters(value_files_.size());
   const uint64_t max_index_file_size = num_values_per_chunk_ * sizeof(uint64_t);
   for (const auto& pair : row_id_mapping_) {
+    if (pair.second < min_row_id) { continue; }
     const uint64_t chunk_id = pair.second / num_values_per_chunk_;
     CHECK(chunk_id < value_files_.size());
     if (index_files[chunk_id].ptr() == nullptr) {
@@ -687,6 +1030,13 @@ void PersistentTableImpl<Key, Engine>::SaveSnapshotImpl(const std::string& name)
       CHECK(index_files[i].ptr() == nullptr);
     }
   }
+  list_ofs.close();
+  last_snapshot_name_ = name;
+  last_snapshot_table_size_ = physical_table_size_;
+  keys_expired_since_last_snapshot_ = false;
+  // Rows of the chunks referenced by any snapshot must stay on disk, the snapshot may overwrite an
+  // older one with the same name so the whole set is listed again.
+  ListSnapshotChunks(snapshots_dir_, &snapshot_chunks_);
 }
 
 template<typename Key, typename Engine>
@@ -697,44 +1047,13 @@ bool PersistentTableImpl<Key, Engine>::SnapshotExists(const std::string& name) {
 
 template<typename Key, typename Engine>
 void PersistentTableImpl<Key, Engine>::LoadSnapshot(const std::string& name) {
-  LoadSnapshotImpl(name);
+  LoadSnapshotImpl(name, nullptr);
 }
 
 template<typename Key, typename Engine>
 void PersistentTableImpl<Key, Engine>::LoadSnapshot(
     const std::string& name, const std::function<void(Iterator* iter)>& Hook) {
-  std::lock_guard<std::recursive_mutex> lock(mutex_);
-  const std::string snapshot_base = SnapshotDirPath(name);
-  const std::string snapshot_list = SnapshotListFilePath(name);
-  row_id_mapping_.clear();
-  std::ifstream list_if(snapshot_list);
-  std::string index_filename;
-  while (std::getline(list_if, index_filename)) {
-    const uint64_t chunk_id = GetChunkId(index_filename, kIndexFileNamePrefix);
-    PosixFile index_file(PosixFile::JoinPath(snapshot_base, index_filename), O_RDONLY, 0644);
-    const size_t index_file_size = index_file.Size();
-    CHECK_EQ(index_file_size % sizeof(uint64_t), 0);
-    if (index_file_size == 0) { return; }
-    const size_t n_entries = index_file_size / sizeof(uint64_t);
-    PosixMappedFile mapped_index(std::move(index_file), index_file_size, PROT_READ);
-    PosixFile key_file(KeyFilePath(chunk_id), O_RDONLY, 0644);
-    PosixMappedFile mapped_key(std::move(key_file), key_file.Size(), PROT_READ);
-    const uint64_t* indices = static_cast<const uint64_t*>(mapped_index.ptr());
-    const Key* keys = static_cast<const Key*>(mapped_key.ptr());
-    const uint64_t chunk_start_index = chunk_id * num_values_per_chunk_;
-    row_id_mapping_.reserve(row_id_mapping_.size() + n_entries);
-    for (size_t i = 0; i < n_entries; ++i) {
-      CHECK(row_id_mapping_.emplace(keys[indices[i] - chunk_start_index], indices[i]).second);
-    }
-    if (Hook) {
-      PosixFile value_file(ValueFilePath(chunk_id), O_RDONLY, 0644);
-      PosixMappedFile mapped_value(std::move(value_file), value_file.Size(), PROT_READ);
-      ChunkIteratorImpl<Key> chunk_iterator(value_size_, logical_block_size_, num_values_per_block_,
-                                            num_values_per_chunk_, chunk_id, n_entries, keys,
-                                            indices, mapped_value.ptr());
-      Hook(&chunk_iterator);
-    }
-  }
+  LoadSnapshotImpl(name, Hook);
 }
 
 template<typename Key, typename Engine>
@@ -748,6 +1067,124 @@ PersistentTable::Iterator* PersistentTableImpl<Key, Engine>::ReadSnapshot(const
                                                num_values_per_block_, num_values_per_chunk_);
 }
 
+template<typename Key, typename Engine>
+void PersistentTableImpl<Key, Engine>::Compact() {
+  std::lock_guard<std::mutex> compaction_lock(compaction_mutex_);
+  std::vector<uint64_t> chunk_ids;
+  {
+    std::lock_guard<std::recursive_mutex> lock(mutex_);
+    ListSnapshotChunks(snapshots_dir_, &snapshot_chunks_);
+    for (uint64_t chunk_id = 0; chunk_id < value_files_.size(); ++chunk_id) {
+      if (IsCompactionCandidate(chunk_id)) { chunk_ids.push_back(chunk_id); }
+    }
+  }
+  for (const uint64_t chunk_id : chunk_ids) { CompactChunk(chunk_id); }
+}
+
+template<typename Key, typename Engine>
+bool PersistentTableImpl<Key, Engine>::IsChunkExpired(uint64_t chunk_id) const {
+  if (ttl_seconds_ == 0) { return false; }
+  return std::time(nullptr) - chunk_write_times_.at(chunk_id)
+         > static_cast<int64_t>(ttl_seconds_);
+}
+
+template<typename Key, typename Engine>
+bool PersistentTableImpl<Key, Engine>::IsCompactionCandidate(uint64_t chunk_id) {
+  if (compaction_threshold_ <= 0 && ttl_seconds_ == 0) { return false; }
+  // The last chunk is still appended to.
+  if (chunk_id + 1 >= value_files_.size()) { return false; }
+  if (!value_files_.at(chunk_id).IsOpen()) { return false; }
+  const bool expired = IsChunkExpired(chunk_id);
+  // The keys of an expired chunk are removed even if a snapshot pins the files of the chunk.
+  if (expired && chunk_num_live_rows_.at(chunk_id) > 0) { return true; }
+  if (snapshot_chunks_.count(chunk_id) != 0) { return false; }
+  return expired
+         || chunk_num_live_rows_.at(chunk_id) < compaction_threshold_ * num_values_per_chunk_;
+}
+
+template<typename Key, typename Engine>
+void PersistentTableImpl<Key, Engine>::ScheduleCompaction() {
+  {
+    std::lock_guard<std::mutex> lock(compaction_signal_mutex_);
+    compaction_pending_ = true;
+  }
+  compaction_cv_.notify_one();
+}
+
+template<typename Key, typename Engine>
+void PersistentTableImpl<Key, Engine>::CompactionLoop() {
+  while (true) {
+    {
+      std::unique_lock<std::mutex> lock(compaction_signal_mutex_);
+      compaction_cv_.wait(lock, [&] { return compaction_pending_ || compaction_shutdown_; });
+      if (compaction_shutdown_) { return; }
+      compaction_pending_ = false;
+    }
+    Compact();
+  }
+}
+
+template<typename Key, typename Engine>
+void PersistentTableImpl<Key, Engine>::CompactChunk(uint64_t chunk_id) {
+  std::unique_lock<std::recursive_mutex> lock(mutex_);
+  if (!IsCompactionCandidate(chunk_id)) { return; }
+  if (chunk_num_live_rows_.at(chunk_id) > 0) {
+    // The files of a sealed chunk are never written again, so they are read without the lock and
+    // the live rows are moved to the end of the table batch by batch, each batch under the lock.
+    PosixFile key_file(KeyFilePath(chunk_id), O_RDONLY, 0644);
+    const size_t key_file_size = key_file.Size();
+    PosixMappedFile mapped_key(std::move(key_file), key_file_size, PROT_READ);
+    PosixFile value_file(ValueFilePath(chunk_id), O_RDONLY, 0644);
+    const size_t value_file_size = value_file.Size();
+    PosixMappedFile mapped_value(std::move(value_file), value_file_size, PROT_READ);
+    lock.unlock();
+    const Key* keys = static_cast<const Key*>(mapped_key.ptr());
+    const uint64_t num_rows = std::min<uint64_t>(
+        key_file_size / sizeof(Key), value_file_size / logical_block_size_ * num_values_per_block_);
+    const uint64_t chunk_start_index = chunk_id * num_values_per_chunk_;
+    std::vector<Key> live_keys;
+    std::vector<char> live_values;
+    for (uint64_t start = 0; start < num_rows; start += kCompactionBatchSize) {
+      const uint64_t end = std::min(start + kCompactionBatchSize, num_rows);
+      lock.lock();
+      if (!IsCompactionCandidate(chunk_id) || chunk_num_live_rows_.at(chunk_id) == 0) {
+        lock.unlock();
+        break;
+      }
+      live_keys.clear();
+      live_values.clear();
+      const bool expired = IsChunkExpired(chunk_id);
+      for (uint64_t row = start; row < end; ++row) {
+        auto it = row_id_mapping_.find(keys[row]);
+        if (it == row_id_mapping_.end() || it->second != chunk_start_index + row) { continue; }
+        if (expired) {
+          row_id_mapping_.erase(it);
+          chunk_num_live_rows_.at(chunk_id) -= 1;
+          num_expired_keys_ += 1;
+          keys_expired_since_last_snapshot_ = true;
+          continue;
+        }
+        const uint64_t block_in_chunk = row / num_values_per_block_;
+        const uint64_t id_in_block = row - block_in_chunk * num_values_per_block_;
+        const uint64_t value_offset =
+            block_in_chunk * logical_block_size_ + id_in_block * value_size_;
+        const char* value = BytesOffset(static_cast<const char*>(mapped_value.ptr()), value_offset);
+        live_keys.push_back(keys[row]);
+        live_values.insert(live_values.end(), value, value + value_size_);
+      }
+      if (!live_keys.empty()) { Put(live_keys.size(), live_keys.data(), live_values.data()); }
+      lock.unlock();
+    }
+    lock.lock();
+  }
+  if (!IsCompactionCandidate(chunk_id) || chunk_num_live_rows_.at(chunk_id) != 0) { return; }
+  value_files_.at(chunk_id).Close();
+  PCHECK(unlink(ValueFilePath(chunk_id).c_str()) == 0);
+  PCHECK(unlink(KeyFilePath(chunk_id).c_str()) == 0);
+  num_reclaimed_rows_ += num_values_per_chunk_;
+  num_compacted_chunks_ += 1;
+}
+
 template<typename Key, typename Engine>
 void PersistentTableImpl<Key, Engine>::ParallelFor(size_t total,
                                                    const ForRange<Engine>& for_range) {
@@ -783,29 +1220,50 @@ class SnapshotIteratorImpl : public PersistentTable::Iterator {
         num_values_per_block_(num_values_per_block),
         num_values_per_chunk_(num_values_per_chunk),
         current_chunk_(0) {
-    const std::string snapshot_list = table_->SnapshotListFilePath(snapshot_name);
-    std::ifstream list_if(snapshot_list);
-    std::string index_filename;
-    while (std::getline(list_if, index_filename)) { indices_names_.push_back(index_filename); }
+    const std::vector<std::string> chain = table_->GetSnapshotChain(snapshot_name);
+    if (chain.size() == 1) {
+      const std::string snapshot_list = table_->SnapshotListFilePath(snapshot_name);
+      std::ifstream list_if(snapshot_list);
+      std::string index_filename;
+      while (std::getline(list_if, index_filename)) { indices_names_.push_back(index_filename); }
+    } else {
+      robin_hood::unordered_flat_map<Key, uint64_t> mapping;
+      for (size_t i = 0; i < chain.size(); ++i) {
+        table_->LoadSnapshotRows(chain.at(i), i > 0, &mapping, nullptr, nullptr);
+      }
+      table_->GroupRowsByChunk(mapping, &chunk_rows_);
+    }
   }
   ~SnapshotIteratorImpl() override = default;
 
   void Next(uint32_t num_keys, uint32_t* return_keys, void* keys, void* values) override {
     *return_keys = 0;
-    while (current_chunk_ < indices_names_.size()) {
+    const size_t num_chunks = chunk_rows_.empty() ? indices_names_.size() : chunk_rows_.size();
+    while (current_chunk_ < num_chunks) {
       if (!chunk_iterator_) {
-        const std::string snapshot_base = table_->SnapshotDirPath(snapshot_name_);
-        const uint64_t chunk_id = GetChunkId(indices_names_[current_chunk_], kIndexFileNamePrefix);
-        PosixFile index_file(PosixFile::JoinPath(snapshot_base, indices_names_[current_chunk_]),
-                             O_RDONLY, 0644);
-        const size_t index_file_size = index_file.Size();
-        CHECK_EQ(index_file_size % sizeof(uint64_t), 0);
-        if (index_file_size == 0) {
-          current_chunk_ += 1;
-          continue;
+        uint64_t chunk_id = 0;
+        size_t n_entries = 0;
+        const uint64_t* indices = nullptr;
+        if (chunk_rows_.empty()) {
+          const std::string snapshot_base = table_->SnapshotDirPath(snapshot_name_);
+          chunk_id = GetChunkId(indices_names_[current_chunk_], kIndexFileNamePrefix);
+          PosixFile index_file(PosixFile::JoinPath(snapshot_base, indices_names_[current_chunk_]),
+                               O_RDONLY, 0644);
+          const size_t index_file_size = index_file.Size();
+          CHECK_EQ(index_file_size % sizeof(uint64_t), 0);
+          if (index_file_size == 0) {
+            current_chunk_ += 1;
+            continue;
+          }
+          n_entries = index_file_size / sizeof(uint64_t);
+          indices_file_.reset(
+              new PosixMappedFile(std::move(index_file), index_file_size, PROT_READ));
+          indices = static_cast<const uint64_t*>(indices_file_->ptr());
+        } else {
+          chunk_id = chunk_rows_[current_chunk_].first;
+          n_entries = chunk_rows_[current_chunk_].second.size();
+          indices = chunk_rows_[current_chunk_].second.data();
         }
-        const size_t n_entries = index_file_size / sizeof(uint64_t);
-        indices_file_.reset(new PosixMappedFile(std::move(index_file), index_file_size, PROT_READ));
         PosixFile key_file(table_->KeyFilePath(chunk_id), O_RDONLY, 0644);
         keys_file_.reset(new PosixMappedFile(std::move(key_file), key_file.Size(), PROT_READ));
         PosixFile value_file(table_->ValueFilePath(chunk_id), O_RDONLY, 0644);
@@ -813,8 +1271,8 @@ class SnapshotIteratorImpl : public PersistentTable::Iterator {
             new PosixMappedFile(std::move(value_file), value_file.Size(), PROT_READ));
         chunk_iterator_.reset(new ChunkIteratorImpl<Key>(
             value_size_, logical_block_size_, num_values_per_block_, num_values_per_chunk_,
-            chunk_id, n_entries, static_cast<const Key*>(keys_file_->ptr()),
-            static_cast<const uint64_t*>(indices_file_->ptr()), values_file_->ptr()));
+            chunk_id, n_entries, static_cast<const Key*>(keys_file_->ptr()), indices,
+            values_file_->ptr()));
       }
       chunk_iterator_->Next(num_keys, return_keys, keys, values);
       if (*return_keys == 0) {
@@ -841,6 +1299,7 @@ class SnapshotIteratorImpl : public PersistentTable::Iterator {
   uint64_t num_values_per_chunk_;
   size_t current_chunk_;
   std::vector<std::string> indices_names_;
+  std::vector<std::pair<uint64_t, std::vector<uint64_t>>> chunk_rows_;
   std::unique_ptr<PosixMappedFile> keys_file_;
   std::unique_ptr<PosixMappedFile> values_file_;
   std::unique_ptr<PosixMappedFile> indices_file_;
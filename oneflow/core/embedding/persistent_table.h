@@ -29,6 +29,30 @@ struct PersistentTableOptions {
   uint64_t target_chunk_size_mb = 4 * 1024;
   uint16_t physical_block_size = 4096;
   uint64_t capacity_hint = 0;
+  // Sealed chunks whose ratio of live rows drops below the threshold are rewritten by a background
+  // thread and their files are removed. 0 disables the compaction.
+  float compaction_threshold = 0;
+  // Up to this number of snapshots in a row only index the keys written since the previous
+  // snapshot, then a full snapshot is saved. 0 saves full snapshots only.
+  uint32_t max_incremental_snapshots = 0;
+  // Keys whose rows have not been written for this number of seconds are removed by the
+  // compaction. Rows are aged per chunk, by the last write to their chunk, and the rows moved by
+  // the compaction count as written again. 0 keeps the keys forever.
+  uint64_t ttl_seconds = 0;
+};
+
+struct PersistentTableStats {
+  uint64_t num_read_keys = 0;
+  uint64_t num_read_bytes = 0;
+  uint64_t num_read_ops = 0;
+  uint64_t num_write_keys = 0;
+  uint64_t num_write_bytes = 0;
+  uint64_t num_write_ops = 0;
+  uint64_t num_keys = 0;
+  uint64_t num_disk_rows = 0;
+  uint64_t num_compacted_chunks = 0;
+  uint64_t num_expired_keys = 0;
+  double disk_amplification = 0;
 };
 
 class PersistentTable {
@@ -61,6 +85,9 @@ class PersistentTable {
                             const std::function<void(Iterator* iter)>& Hook) = 0;
   virtual void SaveSnapshot(const std::string& name) = 0;
   virtual Iterator* ReadSnapshot(const std::string& name) = 0;
+  virtual void Compact() = 0;
+  virtual void GetStats(PersistentTableStats* stats) const = 0;
+  virtual void ResetStats() = 0;
 };
 
 std::unique_ptr<PersistentTable> NewPersistentTable(const PersistentTableOptions& options);
@@ -0,0 +1,340 @@
+/*
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+*/
+#include "oneflow/core/embedding/persistent_table_bulk_io.h"
+#include "oneflow/core/embedding/hash_functions.cuh"
+#include <deque>
+#include <limits>
+
+namespace oneflow {
+
+namespace embedding {
+
+namespace {
+
+// Keys sharded by a thread of the writer, smaller writes are sharded by fewer threads.
+constexpr uint64_t kMinShardRangeSize = 65536;
+
+uint32_t GetNumThreads(uint32_t num_threads, uint64_t num_tasks) {
+  if (num_threads == 0) { num_threads = std::max(std::thread::hardware_concurrency(), 1U); }
+  return static_cast<uint32_t>(std::max<uint64_t>(std::min<uint64_t>(num_threads, num_tasks), 1));
+}
+
+// Runs Fn(i) for every i in [0, n) on up to num_threads threads.
+void ParallelForEach(uint64_t n, uint32_t num_threads, const std::function<void(uint64_t)>& Fn) {
+  num_threads = GetNumThreads(num_threads, n);
+  if (num_threads == 1) {
+    for (uint64_t i = 0; i < n; ++i) { Fn(i); }
+    return;
+  }
+  std::atomic<uint64_t> next(0);
+  std::vector<std::thread> threads;
+  threads.reserve(num_threads);
+  for (uint32_t t = 0; t < num_threads; ++t) {
+    threads.emplace_back([&]() {
+      for (uint64_t i = next++; i < n; i = next++) { Fn(i); }
+    });
+  }
+  for (auto& thread : threads) { thread.join(); }
+}
+
+PersistentTableOptions GetTableOptions(const PersistentTableBulkOptions& options,
+                                       const std::string& path) {
+  PersistentTableOptions table_options;
+  table_options.path = path;
+  table_options.key_size = GetSizeOfDataType(options.key_type);
+  table_options.value_size = options.value_size;
+  table_options.target_chunk_size_mb = options.target_chunk_size_mb;
+  table_options.physical_block_size = options.physical_block_size;
+  return table_options;
+}
+
+template<typename Key>
+bool IsKeySelected(const PersistentTableKeyFilter& filter, Key key) {
+  if (filter.has_key_range
+      && (key < static_cast<Key>(filter.key_begin) || key >= static_cast<Key>(filter.key_end))) {
+    return false;
+  }
+  return filter.num_shards <= 1 || ShardingHash()(key) % filter.num_shards == filter.shard_id;
+}
+
+template<typename Key>
+class PersistentTableBulkReaderImpl : public PersistentTableBulkReader {
+ public:
+  OF_DISALLOW_COPY_AND_MOVE(PersistentTableBulkReaderImpl);
+  explicit PersistentTableBulkReaderImpl(const PersistentTableBulkOptions& options)
+      : options_(options), next_table_(0), num_running_workers_(0), closed_(false) {
+    CHECK_GT(options_.batch_size, 0);
+    CHECK_GT(options_.filter.num_shards, 0);
+    CHECK_LT(options_.filter.shard_id, options_.filter.num_shards);
+    const uint32_t num_workers = GetNumThreads(options_.num_threads, options_.paths.size());
+    // The queue holds a batch per worker, the workers read their next batches while it is full.
+    max_num_batches_ = num_workers;
+    num_running_workers_ = num_workers;
+    for (uint32_t i = 0; i < num_workers; ++i) {
+      workers_.emplace_back(&PersistentTableBulkReaderImpl::WorkerLoop, this);
+    }
+  }
+  ~PersistentTableBulkReaderImpl() override {
+    {
+      std::lock_guard<std::mutex> lock(mutex_);
+      closed_ = true;
+    }
+    not_full_.notify_all();
+    for (auto& worker : workers_) { worker.join(); }
+  }
+
+  bool Next(uint32_t* num_keys, std::vector<char>* keys, std::vector<char>* values) override {
+    std::unique_lock<std::mutex> lock(mutex_);
+    not_empty_.wait(lock, [&]() { return !batches_.empty() || num_running_workers_ == 0; });
+    if (batches_.empty()) { return false; }
+    Batch& batch = batches_.front();
+    *num_keys = batch.num_keys;
+    keys->swap(batch.keys);
+    values->swap(batch.values);
+    batches_.pop_front();
+    not_full_.notify_one();
+    return true;
+  }
+
+ private:
+  struct Batch {
+    uint32_t num_keys = 0;
+    std::vector<char> keys;
+    std::vector<char> values;
+  };
+
+  void WorkerLoop() {
+    for (size_t i = next_table_++; i < options_.paths.size(); i = next_table_++) {
+      if (!ReadTable(options_.paths.at(i))) { break; }
+    }
+    {
+      std::lock_guard<std::mutex> lock(mutex_);
+      num_running_workers_ -= 1;
+    }
+    not_empty_.notify_all();
+  }
+
+  // Returns false when the reader is destroyed before the table is read.
+  bool ReadTable(const std::string& path) {
+    std::unique_ptr<PersistentTable> table = NewPersistentTable(GetTableOptions(options_, path));
+    std::unique_ptr<PersistentTable::Iterator> iterator(
+        table->ReadSnapshot(options_.snapshot_name));
+    const uint32_t batch_size = options_.batch_size;
+    const uint32_t value_size = options_.value_size;
+    while (true) {
+      Batch batch;
+      batch.keys.resize(static_cast<size_t>(batch_size) * sizeof(Key));
+      batch.values.resize(static_cast<size_t>(batch_size) * value_size);
+      uint32_t n_result = 0;
+      iterator->Next(batch_size, &n_result, batch.keys.data(), batch.values.data());
+      if (n_result == 0) { return true; }
+      Key* keys = reinterpret_cast<Key*>(batch.keys.data());
+      char* values = batch.values.data();
+      // Moves the selected keys and values to the front of the batch.
+      uint32_t num_selected = 0;
+      for (uint32_t i = 0; i < n_result; ++i) {
+        if (!IsKeySelected(options_.filter, keys[i])) { continue; }
+        if (num_selected != i) {
+          keys[num_selected] = keys[i];
+          std::memcpy(values + static_cast<size_t>(num_selected) * value_size,
+                      values + static_cast<size_t>(i) * value_size, value_size);
+        }
+        num_selected += 1;
+      }
+      if (num_selected == 0) { continue; }
+      batch.num_keys = num_selected;
+      batch.keys.resize(static_cast<size_t>(num_selected) * sizeof(Key));
+      batch.values.resize(static_cast<size_t>(num_selected) * value_size);
+      std::unique_lock<std::mutex> lock(mutex_);
+      not_full_.wait(lock, [&]() { return closed_ || batches_.size() < max_num_batches_; });
+      if (closed_) { return false; }
+      batches_.push_back(std::move(batch));
+      not_empty_.notify_one();
+    }
+  }
+
+  PersistentTableBulkOptions options_;
+  std::atomic<size_t> next_table_;
+  std::vector<std::thread> workers_;
+  std::mutex mutex_;
+  std::condition_variable not_empty_;
+  std::condition_variable not_full_;
+  std::deque<Batch> batches_;
+  size_t max_num_batches_;
+  uint32_t num_running_workers_;
+  bool closed_;
+};
+
+template<typename Key>
+class PersistentTableBulkWriterImpl : public PersistentTableBulkWriter {
+ public:
+  OF_DISALLOW_COPY_AND_MOVE(PersistentTableBulkWriterImpl);
+  explicit PersistentTableBulkWriterImpl(const PersistentTableBulkOptions& options)
+      : options_(options), closed_(false) {
+    CHECK_GT(options_.paths.size(), 0);
+    tables_.resize(options_.paths.size());
+    ParallelForEach(tables_.size(), options_.num_threads, [&](uint64_t i) {
+      tables_.at(i) = NewPersistentTable(GetTableOptions(options_, options_.paths.at(i)));
+    });
+  }
+  ~PersistentTableBulkWriterImpl() override { CloseImpl(); }
+
+  void Write(uint64_t num_keys, const void* keys, const void* values) override {
+    CHECK(!closed_) << "Write on closed table";
+    const Key* keys_ptr = static_cast<const Key*>(keys);
+    const char* values_ptr = static_cast<const char*>(values);
+    const size_t num_tables = tables_.size();
+    const size_t value_size = options_.value_size;
+    if (num_tables == 1) {
+      PutKeys(tables_.at(0).get(), num_keys, keys_ptr, values_ptr);
+      return;
+    }
+    // The keys are split into ranges. Every range counts the keys of each table, then copies them
+    // to the offsets given by the prefix sums of the counts, so the keys of a table are grouped in
+    // the order of the input.
+    const uint32_t num_ranges = GetNumThreads(
+        options_.num_threads, (num_keys + kMinShardRangeSize - 1) / kMinShardRangeSize);
+    const uint64_t range_size = (num_keys + num_ranges - 1) / num_ranges;
+    std::vector<uint32_t> table_ids(num_keys);
+    std::vector<uint64_t> range_offsets(static_cast<size_t>(num_ranges) * num_tables, 0);
+    ParallelForEach(num_ranges, num_ranges, [&](uint64_t range) {
+      uint64_t* counts = range_offsets.data() + range * num_tables;
+      const uint64_t end = std::min((range + 1) * range_size, num_keys);
+      for (uint64_t i = range * range_size; i < end; ++i) {
+        const uint32_t table_id = ShardingHash()(keys_ptr[i]) % num_tables;
+        table_ids[i] = table_id;
+        counts[table_id] += 1;
+      }
+    });
+    std::vector<uint64_t> table_offsets(num_tables + 1, 0);
+    uint64_t offset = 0;
+    for (size_t table_id = 0; table_id < num_tables; ++table_id) {
+      table_offsets[table_id] = offset;
+      for (uint32_t range = 0; range < num_ranges; ++range) {
+        const uint64_t count = range_offsets[range * num_tables + table_id];
+        range_offsets[range * num_tables + table_id] = offset;
+        offset += count;
+      }
+    }
+    table_offsets[num_tables] = offset;
+    keys_buffer_.resize(num_keys);
+    values_buffer_.resize(num_keys * value_size);
+    ParallelForEach(num_ranges, num_ranges, [&](uint64_t range) {
+      uint64_t* offsets = range_offsets.data() + range * num_tables;
+      const uint64_t end = std::min((range + 1) * range_size, num_keys);
+      for (uint64_t i = range * range_size; i < end; ++i) {
+        const uint64_t pos = offsets[table_ids[i]]++;
+        keys_buffer_[pos] = keys_ptr[i];
+        std::memcpy(values_buffer_.data() + pos * value_size, values_ptr + i * value_size,
+                    value_size);
+      }
+    });
+    ParallelForEach(num_tables, options_.num_threads, [&](uint64_t table_id) {
+      const uint64_t start = table_offsets[table_id];
+      PutKeys(tables_.at(table_id).get(), table_offsets[table_id + 1] - start,
+              keys_buffer_.data() + start, values_buffer_.data() + start * value_size);
+    });
+  }
+
+  void Close() override { CloseImpl(); }
+
+ private:
+  void PutKeys(PersistentTable* table, uint64_t num_keys, const Key* keys, const char* values) {
+    const uint64_t max_num_keys = std::numeric_limits<uint32_t>::max();
+    for (uint64_t start = 0; start < num_keys; start += max_num_keys) {
+      const uint64_t n = std::min(num_keys - start, max_num_keys);
+      table->Put(n, keys + start, values + start * options_.value_size);
+    }
+  }
+
+  void CloseImpl() {
+    if (!closed_) {
+      ParallelForEach(tables_.size(), options_.num_threads, [&](uint64_t i) {
+        tables_.at(i)->SaveSnapshot(options_.snapshot_name);
+        tables_.at(i).reset();
+      });
+    }
+    closed_ = true;
+  }
+
+  PersistentTableBulkOptions options_;
+  bool closed_;
+  std::vector<std::unique_ptr<PersistentTable>> tables_;
+  std::vector<Key> keys_buffer_;
+  std::vector<char> values_buffer_;
+};
+
+}  // namespace
+
+std::unique_ptr<PersistentTableBulkReader> NewPersistentTableBulkReader(
+    const PersistentTableBulkOptions& options) {
+  if (options.key_type == DataType::kInt32) {
+    return std::unique_ptr<PersistentTableBulkReader>(
+        new PersistentTableBulkReaderImpl<int32_t>(options));
+  } else if (options.key_type == DataType::kUInt32) {
+    return std::unique_ptr<PersistentTableBulkReader>(
+        new PersistentTableBulkReaderImpl<uint32_t>(options));
+  } else if (options.key_type == DataType::kInt64) {
+    return std::unique_ptr<PersistentTableBulkReader>(
+        new PersistentTableBulkReaderImpl<int64_t>(options));
+  } else if (options.key_type == DataType::kUInt64) {
+    return std::unique_ptr<PersistentTableBulkReader>(
+        new PersistentTableBulkReaderImpl<uint64_t>(options));
+  } else {
+    UNIMPLEMENTED();
+    return nullptr;
+  }
+}
+
+std::unique_ptr<PersistentTableBulkWriter> NewPersistentTableBulkWriter(
+    const PersistentTableBulkOptions& options) {
+  if (options.key_type == DataType::kInt32) {
+    return std::unique_ptr<PersistentTableBulkWriter>(
+        new PersistentTableBulkWriterImpl<int32_t>(options));
+  } else if (options.key_type == DataType::kUInt32) {
+    return std::unique_ptr<PersistentTableBulkWriter>(
+        new PersistentTableBulkWriterImpl<uint32_t>(options));
+  } else if (options.key_type == DataType::kInt64) {
+    return std::unique_ptr<PersistentTableBulkWriter>(
+        new PersistentTableBulkWriterImpl<int64_t>(options));
+  } else if (options.key_type == DataType::kUInt64) {
+    return std::unique_ptr<PersistentTableBulkWriter>(
+        new PersistentTableBulkWriterImpl<uint64_t>(options));
+  } else {
+    UNIMPLEMENTED();
+    return nullptr;
+  }
+}
+
+void ReshardPersistentTables(const PersistentTableBulkOptions& src_options,
+                             const PersistentTableBulkOptions& dst_options) {
+  CHECK(src_options.key_type == dst_options.key_type);
+  CHECK_EQ(src_options.value_size, dst_options.value_size);
+  std::unique_ptr<PersistentTableBulkReader> reader = NewPersistentTableBulkReader(src_options);
+  std::unique_ptr<PersistentTableBulkWriter> writer = NewPersistentTableBulkWriter(dst_options);
+  // The workers of the reader read the next batches while a batch is written.
+  uint32_t num_keys = 0;
+  std::vector<char> keys;
+  std::vector<char> values;
+  while (reader->Next(&num_keys, &keys, &values)) {
+    writer->Write(num_keys, keys.data(), values.data());
+  }
+  writer->Close();
+}
+
+}  // namespace embedding
+
+}  // namespace oneflow
@@ -0,0 +1,93 @@
+/*
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+*/
+#ifndef ONEFLOW_CORE_EMBEDDING_PERSISTENT_TABLE_BULK_IO_H_
+#define ONEFLOW_CORE_EMBEDDING_PERSISTENT_TABLE_BULK_IO_H_
+
+#include "oneflow/core/embedding/persistent_table.h"
+#include "oneflow/core/common/data_type.h"
+
+namespace oneflow {
+
+namespace embedding {
+
+struct PersistentTableKeyFilter {
+  // Only the keys in [key_begin, key_end) are read. The bounds hold the bits of a key, cast from
+  // the key type, and are compared as the key type.
+  bool has_key_range = false;
+  uint64_t key_begin = 0;
+  uint64_t key_end = 0;
+  // Only the keys with ShardingHash()(key) % num_shards == shard_id are read.
+  uint32_t num_shards = 1;
+  uint32_t shard_id = 0;
+};
+
+// The tables of all the ranks of an embedding, one table per path.
+struct PersistentTableBulkOptions {
+  std::vector<std::string> paths;
+  std::string snapshot_name;
+  DataType key_type = DataType::kInvalidDataType;
+  uint32_t value_size = 0;
+  uint64_t target_chunk_size_mb = 4 * 1024;
+  uint16_t physical_block_size = 4096;
+  // The number of threads reading or writing the tables, 0 uses a thread per hardware thread.
+  uint32_t num_threads = 0;
+  // Reader only.
+  uint32_t batch_size = 65536;
+  PersistentTableKeyFilter filter;
+};
+
+// Reads the snapshot of the tables with a thread per table, up to num_threads tables at a time.
+// The batches of different tables are interleaved in no particular order.
+class PersistentTableBulkReader {
+ public:
+  OF_DISALLOW_COPY_AND_MOVE(PersistentTableBulkReader);
+  PersistentTableBulkReader() = default;
+  virtual ~PersistentTableBulkReader() = default;
+
+  // Returns false once all the tables are read. Otherwise keys and values are replaced with the
+  // num_keys keys and values of the next batch, which has at most batch_size keys.
+  virtual bool Next(uint32_t* num_keys, std::vector<char>* keys, std::vector<char>* values) = 0;
+};
+
+// Writes keys to the table of their shard, ShardingHash()(key) % paths.size(), and saves the
+// snapshot of all the tables on Close.
+class PersistentTableBulkWriter {
+ public:
+  OF_DISALLOW_COPY_AND_MOVE(PersistentTableBulkWriter);
+  PersistentTableBulkWriter() = default;
+  virtual ~PersistentTableBulkWriter() = default;
+
+  virtual void Write(uint64_t num_keys, const void* keys, const void* values) = 0;
+  virtual void Close() = 0;
+};
+
+std::unique_ptr<PersistentTableBulkReader> NewPersistentTableBulkReader(
+    const PersistentTableBulkOptions& options);
+
+std::unique_ptr<PersistentTableBulkWriter> NewPersistentTableBulkWriter(
+    const PersistentTableBulkOptions& options);
+
+// Rewrites the snapshot of src_options.paths into the tables of dst_options.paths, sharded by
+// the number of the destination tables. The rows are copied as they are, whatever their data
+// type is.
+void ReshardPersistentTables(const PersistentTableBulkOptions& src_options,
+                             const PersistentTableBulkOptions& dst_options);
+
+}  // namespace embedding
+
+}  // namespace oneflow
+
+#endif  // ONEFLOW_CORE_EMBEDDING_PERSISTENT_TABLE_BULK_IO_H_
@@ -0,0 +1,202 @@
+/*
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+*/
+#include "oneflow/core/embedding/persistent_table_bulk_io.h"
+#include "oneflow/core/embedding/hash_functions.cuh"
+#include "oneflow/core/embedding/posix_file.h"
+#include <gtest/gtest.h>
+#include <random>
+
+namespace oneflow {
+
+namespace embedding {
+
+namespace {
+
+#ifdef __linux__
+
+std::string CreateTempDirectory() {
+  const char* tmp_env = getenv("TMPDIR");
+  const char* tmp_dir = tmp_env == nullptr ? "/tmp" : tmp_env;
+  std::string tpl = std::string(tmp_dir) + "/test_bulk_XXXXXX";
+  char* path = mkdtemp(const_cast<char*>(tpl.c_str()));
+  PCHECK(path != nullptr);
+  return std::string(path);
+}
+
+constexpr uint32_t kValueLength = 4;
+
+PersistentTableBulkOptions GetOptions(const std::string& path, uint32_t num_tables) {
+  PersistentTableBulkOptions options;
+  for (uint32_t i = 0; i < num_tables; ++i) {
+    options.paths.push_back(PosixFile::JoinPath(path, std::to_string(i)));
+  }
+  options.snapshot_name = "bulk";
+  options.key_type = DataType::kInt64;
+  options.value_size = kValueLength * sizeof(float);
+  options.target_chunk_size_mb = 1;
+  options.physical_block_size = 512;
+  options.num_threads = 4;
+  options.batch_size = 1000;
+  return options;
+}
+
+// Reads all the batches and checks that the values of every key are the key itself.
+std::vector<int64_t> ReadKeys(const PersistentTableBulkOptions& options) {
+  std::unique_ptr<PersistentTableBulkReader> reader = NewPersistentTableBulkReader(options);
+  std::vector<int64_t> all_keys;
+  uint32_t num_keys = 0;
+  std::vector<char> keys;
+  std::vector<char> values;
+  while (reader->Next(&num_keys, &keys, &values)) {
+    EXPECT_LE(num_keys, options.batch_size);
+    const int64_t* keys_ptr = reinterpret_cast<const int64_t*>(keys.data());
+    const float* values_ptr = reinterpret_cast<const float*>(values.data());
+    for (uint32_t i = 0; i < num_keys; ++i) {
+      for (uint32_t j = 0; j < kValueLength; ++j) {
+        EXPECT_EQ(values_ptr[i * kValueLength + j], static_cast<float>(keys_ptr[i]));
+      }
+    }
+    all_keys.insert(all_keys.end(), keys_ptr, keys_ptr + num_keys);
+  }
+  std::sort(all_keys.begin(), all_keys.end());
+  return all_keys;
+}
+
+TEST(PersistentTableBulkIo, WriteAndRead) {
+  const std::string path = CreateTempDirectory();
+  const PersistentTableBulkOptions options = GetOptions(path, 3);
+  const int64_t num_keys = 100000;
+  std::vector<int64_t> keys(num_keys);
+  std::iota(keys.begin(), keys.end(), -num_keys / 2);
+  std::vector<float> values(num_keys * kValueLength);
+  for (int64_t i = 0; i < num_keys * kValueLength; ++i) {
+    values[i] = static_cast<float>(keys[i / kValueLength]);
+  }
+  std::unique_ptr<PersistentTableBulkWriter> writer = NewPersistentTableBulkWriter(options);
+  writer->Write(num_keys / 2, keys.data(), values.data());
+  writer->Write(num_keys - num_keys / 2, keys.data() + num_keys / 2,
+                values.data() + num_keys / 2 * kValueLength);
+  writer->Close();
+  ASSERT_EQ(ReadKeys(options), keys);
+
+  // Every table only has the keys of its shard.
+  for (uint32_t i = 0; i < options.paths.size(); ++i) {
+    PersistentTableBulkOptions table_options = options;
+    table_options.paths = {options.paths.at(i)};
+    for (const int64_t key : ReadKeys(table_options)) {
+      ASSERT_EQ(ShardingHash()(key) % options.paths.size(), i);
+    }
+  }
+
+  // The key range is compared as the key type, the negative keys come first.
+  PersistentTableBulkOptions range_options = options;
+  range_options.filter.has_key_range = true;
+  range_options.filter.key_begin = static_cast<uint64_t>(static_cast<int64_t>(-100));
+  range_options.filter.key_end = 200;
+  std::vector<int64_t> range_keys(300);
+  std::iota(range_keys.begin(), range_keys.end(), -100);
+  ASSERT_EQ(ReadKeys(range_options), range_keys);
+
+  PersistentTableBulkOptions shard_options = options;
+  shard_options.filter.num_shards = 7;
+  size_t num_shard_keys = 0;
+  for (uint32_t shard_id = 0; shard_id < shard_options.filter.num_shards; ++shard_id) {
+    shard_options.filter.shard_id = shard_id;
+    for (const int64_t key : ReadKeys(shard_options)) {
+      ASSERT_EQ(ShardingHash()(key) % shard_options.filter.num_shards, shard_id);
+      num_shard_keys += 1;
+    }
+  }
+  ASSERT_EQ(num_shard_keys, num_keys);
+
+  // A reader destroyed before the end stops its workers.
+  std::unique_ptr<PersistentTableBulkReader> reader = NewPersistentTableBulkReader(options);
+  uint32_t n = 0;
+  std::vector<char> batch_keys;
+  std::vector<char> batch_values;
+  ASSERT_TRUE(reader->Next(&n, &batch_keys, &batch_values));
+  reader.reset();
+  PosixFile::RecursiveDelete(path);
+}
+
+TEST(PersistentTableBulkIo, WriteLargeBatch) {
+  const std::string path = CreateTempDirectory();
+  const PersistentTableBulkOptions options = GetOptions(path, 3);
+  ASSERT_GT(options.num_threads, 1);
+  // More keys than two ranges of 65536 keys, the batch is sharded by three threads and the last
+  // range is shorter than the others.
+  const int64_t num_keys = 2 * 65536 + 12345;
+  std::vector<int64_t> keys(num_keys);
+  std::iota(keys.begin(), keys.end(), 0);
+  std::shuffle(keys.begin(), keys.end(), std::mt19937(2022));
+  std::vector<float> values(num_keys * kValueLength);
+  for (int64_t i = 0; i < num_keys * kValueLength; ++i) {
+    values[i] = static_cast<float>(keys[i / kValueLength]);
+  }
+  std::unique_ptr<PersistentTableBulkWriter> writer = NewPersistentTableBulkWriter(options);
+  writer->Write(num_keys, keys.data(), values.data());
+  writer->Close();
+  std::sort(keys.begin(), keys.end());
+  ASSERT_EQ(ReadKeys(options), keys);
+  for (uint32_t i = 0; i < options.paths.size(); ++i) {
+    PersistentTableBulkOptions table_options = options;
+    table_options.paths = {options.paths.at(i)};
+    for (const int64_t key : ReadKeys(table_options)) {
+      ASSERT_EQ(ShardingHash()(key) % options.paths.size(), i);
+    }
+  }
+  PosixFile::RecursiveDelete(path);
+}
+
+TEST(PersistentTableBulkIo, Reshard) {
+  const std::string path = CreateTempDirectory();
+  const PersistentTableBulkOptions src_options = GetOptions(PosixFile::JoinPath(path, "src"), 3);
+  const int64_t num_keys = 50000;
+  std::vector<int64_t> keys(num_keys);
+  std::iota(keys.begin(), keys.end(), 0);
+  std::vector<float> values(num_keys * kValueLength);
+  for (int64_t i = 0; i < num_keys * kValueLength; ++i) {
+    values[i] = static_cast<float>(keys[i / kValueLength]);
+  }
+  std::unique_ptr<PersistentTableBulkWriter> writer = NewPersistentTableBulkWriter(src_options);
+  writer->Write(num_keys, keys.data(), values.data());
+  writer->Close();
+
+  for (const uint32_t num_dst_tables : {2, 5}) {
+    PersistentTableBulkOptions dst_options =
+        GetOptions(PosixFile::JoinPath(path, "dst" + std::to_string(num_dst_tables)),
+                   num_dst_tables);
+    dst_options.snapshot_name = "resharded";
+    ReshardPersistentTables(src_options, dst_options);
+    ASSERT_EQ(ReadKeys(dst_options), keys);
+    for (uint32_t i = 0; i < num_dst_tables; ++i) {
+      PersistentTableBulkOptions table_options = dst_options;
+      table_options.paths = {dst_options.paths.at(i)};
+      for (const int64_t key : ReadKeys(table_options)) {
+        ASSERT_EQ(ShardingHash()(key) % num_dst_tables, i);
+      }
+    }
+  }
+  PosixFile::RecursiveDelete(path);
+}
+
+#endif  // __linux__
+
+}  // namespace
+
+}  // namespace embedding
+
+}  // namespace oneflow
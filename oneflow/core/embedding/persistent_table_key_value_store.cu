@@ -136,6 +136,12 @@ class KeyValueStoreImpl : public KeyValueStore {
                     const std::function<void(KVIterator* iter)>& Hook) override;
   void SaveSnapshot(const std::string& name) override;
 
+  void GetStats(KeyValueStoreStats* stats) const override {
+    table_->GetStats(&stats->persistent_table_stats);
+  }
+
+  void ResetStats() override { table_->ResetStats(); }
+
  private:
   int device_index_;
   uint32_t max_query_length_;
@@ -23,12 +23,15 @@ namespace oneflow {
 
 namespace embedding {
 
-#ifdef WITH_CUDA
-
 struct PersistentTableKeyValueStoreOptions {
   PersistentTableOptions table_options{};
 };
 
+std::unique_ptr<KeyValueStore> NewCpuPersistentTableKeyValueStore(
+    const PersistentTableKeyValueStoreOptions& options);
+
+#ifdef WITH_CUDA
+
 std::unique_ptr<KeyValueStore> NewPersistentTableKeyValueStore(
     const PersistentTableKeyValueStoreOptions& options);
 
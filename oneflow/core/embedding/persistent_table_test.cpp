@@ -0,0 +1,326 @@
+/*
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+*/
+#include "oneflow/core/embedding/persistent_table.h"
+#include <gtest/gtest.h>
+#include "oneflow/core/embedding/posix_file.h"
+#include <dirent.h>
+#include <sys/time.h>
+
+namespace oneflow {
+
+namespace embedding {
+
+namespace {
+
+#ifdef __linux__
+
+std::string CreateTempDirectory() {
+  const char* tmp_env = getenv("TMPDIR");
+  const char* tmp_dir = tmp_env == nullptr ? "/tmp" : tmp_env;
+  std::string tpl = std::string(tmp_dir) + "/test_pt_XXXXXX";
+  char* path = mkdtemp(const_cast<char*>(tpl.c_str()));
+  PCHECK(path != nullptr);
+  return std::string(path);
+}
+
+constexpr uint32_t kValueLength = 4;
+
+void PutKeys(PersistentTable* table, uint64_t begin, uint64_t end, float value) {
+  std::vector<uint64_t> keys(end - begin);
+  std::iota(keys.begin(), keys.end(), begin);
+  std::vector<float> values(keys.size() * kValueLength, value);
+  table->Put(keys.size(), keys.data(), values.data());
+}
+
+void CheckKeys(PersistentTable* table, uint64_t begin, uint64_t end, float value) {
+  std::vector<uint64_t> keys(end - begin);
+  std::iota(keys.begin(), keys.end(), begin);
+  std::vector<float> values(keys.size() * kValueLength);
+  std::vector<uint32_t> missing_indices(keys.size());
+  uint32_t n_missing = 0;
+  table->Get(keys.size(), keys.data(), values.data(), &n_missing, missing_indices.data());
+  ASSERT_EQ(n_missing, 0);
+  for (const float v : values) { ASSERT_EQ(v, value); }
+}
+
+void CheckMissingKeys(PersistentTable* table, uint64_t begin, uint64_t end) {
+  std::vector<uint64_t> keys(end - begin);
+  std::iota(keys.begin(), keys.end(), begin);
+  std::vector<float> values(keys.size() * kValueLength);
+  std::vector<uint32_t> missing_indices(keys.size());
+  uint32_t n_missing = 0;
+  table->Get(keys.size(), keys.data(), values.data(), &n_missing, missing_indices.data());
+  ASSERT_EQ(n_missing, keys.size());
+}
+
+void SetModificationTimes(const std::string& dir_path, time_t mtime) {
+  DIR* dir = opendir(dir_path.c_str());
+  PCHECK(dir != nullptr);
+  struct dirent* ent = nullptr;
+  while ((ent = readdir(dir)) != nullptr) {
+    if (ent->d_type != DT_REG) { continue; }
+    struct timeval times[2] = {{mtime, 0}, {mtime, 0}};
+    PCHECK(utimes(PosixFile::JoinPath(dir_path, ent->d_name).c_str(), times) == 0);
+  }
+  PCHECK(closedir(dir) == 0);
+}
+
+uint64_t CountSnapshotEntries(const std::string& path, const std::string& name) {
+  const std::string snapshot_dir = path + "/snapshots/" + name;
+  std::ifstream list_if(snapshot_dir + "/LIST");
+  std::string index_filename;
+  uint64_t num_entries = 0;
+  while (std::getline(list_if, index_filename)) {
+    PosixFile index_file(snapshot_dir + "/" + index_filename, O_RDONLY, 0644);
+    num_entries += index_file.Size() / sizeof(uint64_t);
+  }
+  return num_entries;
+}
+
+uint64_t CountIteratedKeys(PersistentTable::Iterator* iter) {
+  std::vector<uint64_t> keys(1024);
+  std::vector<float> values(keys.size() * kValueLength);
+  uint64_t num_keys = 0;
+  while (true) {
+    uint32_t n_result = 0;
+    iter->Next(keys.size(), &n_result, keys.data(), values.data());
+    if (n_result == 0) { break; }
+    num_keys += n_result;
+  }
+  return num_keys;
+}
+
+TEST(PersistentTable, Compaction) {
+  std::string path = CreateTempDirectory();
+  PersistentTableOptions options{};
+  options.path = path;
+  options.key_size = sizeof(uint64_t);
+  options.value_size = kValueLength * sizeof(float);
+  options.physical_block_size = 512;
+  // 65536 rows per chunk.
+  options.target_chunk_size_mb = 1;
+  options.compaction_threshold = 0.5;
+  std::unique_ptr<PersistentTable> table = NewPersistentTable(options);
+  const uint64_t num_hot_keys = 20000;
+  const uint64_t num_cold_keys = 2000;
+  PutKeys(table.get(), 0, num_hot_keys, 0);
+  // The base snapshot references the first chunk, the chunk must survive the compaction.
+  table->SaveSnapshot("base");
+  for (int i = 0; i < 3; ++i) { PutKeys(table.get(), 0, num_hot_keys, 1); }
+  // The cold keys are written once and stay live in a chunk that is mostly dead.
+  PutKeys(table.get(), num_hot_keys, num_hot_keys + num_cold_keys, 7);
+  for (int i = 0; i < 10; ++i) { PutKeys(table.get(), 0, num_hot_keys, 2); }
+  const uint64_t num_appended_rows = 14 * num_hot_keys + num_cold_keys;
+
+  // The background thread may have compacted some of the chunks already.
+  table->Compact();
+  PersistentTableStats stats;
+  table->GetStats(&stats);
+  ASSERT_EQ(stats.num_keys, num_hot_keys + num_cold_keys);
+  ASSERT_GE(stats.num_compacted_chunks, 3);
+  ASSERT_LT(stats.num_disk_rows, num_appended_rows / 2);
+  ASSERT_LT(stats.disk_amplification, 5);
+  CheckKeys(table.get(), 0, num_hot_keys, 2);
+  CheckKeys(table.get(), num_hot_keys, num_hot_keys + num_cold_keys, 7);
+  table->SaveSnapshot("compacted");
+
+  // The compacted chunks are gone from the disk, the snapshots are still readable after reopening.
+  table.reset();
+  table = NewPersistentTable(options);
+  table->LoadSnapshot("base");
+  CheckKeys(table.get(), 0, num_hot_keys, 0);
+  table->LoadSnapshot("compacted");
+  CheckKeys(table.get(), 0, num_hot_keys, 2);
+  CheckKeys(table.get(), num_hot_keys, num_hot_keys + num_cold_keys, 7);
+  table.reset();
+  PosixFile::RecursiveDelete(path);
+}
+
+TEST(PersistentTable, LoadSnapshot) {
+  std::string path = CreateTempDirectory();
+  PersistentTableOptions options{};
+  options.path = path;
+  options.key_size = sizeof(uint64_t);
+  options.value_size = kValueLength * sizeof(float);
+  options.physical_block_size = 512;
+  options.target_chunk_size_mb = 2;
+  std::unique_ptr<PersistentTable> table = NewPersistentTable(options);
+  // More keys than a loading batch, in more than one chunk.
+  const uint64_t num_keys = 200000;
+  PutKeys(table.get(), 0, num_keys, 1);
+  PutKeys(table.get(), 0, num_keys / 3, 2);
+  table->SaveSnapshot("snapshot");
+  table.reset();
+
+  table = NewPersistentTable(options);
+  uint64_t num_iterated_keys = 0;
+  table->LoadSnapshot("snapshot", [&](PersistentTable::Iterator* iter) {
+    num_iterated_keys += CountIteratedKeys(iter);
+  });
+  ASSERT_EQ(num_iterated_keys, num_keys);
+  CheckKeys(table.get(), 0, num_keys / 3, 2);
+  CheckKeys(table.get(), num_keys / 3, num_keys, 1);
+  PersistentTableStats stats;
+  table->GetStats(&stats);
+  ASSERT_EQ(stats.num_keys, num_keys);
+  table.reset();
+  PosixFile::RecursiveDelete(path);
+}
+
+TEST(PersistentTable, IncrementalSnapshot) {
+  std::string path = CreateTempDirectory();
+  PersistentTableOptions options{};
+  options.path = path;
+  options.key_size = sizeof(uint64_t);
+  options.value_size = kValueLength * sizeof(float);
+  options.physical_block_size = 512;
+  options.target_chunk_size_mb = 1;
+  options.max_incremental_snapshots = 2;
+  std::unique_ptr<PersistentTable> table = NewPersistentTable(options);
+  PutKeys(table.get(), 0, 1000, 1);
+  table->SaveSnapshot("s0");
+  PutKeys(table.get(), 0, 100, 2);
+  table->SaveSnapshot("s1");
+  PutKeys(table.get(), 1000, 1100, 3);
+  table->SaveSnapshot("s2");
+  PutKeys(table.get(), 0, 10, 4);
+  // The chain of s2 already has two incremental snapshots, s3 is a full one.
+  table->SaveSnapshot("s3");
+  ASSERT_EQ(CountSnapshotEntries(path, "s0"), 1000);
+  ASSERT_EQ(CountSnapshotEntries(path, "s1"), 100);
+  ASSERT_EQ(CountSnapshotEntries(path, "s2"), 100);
+  ASSERT_EQ(CountSnapshotEntries(path, "s3"), 1100);
+  table.reset();
+
+  table = NewPersistentTable(options);
+  uint64_t num_hooked_keys = 0;
+  table->LoadSnapshot("s2", [&](PersistentTable::Iterator* iter) {
+    num_hooked_keys += CountIteratedKeys(iter);
+  });
+  ASSERT_EQ(num_hooked_keys, 1100);
+  CheckKeys(table.get(), 0, 100, 2);
+  CheckKeys(table.get(), 100, 1000, 1);
+  CheckKeys(table.get(), 1000, 1100, 3);
+  std::unique_ptr<PersistentTable::Iterator> iter(table->ReadSnapshot("s1"));
+  ASSERT_EQ(CountIteratedKeys(iter.get()), 1000);
+  // Loading a snapshot makes it the base of the next incremental one.
+  table->LoadSnapshot("s3");
+  PutKeys(table.get(), 100, 200, 5);
+  table->SaveSnapshot("s4");
+  ASSERT_EQ(CountSnapshotEntries(path, "s4"), 100);
+  table->LoadSnapshot("s4");
+  CheckKeys(table.get(), 0, 10, 4);
+  CheckKeys(table.get(), 10, 100, 2);
+  CheckKeys(table.get(), 100, 200, 5);
+  CheckKeys(table.get(), 200, 1000, 1);
+  table.reset();
+  PosixFile::RecursiveDelete(path);
+}
+
+TEST(PersistentTable, Ttl) {
+  std::string path = CreateTempDirectory();
+  PersistentTableOptions options{};
+  options.path = path;
+  options.key_size = sizeof(uint64_t);
+  options.value_size = kValueLength * sizeof(float);
+  options.physical_block_size = 512;
+  // 65536 rows per chunk.
+  options.target_chunk_size_mb = 1;
+  std::unique_ptr<PersistentTable> table = NewPersistentTable(options);
+  const uint64_t num_rows_per_chunk = 65536;
+  PutKeys(table.get(), 0, num_rows_per_chunk + 1000, 1);
+  table->SaveSnapshot("old");
+  table.reset();
+  // Both chunks were written two hours ago.
+  SetModificationTimes(path + "/values", std::time(nullptr) - 7200);
+
+  options.ttl_seconds = 3600;
+  table = NewPersistentTable(options);
+  table->LoadSnapshot("old");
+  // Rewrites some keys of the first chunk and seals the second chunk, which is written again.
+  PutKeys(table.get(), 0, 1000, 2);
+  PutKeys(table.get(), num_rows_per_chunk + 1000, 2 * num_rows_per_chunk, 3);
+  table->Compact();
+  PersistentTableStats stats;
+  table->GetStats(&stats);
+  ASSERT_EQ(stats.num_expired_keys, num_rows_per_chunk - 1000);
+  ASSERT_EQ(stats.num_keys, num_rows_per_chunk + 1000);
+  CheckKeys(table.get(), 0, 1000, 2);
+  CheckMissingKeys(table.get(), 1000, num_rows_per_chunk);
+  CheckKeys(table.get(), num_rows_per_chunk, num_rows_per_chunk + 1000, 1);
+  CheckKeys(table.get(), num_rows_per_chunk + 1000, 2 * num_rows_per_chunk, 3);
+  // The snapshot pins the files of the expired chunk, its keys can still be loaded.
+  ASSERT_EQ(stats.num_compacted_chunks, 0);
+  std::unique_ptr<PersistentTable::Iterator> iter(table->ReadSnapshot("old"));
+  ASSERT_EQ(CountIteratedKeys(iter.get()), num_rows_per_chunk + 1000);
+  iter.reset();
+  table.reset();
+  PosixFile::RecursiveDelete(path);
+}
+
+TEST(PersistentTable, TtlIncrementalSnapshot) {
+  std::string path = CreateTempDirectory();
+  PersistentTableOptions options{};
+  options.path = path;
+  options.key_size = sizeof(uint64_t);
+  options.value_size = kValueLength * sizeof(float);
+  options.physical_block_size = 512;
+  // 65536 rows per chunk.
+  options.target_chunk_size_mb = 1;
+  options.max_incremental_snapshots = 2;
+  std::unique_ptr<PersistentTable> table = NewPersistentTable(options);
+  const uint64_t num_rows_per_chunk = 65536;
+  PutKeys(table.get(), 0, num_rows_per_chunk + 1000, 1);
+  table->SaveSnapshot("s0");
+  table.reset();
+  SetModificationTimes(path + "/values", std::time(nullptr) - 7200);
+
+  options.ttl_seconds = 3600;
+  table = NewPersistentTable(options);
+  table->LoadSnapshot("s0");
+  PutKeys(table.get(), 0, 1000, 2);
+  PutKeys(table.get(), num_rows_per_chunk + 1000, 2 * num_rows_per_chunk, 3);
+  table->Compact();
+  // The keys that expired are still in s0, a snapshot based on it would bring them back.
+  table->SaveSnapshot("s1");
+  ASSERT_EQ(CountSnapshotEntries(path, "s1"), num_rows_per_chunk + 1000);
+  // Without expired keys the next snapshot is incremental again.
+  PutKeys(table.get(), 0, 10, 4);
+  table->SaveSnapshot("s2");
+  ASSERT_EQ(CountSnapshotEntries(path, "s2"), 10);
+  table.reset();
+
+  table = NewPersistentTable(options);
+  table->LoadSnapshot("s2");
+  CheckKeys(table.get(), 0, 10, 4);
+  CheckKeys(table.get(), 10, 1000, 2);
+  CheckMissingKeys(table.get(), 1000, num_rows_per_chunk);
+  CheckKeys(table.get(), num_rows_per_chunk, num_rows_per_chunk + 1000, 1);
+  CheckKeys(table.get(), num_rows_per_chunk + 1000, 2 * num_rows_per_chunk, 3);
+  std::unique_ptr<PersistentTable::Iterator> iter(table->ReadSnapshot("s2"));
+  ASSERT_EQ(CountIteratedKeys(iter.get()), num_rows_per_chunk + 1000);
+  iter.reset();
+  table.reset();
+  PosixFile::RecursiveDelete(path);
+}
+
+#endif  // __linux__
+
+}  // namespace
+
+}  // namespace embedding
+
+}  // namespace oneflow
@@ -0,0 +1,168 @@
+/*
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+*/
+#include "oneflow/core/embedding/reduced_precision_key_value_store.h"
+#include "oneflow/core/ep/cpu/cpu_stream.h"
+
+namespace oneflow {
+
+namespace embedding {
+
+namespace {
+
+constexpr int64_t kCodecGrainSize = 1024;
+
+void ParallelEncode(ep::Stream* stream, const ValueCodec* codec, uint32_t num_rows,
+                    const float* values, char* encoded) {
+  const uint32_t line_size = codec->LineSize();
+  const uint32_t encoded_size = codec->EncodedValueSize();
+  stream->As<ep::CpuStream>()->ParallelFor(
+      0, num_rows,
+      [&](int64_t start, int64_t end) {
+        codec->Encode(end - start, values + start * line_size, encoded + start * encoded_size);
+      },
+      kCodecGrainSize);
+}
+
+void ParallelDecode(ep::Stream* stream, const ValueCodec* codec, uint32_t num_rows,
+                    const char* encoded, float* values) {
+  const uint32_t line_size = codec->LineSize();
+  const uint32_t encoded_size = codec->EncodedValueSize();
+  stream->As<ep::CpuStream>()->ParallelFor(
+      0, num_rows,
+      [&](int64_t start, int64_t end) {
+        codec->Decode(end - start, encoded + start * encoded_size, values + start * line_size);
+      },
+      kCodecGrainSize);
+}
+
+class DecodingIterator final : public KVIterator {
+ public:
+  OF_DISALLOW_COPY_AND_MOVE(DecodingIterator);
+  DecodingIterator(KVIterator* base_iter, const ValueCodec* codec)
+      : base_iter_(base_iter), codec_(codec) {}
+  ~DecodingIterator() override = default;
+
+  void NextN(ep::Stream* stream, uint32_t n_request, uint32_t* n_result, void* keys,
+             void* values) override {
+    encoded_buffer_.resize(static_cast<size_t>(n_request) * codec_->EncodedValueSize());
+    base_iter_->NextN(stream, n_request, n_result, keys, encoded_buffer_.data());
+    ParallelDecode(stream, codec_, *n_result, encoded_buffer_.data(), static_cast<float*>(values));
+  }
+
+  void Reset() override { base_iter_->Reset(); }
+
+ private:
+  KVIterator* base_iter_;
+  const ValueCodec* codec_;
+  std::vector<char> encoded_buffer_;
+};
+
+class ReducedPrecisionKeyValueStoreImpl : public KeyValueStore {
+ public:
+  OF_DISALLOW_COPY_AND_MOVE(ReducedPrecisionKeyValueStoreImpl);
+  ReducedPrecisionKeyValueStoreImpl(std::unique_ptr<KeyValueStore>&& store,
+                                    std::unique_ptr<ValueCodec>&& codec)
+      : store_(std::move(store)), codec_(std::move(codec)), max_query_length_(0) {
+    CHECK_EQ(store_->ValueSize(), codec_->EncodedValueSize());
+  }
+  ~ReducedPrecisionKeyValueStoreImpl() override = default;
+
+  uint32_t KeySize() const override { return store_->KeySize(); }
+  uint32_t ValueSize() const override { return codec_->LineSize() * sizeof(float); }
+  uint32_t MaxQueryLength() const override { return max_query_length_; }
+
+  void ReserveQueryLength(uint32_t query_length) override {
+    std::lock_guard<std::mutex> lock(mutex_);
+    if (query_length <= max_query_length_) { return; }
+    if (query_length > store_->MaxQueryLength()) { store_->ReserveQueryLength(query_length); }
+    encoded_buffer_.resize(static_cast<size_t>(query_length) * codec_->EncodedValueSize());
+    max_query_length_ = query_length;
+  }
+
+  void Get(ep::Stream* stream, uint32_t num_keys, const void* keys, void* values,
+           uint32_t* n_missing, uint32_t* missing_indices) override {
+    Get(stream, num_keys, keys, values, n_missing, missing_indices, true);
+  }
+
+  void GetUncounted(ep::Stream* stream, uint32_t num_keys, const void* keys, void* values,
+                    uint32_t* n_missing, uint32_t* missing_indices) override {
+    Get(stream, num_keys, keys, values, n_missing, missing_indices, false);
+  }
+
+  void Put(ep::Stream* stream, uint32_t num_keys, const void* keys, const void* values) override {
+    std::lock_guard<std::mutex> lock(mutex_);
+    CHECK_LE(num_keys, max_query_length_);
+    ParallelEncode(stream, codec_.get(), num_keys, static_cast<const float*>(values),
+                   encoded_buffer_.data());
+    store_->Put(stream, num_keys, keys, encoded_buffer_.data());
+  }
+
+  bool SnapshotExists(const std::string& name) override { return store_->SnapshotExists(name); }
+
+  void LoadSnapshot(const std::string& name) override { store_->LoadSnapshot(name); }
+
+  void LoadSnapshot(const std::string& name,
+                    const std::function<void(KVIterator* iter)>& Hook) override {
+    if (!Hook) {
+      store_->LoadSnapshot(name, Hook);
+      return;
+    }
+    store_->LoadSnapshot(name, [&](KVIterator* iter) {
+      DecodingIterator decoding_iter(iter, codec_.get());
+      Hook(&decoding_iter);
+    });
+  }
+
+  void SaveSnapshot(const std::string& name) override { store_->SaveSnapshot(name); }
+
+  void GetStats(KeyValueStoreStats* stats) const override { store_->GetStats(stats); }
+
+  void ResetStats() override { store_->ResetStats(); }
+
+ private:
+  void Get(ep::Stream* stream, uint32_t num_keys, const void* keys, void* values,
+           uint32_t* n_missing, uint32_t* missing_indices, bool count_stats) {
+    std::lock_guard<std::mutex> lock(mutex_);
+    CHECK_LE(num_keys, max_query_length_);
+    if (count_stats) {
+      store_->Get(stream, num_keys, keys, encoded_buffer_.data(), n_missing, missing_indices);
+    } else {
+      store_->GetUncounted(stream, num_keys, keys, encoded_buffer_.data(), n_missing,
+                           missing_indices);
+    }
+    // The rows of the missing keys are decoded too, they are overwritten by the initializers.
+    ParallelDecode(stream, codec_.get(), num_keys, encoded_buffer_.data(),
+                   static_cast<float*>(values));
+  }
+
+  std::unique_ptr<KeyValueStore> store_;
+  std::unique_ptr<ValueCodec> codec_;
+  std::vector<char> encoded_buffer_;
+  uint32_t max_query_length_;
+  std::mutex mutex_;
+};
+
+}  // namespace
+
+std::unique_ptr<KeyValueStore> NewCpuReducedPrecisionKeyValueStore(
+    std::unique_ptr<KeyValueStore>&& store, std::unique_ptr<ValueCodec>&& codec) {
+  return std::unique_ptr<KeyValueStore>(
+      new ReducedPrecisionKeyValueStoreImpl(std::move(store), std::move(codec)));
+}
+
+}  // namespace embedding
+
+}  // namespace oneflow
@@ -0,0 +1,250 @@
+/*
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+*/
+#include "oneflow/core/embedding/value_codec.h"
+#include <cmath>
+#include <random>
+
+namespace oneflow {
+
+namespace embedding {
+
+namespace {
+
+constexpr float kInt8MaxValue = 127;
+
+// The values are rounded stochastically, up with a probability of their distance to the lower
+// value, so that the updates smaller than half of the unit in the last place are kept on average
+// instead of being always rounded away.
+uint32_t RandomBits() {
+  // splitmix64, every thread has its own state.
+  thread_local uint64_t state =
+      (static_cast<uint64_t>(std::random_device()()) << 32) | std::random_device()();
+  uint64_t z = (state += 0x9E3779B97F4A7C15ULL);
+  z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9ULL;
+  z = (z ^ (z >> 27)) * 0x94D049BB133111EBULL;
+  return static_cast<uint32_t>((z ^ (z >> 31)) >> 32);
+}
+
+// A random float in [0, 1).
+float RandomUniform() { return static_cast<float>(RandomBits() >> 8) * (1.0f / (1 << 24)); }
+
+uint16_t FloatToBFloat16(float value) {
+  uint32_t bits = 0;
+  std::memcpy(&bits, &value, sizeof(bits));
+  if (std::isnan(value)) { return 0x7FC0; }
+  bits += RandomBits() & 0xFFFF;
+  return static_cast<uint16_t>(bits >> 16);
+}
+
+float16 FloatToFloat16(float value) {
+  const float16 toward_zero = half_float::half_cast<float16, std::round_toward_zero>(value);
+  const float lower = static_cast<float>(toward_zero);
+  if (lower == value || std::isnan(value)) { return toward_zero; }
+  const float16 away_from_zero =
+      value > 0 ? half_float::half_cast<float16, std::round_toward_infinity>(value)
+                : half_float::half_cast<float16, std::round_toward_neg_infinity>(value);
+  // The values out of the range of float16 saturate, the probability to round them up is 0.
+  const float upper = static_cast<float>(away_from_zero);
+  return RandomUniform() < (value - lower) / (upper - lower) ? away_from_zero : toward_zero;
+}
+
+float BFloat16ToFloat(uint16_t value) {
+  const uint32_t bits = static_cast<uint32_t>(value) << 16;
+  float result = 0;
+  std::memcpy(&result, &bits, sizeof(result));
+  return result;
+}
+
+class FloatCodec final : public ValueCodec {
+ public:
+  OF_DISALLOW_COPY_AND_MOVE(FloatCodec);
+  explicit FloatCodec(uint32_t line_size) : line_size_(line_size) {}
+  ~FloatCodec() override = default;
+
+  DataType StorageDataType() const override { return DataType::kFloat; }
+  uint32_t LineSize() const override { return line_size_; }
+  uint32_t EncodedValueSize() const override { return line_size_ * sizeof(float); }
+
+  void Encode(uint32_t num_rows, const float* values, void* encoded) const override {
+    std::memcpy(encoded, values, static_cast<size_t>(num_rows) * EncodedValueSize());
+  }
+
+  void Decode(uint32_t num_rows, const void* encoded, float* values) const override {
+    std::memcpy(values, encoded, static_cast<size_t>(num_rows) * EncodedValueSize());
+  }
+
+ private:
+  uint32_t line_size_;
+};
+
+class Float16Codec final : public ValueCodec {
+ public:
+  OF_DISALLOW_COPY_AND_MOVE(Float16Codec);
+  explicit Float16Codec(uint32_t line_size) : line_size_(line_size) {}
+  ~Float16Codec() override = default;
+
+  DataType StorageDataType() const override { return DataType::kFloat16; }
+  uint32_t LineSize() const override { return line_size_; }
+  uint32_t EncodedValueSize() const override { return line_size_ * sizeof(float16); }
+
+  void Encode(uint32_t num_rows, const float* values, void* encoded) const override {
+    float16* out = static_cast<float16*>(encoded);
+    const size_t n = static_cast<size_t>(num_rows) * line_size_;
+    for (size_t i = 0; i < n; ++i) { out[i] = FloatToFloat16(values[i]); }
+  }
+
+  void Decode(uint32_t num_rows, const void* encoded, float* values) const override {
+    const float16* in = static_cast<const float16*>(encoded);
+    const size_t n = static_cast<size_t>(num_rows) * line_size_;
+    for (size_t i = 0; i < n; ++i) { values[i] = static_cast<float>(in[i]); }
+  }
+
+ private:
+  uint32_t line_size_;
+};
+
+class BFloat16Codec final : public ValueCodec {
+ public:
+  OF_DISALLOW_COPY_AND_MOVE(BFloat16Codec);
+  explicit BFloat16Codec(uint32_t line_size) : line_size_(line_size) {}
+  ~BFloat16Codec() override = default;
+
+  DataType StorageDataType() const override { return DataType::kBFloat16; }
+  uint32_t LineSize() const override { return line_size_; }
+  uint32_t EncodedValueSize() const override { return line_size_ * sizeof(uint16_t); }
+
+  void Encode(uint32_t num_rows, const float* values, void* encoded) const override {
+    uint16_t* out = static_cast<uint16_t*>(encoded);
+    const size_t n = static_cast<size_t>(num_rows) * line_size_;
+    for (size_t i = 0; i < n; ++i) { out[i] = FloatToBFloat16(values[i]); }
+  }
+
+  void Decode(uint32_t num_rows, const void* encoded, float* values) const override {
+    const uint16_t* in = static_cast<const uint16_t*>(encoded);
+    const size_t n = static_cast<size_t>(num_rows) * line_size_;
+    for (size_t i = 0; i < n; ++i) { values[i] = BFloat16ToFloat(in[i]); }
+  }
+
+ private:
+  uint32_t line_size_;
+};
+
+// An encoded row is num_segments float scales followed by line_size int8 values, a segment is
+// quantized symmetrically with the scale max(abs(value)) / 127, and stochastic rounding.
+class Int8Codec final : public ValueCodec {
+ public:
+  OF_DISALLOW_COPY_AND_MOVE(Int8Codec);
+  Int8Codec(uint32_t line_size, uint32_t num_segments)
+      : line_size_(line_size),
+        num_segments_(num_segments),
+        segment_size_(line_size / num_segments) {
+    CHECK_GT(num_segments_, 0);
+    CHECK_EQ(line_size_ % num_segments_, 0);
+  }
+  ~Int8Codec() override = default;
+
+  DataType StorageDataType() const override { return DataType::kInt8; }
+  uint32_t LineSize() const override { return line_size_; }
+  uint32_t EncodedValueSize() const override {
+    return num_segments_ * sizeof(float) + line_size_ * sizeof(int8_t);
+  }
+
+  void Encode(uint32_t num_rows, const float* values, void* encoded) const override {
+    for (uint32_t row = 0; row < num_rows; ++row) {
+      char* out = static_cast<char*>(encoded) + static_cast<size_t>(row) * EncodedValueSize();
+      int8_t* quantized = reinterpret_cast<int8_t*>(out + num_segments_ * sizeof(float));
+      const float* row_values = values + static_cast<size_t>(row) * line_size_;
+      for (uint32_t segment = 0; segment < num_segments_; ++segment) {
+        const float* segment_values = row_values + segment * segment_size_;
+        float max_abs = 0;
+        for (uint32_t i = 0; i < segment_size_; ++i) {
+          max_abs = std::max(max_abs, std::abs(segment_values[i]));
+        }
+        const float scale = max_abs / kInt8MaxValue;
+        std::memcpy(out + segment * sizeof(float), &scale, sizeof(float));
+        const float inv_scale = scale == 0 ? 0 : 1 / scale;
+        for (uint32_t i = 0; i < segment_size_; ++i) {
+          const float q = std::floor(segment_values[i] * inv_scale + RandomUniform());
+          quantized[segment * segment_size_ + i] =
+              static_cast<int8_t>(std::min(std::max(q, -kInt8MaxValue), kInt8MaxValue));
+        }
+      }
+    }
+  }
+
+  void Decode(uint32_t num_rows, const void* encoded, float* values) const override {
+    for (uint32_t row = 0; row < num_rows; ++row) {
+      const char* in =
+          static_cast<const char*>(encoded) + static_cast<size_t>(row) * EncodedValueSize();
+      const int8_t* quantized = reinterpret_cast<const int8_t*>(in + num_segments_ * sizeof(float));
+      float* row_values = values + static_cast<size_t>(row) * line_size_;
+      for (uint32_t segment = 0; segment < num_segments_; ++segment) {
+        float scale = 0;
+        std::memcpy(&scale, in + segment * sizeof(float), sizeof(float));
+        for (uint32_t i = segment * segment_size_; i < (segment + 1) * segment_size_; ++i) {
+          row_values[i] = quantized[i] * scale;
+        }
+      }
+    }
+  }
+
+ private:
+  uint32_t line_size_;
+  uint32_t num_segments_;
+  uint32_t segment_size_;
+};
+
+}  // namespace
+
+DataType ParseStorageDataType(const std::string& storage_dtype) {
+  if (storage_dtype == "float32") {
+    return DataType::kFloat;
+  } else if (storage_dtype == "float16") {
+    return DataType::kFloat16;
+  } else if (storage_dtype == "bfloat16") {
+    return DataType::kBFloat16;
+  } else if (storage_dtype == "int8") {
+    return DataType::kInt8;
+  } else {
+    UNIMPLEMENTED() << "Unsupported storage_dtype " << storage_dtype;
+    return DataType::kInvalidDataType;
+  }
+}
+
+uint32_t GetEncodedValueSize(DataType storage_data_type, uint32_t line_size,
+                             uint32_t num_segments) {
+  return NewValueCodec(storage_data_type, line_size, num_segments)->EncodedValueSize();
+}
+
+std::unique_ptr<ValueCodec> NewValueCodec(DataType storage_data_type, uint32_t line_size,
+                                          uint32_t num_segments) {
+  if (storage_data_type == DataType::kFloat) {
+    return std::unique_ptr<ValueCodec>(new FloatCodec(line_size));
+  } else if (storage_data_type == DataType::kFloat16) {
+    return std::unique_ptr<ValueCodec>(new Float16Codec(line_size));
+  } else if (storage_data_type == DataType::kBFloat16) {
+    return std::unique_ptr<ValueCodec>(new BFloat16Codec(line_size));
+  } else if (storage_data_type == DataType::kInt8) {
+    return std::unique_ptr<ValueCodec>(new Int8Codec(line_size, num_segments));
+  } else {
+    UNIMPLEMENTED() << "Unsupported storage data type";
+    return nullptr;
+  }
+}
+
+}  // namespace embedding
+
+}  // namespace oneflow
@@ -0,0 +1,59 @@
+/*
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+*/
+#ifndef ONEFLOW_CORE_EMBEDDING_VALUE_CODEC_H_
+#define ONEFLOW_CORE_EMBEDDING_VALUE_CODEC_H_
+
+#include "oneflow/core/common/util.h"
+#include "oneflow/core/common/data_type.h"
+
+namespace oneflow {
+
+namespace embedding {
+
+// Converts rows of line_size float values to the storage data type of a store and back.
+// kFloat16 and kBFloat16 convert every value. kInt8 splits a row into num_segments segments, e.g.
+// the embedding and each of the optimizer states, and stores every segment as int8 values with a
+// float scale of its own, so the values much smaller than the largest one of their segment are
+// often stored as 0. The encoding rounds stochastically, an update smaller than the precision of
+// the storage data type is kept on average.
+class ValueCodec {
+ public:
+  OF_DISALLOW_COPY_AND_MOVE(ValueCodec);
+  ValueCodec() = default;
+  virtual ~ValueCodec() = default;
+
+  virtual DataType StorageDataType() const = 0;
+  virtual uint32_t LineSize() const = 0;
+  virtual uint32_t EncodedValueSize() const = 0;
+  virtual void Encode(uint32_t num_rows, const float* values, void* encoded) const = 0;
+  virtual void Decode(uint32_t num_rows, const void* encoded, float* values) const = 0;
+};
+
+// Parses the storage_dtype of the kv_store options, "float32", "float16", "bfloat16" or "int8".
+DataType ParseStorageDataType(const std::string& storage_dtype);
+
+// The size in bytes of an encoded row, line_size * sizeof(float) for kFloat.
+uint32_t GetEncodedValueSize(DataType storage_data_type, uint32_t line_size,
+                             uint32_t num_segments);
+
+std::unique_ptr<ValueCodec> NewValueCodec(DataType storage_data_type, uint32_t line_size,
+                                          uint32_t num_segments);
+
+}  // namespace embedding
+
+}  // namespace oneflow
+
+#endif  // ONEFLOW_CORE_EMBEDDING_VALUE_CODEC_H_
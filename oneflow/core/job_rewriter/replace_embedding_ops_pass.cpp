@@ -938,8 +938,15 @@ Maybe<void> ReplaceEmbeddingOps::Apply(const OpGraph& op_graph, JobBuilder* job_
         embedding_op.attr<std::string>("key_value_store_options"));
     const int64_t embedding_size = embedding_op.attr<int64_t>("embedding_size");
     const int64_t parallel_num = op_node->parallel_desc().parallel_num();
+    const bool is_cpu_embedding = (op_node->parallel_desc().device_type() == DeviceType::kCPU);
+    // id_shuffle and embedding_shuffle exchange ids with nccl, so cpu embeddings are only
+    // supported on a single rank where the system gather path is used.
+    CHECK(!is_cpu_embedding || parallel_num == 1)
+        << "cpu embedding only supports placement with a single device";
     const bool use_system_gather =
-        (parallel_num == 1 && ParseBooleanFromEnv("ONEFLOW_ONE_EMBEDDING_USE_SYSTEM_GATHER", true));
+        is_cpu_embedding
+        || (parallel_num == 1
+            && ParseBooleanFromEnv("ONEFLOW_ONE_EMBEDDING_USE_SYSTEM_GATHER", true));
     std::vector<OperatorConf> add_ops;
     std::vector<std::string> delete_op_names;
     std::string new_embeddings_lbn;
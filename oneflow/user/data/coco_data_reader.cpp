@@ -19,65 +19,174 @@ limitations under the License.
 #include "oneflow/user/data/group_batch_dataset.h"
 #include "oneflow/user/data/batch_dataset.h"
 #include "oneflow/user/data/distributed_util.h"
+#include "oneflow/core/common/str_util.h"
 #include "oneflow/core/persistence/file_system.h"
 #include "oneflow/core/persistence/persistent_in_stream.h"
 #include "oneflow/core/rpc/include/global_process_ctx.h"
+#include "nlohmann/json.hpp"
+
+#include <unistd.h>
+
+#ifdef __linux__
+#include <sys/stat.h>
+#endif
+
+#define XXH_NAMESPACE LZ4_
+#include <xxhash.h>
 
 namespace oneflow {
 namespace data {
 
-COCODataReader::COCODataReader(user_op::KernelInitContext* ctx) : DataReader<COCOImage>(ctx) {
-  batch_size_ = ctx->TensorDesc4ArgNameAndIndex("image", 0)->shape().elem_cnt();
-  if (auto* pool = TensorBufferPool::TryGet()) { pool->IncreasePoolSizeByBase(batch_size_); }
+struct COCOAnnotationArrays {
+  std::vector<int64_t> image_ids;
+  std::vector<int32_t> image_heights;
+  std::vector<int32_t> image_widths;
+  std::vector<int64_t> image_file_name_offsets;
+  std::vector<char> image_file_names;
+  std::vector<int64_t> image_anno_offsets;
+  std::vector<float> anno_bboxes;
+  std::vector<int32_t> anno_labels;
+  std::vector<int64_t> anno_poly_offsets;
+  std::vector<int64_t> poly_coord_offsets;
+  std::vector<float> segm_coords;
+};
 
-  std::shared_ptr<const COCOMeta> meta(new COCOMeta(
-      ctx->Attr<int64_t>("session_id"), ctx->Attr<std::string>("annotation_file"),
-      ctx->Attr<std::string>("image_dir"), ctx->Attr<bool>("remove_images_without_annotations")));
-  std::unique_ptr<RandomAccessDataset<COCOImage>> coco_dataset_ptr(new COCODataset(ctx, meta));
+namespace {
 
-  size_t world_size = 1;
-  int64_t rank = 0;
-  CHECK_JUST(InitDataSourceDistributedInfo(ctx, world_size, rank));
-  loader_.reset(new DistributedTrainingDataset<COCOImage>(
-      world_size, rank, ctx->Attr<bool>("stride_partition"), ctx->Attr<bool>("shuffle_after_epoch"),
-      ctx->Attr<int64_t>("random_seed"), std::move(coco_dataset_ptr)));
+constexpr char kCacheMagicCode[] = "OFCOCOC\x00";
+constexpr size_t kCacheMagicCodeLen = sizeof(kCacheMagicCode) - 1;
+constexpr uint64_t kCacheVersion = 3;
+// annotation file size, modification time (ns), inode, content hash and
+// remove_images_without_annotations
+constexpr size_t kCacheKeySize = 5;
+constexpr size_t kKeyFileSize = 0;
+constexpr size_t kKeyFileMTime = 1;
+constexpr size_t kKeyFileInode = 2;
+constexpr size_t kKeyFileContentHash = 3;
+constexpr size_t kKeyRemoveImagesWithoutAnnotations = 4;
+// version, key, number of images, annotations, polygons, coordinates and file name chars
+constexpr size_t kCacheHeaderSize = kCacheMagicCodeLen + (1 + kCacheKeySize + 5) * sizeof(uint64_t);
+constexpr size_t kCacheAlignment = 8;
+constexpr int kMinKeypointsPerImage = 10;
 
-  if (ctx->Attr<bool>("group_by_ratio")) {
-    auto GetGroupId = [](const COCOImage& sample) {
-      return static_cast<int64_t>(sample.height / sample.width);
-    };
-    loader_.reset(new GroupBatchDataset<COCOImage>(batch_size_, GetGroupId, std::move(loader_)));
-  } else {
-    loader_.reset(new BatchDataset<COCOImage>(batch_size_, std::move(loader_)));
+std::string GetCacheFilePath(const std::string& annotation_file) {
+  // the cache is written next to the annotation file unless a (node local) cache dir is given
+  const std::string cache_dir = GetStringFromEnv("ONEFLOW_COCO_ANNOTATION_CACHE_DIR", "");
+  if (cache_dir.empty()) { return annotation_file + ".ofcache"; }
+  return JoinPath(cache_dir, Basename(annotation_file) + ".ofcache");
+}
+
+uint64_t GetFileContentHash(const std::string& file_path, uint64_t file_size) {
+  // the file is read through DataFS like the parser does, hashing is much cheaper than parsing
+  // the json but still reads all of it, so it is only done when the file stat changed
+  constexpr uint64_t kReadChunkSize = 4 << 20;
+  std::unique_ptr<RandomAccessFile> file;
+  DataFS()->NewRandomAccessFile(file_path, &file);
+  std::vector<char> buffer(std::min(file_size, kReadChunkSize));
+  XXH64_state_t* state = XXH64_createState();
+  CHECK_NE(XXH64_reset(state, 0), XXH_ERROR);
+  for (uint64_t offset = 0; offset < file_size; offset += buffer.size()) {
+    const size_t size = std::min<uint64_t>(buffer.size(), file_size - offset);
+    file->Read(offset, size, buffer.data());
+    CHECK_NE(XXH64_update(state, buffer.data(), size), XXH_ERROR);
   }
+  const uint64_t hash = XXH64_digest(state);
+  CHECK_NE(XXH64_freeState(state), XXH_ERROR);
+  return hash;
+}
 
-  parser_.reset(new COCOParser(meta));
-  StartLoadThread();
+// The key without the content hash, whose modification time and inode are only known when
+// DataFS is the local file system: a non-local one (e.g. HDFS) has no reliable modification time
+std::vector<uint64_t> GetCacheKey(const std::string& annotation_file,
+                                  bool remove_images_without_annotations, bool* has_file_stat) {
+  std::vector<uint64_t> key(kCacheKeySize, 0);
+  key[kKeyFileSize] = DataFS()->GetFileSize(annotation_file);
+  key[kKeyRemoveImagesWithoutAnnotations] = remove_images_without_annotations;
+  *has_file_stat = false;
+#ifdef __linux__
+  struct stat st;
+  if (ToLower(GetStringFromEnv("ONEFLOW_DATA_FILE_SYSTEM_TYPE", "local")) == "local"
+      && stat(annotation_file.c_str(), &st) == 0) {
+    key[kKeyFileMTime] = st.st_mtim.tv_sec * 1000000000ULL + st.st_mtim.tv_nsec;
+    key[kKeyFileInode] = st.st_ino;
+    *has_file_stat = true;
+  }
+#endif
+  return key;
 }
 
-COCODataReader::~COCODataReader() {
-  if (auto* pool = TensorBufferPool::TryGet()) { pool->DecreasePoolSizeByBase(batch_size_); }
+bool CacheKeyMatches(const std::vector<uint64_t>& key, const uint64_t* cached_key,
+                     bool by_content) {
+  const std::vector<size_t> fields =
+      by_content ? std::vector<size_t>{kKeyFileSize, kKeyFileContentHash,
+                                       kKeyRemoveImagesWithoutAnnotations}
+                 : std::vector<size_t>{kKeyFileSize, kKeyFileMTime, kKeyFileInode,
+                                       kKeyRemoveImagesWithoutAnnotations};
+  return std::all_of(fields.cbegin(), fields.cend(),
+                     [&](size_t i) { return key[i] == cached_key[i]; });
 }
 
-COCOMeta::COCOMeta(int64_t session_id, const std::string& annotation_file,
-                   const std::string& image_dir, bool remove_images_without_annotations)
-    : image_dir_(image_dir) {
+// Rewrites the key in the header of a cache whose annotation file was touched or copied but has
+// the same content, so that the next readers match it by file stat again
+void UpdateCacheKey(const std::string& cache_file_path, const std::vector<uint64_t>& key) {
+  std::fstream stream(cache_file_path, std::ios::binary | std::ios::in | std::ios::out);
+  if (!stream.is_open()) { return; }
+  stream.seekp(kCacheMagicCodeLen + sizeof(uint64_t));
+  stream.write(reinterpret_cast<const char*>(key.data()), kCacheKeySize * sizeof(uint64_t));
+}
+
+bool ImageHasValidAnnotations(const std::vector<const nlohmann::json*>& annos) {
+  if (annos.empty()) { return false; }
+
+  bool bbox_area_all_close_to_zero = true;
+  size_t visible_keypoints_count = 0;
+  for (const nlohmann::json* anno : annos) {
+    if ((*anno)["bbox"][2] > 1 && (*anno)["bbox"][3] > 1) { bbox_area_all_close_to_zero = false; }
+    if (anno->contains("keypoints")) {
+      const auto& keypoints = (*anno)["keypoints"];
+      CHECK_EQ(keypoints.size() % 3, 0);
+      FOR_RANGE(size_t, i, 0, keypoints.size() / 3) {
+        int32_t keypoints_label = keypoints[i * 3 + 2].get<int32_t>();
+        if (keypoints_label > 0) { visible_keypoints_count += 1; }
+      }
+    }
+  }
+  // check if all boxes are close to zero area
+  if (bbox_area_all_close_to_zero) { return false; }
+  // keypoints task have a slight different critera for considering
+  // if an annotation is valid
+  if (!annos.at(0)->contains("keypoints")) { return true; }
+  // for keypoint detection tasks, only consider valid images those
+  // containing at least min_keypoints_per_image
+  if (visible_keypoints_count >= kMinKeypointsPerImage) { return true; }
+  return false;
+}
+
+void ParseAnnotationFile(int64_t session_id, const std::string& annotation_file,
+                         bool remove_images_without_annotations, COCOAnnotationArrays* arrays) {
   // Read content of annotation file (json format) to json obj
   PersistentInStream in_stream(session_id, DataFS(), annotation_file);
   std::string json_str;
   std::string line;
   while (in_stream.ReadLine(&line) == 0) { json_str += line; }
+  nlohmann::json annotation_json;
   std::istringstream in_str_stream(json_str);
-  in_str_stream >> annotation_json_;
-  // initialize image_ids_, image_id2image_ and image_id2anno_ids_
-  for (const auto& image : annotation_json_["images"]) {
+  in_str_stream >> annotation_json;
+  json_str.clear();
+  json_str.shrink_to_fit();
+  // initialize image_ids, image_id2image and image_id2annos
+  std::vector<int64_t> image_ids;
+  HashMap<int64_t, const nlohmann::json*> image_id2image;
+  HashMap<int64_t, std::vector<const nlohmann::json*>> image_id2annos;
+  for (const auto& image : annotation_json["images"]) {
     int64_t id = image["id"].get<int64_t>();
-    image_ids_.emplace_back(id);
-    CHECK(image_id2image_.emplace(id, image).second);
-    CHECK(image_id2anno_ids_.emplace(id, std::vector<int64_t>()).second);
+    image_ids.emplace_back(id);
+    CHECK(image_id2image.emplace(id, &image).second);
+    CHECK(image_id2annos.emplace(id, std::vector<const nlohmann::json*>()).second);
   }
   // build anno map
-  for (const auto& anno : annotation_json_["annotations"]) {
+  HashSet<int64_t> anno_ids;
+  for (const auto& anno : annotation_json["annotations"]) {
     int64_t id = anno["id"].get<int64_t>();
     int64_t image_id = anno["image_id"].get<int64_t>();
     // ignore crowd object for now
@@ -90,63 +199,253 @@ COCOMeta::COCOMeta(int64_t session_id, const std::string& annotation_file,
         CHECK_GT(poly.size(), 6);
       }
     }
-    CHECK(anno_id2anno_.emplace(id, anno).second);
-    image_id2anno_ids_.at(image_id).emplace_back(id);
+    CHECK(anno_ids.insert(id).second);
+    image_id2annos.at(image_id).emplace_back(&anno);
   }
   // remove images without annotations if necessary
   if (remove_images_without_annotations) {
-    HashSet<int64_t> to_remove_image_ids;
-    for (int64_t image_id : image_ids_) {
-      if (!ImageHasValidAnnotations(image_id)) { to_remove_image_ids.insert(image_id); }
-    }
-    image_ids_.erase(std::remove_if(image_ids_.begin(), image_ids_.end(),
-                                    [&to_remove_image_ids](int64_t image_id) {
-                                      return to_remove_image_ids.find(image_id)
-                                             != to_remove_image_ids.end();
-                                    }),
-                     image_ids_.end());
+    image_ids.erase(std::remove_if(image_ids.begin(), image_ids.end(),
+                                   [&image_id2annos](int64_t image_id) {
+                                     return !ImageHasValidAnnotations(image_id2annos.at(image_id));
+                                   }),
+                    image_ids.end());
   }
   // sort image ids for reproducible results
-  std::sort(image_ids_.begin(), image_ids_.end());
+  std::sort(image_ids.begin(), image_ids.end());
   // build categories map
   std::vector<int32_t> category_ids;
-  for (const auto& cat : annotation_json_["categories"]) {
+  for (const auto& cat : annotation_json["categories"]) {
     category_ids.emplace_back(cat["id"].get<int32_t>());
   }
   std::sort(category_ids.begin(), category_ids.end());
+  HashMap<int32_t, int32_t> category_id2contiguous_id;
   int32_t contiguous_id = 1;
   for (int32_t category_id : category_ids) {
-    CHECK(category_id2contiguous_id_.emplace(category_id, contiguous_id++).second);
+    CHECK(category_id2contiguous_id.emplace(category_id, contiguous_id++).second);
+  }
+  // flatten annotations of the kept images
+  arrays->image_file_name_offsets.push_back(0);
+  arrays->image_anno_offsets.push_back(0);
+  arrays->anno_poly_offsets.push_back(0);
+  arrays->poly_coord_offsets.push_back(0);
+  for (int64_t image_id : image_ids) {
+    const auto& image = *image_id2image.at(image_id);
+    arrays->image_ids.push_back(image_id);
+    arrays->image_heights.push_back(image["height"].get<int32_t>());
+    arrays->image_widths.push_back(image["width"].get<int32_t>());
+    const std::string file_name = image["file_name"].get<std::string>();
+    arrays->image_file_names.insert(arrays->image_file_names.end(), file_name.cbegin(),
+                                    file_name.cend());
+    arrays->image_file_name_offsets.push_back(arrays->image_file_names.size());
+    for (const nlohmann::json* anno : image_id2annos.at(image_id)) {
+      const auto& bbox_json = (*anno)["bbox"];
+      CHECK(bbox_json.is_array());
+      CHECK_EQ(bbox_json.size(), 4);
+      for (const auto& elem : bbox_json) { arrays->anno_bboxes.push_back(elem.get<float>()); }
+      int32_t category_id = (*anno)["category_id"].get<int32_t>();
+      arrays->anno_labels.push_back(category_id2contiguous_id.at(category_id));
+      const auto& segm_json = (*anno)["segmentation"];
+      if (segm_json.is_array()) {
+        for (const auto& poly_json : segm_json) {
+          CHECK(poly_json.is_array());
+          CHECK_EQ(poly_json.size() % 2, 0);
+          for (const auto& elem : poly_json) { arrays->segm_coords.push_back(elem.get<float>()); }
+          arrays->poly_coord_offsets.push_back(arrays->segm_coords.size());
+        }
+      }
+      arrays->anno_poly_offsets.push_back(arrays->poly_coord_offsets.size() - 1);
+    }
+    arrays->image_anno_offsets.push_back(arrays->anno_labels.size());
   }
 }
 
-bool COCOMeta::ImageHasValidAnnotations(int64_t image_id) const {
-  const std::vector<int64_t>& anno_id_vec = image_id2anno_ids_.at(image_id);
-  if (anno_id_vec.empty()) { return false; }
+}  // namespace
 
-  bool bbox_area_all_close_to_zero = true;
-  size_t visible_keypoints_count = 0;
-  for (int64_t anno_id : anno_id_vec) {
-    const auto& anno = anno_id2anno_.at(anno_id);
-    if (anno["bbox"][2] > 1 && anno["bbox"][3] > 1) { bbox_area_all_close_to_zero = false; }
-    if (anno.contains("keypoints")) {
-      const auto& keypoints = anno["keypoints"];
-      CHECK_EQ(keypoints.size() % 3, 0);
-      FOR_RANGE(size_t, i, 0, keypoints.size() / 3) {
-        int32_t keypoints_label = keypoints[i * 3 + 2].get<int32_t>();
-        if (keypoints_label > 0) { visible_keypoints_count += 1; }
+COCODataReader::COCODataReader(user_op::KernelInitContext* ctx) : DataReader<COCOImage>(ctx) {
+  batch_size_ = ctx->TensorDesc4ArgNameAndIndex("image", 0)->shape().elem_cnt();
+  if (auto* pool = TensorBufferPool::TryGet()) { pool->IncreasePoolSizeByBase(batch_size_); }
+
+  std::shared_ptr<const COCOMeta> meta(new COCOMeta(
+      ctx->Attr<int64_t>("session_id"), ctx->Attr<std::string>("annotation_file"),
+      ctx->Attr<std::string>("image_dir"), ctx->Attr<bool>("remove_images_without_annotations")));
+  std::unique_ptr<RandomAccessDataset<COCOImage>> coco_dataset_ptr(new COCODataset(ctx, meta));
+
+  size_t world_size = 1;
+  int64_t rank = 0;
+  CHECK_JUST(InitDataSourceDistributedInfo(ctx, world_size, rank));
+  loader_.reset(new DistributedTrainingDataset<COCOImage>(
+      world_size, rank, ctx->Attr<bool>("stride_partition"), ctx->Attr<bool>("shuffle_after_epoch"),
+      ctx->Attr<int64_t>("random_seed"), std::move(coco_dataset_ptr)));
+
+  if (ctx->Attr<bool>("group_by_ratio")) {
+    auto GetGroupId = [](const COCOImage& sample) {
+      return static_cast<int64_t>(sample.height / sample.width);
+    };
+    loader_.reset(new GroupBatchDataset<COCOImage>(batch_size_, GetGroupId, std::move(loader_)));
+  } else {
+    loader_.reset(new BatchDataset<COCOImage>(batch_size_, std::move(loader_)));
+  }
+
+  parser_.reset(new COCOParser(meta));
+  StartLoadThread();
+}
+
+COCODataReader::~COCODataReader() {
+  if (auto* pool = TensorBufferPool::TryGet()) { pool->DecreasePoolSizeByBase(batch_size_); }
+}
+
+COCOMeta::COCOMeta(int64_t session_id, const std::string& annotation_file,
+                   const std::string& image_dir, bool remove_images_without_annotations)
+    : image_dir_(image_dir) {
+  auto start = std::chrono::system_clock::now();
+  const std::string cache_file_path = GetCacheFilePath(annotation_file);
+  bool has_file_stat = false;
+  std::vector<uint64_t> key =
+      GetCacheKey(annotation_file, remove_images_without_annotations, &has_file_stat);
+  // parsing the annotation json is slow and memory hungry, so it is done once and the flattened
+  // annotations are mapped from the cache file by the following readers
+  bool cache_hit = has_file_stat && LoadCache(cache_file_path, key, /*by_content=*/false);
+  if (!cache_hit) {
+    CacheBuildLock build_lock(cache_file_path);
+    // another process may have saved the cache while this one waited for the lock
+    cache_hit = has_file_stat && LoadCache(cache_file_path, key, /*by_content=*/false);
+    if (!cache_hit) {
+      key[kKeyFileContentHash] = GetFileContentHash(annotation_file, key[kKeyFileSize]);
+      cache_hit = LoadCache(cache_file_path, key, /*by_content=*/true);
+      if (cache_hit && has_file_stat) { UpdateCacheKey(cache_file_path, key); }
+    }
+    if (!cache_hit) {
+      COCOAnnotationArrays arrays;
+      ParseAnnotationFile(session_id, annotation_file, remove_images_without_annotations,
+                          &arrays);
+      if (!SaveCache(cache_file_path, key, arrays)
+          || !LoadCache(cache_file_path, key, /*by_content=*/true)) {
+        Reset(std::move(arrays));
       }
     }
   }
-  // check if all boxes are close to zero area
-  if (bbox_area_all_close_to_zero) { return false; }
-  // keypoints task have a slight different critera for considering
-  // if an annotation is valid
-  if (!anno_id2anno_.at(anno_id_vec.at(0)).contains("keypoints")) { return true; }
-  // for keypoint detection tasks, only consider valid images those
-  // containing at least min_keypoints_per_image
-  if (visible_keypoints_count >= kMinKeypointsPerImage) { return true; }
-  return false;
+  std::chrono::duration<double, std::milli> elapse = std::chrono::system_clock::now() - start;
+  VLOG(2) << "Load COCO annotations successed, annotation_file: " << annotation_file
+          << ", number of images: " << Size() << ", cache: " << cache_file_path
+          << (cache_hit ? " (hit)" : " (miss)") << ", elapsed time: " << elapse.count() << " ms";
+}
+
+void COCOMeta::Reset(COCOAnnotationArrays&& arrays) {
+  image_ids_.Reset(std::move(arrays.image_ids));
+  image_heights_.Reset(std::move(arrays.image_heights));
+  image_widths_.Reset(std::move(arrays.image_widths));
+  image_file_name_offsets_.Reset(std::move(arrays.image_file_name_offsets));
+  image_file_names_.Reset(std::move(arrays.image_file_names));
+  image_anno_offsets_.Reset(std::move(arrays.image_anno_offsets));
+  anno_bboxes_.Reset(std::move(arrays.anno_bboxes));
+  anno_labels_.Reset(std::move(arrays.anno_labels));
+  anno_poly_offsets_.Reset(std::move(arrays.anno_poly_offsets));
+  poly_coord_offsets_.Reset(std::move(arrays.poly_coord_offsets));
+  segm_coords_.Reset(std::move(arrays.segm_coords));
+}
+
+bool COCOMeta::LoadCache(const std::string& cache_file_path, const std::vector<uint64_t>& key,
+                         bool by_content) {
+  std::ifstream stream(cache_file_path, std::ios::binary);
+  if (!stream.is_open()) { return false; }
+  char header[kCacheHeaderSize];
+  if (!stream.read(header, kCacheHeaderSize)) { return false; }
+  if (std::memcmp(header, kCacheMagicCode, kCacheMagicCodeLen) != 0) { return false; }
+  std::vector<uint64_t> fields(1 + kCacheKeySize + 5);
+  std::memcpy(fields.data(), header + kCacheMagicCodeLen, fields.size() * sizeof(uint64_t));
+  if (fields[0] != kCacheVersion) { return false; }
+  if (!CacheKeyMatches(key, fields.data() + 1, by_content)) {
+    if (by_content) {
+      LOG(WARNING) << "COCO annotation cache " << cache_file_path
+                   << " is stale and will be rebuilt";
+    }
+    return false;
+  }
+  stream.close();
+  const size_t num_images = fields[1 + kCacheKeySize];
+  const size_t num_annos = fields[2 + kCacheKeySize];
+  const size_t num_polys = fields[3 + kCacheKeySize];
+  const size_t num_coords = fields[4 + kCacheKeySize];
+  const size_t num_file_name_chars = fields[5 + kCacheKeySize];
+
+  auto mapped = std::make_shared<const MappedBuffer>(cache_file_path);
+  size_t offset = kCacheHeaderSize;
+  auto MapArray = [&](auto* array, size_t size) {
+    using T = typename std::remove_reference<decltype((*array)[0])>::type;
+    offset = RoundUp(offset, kCacheAlignment);
+    array->Reset(mapped, offset, size);
+    offset += size * sizeof(T);
+  };
+  // keep in the same order as SaveCache
+  MapArray(&image_ids_, num_images);
+  MapArray(&image_heights_, num_images);
+  MapArray(&image_widths_, num_images);
+  MapArray(&image_file_name_offsets_, num_images + 1);
+  MapArray(&image_file_names_, num_file_name_chars);
+  MapArray(&image_anno_offsets_, num_images + 1);
+  MapArray(&anno_bboxes_, num_annos * 4);
+  MapArray(&anno_labels_, num_annos);
+  MapArray(&anno_poly_offsets_, num_annos + 1);
+  MapArray(&poly_coord_offsets_, num_polys + 1);
+  MapArray(&segm_coords_, num_coords);
+  // a truncated file is never mapped beyond its end, the arrays are reset by the caller
+  return offset == mapped->size();
+}
+
+bool COCOMeta::SaveCache(const std::string& cache_file_path, const std::vector<uint64_t>& key,
+                         const COCOAnnotationArrays& arrays) {
+  // write to a private file then rename, so that readers building the same cache concurrently
+  // never observe a partially written file
+  const std::string tmp_file_path = cache_file_path + ".tmp." + std::to_string(getpid());
+  {
+    std::ofstream stream(tmp_file_path, std::ios::binary | std::ios::trunc);
+    if (!stream.is_open()) {
+      LOG(WARNING) << "can't write COCO annotation cache " << cache_file_path
+                   << ", annotations are kept in memory";
+      return false;
+    }
+    std::vector<uint64_t> fields{kCacheVersion};
+    fields.insert(fields.end(), key.cbegin(), key.cend());
+    fields.push_back(arrays.image_ids.size());
+    fields.push_back(arrays.anno_labels.size());
+    fields.push_back(arrays.poly_coord_offsets.size() - 1);
+    fields.push_back(arrays.segm_coords.size());
+    fields.push_back(arrays.image_file_names.size());
+    stream.write(kCacheMagicCode, kCacheMagicCodeLen);
+    stream.write(reinterpret_cast<const char*>(fields.data()), fields.size() * sizeof(uint64_t));
+    size_t offset = kCacheHeaderSize;
+    auto WriteArray = [&](const auto& vec) {
+      static const char kPadding[kCacheAlignment] = {};
+      const size_t aligned_offset = RoundUp(offset, kCacheAlignment);
+      const size_t nbytes = vec.size() * sizeof(vec[0]);
+      stream.write(kPadding, aligned_offset - offset);
+      stream.write(reinterpret_cast<const char*>(vec.data()), nbytes);
+      offset = aligned_offset + nbytes;
+    };
+    // keep in the same order as LoadCache
+    WriteArray(arrays.image_ids);
+    WriteArray(arrays.image_heights);
+    WriteArray(arrays.image_widths);
+    WriteArray(arrays.image_file_name_offsets);
+    WriteArray(arrays.image_file_names);
+    WriteArray(arrays.image_anno_offsets);
+    WriteArray(arrays.anno_bboxes);
+    WriteArray(arrays.anno_labels);
+    WriteArray(arrays.anno_poly_offsets);
+    WriteArray(arrays.poly_coord_offsets);
+    WriteArray(arrays.segm_coords);
+    if (!stream.good()) {
+      LOG(WARNING) << "failed to write COCO annotation cache " << cache_file_path;
+      stream.close();
+      std::remove(tmp_file_path.c_str());
+      return false;
+    }
+  }
+  if (std::rename(tmp_file_path.c_str(), cache_file_path.c_str()) != 0) {
+    std::remove(tmp_file_path.c_str());
+    return false;
+  }
+  return true;
 }
 
 }  // namespace data
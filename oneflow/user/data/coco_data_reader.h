@@ -18,8 +18,8 @@ limitations under the License.
 
 #include "oneflow/user/data/data_reader.h"
 #include "oneflow/user/data/coco_parser.h"
+#include "oneflow/user/data/mapped_buffer.h"
 #include "oneflow/core/common/str_util.h"
-#include "nlohmann/json.hpp"
 
 namespace oneflow {
 namespace data {
@@ -37,26 +37,25 @@ class COCODataReader final : public DataReader<COCOImage> {
   size_t batch_size_;
 };
 
+struct COCOAnnotationArrays;
+
+// Annotations of the kept images stored as flat arrays with offsets, which are either parsed
+// from the annotation json or mapped from a binary cache file shared by all readers on a node
 class COCOMeta final {
  public:
   COCOMeta(int64_t session_id, const std::string& annotation_file, const std::string& image_dir,
            bool remove_images_without_annotations);
+  OF_DISALLOW_COPY_AND_MOVE(COCOMeta);
   ~COCOMeta() = default;
 
   int64_t Size() const { return image_ids_.size(); }
-  int64_t GetImageId(int64_t index) const { return image_ids_.at(index); }
-  int32_t GetImageHeight(int64_t index) const {
-    int64_t image_id = image_ids_.at(index);
-    return image_id2image_.at(image_id)["height"].get<int32_t>();
-  }
-  int32_t GetImageWidth(int64_t index) const {
-    int64_t image_id = image_ids_.at(index);
-    return image_id2image_.at(image_id)["width"].get<int32_t>();
-  }
+  int64_t GetImageId(int64_t index) const { return image_ids_[CheckIndex(index)]; }
+  int32_t GetImageHeight(int64_t index) const { return image_heights_[CheckIndex(index)]; }
+  int32_t GetImageWidth(int64_t index) const { return image_widths_[CheckIndex(index)]; }
   std::string GetImageFilePath(int64_t index) const {
-    int64_t image_id = image_ids_.at(index);
-    const auto& image_json = image_id2image_.at(image_id);
-    return JoinPath(image_dir_, image_json["file_name"].get<std::string>());
+    const int64_t begin = image_file_name_offsets_[CheckIndex(index)];
+    const int64_t end = image_file_name_offsets_[index + 1];
+    return JoinPath(image_dir_, std::string(image_file_names_.data() + begin, end - begin));
   }
   template<typename T>
   std::vector<T> GetBboxVec(int64_t index) const;
@@ -67,40 +66,53 @@ class COCOMeta final {
                                        TensorBuffer* segm_offset_mat) const;
 
  private:
-  bool ImageHasValidAnnotations(int64_t image_id) const;
+  int64_t CheckIndex(int64_t index) const {
+    CHECK_GE(index, 0);
+    CHECK_LT(index, Size());
+    return index;
+  }
+  void Reset(COCOAnnotationArrays&& arrays);
+  // the key is compared by annotation file content hash, or else by file stat
+  bool LoadCache(const std::string& cache_file_path, const std::vector<uint64_t>& key,
+                 bool by_content);
+  static bool SaveCache(const std::string& cache_file_path, const std::vector<uint64_t>& key,
+                        const COCOAnnotationArrays& arrays);
 
-  static constexpr int kMinKeypointsPerImage = 10;
-  nlohmann::json annotation_json_;
   std::string image_dir_;
-  std::vector<int64_t> image_ids_;
-  HashMap<int64_t, const nlohmann::json&> image_id2image_;
-  HashMap<int64_t, const nlohmann::json&> anno_id2anno_;
-  HashMap<int64_t, std::vector<int64_t>> image_id2anno_ids_;
-  HashMap<int32_t, int32_t> category_id2contiguous_id_;
+  // per image
+  MappedArray<int64_t> image_ids_;
+  MappedArray<int32_t> image_heights_;
+  MappedArray<int32_t> image_widths_;
+  MappedArray<int64_t> image_file_name_offsets_;
+  MappedArray<char> image_file_names_;
+  MappedArray<int64_t> image_anno_offsets_;
+  // per annotation, bbox in COCO format [left, top, width, height] and contiguous label
+  MappedArray<float> anno_bboxes_;
+  MappedArray<int32_t> anno_labels_;
+  MappedArray<int64_t> anno_poly_offsets_;
+  // per segmentation polygon, coordinates are flattened (x, y) pairs
+  MappedArray<int64_t> poly_coord_offsets_;
+  MappedArray<float> segm_coords_;
 };
 
 template<typename T>
 std::vector<T> COCOMeta::GetBboxVec(int64_t index) const {
   std::vector<T> bbox_vec;
-  int64_t image_id = image_ids_.at(index);
-  const auto& anno_ids = image_id2anno_ids_.at(image_id);
-  for (int64_t anno_id : anno_ids) {
-    const auto& bbox_json = anno_id2anno_.at(anno_id)["bbox"];
-    CHECK(bbox_json.is_array());
-    CHECK_EQ(bbox_json.size(), 4);
+  const int32_t image_height = GetImageHeight(index);
+  const int32_t image_width = GetImageWidth(index);
+  FOR_RANGE(int64_t, anno_idx, image_anno_offsets_[index], image_anno_offsets_[index + 1]) {
+    const float* bbox = anno_bboxes_.data() + anno_idx * 4;
     // COCO bounding box format is [left, top, width, height]
     // we need format xyxy
     const T alginment = static_cast<T>(1);
     const T min_size = static_cast<T>(0);
-    T left = bbox_json[0].get<T>();
-    T top = bbox_json[1].get<T>();
-    T width = bbox_json[2].get<T>();
-    T height = bbox_json[3].get<T>();
+    T left = static_cast<T>(bbox[0]);
+    T top = static_cast<T>(bbox[1]);
+    T width = static_cast<T>(bbox[2]);
+    T height = static_cast<T>(bbox[3]);
     T right = left + std::max(width - alginment, min_size);
     T bottom = top + std::max(height - alginment, min_size);
     // clip to image
-    int32_t image_height = GetImageHeight(index);
-    int32_t image_width = GetImageWidth(index);
     left = std::min(std::max(left, min_size), image_width - alginment);
     top = std::min(std::max(top, min_size), image_height - alginment);
     right = std::min(std::max(right, min_size), image_width - alginment);
@@ -115,55 +127,40 @@ std::vector<T> COCOMeta::GetBboxVec(int64_t index) const {
 
 template<typename T>
 std::vector<T> COCOMeta::GetLabelVec(int64_t index) const {
-  std::vector<T> label_vec;
-  int64_t image_id = image_ids_.at(index);
-  const auto& anno_ids = image_id2anno_ids_.at(image_id);
-  for (int64_t anno_id : anno_ids) {
-    int32_t category_id = anno_id2anno_.at(anno_id)["category_id"].get<int32_t>();
-    label_vec.emplace_back(category_id2contiguous_id_.at(category_id));
-  }
-  return label_vec;
+  const int64_t begin = image_anno_offsets_[CheckIndex(index)];
+  const int64_t end = image_anno_offsets_[index + 1];
+  return std::vector<T>(anno_labels_.data() + begin, anno_labels_.data() + end);
 }
 
 template<typename T>
 void COCOMeta::ReadSegmentationsToTensorBuffer(int64_t index, TensorBuffer* segm,
                                                TensorBuffer* segm_index) const {
   if (segm == nullptr || segm_index == nullptr) { return; }
-  int64_t image_id = image_ids_.at(index);
-  const auto& anno_ids = image_id2anno_ids_.at(image_id);
-  std::vector<T> segm_vec;
-  for (int64_t anno_id : anno_ids) {
-    const auto& segm_json = anno_id2anno_.at(anno_id)["segmentation"];
-    if (!segm_json.is_array()) { continue; }
-    for (const auto& poly_json : segm_json) {
-      CHECK(poly_json.is_array());
-      for (const auto& elem : poly_json) { segm_vec.emplace_back(elem.get<T>()); }
-    }
-  }
-  CHECK_EQ(segm_vec.size() % 2, 0);
-  int64_t num_pts = segm_vec.size() / 2;
+  const int64_t anno_begin = image_anno_offsets_[CheckIndex(index)];
+  const int64_t anno_end = image_anno_offsets_[index + 1];
+  const int64_t coord_begin = poly_coord_offsets_[anno_poly_offsets_[anno_begin]];
+  const int64_t coord_end = poly_coord_offsets_[anno_poly_offsets_[anno_end]];
+  CHECK_EQ((coord_end - coord_begin) % 2, 0);
+  int64_t num_pts = (coord_end - coord_begin) / 2;
   segm->Resize(Shape({num_pts, 2}), GetDataType<T>::value);
-  std::copy(segm_vec.begin(), segm_vec.end(), segm->mut_data<T>());
+  std::copy(segm_coords_.data() + coord_begin, segm_coords_.data() + coord_end,
+            segm->mut_data<T>());
 
   segm_index->Resize(Shape({num_pts, 3}), DataType::kInt32);
   int32_t* index_ptr = segm_index->mut_data<int32_t>();
-  int i = 0;
-  int32_t segm_idx = 0;
-  for (int64_t anno_id : anno_ids) {
-    const auto& segm_json = anno_id2anno_.at(anno_id)["segmentation"];
-    CHECK(segm_json.is_array());
-    FOR_RANGE(int32_t, poly_idx, 0, segm_json.size()) {
-      const auto& poly_json = segm_json[poly_idx];
-      CHECK(poly_json.is_array());
-      CHECK_EQ(poly_json.size() % 2, 0);
-      FOR_RANGE(int32_t, pt_idx, 0, poly_json.size() / 2) {
+  int64_t i = 0;
+  FOR_RANGE(int64_t, anno_idx, anno_begin, anno_end) {
+    const int64_t poly_begin = anno_poly_offsets_[anno_idx];
+    FOR_RANGE(int64_t, poly_idx, poly_begin, anno_poly_offsets_[anno_idx + 1]) {
+      const int64_t poly_num_pts =
+          (poly_coord_offsets_[poly_idx + 1] - poly_coord_offsets_[poly_idx]) / 2;
+      FOR_RANGE(int64_t, pt_idx, 0, poly_num_pts) {
         index_ptr[i * 3 + 0] = pt_idx;
-        index_ptr[i * 3 + 1] = poly_idx;
-        index_ptr[i * 3 + 2] = segm_idx;
+        index_ptr[i * 3 + 1] = poly_idx - poly_begin;
+        index_ptr[i * 3 + 2] = anno_idx - anno_begin;
         i += 1;
       }
     }
-    segm_idx += 1;
   }
   CHECK_EQ(i, num_pts);
 }
@@ -15,13 +15,7 @@ limitations under the License.
 */
 #include "oneflow/user/data/gpt_dataset.h"
 
-#ifdef __linux__
-#include <fcntl.h>
-#include <stdio.h>
-#include <errno.h>
-#include <sys/stat.h>
-#include <sys/mman.h>
-#endif
+#include <unistd.h>
 
 namespace oneflow {
 
@@ -74,6 +68,30 @@ size_t GetNumCompleteEpochs(size_t num_samples, size_t seq_length, size_t tokens
   return separate_last_epoch ? (num_epochs - 1) : num_epochs;
 }
 
+// Cached doc/sample/shuffle indices of a MegatronGPTMMapDataset:
+//   magic code (8 bytes) | version | key (kIndexCacheKeySize) |
+//   num doc indices | num sample indices | num shuffle indices |
+//   doc indices | sample indices (pairs) | shuffle indices
+// every field is a uint64
+constexpr char kIndexCacheMagicCode[] = "GPTIXMAP";
+constexpr size_t kIndexCacheMagicCodeLen = sizeof(kIndexCacheMagicCode) - 1;
+constexpr uint64_t kIndexCacheVersion = 1;
+constexpr size_t kIndexCacheKeySize = 8;
+constexpr size_t kIndexCacheHeaderSize =
+    kIndexCacheMagicCodeLen + (1 + kIndexCacheKeySize + 3) * sizeof(uint64_t);
+static_assert(sizeof(size_t) == sizeof(uint64_t), "index cache stores size_t as uint64");
+
+std::string GetIndexCacheFilePath(const std::string& data_file_prefix, size_t seq_len,
+                                  size_t num_samples, const std::vector<int64_t>& split_sizes,
+                                  size_t split_index, bool shuffle, uint32_t seed) {
+  std::ostringstream ss;
+  ss << data_file_prefix << "_split" << split_index << "of";
+  FOR_RANGE(size_t, i, 0, split_sizes.size()) { ss << (i > 0 ? "-" : "") << split_sizes[i]; }
+  ss << "_" << num_samples << "ns_" << seq_len << "sl_" << seed << "s"
+     << (shuffle ? "" : "_noshuffle") << "_indexmap.bin";
+  return ss.str();
+}
+
 }  // namespace
 
 constexpr char MegatronGPTIndex::kMagicCode[];
@@ -120,28 +138,6 @@ MegatronGPTIndex::MegatronGPTIndex(const std::string& index_file_path) {
           << " ms";
 }
 
-MappedBuffer::MappedBuffer(const std::string& filename) : mapped_(nullptr), size_(0) {
-#ifdef __linux__
-  int fd = open(filename.c_str(), O_RDONLY);
-  CHECK(fd != -1) << "open " << filename << " failed: " << strerror(errno);
-
-  struct stat s;
-  CHECK(fstat(fd, &s) != -1) << "stat " << filename << " failed: " << strerror(errno);
-  size_ = s.st_size;
-
-  mapped_ = mmap(nullptr, size_, PROT_READ, MAP_PRIVATE, fd, 0);
-  CHECK(mapped_ != MAP_FAILED) << "mmap " << filename << " failed: " << strerror(errno);
-
-  close(fd);
-#endif
-}
-
-MappedBuffer::~MappedBuffer() {
-#ifdef __linux__
-  CHECK(munmap(mapped_, size_) == 0) << "munmap failed";
-#endif
-}
-
 MegatronGPTMMapDataset::MegatronGPTMMapDataset(const std::string& data_file_prefix, size_t seq_len,
                                                size_t label_len, size_t num_samples,
                                                const std::vector<int64_t>& split_sizes,
@@ -161,11 +157,34 @@ MegatronGPTMMapDataset::MegatronGPTMMapDataset(const std::string& data_file_pref
   tokens_per_epoch_ = GetEpochNumTokens(epoch_doc_indices);
   num_epochs_ = GetNumEpochs(num_samples_, seq_len_, tokens_per_epoch_);
   num_complete_epochs_ = GetNumCompleteEpochs(num_samples_, seq_len_, tokens_per_epoch_);
-  InitDocIndices(epoch_doc_indices, num_epochs_, num_complete_epochs_);
-  size_t total_num_samples = static_cast<size_t>(
-      std::floor(static_cast<double>(num_epochs_ * tokens_per_epoch_ - 1) / seq_len_));
-  InitSampleIndices(total_num_samples);
-  InitShuffleIndices(sample_indices_.size());
+  // NOTE: building the indices takes minutes and gigabytes for large corpora, so they are built
+  // once, saved next to the data and mapped by later runs and by every rank
+  const std::string cache_file_path = GetIndexCacheFilePath(
+      data_file_prefix, seq_len_, num_samples_, split_sizes, split_index, shuffle_, seed_);
+  bool cache_hit = LoadIndexCache(cache_file_path);
+  std::unique_ptr<CacheBuildLock> build_lock;
+  if (!cache_hit) {
+    build_lock = std::make_unique<CacheBuildLock>(cache_file_path);
+    // another process may have saved the cache while this one waited for the lock
+    cache_hit = LoadIndexCache(cache_file_path);
+  }
+  if (!cache_hit) {
+    std::vector<size_t> doc_indices;
+    InitDocIndices(epoch_doc_indices, num_epochs_, num_complete_epochs_, &doc_indices);
+    size_t total_num_samples = static_cast<size_t>(
+        std::floor(static_cast<double>(num_epochs_ * tokens_per_epoch_ - 1) / seq_len_));
+    std::vector<std::pair<size_t, size_t>> sample_indices;
+    InitSampleIndices(total_num_samples, doc_indices, &sample_indices);
+    std::vector<size_t> shuffle_indices;
+    InitShuffleIndices(sample_indices.size(), &shuffle_indices);
+    if (!SaveIndexCache(cache_file_path, doc_indices, sample_indices, shuffle_indices)
+        || !LoadIndexCache(cache_file_path)) {
+      doc_indices_.Reset(std::move(doc_indices));
+      sample_indices_.Reset(std::move(sample_indices));
+      shuffle_indices_.Reset(std::move(shuffle_indices));
+    }
+  }
+  build_lock.reset();
   std::chrono::duration<double, std::milli> elapse = std::chrono::system_clock::now() - start;
   VLOG(2) << "Create GPT Dataset successed, sequence length: " << seq_len_
           << ", number of samples: " << num_samples_
@@ -174,6 +193,7 @@ MegatronGPTMMapDataset::MegatronGPTMMapDataset(const std::string& data_file_pref
           << ", number of epochs: " << num_epochs_
           << ", number of complete epochs: " << num_complete_epochs_
           << ", shuffle: " << std::boolalpha << shuffle_ << ", random_seed: " << seed_
+          << ", index cache: " << cache_file_path << (cache_hit ? " (hit)" : " (miss)")
           << ", elapsed time: " << elapse.count() << " ms";
 }
 
@@ -184,35 +204,38 @@ size_t MegatronGPTMMapDataset::GetEpochNumTokens(const std::vector<size_t>& doc_
 }
 
 void MegatronGPTMMapDataset::InitDocIndices(const std::vector<size_t>& epoch_doc_indices,
-                                            size_t num_epochs, size_t num_complete_epochs) {
-  doc_indices_.reserve(epoch_doc_indices.size() * num_epochs);
-  InitDocIndices(epoch_doc_indices, num_complete_epochs);
+                                            size_t num_epochs, size_t num_complete_epochs,
+                                            std::vector<size_t>* doc_indices) {
+  doc_indices->reserve(epoch_doc_indices.size() * num_epochs);
+  InitDocIndices(epoch_doc_indices, num_complete_epochs, doc_indices);
   if (num_epochs != num_complete_epochs) {
     CHECK_EQ(num_complete_epochs + 1, num_epochs);
-    InitDocIndices(epoch_doc_indices, 1);
+    InitDocIndices(epoch_doc_indices, 1, doc_indices);
   }
 }
 
 void MegatronGPTMMapDataset::InitDocIndices(const std::vector<size_t>& epoch_doc_indices,
-                                            size_t num_epochs) {
-  auto start = std::distance(doc_indices_.cbegin(), doc_indices_.cend());
+                                            size_t num_epochs, std::vector<size_t>* doc_indices) {
+  auto start = std::distance(doc_indices->cbegin(), doc_indices->cend());
   FOR_RANGE(size_t, i, 0, num_epochs) {
-    doc_indices_.insert(doc_indices_.end(), epoch_doc_indices.cbegin(), epoch_doc_indices.cend());
+    doc_indices->insert(doc_indices->end(), epoch_doc_indices.cbegin(), epoch_doc_indices.cend());
   }
-  if (shuffle_) { std::shuffle(doc_indices_.begin() + start, doc_indices_.end(), gen_); }
+  if (shuffle_) { std::shuffle(doc_indices->begin() + start, doc_indices->end(), gen_); }
 }
 
-void MegatronGPTMMapDataset::InitSampleIndices(size_t total_num_samples) {
-  sample_indices_.reserve(total_num_samples);
+void MegatronGPTMMapDataset::InitSampleIndices(
+    size_t total_num_samples, const std::vector<size_t>& doc_indices,
+    std::vector<std::pair<size_t, size_t>>* sample_indices) const {
+  sample_indices->reserve(total_num_samples);
   size_t doc_indices_idx = 0;
   size_t doc_offset = 0;
   FOR_RANGE(size_t, i, 0, total_num_samples) {
-    if (doc_indices_idx >= doc_indices_.size()) { break; }
-    sample_indices_.emplace_back(doc_indices_idx, doc_offset);
+    if (doc_indices_idx >= doc_indices.size()) { break; }
+    sample_indices->emplace_back(doc_indices_idx, doc_offset);
     int remaining_tokens = seq_len_;
     while (remaining_tokens > 0) {
-      CHECK_LT(doc_indices_idx, doc_indices_.size());
-      size_t doc_len = index_->doc_length(doc_indices_[doc_indices_idx]);
+      CHECK_LT(doc_indices_idx, doc_indices.size());
+      size_t doc_len = index_->doc_length(doc_indices[doc_indices_idx]);
       CHECK_LT(doc_offset, doc_len);
       doc_len -= doc_offset;
       if (remaining_tokens < doc_len) {
@@ -226,24 +249,111 @@ void MegatronGPTMMapDataset::InitSampleIndices(size_t total_num_samples) {
       remaining_tokens -= doc_len;
     }
   }
-  CHECK_EQ(sample_indices_.size(), total_num_samples);
-  CHECK_GE(sample_indices_.size(), num_samples_);
+  CHECK_EQ(sample_indices->size(), total_num_samples);
+  CHECK_GE(sample_indices->size(), num_samples_);
 }
 
-void MegatronGPTMMapDataset::InitShuffleIndices(size_t total_num_samples) {
-  shuffle_indices_.resize(total_num_samples);
-  std::iota(shuffle_indices_.begin(), shuffle_indices_.end(), 0);
+void MegatronGPTMMapDataset::InitShuffleIndices(size_t total_num_samples,
+                                                std::vector<size_t>* shuffle_indices) {
+  shuffle_indices->resize(total_num_samples);
+  std::iota(shuffle_indices->begin(), shuffle_indices->end(), 0);
   if (shuffle_) {
     size_t num_samples = static_cast<size_t>(
         std::floor(static_cast<double>(num_complete_epochs_ * tokens_per_epoch_ - 1) / seq_len_));
-    CHECK_LE(num_samples, shuffle_indices_.size());
-    std::shuffle(shuffle_indices_.begin(), shuffle_indices_.begin() + num_samples, gen_);
+    CHECK_LE(num_samples, shuffle_indices->size());
+    std::shuffle(shuffle_indices->begin(), shuffle_indices->begin() + num_samples, gen_);
     if (num_complete_epochs_ != num_epochs_) {
-      std::shuffle(shuffle_indices_.begin() + num_samples, shuffle_indices_.end(), gen_);
+      std::shuffle(shuffle_indices->begin() + num_samples, shuffle_indices->end(), gen_);
     }
   }
 }
 
+std::vector<uint64_t> MegatronGPTMMapDataset::GetIndexCacheKey() const {
+  std::vector<uint64_t> key{seq_len_,    num_samples_,      seed_,
+                            shuffle_,    index_->num_docs(), tokens_per_epoch_,
+                            num_epochs_, num_complete_epochs_};
+  CHECK_EQ(key.size(), kIndexCacheKeySize);
+  return key;
+}
+
+bool MegatronGPTMMapDataset::LoadIndexCache(const std::string& cache_file_path) {
+  std::ifstream stream(cache_file_path, std::ios::binary);
+  if (!stream.is_open()) { return false; }
+  char header[kIndexCacheHeaderSize];
+  if (!stream.read(header, kIndexCacheHeaderSize)) { return false; }
+  if (std::memcmp(header, kIndexCacheMagicCode, kIndexCacheMagicCodeLen) != 0) { return false; }
+  std::vector<uint64_t> fields(1 + kIndexCacheKeySize + 3);
+  std::memcpy(fields.data(), header + kIndexCacheMagicCodeLen, fields.size() * sizeof(uint64_t));
+  if (fields[0] != kIndexCacheVersion) { return false; }
+  // the key covers every input of the indices, so a mismatch means the cache is stale
+  if (!std::equal(fields.begin() + 1, fields.begin() + 1 + kIndexCacheKeySize,
+                  GetIndexCacheKey().begin())) {
+    LOG(WARNING) << "GPT Dataset index cache " << cache_file_path
+                 << " is stale and will be rebuilt";
+    return false;
+  }
+  const size_t num_doc_indices = fields[1 + kIndexCacheKeySize];
+  const size_t num_sample_indices = fields[2 + kIndexCacheKeySize];
+  const size_t num_shuffle_indices = fields[3 + kIndexCacheKeySize];
+  const size_t doc_indices_offset = kIndexCacheHeaderSize;
+  const size_t sample_indices_offset = doc_indices_offset + num_doc_indices * sizeof(size_t);
+  const size_t shuffle_indices_offset =
+      sample_indices_offset + num_sample_indices * sizeof(std::pair<size_t, size_t>);
+  const size_t file_size = shuffle_indices_offset + num_shuffle_indices * sizeof(size_t);
+  stream.seekg(0, std::ios_base::end);
+  if (static_cast<size_t>(stream.tellg()) != file_size) { return false; }
+  stream.close();
+
+  auto mapped = std::make_shared<const MappedBuffer>(cache_file_path);
+  CHECK_EQ(mapped->size(), file_size);
+  doc_indices_.Reset(mapped, doc_indices_offset, num_doc_indices);
+  sample_indices_.Reset(mapped, sample_indices_offset, num_sample_indices);
+  shuffle_indices_.Reset(mapped, shuffle_indices_offset, num_shuffle_indices);
+  return true;
+}
+
+bool MegatronGPTMMapDataset::SaveIndexCache(
+    const std::string& cache_file_path, const std::vector<size_t>& doc_indices,
+    const std::vector<std::pair<size_t, size_t>>& sample_indices,
+    const std::vector<size_t>& shuffle_indices) const {
+  // write to a private file then rename, so that ranks building the same cache concurrently
+  // never observe a partially written file
+  const std::string tmp_file_path = cache_file_path + ".tmp." + std::to_string(getpid());
+  {
+    std::ofstream stream(tmp_file_path, std::ios::binary | std::ios::trunc);
+    if (!stream.is_open()) {
+      LOG(WARNING) << "can't write GPT Dataset index cache " << cache_file_path
+                   << ", indices are kept in memory";
+      return false;
+    }
+    std::vector<uint64_t> fields{kIndexCacheVersion};
+    const std::vector<uint64_t> key = GetIndexCacheKey();
+    fields.insert(fields.end(), key.cbegin(), key.cend());
+    fields.push_back(doc_indices.size());
+    fields.push_back(sample_indices.size());
+    fields.push_back(shuffle_indices.size());
+    stream.write(kIndexCacheMagicCode, kIndexCacheMagicCodeLen);
+    stream.write(reinterpret_cast<const char*>(fields.data()), fields.size() * sizeof(uint64_t));
+    stream.write(reinterpret_cast<const char*>(doc_indices.data()),
+                 doc_indices.size() * sizeof(size_t));
+    stream.write(reinterpret_cast<const char*>(sample_indices.data()),
+                 sample_indices.size() * sizeof(std::pair<size_t, size_t>));
+    stream.write(reinterpret_cast<const char*>(shuffle_indices.data()),
+                 shuffle_indices.size() * sizeof(size_t));
+    if (!stream.good()) {
+      LOG(WARNING) << "failed to write GPT Dataset index cache " << cache_file_path;
+      stream.close();
+      std::remove(tmp_file_path.c_str());
+      return false;
+    }
+  }
+  if (std::rename(tmp_file_path.c_str(), cache_file_path.c_str()) != 0) {
+    std::remove(tmp_file_path.c_str());
+    return false;
+  }
+  return true;
+}
+
 const HashMap<char, size_t> MegatronGPTMMapDataset::kDTypeCode2Size = {
     {1, 1},  // DataType::kUInt8
     {2, 1},  // DataType::kInt8
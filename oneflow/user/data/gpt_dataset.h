@@ -17,6 +17,7 @@ limitations under the License.
 #define ONEFLOW_USER_DATA_GPT_DATASET_H_
 
 #include "oneflow/core/common/util.h"
+#include "oneflow/user/data/mapped_buffer.h"
 
 namespace oneflow {
 
@@ -45,19 +46,6 @@ class MegatronGPTIndex final {
   std::vector<int64_t> doc_offsets_;
 };
 
-class MappedBuffer final {
- public:
-  MappedBuffer(const std::string& filename);
-  ~MappedBuffer();
-
-  const void* ptr() const { return mapped_; }
-  size_t size() const { return size_; }
-
- private:
-  void* mapped_;
-  size_t size_;
-};
-
 class MegatronGPTMMapDataset final {
  public:
   MegatronGPTMMapDataset(const std::string& data_file_prefix, size_t seq_len, size_t label_len,
@@ -74,10 +62,17 @@ class MegatronGPTMMapDataset final {
 
   size_t GetEpochNumTokens(const std::vector<size_t>& doc_indices) const;
   void InitDocIndices(const std::vector<size_t>& epoch_doc_indices, size_t num_epochs,
-                      size_t num_complete_epochs);
-  void InitDocIndices(const std::vector<size_t>& doc_indices, size_t num_epochs);
-  void InitSampleIndices(size_t total_num_samples);
-  void InitShuffleIndices(size_t total_num_samples);
+                      size_t num_complete_epochs, std::vector<size_t>* doc_indices);
+  void InitDocIndices(const std::vector<size_t>& epoch_doc_indices, size_t num_epochs,
+                      std::vector<size_t>* doc_indices);
+  void InitSampleIndices(size_t total_num_samples, const std::vector<size_t>& doc_indices,
+                         std::vector<std::pair<size_t, size_t>>* sample_indices) const;
+  void InitShuffleIndices(size_t total_num_samples, std::vector<size_t>* shuffle_indices);
+  std::vector<uint64_t> GetIndexCacheKey() const;
+  bool LoadIndexCache(const std::string& cache_file_path);
+  bool SaveIndexCache(const std::string& cache_file_path, const std::vector<size_t>& doc_indices,
+                      const std::vector<std::pair<size_t, size_t>>& sample_indices,
+                      const std::vector<size_t>& shuffle_indices) const;
   template<typename T>
   void ReadTokens(const void* src, size_t offset, T* dst, size_t size) const;
 
@@ -96,9 +91,9 @@ class MegatronGPTMMapDataset final {
   size_t tokens_per_epoch_;
   size_t num_epochs_;
   size_t num_complete_epochs_;
-  std::vector<size_t> doc_indices_;
-  std::vector<std::pair<size_t, size_t>> sample_indices_;
-  std::vector<size_t> shuffle_indices_;
+  MappedArray<size_t> doc_indices_;
+  MappedArray<std::pair<size_t, size_t>> sample_indices_;
+  MappedArray<size_t> shuffle_indices_;
 };
 
 template<typename T>
@@ -0,0 +1,77 @@
+/*
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+*/
+#include "oneflow/user/data/mapped_buffer.h"
+
+#ifdef __linux__
+#include <fcntl.h>
+#include <stdio.h>
+#include <errno.h>
+#include <unistd.h>
+#include <sys/file.h>
+#include <sys/stat.h>
+#include <sys/mman.h>
+#endif
+
+namespace oneflow {
+
+namespace data {
+
+MappedBuffer::MappedBuffer(const std::string& filename) : mapped_(nullptr), size_(0) {
+#ifdef __linux__
+  int fd = open(filename.c_str(), O_RDONLY);
+  CHECK(fd != -1) << "open " << filename << " failed: " << strerror(errno);
+
+  struct stat s;
+  CHECK(fstat(fd, &s) != -1) << "stat " << filename << " failed: " << strerror(errno);
+  size_ = s.st_size;
+
+  mapped_ = mmap(nullptr, size_, PROT_READ, MAP_PRIVATE, fd, 0);
+  CHECK(mapped_ != MAP_FAILED) << "mmap " << filename << " failed: " << strerror(errno);
+
+  close(fd);
+#endif
+}
+
+MappedBuffer::~MappedBuffer() {
+#ifdef __linux__
+  CHECK(munmap(mapped_, size_) == 0) << "munmap failed";
+#endif
+}
+
+CacheBuildLock::CacheBuildLock(const std::string& cache_file_path) : fd_(-1) {
+#ifdef __linux__
+  fd_ = open((cache_file_path + ".lock").c_str(), O_RDWR | O_CREAT, 0644);
+  // without a writable location every process builds its cache in memory anyway
+  if (fd_ == -1) { return; }
+  if (flock(fd_, LOCK_EX) != 0) {
+    close(fd_);
+    fd_ = -1;
+  }
+#endif
+}
+
+CacheBuildLock::~CacheBuildLock() {
+#ifdef __linux__
+  if (fd_ != -1) {
+    flock(fd_, LOCK_UN);
+    close(fd_);
+  }
+#endif
+}
+
+}  // namespace data
+
+}  // namespace oneflow
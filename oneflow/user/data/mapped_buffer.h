@@ -0,0 +1,86 @@
+/*
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+*/
+#ifndef ONEFLOW_USER_DATA_MAPPED_BUFFER_H_
+#define ONEFLOW_USER_DATA_MAPPED_BUFFER_H_
+
+#include "oneflow/core/common/util.h"
+
+namespace oneflow {
+
+namespace data {
+
+class MappedBuffer final {
+ public:
+  MappedBuffer(const std::string& filename);
+  ~MappedBuffer();
+
+  const void* ptr() const { return mapped_; }
+  size_t size() const { return size_; }
+
+ private:
+  void* mapped_;
+  size_t size_;
+};
+
+// Holds an exclusive lock on <cache file>.lock, so that like Megatron only one process builds
+// a cache file on a cold start while the others wait and then map the saved cache
+class CacheBuildLock final {
+ public:
+  explicit CacheBuildLock(const std::string& cache_file_path);
+  OF_DISALLOW_COPY_AND_MOVE(CacheBuildLock);
+  ~CacheBuildLock();
+
+ private:
+  int fd_;
+};
+
+// A read-only array which is either built in memory or mapped from a cache file
+template<typename T>
+class MappedArray final {
+ public:
+  MappedArray() : data_(nullptr), size_(0) {}
+  OF_DISALLOW_COPY_AND_MOVE(MappedArray);
+  ~MappedArray() = default;
+
+  void Reset(std::vector<T>&& vec) {
+    mapped_.reset();
+    vec_ = std::move(vec);
+    data_ = vec_.data();
+    size_ = vec_.size();
+  }
+  void Reset(const std::shared_ptr<const MappedBuffer>& mapped, size_t offset, size_t size) {
+    vec_ = std::vector<T>();
+    mapped_ = mapped;
+    data_ = reinterpret_cast<const T*>(static_cast<const char*>(mapped->ptr()) + offset);
+    size_ = size;
+  }
+
+  size_t size() const { return size_; }
+  const T* data() const { return data_; }
+  const T& operator[](size_t i) const { return data_[i]; }
+
+ private:
+  std::vector<T> vec_;
+  std::shared_ptr<const MappedBuffer> mapped_;
+  const T* data_;
+  size_t size_;
+};
+
+}  // namespace data
+
+}  // namespace oneflow
+
+#endif  // ONEFLOW_USER_DATA_MAPPED_BUFFER_H_
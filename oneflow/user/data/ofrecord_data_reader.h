@@ -18,6 +18,7 @@ limitations under the License.
 
 #include "oneflow/user/data/data_reader.h"
 #include "oneflow/user/data/ofrecord_dataset.h"
+#include "oneflow/user/data/ofrecord_indexed_dataset.h"
 #include "oneflow/user/data/ofrecord_parser.h"
 #include "oneflow/user/data/random_shuffle_dataset.h"
 #include "oneflow/user/data/batch_dataset.h"
@@ -30,8 +31,15 @@ class OFRecordDataReader final : public DataReader<TensorBuffer> {
   OFRecordDataReader(user_op::KernelInitContext* ctx) : DataReader<TensorBuffer>(ctx) {
     batch_size_ = ctx->TensorDesc4ArgNameAndIndex("out", 0)->shape().elem_cnt();
     if (auto* pool = TensorBufferPool::TryGet()) { pool->IncreasePoolSizeByBase(batch_size_); }
-    loader_.reset(new OFRecordDataset(ctx));
-    if (ctx->Attr<bool>("random_shuffle")) {
+    if (ctx->Attr<bool>("use_index")) {
+      // shuffling is done globally by the indexed dataset, no shuffle buffer is needed
+      loader_.reset(new OFRecordIndexedDataset(ctx));
+    } else {
+      CHECK_EQ(ctx->Attr<int64_t>("start_sample_offset"), 0)
+          << "start_sample_offset is only supported when use_index is true";
+      loader_.reset(new OFRecordDataset(ctx));
+    }
+    if (ctx->Attr<bool>("random_shuffle") && !ctx->Attr<bool>("use_index")) {
       loader_.reset(new RandomShuffleDataset<TensorBuffer>(ctx, std::move(loader_)));
     }
     loader_.reset(new BatchDataset<TensorBuffer>(batch_size_, std::move(loader_)));
@@ -28,6 +28,45 @@ limitations under the License.
 namespace oneflow {
 namespace data {
 
+inline std::vector<std::string> GetOFRecordPartFilePaths(user_op::KernelInitContext* ctx) {
+  int32_t data_part_num = ctx->Attr<int32_t>("data_part_num");
+  std::string data_dir = ctx->Attr<std::string>("data_dir");
+  std::string part_name_prefix = ctx->Attr<std::string>("part_name_prefix");
+  int32_t part_name_suffix_length = ctx->Attr<int32_t>("part_name_suffix_length");
+
+  std::vector<std::string> data_file_paths;
+  for (int i = 0; i < data_part_num; ++i) {
+    std::string num = std::to_string(i);
+    int32_t zero_count = std::max(part_name_suffix_length - static_cast<int32_t>(num.length()), 0);
+    data_file_paths.emplace_back(
+        JoinPath(data_dir, part_name_prefix + std::string(zero_count, '0') + num));
+  }
+  return data_file_paths;
+}
+
+inline void GetOFRecordParallelIdAndNum(user_op::KernelInitContext* ctx, int32_t* parallel_id,
+                                        int32_t* parallel_num) {
+  bool is_local = false;
+  // NOTE(zwx): OFRecordDataset is used by OFRecordDataReader and
+  // OFRecordImageClassificationDataReader both, the latter has no attr nd_sbp,
+  // so it couldn't work in DDP for now. The If condition here could be removed when
+  // OFRecordImageClassificationDataReader had supported DDP (add attr nd_sbp)
+  // or been deprecated.
+  if (ctx->op_type_name() == "OFRecordReader") {
+    auto nd_sbp_str_vec = ctx->Attr<std::vector<std::string>>("nd_sbp");
+    // NOTE(zwx): OFRecordDataset is not consistent since attr nd_sbp is empty,
+    // we assume that it works in DDP
+    if (nd_sbp_str_vec.empty()) { is_local = true; }
+  }
+  if (is_local) {
+    *parallel_id = GlobalProcessCtx::Rank();
+    *parallel_num = GlobalProcessCtx::WorldSize();
+  } else {
+    *parallel_id = ctx->parallel_ctx().parallel_id();
+    *parallel_num = ctx->parallel_ctx().parallel_num();
+  }
+}
+
 class OFRecordDataset final : public Dataset<TensorBuffer> {
  public:
   using Base = Dataset<TensorBuffer>;
@@ -42,37 +81,8 @@ class OFRecordDataset final : public Dataset<TensorBuffer> {
 
     // in stream
     data_part_num_ = ctx->Attr<int32_t>("data_part_num");
-    std::string data_dir = ctx->Attr<std::string>("data_dir");
-    std::string part_name_prefix = ctx->Attr<std::string>("part_name_prefix");
-    int32_t part_name_suffix_length = ctx->Attr<int32_t>("part_name_suffix_length");
-
-    for (int i = 0; i < data_part_num_; ++i) {
-      std::string num = std::to_string(i);
-      int32_t zero_count =
-          std::max(part_name_suffix_length - static_cast<int32_t>(num.length()), 0);
-      data_file_paths_.emplace_back(
-          JoinPath(data_dir, part_name_prefix + std::string(zero_count, '0') + num));
-    }
-
-    bool is_local = false;
-    // NOTE(zwx): OFRecordDataset is used by OFRecordDataReader and
-    // OFRecordImageClassificationDataReader both, the latter has no attr nd_sbp,
-    // so it couldn't work in DDP for now. The If condition here could be removed when
-    // OFRecordImageClassificationDataReader had supported DDP (add attr nd_sbp)
-    // or been deprecated.
-    if (ctx->op_type_name() == "OFRecordReader") {
-      auto nd_sbp_str_vec = ctx->Attr<std::vector<std::string>>("nd_sbp");
-      // NOTE(zwx): OFRecordDataset is not consistent since attr nd_sbp is empty,
-      // we assume that it works in DDP
-      if (nd_sbp_str_vec.empty()) { is_local = true; }
-    }
-    if (is_local) {
-      parallel_id_ = GlobalProcessCtx::Rank();
-      parallel_num_ = GlobalProcessCtx::WorldSize();
-    } else {
-      parallel_id_ = ctx->parallel_ctx().parallel_id();
-      parallel_num_ = ctx->parallel_ctx().parallel_num();
-    }
+    data_file_paths_ = GetOFRecordPartFilePaths(ctx);
+    GetOFRecordParallelIdAndNum(ctx, &parallel_id_, &parallel_num_);
     CHECK_LE(parallel_num_, data_part_num_);
     BalancedSplitter bs(data_part_num_, parallel_num_);
     range_ = bs.At(parallel_id_);
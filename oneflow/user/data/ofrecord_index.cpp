@@ -0,0 +1,92 @@
+/*
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+*/
+#include "oneflow/user/data/ofrecord_index.h"
+#include "oneflow/core/persistence/file_system.h"
+
+namespace oneflow {
+namespace data {
+
+constexpr char OFRecordIndex::kMagicCode[];
+
+OFRecordIndex::OFRecordIndex(const std::string& data_file_path) {
+  auto start = std::chrono::system_clock::now();
+  const uint64_t data_file_size = DataFS()->GetFileSize(data_file_path);
+  const std::string index_file_path = IndexFilePath(data_file_path);
+  bool loaded = false;
+  if (DataFS()->FileExists(index_file_path)) {
+    loaded = TryLoad(index_file_path, data_file_size);
+    if (!loaded) {
+      LOG(WARNING) << "OFRecord index file " << index_file_path
+                   << " does not match its part file and will be ignored";
+    }
+  }
+  if (!loaded) { Build(data_file_path, data_file_size); }
+  std::chrono::duration<double, std::milli> elapse = std::chrono::system_clock::now() - start;
+  VLOG(2) << (loaded ? "Load" : "Build") << " OFRecord index successed, file_path: "
+          << data_file_path << ", number of records: " << this->num_records()
+          << ", elapsed time: " << elapse.count() << " ms";
+}
+
+bool OFRecordIndex::TryLoad(const std::string& index_file_path, uint64_t data_file_size) {
+  const uint64_t header_size = kMagicCodeLen + 2 * sizeof(uint64_t);
+  const uint64_t index_file_size = DataFS()->GetFileSize(index_file_path);
+  if (index_file_size < header_size) { return false; }
+  std::unique_ptr<fs::RandomAccessFile> file;
+  DataFS()->NewRandomAccessFile(index_file_path, &file);
+  std::vector<char> header(header_size);
+  file->Read(0, header_size, header.data());
+  // verify magic code and version
+  if (std::memcmp(header.data(), kMagicCode, kMagicCodeLen) != 0) { return false; }
+  uint64_t version = 0;
+  std::memcpy(&version, header.data() + kMagicCodeLen, sizeof(version));
+  if (version != kVersion) { return false; }
+  uint64_t num_records = 0;
+  std::memcpy(&num_records, header.data() + kMagicCodeLen + sizeof(version), sizeof(num_records));
+  if (index_file_size != header_size + (num_records + 1) * sizeof(int64_t)) { return false; }
+  // read offsets
+  offsets_.resize(num_records + 1);
+  file->Read(header_size, offsets_.size() * sizeof(int64_t),
+             reinterpret_cast<char*>(offsets_.data()));
+  // a stale index (e.g. the part file has been rewritten) must not be used
+  if (offsets_.front() != 0 || offsets_.back() != static_cast<int64_t>(data_file_size)) {
+    offsets_.clear();
+    return false;
+  }
+  return true;
+}
+
+void OFRecordIndex::Build(const std::string& data_file_path, uint64_t data_file_size) {
+  std::unique_ptr<fs::RandomAccessFile> file;
+  DataFS()->NewRandomAccessFile(data_file_path, &file);
+  offsets_.clear();
+  int64_t offset = 0;
+  while (offset < static_cast<int64_t>(data_file_size)) {
+    CHECK_LE(offset + sizeof(int64_t), data_file_size)
+        << "truncated OFRecord size header in " << data_file_path << " at offset " << offset;
+    int64_t record_size = -1;
+    file->Read(offset, sizeof(int64_t), reinterpret_cast<char*>(&record_size));
+    CHECK_GT(record_size, 0) << "invalid OFRecord size in " << data_file_path << " at offset "
+                             << offset;
+    offsets_.push_back(offset);
+    offset += sizeof(int64_t) + record_size;
+  }
+  CHECK_EQ(offset, static_cast<int64_t>(data_file_size))
+      << "truncated OFRecord in " << data_file_path;
+  offsets_.push_back(offset);
+}
+
+}  // namespace data
+}  // namespace oneflow
@@ -0,0 +1,62 @@
+/*
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+*/
+#ifndef ONEFLOW_USER_DATA_OFRECORD_INDEX_H_
+#define ONEFLOW_USER_DATA_OFRECORD_INDEX_H_
+
+#include "oneflow/core/common/util.h"
+
+namespace oneflow {
+namespace data {
+
+// Per-record byte offsets of an OFRecord part file.
+//
+// The index of `part-00000` is stored next to it as `part-00000.idx`:
+//   magic code (8 bytes) | version (uint64) | num_records (uint64) | offsets (int64 x N + 1)
+// Record i occupies [offsets[i], offsets[i + 1]) of the part file, including its int64 size
+// header, and offsets[num_records] equals the size of the part file. When the index file is
+// missing or does not match the part file, the offsets are rebuilt in memory by scanning the
+// size headers of the part file.
+class OFRecordIndex final {
+ public:
+  OF_DISALLOW_COPY_AND_MOVE(OFRecordIndex);
+  explicit OFRecordIndex(const std::string& data_file_path);
+  ~OFRecordIndex() = default;
+
+  static constexpr char kMagicCode[] = "OFRIDX\x00\x00";
+  static constexpr size_t kMagicCodeLen = sizeof(kMagicCode) - 1;
+  static constexpr uint64_t kVersion = 1;
+
+  static std::string IndexFilePath(const std::string& data_file_path) {
+    return data_file_path + ".idx";
+  }
+
+  size_t num_records() const { return offsets_.size() - 1; }
+  int64_t record_offset(size_t record_index) const { return offsets_.at(record_index); }
+  int64_t record_size(size_t record_index) const {
+    return offsets_.at(record_index + 1) - offsets_.at(record_index);
+  }
+
+ private:
+  bool TryLoad(const std::string& index_file_path, uint64_t data_file_size);
+  void Build(const std::string& data_file_path, uint64_t data_file_size);
+
+  std::vector<int64_t> offsets_;
+};
+
+}  // namespace data
+}  // namespace oneflow
+
+#endif  // ONEFLOW_USER_DATA_OFRECORD_INDEX_H_
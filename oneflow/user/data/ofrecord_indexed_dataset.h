@@ -0,0 +1,141 @@
+/*
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+*/
+#ifndef ONEFLOW_USER_DATA_OFRECORD_INDEXED_DATASET_H_
+#define ONEFLOW_USER_DATA_OFRECORD_INDEXED_DATASET_H_
+
+#include "oneflow/core/framework/op_kernel.h"
+#include "oneflow/core/persistence/file_system.h"
+#include "oneflow/user/data/dataset.h"
+#include "oneflow/user/data/ofrecord_dataset.h"
+#include "oneflow/user/data/ofrecord_index.h"
+
+namespace oneflow {
+namespace data {
+
+// Reads OFRecords by index instead of streaming part files.
+//
+// Every epoch visits each record of all part files exactly once in a global order, which is a
+// permutation of all records (seeded by `seed` + epoch) when shuffling is on. Rank r reads
+// positions r, r + parallel_num, r + 2 * parallel_num, ... of that order, and an epoch is padded
+// by wrapping around so that every rank reads the same number of records.
+//
+// `start_sample_offset` is the number of records already read by all ranks since the start of
+// the first epoch, which allows resuming in the middle of an epoch.
+class OFRecordIndexedDataset final : public Dataset<TensorBuffer> {
+ public:
+  using Base = Dataset<TensorBuffer>;
+  using SampleType = typename Base::SampleType;
+  using BatchType = typename Base::BatchType;
+
+  OF_DISALLOW_COPY_AND_MOVE(OFRecordIndexedDataset);
+
+  OFRecordIndexedDataset(user_op::KernelInitContext* ctx) {
+    random_shuffle_ = ctx->Attr<bool>("random_shuffle");
+    shuffle_after_epoch_ = ctx->Attr<bool>("shuffle_after_epoch");
+    // NOTE: all ranks must agree on the permutation, so a fixed seed is used by default
+    seed_ = ctx->Attr<int64_t>("seed");
+    if (seed_ == -1) { seed_ = kOneflowDatasetSeed; }
+
+    std::vector<std::string> data_file_paths = GetOFRecordPartFilePaths(ctx);
+    record_index_offsets_.push_back(0);
+    for (const auto& data_file_path : data_file_paths) {
+      indices_.emplace_back(new OFRecordIndex(data_file_path));
+      files_.emplace_back();
+      DataFS()->NewRandomAccessFile(data_file_path, &files_.back());
+      record_index_offsets_.push_back(record_index_offsets_.back()
+                                      + indices_.back()->num_records());
+    }
+    num_records_ = record_index_offsets_.back();
+    CHECK_GT(num_records_, 0) << "no OFRecord found in " << ctx->Attr<std::string>("data_dir");
+
+    GetOFRecordParallelIdAndNum(ctx, &parallel_id_, &parallel_num_);
+    num_records_per_rank_ = RoundUp(num_records_, parallel_num_) / parallel_num_;
+
+    const int64_t start_sample_offset = ctx->Attr<int64_t>("start_sample_offset");
+    CHECK_GE(start_sample_offset, 0);
+    CHECK_EQ(start_sample_offset % parallel_num_, 0)
+        << "start_sample_offset must be a multiple of the number of ranks (" << parallel_num_
+        << ")";
+    const int64_t num_records_per_epoch = num_records_per_rank_ * parallel_num_;
+    current_epoch_ = start_sample_offset / num_records_per_epoch;
+    current_pos_ = (start_sample_offset % num_records_per_epoch) / parallel_num_;
+    InitEpochOrder();
+  }
+  ~OFRecordIndexedDataset() = default;
+
+  BatchType Next() override {
+    if (current_pos_ >= num_records_per_rank_) {
+      current_epoch_ += 1;
+      current_pos_ = 0;
+      InitEpochOrder();
+    }
+    int64_t pos = (current_pos_ * parallel_num_ + parallel_id_) % num_records_;
+    current_pos_ += 1;
+    BatchType batch;
+    batch.push_back(TensorBuffer());
+    ReadRecord(epoch_order_.empty() ? pos : epoch_order_[pos], batch.back());
+    return batch;
+  }
+
+ private:
+  void InitEpochOrder() {
+    const bool shuffle = random_shuffle_ || (shuffle_after_epoch_ && current_epoch_ > 0);
+    if (!shuffle) {
+      epoch_order_.clear();
+      return;
+    }
+    epoch_order_.resize(num_records_);
+    std::iota(epoch_order_.begin(), epoch_order_.end(), 0);
+    std::mt19937_64 gen(seed_ + current_epoch_);
+    std::shuffle(epoch_order_.begin(), epoch_order_.end(), gen);
+  }
+
+  void ReadRecord(int64_t record_index, TensorBuffer& tensor) {
+    auto it = std::upper_bound(record_index_offsets_.cbegin(), record_index_offsets_.cend(),
+                               record_index);
+    const size_t part = std::distance(record_index_offsets_.cbegin(), it) - 1;
+    const size_t index_in_part = record_index - record_index_offsets_.at(part);
+    const auto& index = indices_.at(part);
+    // skip the int64 size header in front of the record
+    const int64_t offset = index->record_offset(index_in_part) + sizeof(int64_t);
+    const int64_t size = index->record_size(index_in_part) - sizeof(int64_t);
+    CHECK_GT(size, 0);
+    tensor.Resize(Shape({size}), DataType::kChar);
+    files_.at(part)->Read(offset, size, tensor.mut_data<char>());
+  }
+
+  bool random_shuffle_;
+  bool shuffle_after_epoch_;
+  int64_t seed_;
+
+  std::vector<std::unique_ptr<const OFRecordIndex>> indices_;
+  std::vector<std::unique_ptr<fs::RandomAccessFile>> files_;
+  std::vector<int64_t> record_index_offsets_;
+  int64_t num_records_;
+
+  int32_t parallel_id_;
+  int32_t parallel_num_;
+  int64_t num_records_per_rank_;
+
+  int64_t current_epoch_;
+  int64_t current_pos_;
+  std::vector<int64_t> epoch_order_;
+};
+
+}  // namespace data
+}  // namespace oneflow
+
+#endif  // ONEFLOW_USER_DATA_OFRECORD_INDEXED_DATASET_H_
@@ -35,10 +35,27 @@ class LibjpegCtx {
   struct jpeg_decompress_struct* compress_info_;
 };
 
-bool JpegPartialDecodeRandomCropImage(const unsigned char* data, size_t length,
-                                      RandomCropGenerator* random_crop_gen,
-                                      unsigned char* workspace, size_t workspace_size,
-                                      cv::Mat* out_mat) {
+namespace {
+
+// Smallest scale n / 8 (the ones libjpeg supports) that keeps a crop of crop_w x crop_h at least
+// min_width x min_height, so that downscaling is done in the DCT domain while decoding.
+int GetJpegScaleNum(unsigned int crop_w, unsigned int crop_h, int min_width, int min_height) {
+  constexpr int kScaleDenom = 8;
+  if (min_width <= 0 || min_height <= 0) { return kScaleDenom; }
+  for (int scale_num = 1; scale_num < kScaleDenom; ++scale_num) {
+    if (static_cast<int64_t>(crop_w) * scale_num >= static_cast<int64_t>(min_width) * kScaleDenom
+        && static_cast<int64_t>(crop_h) * scale_num
+               >= static_cast<int64_t>(min_height) * kScaleDenom) {
+      return scale_num;
+    }
+  }
+  return kScaleDenom;
+}
+
+bool JpegPartialDecodeRandomCropImageImpl(const unsigned char* data, size_t length,
+                                          RandomCropGenerator* random_crop_gen,
+                                          unsigned char* workspace, size_t workspace_size,
+                                          int min_width, int min_height, cv::Mat* out_mat) {
   struct jpeg_decompress_struct compress_info {};
   struct jpeg_error_mgr jpeg_err {};
   compress_info.err = jpeg_std_error(&jpeg_err);
@@ -53,20 +70,37 @@ bool JpegPartialDecodeRandomCropImage(const unsigned char* data, size_t length,
   int rc = jpeg_read_header(ctx_guard.compress_info(), TRUE);
   if (rc != JPEG_HEADER_OK) { return false; }
 
-  jpeg_start_decompress(ctx_guard.compress_info());
-  int width = ctx_guard.compress_info()->output_width;
-  int height = ctx_guard.compress_info()->output_height;
-  int pixel_size = ctx_guard.compress_info()->output_components;
-
-  unsigned int u_crop_x = 0, u_crop_y = 0, u_crop_w = width, u_crop_h = height;
+  const int image_width = ctx_guard.compress_info()->image_width;
+  const int image_height = ctx_guard.compress_info()->image_height;
+  unsigned int u_crop_x = 0, u_crop_y = 0, u_crop_w = image_width, u_crop_h = image_height;
   if (random_crop_gen) {
     CropWindow crop;
-    random_crop_gen->GenerateCropWindow({height, width}, &crop);
+    random_crop_gen->GenerateCropWindow({image_height, image_width}, &crop);
     u_crop_y = crop.anchor.At(0);
     u_crop_x = crop.anchor.At(1);
     u_crop_h = crop.shape.At(0);
     u_crop_w = crop.shape.At(1);
   }
+  const int scale_num = GetJpegScaleNum(u_crop_w, u_crop_h, min_width, min_height);
+  ctx_guard.compress_info()->scale_num = scale_num;
+  ctx_guard.compress_info()->scale_denom = 8;
+
+  jpeg_start_decompress(ctx_guard.compress_info());
+  int width = ctx_guard.compress_info()->output_width;
+  int height = ctx_guard.compress_info()->output_height;
+  int pixel_size = ctx_guard.compress_info()->output_components;
+
+  if (scale_num != 8) {
+    // map the crop window to the downscaled image
+    const unsigned int crop_x_end = std::min<unsigned int>(
+        width, (static_cast<uint64_t>(u_crop_x + u_crop_w) * scale_num + 7) / 8);
+    const unsigned int crop_y_end = std::min<unsigned int>(
+        height, (static_cast<uint64_t>(u_crop_y + u_crop_h) * scale_num + 7) / 8);
+    u_crop_x = static_cast<uint64_t>(u_crop_x) * scale_num / 8;
+    u_crop_y = static_cast<uint64_t>(u_crop_y) * scale_num / 8;
+    u_crop_w = crop_x_end - u_crop_x;
+    u_crop_h = crop_y_end - u_crop_y;
+  }
 
   unsigned int tmp_w = u_crop_w;
   jpeg_crop_scanline(ctx_guard.compress_info(), &u_crop_x, &tmp_w);
@@ -101,6 +135,23 @@ bool JpegPartialDecodeRandomCropImage(const unsigned char* data, size_t length,
   return true;
 }
 
+}  // namespace
+
+bool JpegPartialDecodeRandomCropImage(const unsigned char* data, size_t length,
+                                      RandomCropGenerator* random_crop_gen,
+                                      unsigned char* workspace, size_t workspace_size,
+                                      cv::Mat* out_mat) {
+  return JpegPartialDecodeRandomCropImageImpl(data, length, random_crop_gen, workspace,
+                                              workspace_size, 0, 0, out_mat);
+}
+
+bool JpegPartialDecodeRandomCropScaledImage(const unsigned char* data, size_t length,
+                                            RandomCropGenerator* random_crop_gen, int min_width,
+                                            int min_height, cv::Mat* out_mat) {
+  return JpegPartialDecodeRandomCropImageImpl(data, length, random_crop_gen, nullptr, 0,
+                                              min_width, min_height, out_mat);
+}
+
 void OpenCvPartialDecodeRandomCropImage(const unsigned char* data, size_t length,
                                         RandomCropGenerator* random_crop_gen,
                                         const std::string& color_space, cv::Mat& out_mat) {
@@ -27,6 +27,12 @@ bool JpegPartialDecodeRandomCropImage(const unsigned char* data, size_t length,
                                       unsigned char* workspace, size_t workspace_size,
                                       cv::Mat* out_mat);
 
+// Like JpegPartialDecodeRandomCropImage, but lets libjpeg downscale by n / 8 in the DCT domain
+// as long as the cropped image stays at least min_width x min_height.
+bool JpegPartialDecodeRandomCropScaledImage(const unsigned char* data, size_t length,
+                                            RandomCropGenerator* random_crop_gen, int min_width,
+                                            int min_height, cv::Mat* out_mat);
+
 void OpenCvPartialDecodeRandomCropImage(const unsigned char* data, size_t length,
                                         RandomCropGenerator* random_crop_gen,
                                         const std::string& color_space, cv::Mat& out_mat);
@@ -0,0 +1,90 @@
+/*
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+*/
+#include "oneflow/core/framework/framework.h"
+
+namespace oneflow {
+
+template<typename K, typename V, typename IDX>
+class CpuUniqueKeyValuePairKernel final : public user_op::OpKernel {
+ public:
+  CpuUniqueKeyValuePairKernel() = default;
+  ~CpuUniqueKeyValuePairKernel() override = default;
+
+ private:
+  using user_op::OpKernel::Compute;
+
+  void Compute(user_op::KernelComputeContext* ctx) const override {
+    const user_op::Tensor* keys = ctx->Tensor4ArgNameAndIndex("keys", 0);
+    user_op::Tensor* num_unique = ctx->Tensor4ArgNameAndIndex("num_unique", 0);
+    user_op::Tensor* unique_keys = ctx->Tensor4ArgNameAndIndex("unique_keys", 0);
+    user_op::Tensor* unique_values = ctx->Tensor4ArgNameAndIndex("unique_values", 0);
+    user_op::Tensor* inverse_indices = ctx->Tensor4ArgNameAndIndex("inverse_indices", 0);
+    const int32_t num_tables = ctx->Attr<int32_t>("num_tables");
+    const V* values_ptr = nullptr;
+    if (ctx->has_input("values", 0)) {
+      values_ptr = reinterpret_cast<const V*>(ctx->Tensor4ArgNameAndIndex("values", 0)->dptr());
+    }
+    const int64_t num_keys = keys->shape().elem_cnt();
+    const K* keys_ptr = reinterpret_cast<const K*>(keys->dptr());
+    K* unique_keys_ptr = reinterpret_cast<K*>(unique_keys->mut_dptr());
+    V* unique_values_ptr = reinterpret_cast<V*>(unique_values->mut_dptr());
+    IDX* inverse_indices_ptr = reinterpret_cast<IDX*>(inverse_indices->mut_dptr());
+    // The unique keys keep the order of their first occurrence, the value of a key is the one that
+    // comes with its first occurrence, same as what the cuda kernel keeps in its hash table.
+    HashMap<K, IDX> key2index;
+    key2index.reserve(num_keys);
+    IDX unique_count = 0;
+    for (int64_t i = 0; i < num_keys; ++i) {
+      const K key = keys_ptr[i];
+      auto it = key2index.emplace(key, unique_count);
+      if (it.second) {
+        unique_keys_ptr[unique_count] = key;
+        unique_values_ptr[unique_count] =
+            values_ptr != nullptr ? values_ptr[i] : static_cast<V>(i % num_tables);
+        unique_count += 1;
+      }
+      inverse_indices_ptr[i] = it.first->second;
+    }
+    *reinterpret_cast<IDX*>(num_unique->mut_dptr()) = unique_count;
+  }
+  bool AlwaysComputeWhenAllOutputsEmpty() const override { return false; }
+};
+
+#define ID_DATA_TYPE_SEQ                            \
+  OF_PP_MAKE_TUPLE_SEQ(uint32_t, DataType::kUInt32) \
+  OF_PP_MAKE_TUPLE_SEQ(uint64_t, DataType::kUInt64) \
+  OF_PP_MAKE_TUPLE_SEQ(int32_t, DataType::kInt32)   \
+  OF_PP_MAKE_TUPLE_SEQ(int64_t, DataType::kInt64)
+
+#define IDX_DATA_TYPE_SEQ                           \
+  OF_PP_MAKE_TUPLE_SEQ(uint32_t, DataType::kUInt32) \
+  OF_PP_MAKE_TUPLE_SEQ(int32_t, DataType::kInt32)
+
+#define REGISTER_CPU_UNIQUE_KEY_VALUE_PAIR_KERNEL(k_dtype_pair, value_dtype_pair, idx_dtype_pair) \
+  REGISTER_USER_KERNEL("unique_key_value_pair")                                                   \
+      .SetCreateFn<CpuUniqueKeyValuePairKernel<OF_PP_PAIR_FIRST(k_dtype_pair),                    \
+                                               OF_PP_PAIR_FIRST(value_dtype_pair),                \
+                                               OF_PP_PAIR_FIRST(idx_dtype_pair)>>()               \
+      .SetIsMatchedHob(                                                                           \
+          (user_op::HobDeviceType() == DeviceType::kCPU)                                          \
+          && (user_op::HobDataType("keys", 0) == OF_PP_PAIR_SECOND(k_dtype_pair))                 \
+          && (user_op::HobDataType("inverse_indices", 0) == OF_PP_PAIR_SECOND(idx_dtype_pair))    \
+          && (user_op::HobDataType("unique_values", 0) == OF_PP_PAIR_SECOND(value_dtype_pair)));
+
+OF_PP_SEQ_PRODUCT_FOR_EACH_TUPLE(REGISTER_CPU_UNIQUE_KEY_VALUE_PAIR_KERNEL, ID_DATA_TYPE_SEQ,
+                                 ID_DATA_TYPE_SEQ, IDX_DATA_TYPE_SEQ)
+
+}  // namespace oneflow
@@ -280,4 +280,132 @@ REGISTER_USER_KERNEL("ofrecord_image_decoder")
                      && (user_op::HobDataType("in", 0) == DataType::kOFRecord)
                      && (user_op::HobDataType("out", 0) == DataType::kTensorBuffer));
 
+namespace {
+
+class DecodeRandomCropResizeNormalizeKernelState final : public user_op::OpKernelState {
+ public:
+  explicit DecodeRandomCropResizeNormalizeKernelState(user_op::KernelInitContext* ctx) {
+    const size_t channels = ImageUtil::IsColor(ctx->Attr<std::string>("color_space")) ? 3 : 1;
+    mean_vec_ = ctx->Attr<std::vector<float>>("mean");
+    for (float elem : ctx->Attr<std::vector<float>>("std")) {
+      inv_std_vec_.emplace_back(1.0f / elem);
+    }
+    if (mean_vec_.size() == 1) { mean_vec_.resize(channels, mean_vec_.at(0)); }
+    if (inv_std_vec_.size() == 1) { inv_std_vec_.resize(channels, inv_std_vec_.at(0)); }
+    CHECK_EQ(mean_vec_.size(), channels);
+    CHECK_EQ(inv_std_vec_.size(), channels);
+    if (ctx->Attr<bool>("random_crop")) {
+      random_crop_state_ = CreateRandomCropKernelState(ctx, "in");
+    }
+  }
+  ~DecodeRandomCropResizeNormalizeKernelState() override = default;
+
+  const std::vector<float>& mean_vec() const { return mean_vec_; }
+  const std::vector<float>& inv_std_vec() const { return inv_std_vec_; }
+  RandomCropGenerator* GetGenerator(int32_t idx) {
+    return random_crop_state_ ? random_crop_state_->GetGenerator(idx) : nullptr;
+  }
+
+ private:
+  std::vector<float> mean_vec_;
+  std::vector<float> inv_std_vec_;
+  std::shared_ptr<RandomCropKernelState> random_crop_state_;
+};
+
+void DecodeAndRandomCropImage(const OFRecord& record, const std::string& name,
+                              const std::string& color_space, RandomCropGenerator* random_crop_gen,
+                              int min_width, int min_height, cv::Mat* image) {
+  CHECK(record.feature().find(name) != record.feature().end()) << "Field " << name << " not found";
+  const Feature& feature = record.feature().at(name);
+  CHECK(feature.has_bytes_list());
+  CHECK(feature.bytes_list().value_size() == 1);
+  const std::string& src_data = feature.bytes_list().value(0);
+  const auto* data = reinterpret_cast<const unsigned char*>(src_data.data());
+  // libjpeg decodes to RGB only, so gray images are left to OpenCV
+  if (ImageUtil::IsColor(color_space)
+      && JpegPartialDecodeRandomCropScaledImage(data, src_data.size(), random_crop_gen,
+                                                min_width, min_height, image)) {
+    if (color_space != "RGB") { ImageUtil::ConvertColor("RGB", *image, color_space, *image); }
+  } else {
+    OpenCvPartialDecodeRandomCropImage(data, src_data.size(), random_crop_gen, color_space,
+                                       *image);
+    if (ImageUtil::IsColor(color_space) && color_space != "BGR") {
+      ImageUtil::ConvertColor("BGR", *image, color_space, *image);
+    }
+  }
+}
+
+void NormalizeImage(const cv::Mat& image, bool nchw, const std::vector<float>& mean_vec,
+                    const std::vector<float>& inv_std_vec, float* out_dptr) {
+  CHECK(image.isContinuous());
+  const int64_t HW = static_cast<int64_t>(image.rows) * image.cols;
+  const int64_t C = image.channels();
+  const uint8_t* in_dptr = image.ptr<uint8_t>();
+  for (int64_t i = 0; i < HW; ++i) {
+    for (int64_t c = 0; c < C; ++c) {
+      const int64_t out_offset = nchw ? c * HW + i : i * C + c;
+      out_dptr[out_offset] =
+          (static_cast<float>(in_dptr[i * C + c]) - mean_vec[c]) * inv_std_vec[c];
+    }
+  }
+}
+
+}  // namespace
+
+class OFRecordImageDecoderRandomCropResizeNormalizeKernel final : public user_op::OpKernel {
+ public:
+  OFRecordImageDecoderRandomCropResizeNormalizeKernel() = default;
+  ~OFRecordImageDecoderRandomCropResizeNormalizeKernel() override = default;
+
+  std::shared_ptr<user_op::OpKernelState> CreateOpKernelState(
+      user_op::KernelInitContext* ctx) const override {
+    return std::make_shared<DecodeRandomCropResizeNormalizeKernelState>(ctx);
+  }
+
+ private:
+  void Compute(user_op::KernelComputeContext* ctx, user_op::OpKernelState* state,
+               const user_op::OpKernelCache*) const override {
+    auto* kernel_state = dynamic_cast<DecodeRandomCropResizeNormalizeKernelState*>(state);
+    CHECK_NOTNULL(kernel_state);
+    const user_op::Tensor* in_blob = ctx->Tensor4ArgNameAndIndex("in", 0);
+    user_op::Tensor* out_blob = ctx->Tensor4ArgNameAndIndex("out", 0);
+    const int64_t record_num = in_blob->shape().At(0);
+    CHECK(record_num > 0);
+    CHECK_EQ(out_blob->shape().At(0), record_num);
+    const OFRecord* records = in_blob->dptr<OFRecord>();
+    float* out_dptr = out_blob->mut_dptr<float>();
+    const int64_t out_image_elem_cnt = out_blob->shape().Count(1);
+    const std::string& name = ctx->Attr<std::string>("name");
+    const std::string& color_space = ctx->Attr<std::string>("color_space");
+    const std::string& interp_type = ctx->Attr<std::string>("interpolation_type");
+    const bool nchw = ctx->Attr<std::string>("output_layout") == "NCHW";
+    const int target_width = ctx->Attr<int64_t>("target_width");
+    const int target_height = ctx->Attr<int64_t>("target_height");
+
+    MultiThreadLoop(record_num, [&](size_t i) {
+      cv::Mat image;
+      // decoding downscales in the DCT domain as long as the crop stays >= the target size
+      DecodeAndRandomCropImage(*(records + i), name, color_space, kernel_state->GetGenerator(i),
+                               target_width, target_height, &image);
+      if (image.cols != target_width || image.rows != target_height) {
+        int interp_flag = GetCvInterpolationFlag(interp_type, image.cols, image.rows,
+                                                 target_width, target_height);
+        cv::Mat resized;
+        cv::resize(image, resized, cv::Size(target_width, target_height), 0, 0, interp_flag);
+        image = resized;
+      }
+      CHECK_EQ(static_cast<int64_t>(image.total() * image.channels()), out_image_elem_cnt);
+      NormalizeImage(image, nchw, kernel_state->mean_vec(), kernel_state->inv_std_vec(),
+                     out_dptr + i * out_image_elem_cnt);
+    });
+  }
+  bool AlwaysComputeWhenAllOutputsEmpty() const override { return false; }
+};
+
+REGISTER_USER_KERNEL("ofrecord_image_decoder_random_crop_resize_normalize")
+    .SetCreateFn<OFRecordImageDecoderRandomCropResizeNormalizeKernel>()
+    .SetIsMatchedHob((user_op::HobDeviceType() == DeviceType::kCPU)
+                     && (user_op::HobDataType("in", 0) == DataType::kOFRecord)
+                     && (user_op::HobDataType("out", 0) == DataType::kFloat));
+
 }  // namespace oneflow
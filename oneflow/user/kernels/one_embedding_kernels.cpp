@@ -0,0 +1,501 @@
+/*
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+*/
+#include "oneflow/core/framework/framework.h"
+#include "oneflow/core/embedding/key_value_store.h"
+#include "oneflow/core/embedding/embedding_manager.h"
+#include "oneflow/core/framework/random_generator_impl.h"
+#include "oneflow/core/ep/cpu/cpu_stream.h"
+#include "oneflow/core/ep/include/primitive/copy_nd.h"
+#include "oneflow/core/ep/include/primitive/cast.h"
+#include "oneflow/user/kernels/one_embedding_kernel_util.h"
+
+namespace oneflow {
+
+namespace {
+
+constexpr int64_t kInitGrainSize = 256;
+
+uint64_t LoadKey(const void* keys, uint32_t key_size, uint32_t i) {
+  uint64_t key = 0;
+  std::memcpy(&key, static_cast<const char*>(keys) + i * key_size, key_size);
+  return key;
+}
+
+// Buffers to filter the ids rejected by the admission filter of the embedding out of the ids and
+// values that are put to the store.
+class AdmissionBuffers final {
+ public:
+  OF_DISALLOW_COPY_AND_MOVE(AdmissionBuffers);
+  AdmissionBuffers(uint32_t max_query_length, uint32_t key_size, uint32_t value_size)
+      : key_size_(key_size),
+        value_size_(value_size),
+        keys_(max_query_length),
+        flags_(new bool[max_query_length]),
+        admitted_keys_(max_query_length * key_size),
+        admitted_values_(max_query_length * value_size) {}
+  ~AdmissionBuffers() = default;
+
+  uint64_t* Keys() { return keys_.data(); }
+  bool* Flags() { return flags_.get(); }
+
+  // Puts the ids that are not rejected by the filter and their values to the store, the ids
+  // rejected by the last batch begun if last is true, or else by the first batch not put yet.
+  void PutAdmitted(ep::Stream* stream, embedding::AdmissionFilter* filter,
+                   embedding::KeyValueStore* store, uint32_t num_keys, const void* keys,
+                   const void* values, bool last) {
+    for (uint32_t i = 0; i < num_keys; ++i) { keys_[i] = LoadKey(keys, key_size_, i); }
+    filter->IsRejected(num_keys, keys_.data(), last, flags_.get());
+    uint32_t num_admitted = 0;
+    for (uint32_t i = 0; i < num_keys; ++i) {
+      if (flags_[i]) { continue; }
+      std::memcpy(admitted_keys_.data() + num_admitted * key_size_,
+                  static_cast<const char*>(keys) + i * key_size_, key_size_);
+      std::memcpy(admitted_values_.data() + num_admitted * value_size_,
+                  static_cast<const char*>(values) + i * value_size_, value_size_);
+      num_admitted += 1;
+    }
+    store->Put(stream, num_admitted, admitted_keys_.data(), admitted_values_.data());
+  }
+
+ private:
+  uint32_t key_size_;
+  uint32_t value_size_;
+  std::vector<uint64_t> keys_;
+  std::unique_ptr<bool[]> flags_;
+  std::vector<char> admitted_keys_;
+  std::vector<char> admitted_values_;
+};
+
+class CpuEmbeddingKernelState final : public user_op::OpKernelState {
+ public:
+  explicit CpuEmbeddingKernelState(user_op::KernelInitContext* ctx)
+      : generator_(CHECK_JUST(one::MakeGenerator(DeviceType::kCPU))) {
+    key_value_store_ = Global<embedding::EmbeddingManager>::Get()->GetKeyValueStore(
+        ctx->Attr<std::string>("embedding_name"), ctx->parallel_ctx().parallel_id());
+    uint32_t max_query_length =
+        ctx->TensorDesc4ArgNameAndIndex("unique_ids", 0)->shape().elem_cnt();
+    key_value_store_->ReserveQueryLength(max_query_length);
+    embedding_stats_ = Global<embedding::EmbeddingManager>::Get()->GetEmbeddingStats(
+        ctx->Attr<std::string>("embedding_name"), ctx->parallel_ctx().parallel_id());
+
+    const int64_t embedding_size = ctx->Attr<int64_t>("embedding_size");
+    const int64_t line_size = ctx->Attr<int64_t>("line_size");
+    const std::string& state_initializer = ctx->Attr<std::string>("state_initializer");
+    ParseInitializers(line_size, embedding_size, state_initializer,
+                      ctx->Attr<std::string>("embedding_tables"), &initializer_param_,
+                      &initializer_index_);
+    ParseAdmissions(ctx->Attr<std::string>("embedding_tables"), &admissions_);
+    admission_filter_ = Global<embedding::EmbeddingManager>::Get()->GetAdmissionFilter(
+        ctx->Attr<std::string>("embedding_name"), ctx->parallel_ctx().parallel_id());
+    const bool has_admission = std::any_of(
+        admissions_.begin(), admissions_.end(),
+        [](const EmbeddingAdmission& admission) { return admission.min_frequency > 1; });
+    if (has_admission) {
+      CHECK(admission_filter_ != nullptr);
+      admission_buffers_.reset(new AdmissionBuffers(
+          max_query_length, key_value_store_->KeySize(), key_value_store_->ValueSize()));
+      min_frequencies_.resize(max_query_length);
+    }
+  }
+  ~CpuEmbeddingKernelState() override = default;
+
+  embedding::KeyValueStore* KeyValueStore() { return key_value_store_; }
+
+  embedding::EmbeddingStats* EmbeddingStats() { return embedding_stats_; }
+
+  one::Generator* generator() { return generator_.get(); }
+
+  const int8_t* InitializerIndex() { return initializer_index_.data(); }
+  const EmbeddingInitializer* Initializers() { return initializer_param_.data(); }
+
+  const EmbeddingAdmission* Admissions() { return admissions_.data(); }
+  // nullptr if none of the tables has an admission policy.
+  embedding::AdmissionFilter* AdmissionFilter() {
+    return admission_buffers_ ? admission_filter_ : nullptr;
+  }
+  AdmissionBuffers* GetAdmissionBuffers() { return admission_buffers_.get(); }
+  uint32_t* MinFrequencies() { return min_frequencies_.data(); }
+
+ private:
+  std::shared_ptr<one::Generator> generator_;
+  embedding::KeyValueStore* key_value_store_;
+  embedding::EmbeddingStats* embedding_stats_;
+
+  std::vector<EmbeddingInitializer> initializer_param_;
+  std::vector<int8_t> initializer_index_;
+
+  std::vector<EmbeddingAdmission> admissions_;
+  embedding::AdmissionFilter* admission_filter_;
+  std::unique_ptr<AdmissionBuffers> admission_buffers_;
+  std::vector<uint32_t> min_frequencies_;
+};
+
+class CpuEmbeddingPutKernelState final : public user_op::OpKernelState {
+ public:
+  explicit CpuEmbeddingPutKernelState(user_op::KernelInitContext* ctx) {
+    key_value_store_ = Global<embedding::EmbeddingManager>::Get()->GetKeyValueStore(
+        ctx->Attr<std::string>("embedding_name"), ctx->parallel_ctx().parallel_id());
+    uint32_t max_query_length =
+        ctx->TensorDesc4ArgNameAndIndex("unique_ids", 0)->shape().elem_cnt();
+    key_value_store_->ReserveQueryLength(max_query_length);
+    admission_filter_ = Global<embedding::EmbeddingManager>::Get()->GetAdmissionFilter(
+        ctx->Attr<std::string>("embedding_name"), ctx->parallel_ctx().parallel_id());
+    if (admission_filter_ != nullptr) {
+      admission_buffers_.reset(new AdmissionBuffers(
+          max_query_length, key_value_store_->KeySize(), key_value_store_->ValueSize()));
+    }
+  }
+  ~CpuEmbeddingPutKernelState() override = default;
+
+  embedding::KeyValueStore* KeyValueStore() { return key_value_store_; }
+  // nullptr if none of the tables has an admission policy.
+  embedding::AdmissionFilter* AdmissionFilter() { return admission_filter_; }
+  AdmissionBuffers* GetAdmissionBuffers() { return admission_buffers_.get(); }
+
+ private:
+  embedding::KeyValueStore* key_value_store_;
+  embedding::AdmissionFilter* admission_filter_;
+  std::unique_ptr<AdmissionBuffers> admission_buffers_;
+};
+
+template<typename T, typename U>
+void InitMissingValues(ep::Stream* stream, uint64_t seed, const int32_t line_size,
+                       const EmbeddingInitializer* initializer_param,
+                       const int8_t* initializer_index, const U* table_ids,
+                       const uint32_t num_missing, const uint32_t* missing_indices, T* values) {
+  // Every chunk owns an engine seeded by its first row, so the initialized values do not depend on
+  // how the rows are split among the threads.
+  stream->As<ep::CpuStream>()->ParallelFor(
+      0, num_missing,
+      [&](int64_t start, int64_t end) {
+        std::mt19937 engine(seed + start);
+        for (int64_t row = start; row < end; ++row) {
+          const uint32_t index = missing_indices[row];
+          const int32_t table_idx = table_ids[index];
+          for (int32_t col = 0; col < line_size; ++col) {
+            const int32_t initializer_idx = initializer_index[table_idx * line_size + col];
+            const EmbeddingInitializer& initializer = initializer_param[initializer_idx];
+            T value;
+            if (initializer.type == InitializerType::kUniform) {
+              std::uniform_real_distribution<float> dis(initializer.uniform_param.low,
+                                                        initializer.uniform_param.high);
+              value = dis(engine);
+            } else if (initializer.type == InitializerType::kNormal) {
+              std::normal_distribution<float> dis(initializer.normal_param.mean,
+                                                  initializer.normal_param.std);
+              value = dis(engine);
+            } else if (initializer.type == InitializerType::kConstant) {
+              value = initializer.constant_param.value;
+            } else {
+              UNIMPLEMENTED();
+            }
+            values[static_cast<int64_t>(index) * line_size + col] = value;
+          }
+        }
+      },
+      kInitGrainSize);
+}
+
+// Counts the missing ids in the admission filter if count is true, the ids that are not admitted
+// are looked up as the default value of their table instead of their initialized value.
+template<typename T, typename U>
+void AdmitMissingValues(CpuEmbeddingKernelState* embedding_state, const int64_t embedding_size,
+                        const int32_t line_size, const void* unique_ids, const U* table_ids,
+                        const uint32_t num_missing, const uint32_t* missing_indices,
+                        const bool count, T* values) {
+  embedding::AdmissionFilter* filter = embedding_state->AdmissionFilter();
+  AdmissionBuffers* buffers = embedding_state->GetAdmissionBuffers();
+  const EmbeddingAdmission* admissions = embedding_state->Admissions();
+  const uint32_t key_size = embedding_state->KeyValueStore()->KeySize();
+  uint64_t* keys = buffers->Keys();
+  uint32_t* min_frequencies = embedding_state->MinFrequencies();
+  for (uint32_t i = 0; i < num_missing; ++i) {
+    const uint32_t index = missing_indices[i];
+    keys[i] = LoadKey(unique_ids, key_size, index);
+    min_frequencies[i] = admissions[table_ids[index]].min_frequency;
+  }
+  bool* admitted = buffers->Flags();
+  filter->Admit(num_missing, keys, min_frequencies, count, admitted);
+  for (uint32_t i = 0; i < num_missing; ++i) {
+    if (admitted[i]) { continue; }
+    const uint32_t index = missing_indices[i];
+    const float default_value = admissions[table_ids[index]].default_value;
+    T* row = values + static_cast<int64_t>(index) * line_size;
+    std::fill(row, row + embedding_size, static_cast<T>(default_value));
+  }
+}
+
+template<typename T, typename U, typename IDX>
+void LookupAndInitMissing(ep::Stream* stream, CpuEmbeddingKernelState* embedding_state,
+                          const int64_t num_ids, const int64_t embedding_size,
+                          const int64_t line_size, const void* num_unique_ptr,
+                          const void* unique_ids, const void* table_ids, T* values_ptr,
+                          void* tmp_buffer_ptr, uint32_t* return_num_unique,
+                          const bool put_to_kv_store, const bool count_stats) {
+  const auto& generator = embedding_state->generator();
+  CHECK_NOTNULL(generator);
+  std::shared_ptr<one::CPUGeneratorImpl> cpu_generator =
+      CHECK_JUST(generator->template Get<one::CPUGeneratorImpl>());
+  embedding::KeyValueStore* store = embedding_state->KeyValueStore();
+  bool need_value_buffer = (values_ptr == nullptr);
+  EmbeddingTmpBufferManager buffer_manager(tmp_buffer_ptr, num_ids, line_size * sizeof(T),
+                                           need_value_buffer);
+  uint32_t num_unique = *reinterpret_cast<const IDX*>(num_unique_ptr);
+  uint32_t* num_missing_ptr =
+      buffer_manager.template Ptr<uint32_t>(EmbeddingBufferType::kNumMissing);
+  uint32_t* missing_indices =
+      buffer_manager.template Ptr<uint32_t>(EmbeddingBufferType::kMissingIndices);
+  T* store_values =
+      need_value_buffer ? buffer_manager.template Ptr<T>(EmbeddingBufferType::kValues) : values_ptr;
+  // the first query of a batch counts its ids in the stats and in the admission filter
+  if (count_stats && embedding_state->AdmissionFilter() != nullptr) {
+    embedding_state->AdmissionFilter()->BeginBatch();
+  }
+  if (count_stats) {
+    store->Get(stream, num_unique, unique_ids, store_values, num_missing_ptr, missing_indices);
+  } else {
+    store->GetUncounted(stream, num_unique, unique_ids, store_values, num_missing_ptr,
+                        missing_indices);
+  }
+  const uint32_t num_missing = *num_missing_ptr;
+  if (num_missing > 0) {
+    const uint64_t seed = cpu_generator->engine()();
+    InitMissingValues<T, U>(stream, seed, line_size, embedding_state->Initializers(),
+                            embedding_state->InitializerIndex(),
+                            reinterpret_cast<const U*>(table_ids), num_missing, missing_indices,
+                            store_values);
+    if (embedding_state->AdmissionFilter() != nullptr) {
+      AdmitMissingValues<T, U>(embedding_state, embedding_size, line_size, unique_ids,
+                               reinterpret_cast<const U*>(table_ids), num_missing,
+                               missing_indices, count_stats, store_values);
+    }
+  }
+  if (put_to_kv_store) {
+    if (embedding_state->AdmissionFilter() != nullptr) {
+      embedding_state->GetAdmissionBuffers()->PutAdmitted(
+          stream, embedding_state->AdmissionFilter(), store, num_unique, unique_ids, store_values,
+          true);
+    } else {
+      store->Put(stream, num_unique, unique_ids, store_values);
+    }
+  }
+  *return_num_unique = num_unique;
+}
+
+template<typename T>
+void CopyValuesToEmbeddings(ep::Stream* stream, int64_t num_unique, const int32_t embedding_size,
+                            const int32_t value_size, const DataType value_dtype,
+                            const DataType embedding_dtype, const T* values, void* embeddings) {
+  bool need_cast = (value_dtype != embedding_dtype);
+  bool need_copy_nd = (embedding_size != value_size);
+  CHECK(need_cast || need_copy_nd);
+  if (need_cast && !need_copy_nd) {
+    const int64_t cast_elem_count = num_unique * embedding_size;
+    std::unique_ptr<ep::primitive::Cast> cast_primitive =
+        ep::primitive::NewPrimitive<ep::primitive::CastFactory>(DeviceType::kCPU, value_dtype,
+                                                                embedding_dtype);
+    cast_primitive->Launch(stream, values, embeddings, cast_elem_count);
+  } else if (!need_cast && need_copy_nd) {
+    const int32_t ndims = 2;
+    DimVector src_pos_vec(ndims, 0);
+    DimVector dst_pos_vec(ndims, 0);
+    DimVector src_shape = {num_unique, value_size};
+    DimVector dst_shape = {num_unique, embedding_size};
+    DimVector extent_shape = {num_unique, embedding_size};
+    std::unique_ptr<ep::primitive::CopyNd> copy_nd_primitive =
+        ep::primitive::NewPrimitive<ep::primitive::CopyNdFactory>(DeviceType::kCPU, ndims);
+    CHECK(copy_nd_primitive);
+    copy_nd_primitive->Launch(stream, value_dtype, ndims, embeddings, dst_shape.data(),
+                              dst_pos_vec.data(), values, src_shape.data(), src_pos_vec.data(),
+                              extent_shape.data());
+  } else {
+    if (embedding_dtype == DataType::kFloat16) {
+      float16* out = reinterpret_cast<float16*>(embeddings);
+      for (int64_t row = 0; row < num_unique; ++row) {
+        for (int32_t col = 0; col < embedding_size; ++col) {
+          out[row * embedding_size + col] = static_cast<float16>(values[row * value_size + col]);
+        }
+      }
+    } else {
+      UNIMPLEMENTED();
+    }
+  }
+}
+
+}  // namespace
+
+template<typename T, typename U, typename IDX>
+class CpuEmbeddingPrefetchKernel final : public user_op::OpKernel {
+ public:
+  CpuEmbeddingPrefetchKernel() = default;
+  ~CpuEmbeddingPrefetchKernel() override = default;
+
+  std::shared_ptr<user_op::OpKernelState> CreateOpKernelState(
+      user_op::KernelInitContext* ctx) const override {
+    return std::make_shared<CpuEmbeddingKernelState>(ctx);
+  }
+
+ private:
+  using user_op::OpKernel::Compute;
+  void Compute(user_op::KernelComputeContext* ctx, user_op::OpKernelState* state,
+               const user_op::OpKernelCache*) const override {
+    auto* embedding_state = dynamic_cast<CpuEmbeddingKernelState*>(state);
+    CHECK(embedding_state != nullptr);
+
+    const user_op::Tensor* num_unique_ids = ctx->Tensor4ArgNameAndIndex("num_unique_ids", 0);
+    const user_op::Tensor* unique_ids = ctx->Tensor4ArgNameAndIndex("unique_ids", 0);
+    const user_op::Tensor* table_ids = ctx->Tensor4ArgNameAndIndex("table_ids", 0);
+    user_op::Tensor* tmp_buffer = ctx->Tensor4ArgNameAndIndex("tmp_buffer", 0);
+    const int64_t embedding_size = ctx->Attr<int64_t>("embedding_size");
+    const int64_t line_size = ctx->Attr<int64_t>("line_size");
+    uint32_t num_unique;
+    T* values_ptr = nullptr;
+    LookupAndInitMissing<T, U, IDX>(ctx->stream(), embedding_state, unique_ids->shape().elem_cnt(),
+                                    embedding_size, line_size, num_unique_ids->dptr(),
+                                    unique_ids->dptr(), table_ids->dptr(), values_ptr,
+                                    tmp_buffer->mut_dptr(), &num_unique, true, true);
+  }
+  bool AlwaysComputeWhenAllOutputsEmpty() const override { return false; }
+};
+
+#define REGISTER_CPU_EMBEDDING_PREFETCH_KERNEL(t_dtype_pair, table_dtype_pair, idx_dtype_pair) \
+  REGISTER_USER_KERNEL("embedding_prefetch")                                                   \
+      .SetCreateFn<CpuEmbeddingPrefetchKernel<OF_PP_PAIR_FIRST(t_dtype_pair),                  \
+                                              OF_PP_PAIR_FIRST(table_dtype_pair),              \
+                                              OF_PP_PAIR_FIRST(idx_dtype_pair)>>()             \
+      .SetIsMatchedHob(                                                                        \
+          (user_op::HobDeviceType() == DeviceType::kCPU)                                       \
+          && (user_op::HobDataType("table_ids", 0) == OF_PP_PAIR_SECOND(table_dtype_pair))     \
+          && (user_op::HobDataType("num_unique_ids", 0) == OF_PP_PAIR_SECOND(idx_dtype_pair))) \
+      .SetInferTmpSizeFn([](user_op::InferContext* ctx) {                                      \
+        const user_op::TensorDesc& unique_ids = ctx->InputTensorDesc("unique_ids", 0);         \
+        EmbeddingTmpBufferManager buffer_manager(                                              \
+            nullptr, unique_ids.shape().elem_cnt(),                                            \
+            ctx->Attr<int64_t>("line_size") * sizeof(OF_PP_PAIR_FIRST(t_dtype_pair)), true);   \
+        return buffer_manager.TotalBufferSize();                                               \
+      });
+
+OF_PP_SEQ_PRODUCT_FOR_EACH_TUPLE(REGISTER_CPU_EMBEDDING_PREFETCH_KERNEL, EMBEDDING_DATA_TYPE_SEQ,
+                                 TABLE_ID_DATA_TYPE_SEQ, IDX_DATA_TYPE_SEQ)
+
+template<typename T, typename U, typename IDX>
+class CpuEmbeddingLookupKernel final : public user_op::OpKernel {
+ public:
+  CpuEmbeddingLookupKernel() = default;
+  ~CpuEmbeddingLookupKernel() override = default;
+
+  std::shared_ptr<user_op::OpKernelState> CreateOpKernelState(
+      user_op::KernelInitContext* ctx) const override {
+    return std::make_shared<CpuEmbeddingKernelState>(ctx);
+  }
+
+ private:
+  using user_op::OpKernel::Compute;
+  void Compute(user_op::KernelComputeContext* ctx, user_op::OpKernelState* state,
+               const user_op::OpKernelCache*) const override {
+    auto* embedding_state = dynamic_cast<CpuEmbeddingKernelState*>(state);
+    CHECK(embedding_state != nullptr);
+    const user_op::Tensor* num_unique_ids = ctx->Tensor4ArgNameAndIndex("num_unique_ids", 0);
+    const user_op::Tensor* unique_ids = ctx->Tensor4ArgNameAndIndex("unique_ids", 0);
+    const user_op::Tensor* table_ids = ctx->Tensor4ArgNameAndIndex("table_ids", 0);
+    user_op::Tensor* unique_values = ctx->Tensor4ArgNameAndIndex("unique_values", 0);
+    user_op::Tensor* tmp_buffer = ctx->Tensor4ArgNameAndIndex("tmp_buffer", 0);
+    const int64_t embedding_size = ctx->Attr<int64_t>("embedding_size");
+    const int64_t line_size = ctx->Attr<int64_t>("line_size");
+    // the embedding_prefetch op that feeds the context has already counted the ids in the stats
+    const bool has_prefetch = ctx->has_input("context", 0);
+    uint32_t num_unique;
+    LookupAndInitMissing<T, U, IDX>(
+        ctx->stream(), embedding_state, unique_ids->shape().elem_cnt(), embedding_size, line_size,
+        num_unique_ids->dptr(), unique_ids->dptr(), table_ids->dptr(), unique_values->mut_dptr<T>(),
+        tmp_buffer->mut_dptr(), &num_unique, false, !has_prefetch);
+    embedding_state->EmbeddingStats()->AddBatch(num_unique);
+    if (ctx->has_output("embeddings", 0)) {
+      user_op::Tensor* embeddings = ctx->Tensor4ArgNameAndIndex("embeddings", 0);
+      CopyValuesToEmbeddings<T>(ctx->stream(), num_unique, embedding_size, line_size,
+                                unique_values->data_type(), embeddings->data_type(),
+                                unique_values->dptr<T>(), embeddings->mut_dptr());
+    }
+  }
+  bool AlwaysComputeWhenAllOutputsEmpty() const override { return false; }
+};
+
+#define REGISTER_CPU_EMBEDDING_LOOKUP_KERNEL(t_dtype_pair, table_dtype_pair, idx_dtype_pair)   \
+  REGISTER_USER_KERNEL("embedding_lookup")                                                     \
+      .SetCreateFn<CpuEmbeddingLookupKernel<OF_PP_PAIR_FIRST(t_dtype_pair),                    \
+                                            OF_PP_PAIR_FIRST(table_dtype_pair),                \
+                                            OF_PP_PAIR_FIRST(idx_dtype_pair)>>()               \
+      .SetIsMatchedHob(                                                                        \
+          (user_op::HobDeviceType() == DeviceType::kCPU)                                       \
+          && (user_op::HobDataType("unique_values", 0) == OF_PP_PAIR_SECOND(t_dtype_pair))     \
+          && (user_op::HobDataType("table_ids", 0) == OF_PP_PAIR_SECOND(table_dtype_pair))     \
+          && (user_op::HobDataType("num_unique_ids", 0) == OF_PP_PAIR_SECOND(idx_dtype_pair))) \
+      .SetInferTmpSizeFn([](user_op::InferContext* ctx) {                                      \
+        const user_op::TensorDesc& unique_ids = ctx->InputTensorDesc("unique_ids", 0);         \
+        EmbeddingTmpBufferManager buffer_manager(                                              \
+            nullptr, unique_ids.shape().elem_cnt(),                                            \
+            ctx->Attr<int64_t>("line_size") * sizeof(OF_PP_PAIR_FIRST(t_dtype_pair)), false);  \
+        return buffer_manager.TotalBufferSize();                                               \
+      });
+
+OF_PP_SEQ_PRODUCT_FOR_EACH_TUPLE(REGISTER_CPU_EMBEDDING_LOOKUP_KERNEL, EMBEDDING_DATA_TYPE_SEQ,
+                                 TABLE_ID_DATA_TYPE_SEQ, IDX_DATA_TYPE_SEQ)
+
+template<typename IDX>
+class CpuEmbeddingPutKernel final : public user_op::OpKernel {
+ public:
+  CpuEmbeddingPutKernel() = default;
+  ~CpuEmbeddingPutKernel() override = default;
+
+  std::shared_ptr<user_op::OpKernelState> CreateOpKernelState(
+      user_op::KernelInitContext* ctx) const override {
+    return std::make_shared<CpuEmbeddingPutKernelState>(ctx);
+  }
+
+ private:
+  using user_op::OpKernel::Compute;
+  void Compute(user_op::KernelComputeContext* ctx, user_op::OpKernelState* state,
+               const user_op::OpKernelCache*) const override {
+    auto* embedding_state = dynamic_cast<CpuEmbeddingPutKernelState*>(state);
+    CHECK(embedding_state != nullptr);
+    embedding::KeyValueStore* store = embedding_state->KeyValueStore();
+    const user_op::Tensor* num_unique_ids = ctx->Tensor4ArgNameAndIndex("num_unique_ids", 0);
+    const user_op::Tensor* unique_ids = ctx->Tensor4ArgNameAndIndex("unique_ids", 0);
+    const user_op::Tensor* unique_embeddings = ctx->Tensor4ArgNameAndIndex("unique_embeddings", 0);
+    embedding::AdmissionFilter* filter = embedding_state->AdmissionFilter();
+    if (filter != nullptr) {
+      // The updated values of the ids that are not admitted are dropped.
+      embedding_state->GetAdmissionBuffers()->PutAdmitted(
+          ctx->stream(), filter, store, *num_unique_ids->dptr<IDX>(), unique_ids->dptr(),
+          unique_embeddings->dptr(), false);
+      filter->EndBatch();
+    } else {
+      store->Put(ctx->stream(), *num_unique_ids->dptr<IDX>(), unique_ids->dptr(),
+                 unique_embeddings->dptr());
+    }
+  }
+  bool AlwaysComputeWhenAllOutputsEmpty() const override { return false; }
+};
+
+#define REGISTER_CPU_EMBEDDING_PUT_KERNEL(dtype, typeproto)           \
+  REGISTER_USER_KERNEL("embedding_put")                               \
+      .SetCreateFn<CpuEmbeddingPutKernel<dtype>>()                    \
+      .SetIsMatchedHob((user_op::HobDeviceType() == DeviceType::kCPU) \
+                       && (user_op::HobDataType("num_unique_ids", 0) == typeproto));
+
+OF_PP_FOR_EACH_TUPLE(REGISTER_CPU_EMBEDDING_PUT_KERNEL, IDX_DATA_TYPE_SEQ)
+
+}  // namespace oneflow
@@ -24,164 +24,12 @@ limitations under the License.
 #include "oneflow/core/ep/include/primitive/copy_nd.h"
 #include "oneflow/core/ep/include/primitive/cast.h"
 #include "oneflow/core/ep/include/device.h"
+#include "oneflow/user/kernels/one_embedding_kernel_util.h"
 
 namespace oneflow {
 
 namespace {
 
-enum class InitializerType { kUniform, kNormal, kConstant };
-
-struct EmbeddingInitializer {
-  InitializerType type;
-  union {
-    struct {
-      float low;
-      float high;
-    } uniform_param;
-    struct {
-      float mean;
-      float std;
-    } normal_param;
-    struct {
-      float value;
-    } constant_param;
-  };
-
-  bool operator==(const EmbeddingInitializer& rhs) const {
-    if (this->type != rhs.type) { return false; }
-    if (rhs.type == InitializerType::kUniform) {
-      return (this->uniform_param.low == rhs.uniform_param.low)
-             && (this->uniform_param.high == rhs.uniform_param.high);
-    } else if (rhs.type == InitializerType::kNormal) {
-      return (this->normal_param.mean == rhs.normal_param.mean)
-             && (this->normal_param.std == rhs.normal_param.std);
-    } else if (rhs.type == InitializerType::kConstant) {
-      return this->constant_param.value == rhs.constant_param.value;
-    } else {
-      UNIMPLEMENTED();
-      return false;
-    }
-  }
-};
-
-void ParseInitializerFromJson(const nlohmann::json& initializer,
-                              EmbeddingInitializer* embedding_initializer) {
-  CHECK(initializer.contains("type"));
-  CHECK(initializer["type"].is_string());
-  std::string type = initializer["type"].get<std::string>();
-  if (type == "uniform") {
-    embedding_initializer->type = InitializerType::kUniform;
-    CHECK(initializer.contains("low"));
-    CHECK(initializer.contains("high"));
-    CHECK(initializer["low"].is_number());
-    CHECK(initializer["high"].is_number());
-    embedding_initializer->uniform_param.low = initializer["low"];
-    embedding_initializer->uniform_param.high = initializer["high"];
-  } else if (type == "normal") {
-    CHECK(initializer.contains("mean"));
-    CHECK(initializer.contains("std"));
-    CHECK(initializer["mean"].is_number());
-    CHECK(initializer["std"].is_number());
-    embedding_initializer->type = InitializerType::kNormal;
-    embedding_initializer->normal_param.mean = initializer["mean"];
-    embedding_initializer->normal_param.std = initializer["std"];
-  } else if (type == "constant") {
-    CHECK(initializer.contains("value"));
-    CHECK(initializer["value"].is_number());
-    embedding_initializer->type = InitializerType::kConstant;
-    embedding_initializer->constant_param.value = initializer["value"];
-  } else {
-    UNIMPLEMENTED() << "Unsupported initializer type";
-  }
-}
-
-int32_t ParseJsonToUniqueInitializerVecAndReturnOffset(
-    const nlohmann::json& initializer, std::vector<EmbeddingInitializer>* initializers) {
-  EmbeddingInitializer embedding_initializer;
-  ParseInitializerFromJson(initializer, &embedding_initializer);
-  for (int32_t i = 0; i < initializers->size(); ++i) {
-    if (initializers->at(i) == embedding_initializer) { return i; }
-  }
-  initializers->push_back(embedding_initializer);
-  return initializers->size() - 1;
-}
-
-void SetInitializerIndex(int32_t row_id, int32_t col_start, int32_t col_end, int64_t line_size,
-                         int8_t index, std::vector<int8_t>* initializer_index) {
-  int64_t row_offset = row_id * line_size;
-  for (int32_t col = col_start; col < col_end; ++col) {
-    initializer_index->at(row_offset + col) = index;
-  }
-}
-
-void ParseAndSetStateInitializerIndex(const std::string& state_initializer,
-                                      const int32_t num_tables, const int64_t line_size,
-                                      const int64_t embedding_size,
-                                      std::vector<EmbeddingInitializer>* initializer_params,
-                                      std::vector<int8_t>* initializer_index) {
-  if (line_size == embedding_size) { return; }
-  CHECK(!state_initializer.empty());
-  auto initializers = nlohmann::json::parse(state_initializer);
-  CHECK(initializers.is_array());
-  const int num_states = line_size / embedding_size - 1;
-  CHECK_EQ(num_states, initializers.size());
-  for (int32_t i = 0; i < num_states; ++i) {
-    int32_t offset =
-        ParseJsonToUniqueInitializerVecAndReturnOffset(initializers.at(i), initializer_params);
-    int32_t col_start = embedding_size + i * embedding_size;
-    int32_t col_end = col_start + embedding_size;
-    CHECK_LE(col_end, line_size);
-    for (int32_t j = 0; j < num_tables; ++j) {
-      SetInitializerIndex(j, col_start, col_end, line_size, offset, initializer_index);
-    }
-  }
-}
-
-void ParseAndSetModelInitializerIndex(const nlohmann::json& tables,
-                                      const std::vector<int64_t>& column_dims,
-                                      const int32_t num_tables, const int32_t num_columns,
-                                      const int64_t line_size, const int64_t embedding_size,
-                                      std::vector<EmbeddingInitializer>* initializer_params,
-                                      std::vector<int8_t>* initializer_index) {
-  for (int32_t i = 0; i < num_tables; ++i) {
-    auto table = tables.at(i);
-    CHECK(table.contains("columns"));
-    auto columns = table["columns"];
-    CHECK(columns.is_array());
-    CHECK_EQ(num_columns, columns.size()) << "columns size must equal to num embedding dims";
-    int32_t col_start = 0;
-    for (int k = 0; k < columns.size(); ++k) {
-      auto column = columns.at(k);
-      CHECK(column.contains("initializer"));
-      int32_t offset =
-          ParseJsonToUniqueInitializerVecAndReturnOffset(column["initializer"], initializer_params);
-      int32_t col_end = col_start + column_dims.at(k);
-      SetInitializerIndex(i, col_start, col_end, line_size, offset, initializer_index);
-      col_start = col_end;
-    }
-    CHECK_EQ(col_start, embedding_size);
-  }
-}
-
-void ParseInitializers(const int64_t line_size, const int64_t embedding_size,
-                       const std::string& state_initializer, const std::string& json_serialized,
-                       std::vector<EmbeddingInitializer>* initializer_params,
-                       std::vector<int8_t>* initializer_index) {
-  auto json_object = nlohmann::json::parse(json_serialized);
-  CHECK(json_object.contains("column_dims"));
-  std::vector<int64_t> column_dims = json_object["column_dims"];
-  const int32_t num_columns = column_dims.size();
-  CHECK(json_object.contains("tables"));
-  auto tables = json_object["tables"];
-  CHECK(tables.is_array());
-  const int32_t num_tables = tables.size();
-  initializer_index->resize(num_tables * line_size);
-  ParseAndSetStateInitializerIndex(state_initializer, num_tables, line_size, embedding_size,
-                                   initializer_params, initializer_index);
-  ParseAndSetModelInitializerIndex(tables, column_dims, num_tables, num_columns, line_size,
-                                   embedding_size, initializer_params, initializer_index);
-}
-
 template<typename IDX>
 class EmbeddingKernelState final : public user_op::OpKernelState {
  public:
@@ -194,6 +42,8 @@ class EmbeddingKernelState final : public user_op::OpKernelState {
     uint32_t max_query_length =
         ctx->TensorDesc4ArgNameAndIndex("unique_ids", 0)->shape().elem_cnt();
     key_value_store_->ReserveQueryLength(max_query_length);
+    embedding_stats_ = Global<embedding::EmbeddingManager>::Get()->GetEmbeddingStats(
+        ctx->Attr<std::string>("embedding_name"), ctx->parallel_ctx().parallel_id());
 
     const int64_t embedding_size = ctx->Attr<int64_t>("embedding_size");
     const int64_t line_size = ctx->Attr<int64_t>("line_size");
@@ -234,6 +84,8 @@ class EmbeddingKernelState final : public user_op::OpKernelState {
 
   embedding::KeyValueStore* KeyValueStore() { return key_value_store_; }
 
+  embedding::EmbeddingStats* EmbeddingStats() { return embedding_stats_; }
+
   one::Generator* generator() { return generator_.get(); }
 
   const int8_t* InitializerIndex() { return device_initializer_index_; }
@@ -244,6 +96,7 @@ class EmbeddingKernelState final : public user_op::OpKernelState {
   void* host_num_keys_;
   std::shared_ptr<one::Generator> generator_;
   embedding::KeyValueStore* key_value_store_;
+  embedding::EmbeddingStats* embedding_stats_;
 
   EmbeddingInitializer* host_initializer_param_;
   EmbeddingInitializer* device_initializer_param_;
@@ -277,42 +130,6 @@ class EmbeddingPutKernelState final : public user_op::OpKernelState {
   embedding::KeyValueStore* key_value_store_;
 };
 
-enum class EmbeddingBufferType { kNumMissing = 0, kMissingIndices, kValues, kMaxType };
-
-class EmbeddingTmpBufferManager final {
- public:
-  OF_DISALLOW_COPY_AND_MOVE(EmbeddingTmpBufferManager);
-  EmbeddingTmpBufferManager(void* ptr, const int64_t num_ids, const int64_t value_byte_size,
-                            const bool need_value_buffer)
-      : offset_(0), offsets_(static_cast<size_t>(EmbeddingBufferType::kMaxType), -1), ptr_(ptr) {
-    AllocBuffer(EmbeddingBufferType::kNumMissing, sizeof(uint32_t));
-    AllocBuffer(EmbeddingBufferType::kMissingIndices, num_ids * sizeof(uint32_t));
-    if (need_value_buffer) { AllocBuffer(EmbeddingBufferType::kValues, num_ids * value_byte_size); }
-  }
-
-  template<typename T = void>
-  T* Ptr(EmbeddingBufferType type) {
-    CHECK(ptr_ != nullptr);
-    int64_t offset = offsets_.at(static_cast<size_t>(type));
-    CHECK_NE(offset, -1);
-    return reinterpret_cast<T*>(reinterpret_cast<char*>(ptr_) + offset);
-  }
-
-  size_t TotalBufferSize() const { return offset_; }
-
- private:
-  void AllocBuffer(EmbeddingBufferType type, size_t size) {
-    const size_t type_id = static_cast<size_t>(type);
-    CHECK_EQ(offsets_.at(type_id), -1);
-    offsets_.at(type_id) = offset_;
-    offset_ += GetCudaAlignedSize(size);
-  }
-
-  size_t offset_;
-  std::vector<int64_t> offsets_;
-  void* ptr_;
-};
-
 template<typename T, typename U>
 __global__ void InitValueKernel(uint64_t seed, one::CUDAGeneratorState* cuda_gen_state,
                                 uint64_t inc_offset, const int32_t line_size,
@@ -365,7 +182,7 @@ void LookupAndInitMissing(ep::Stream* stream, EmbeddingKernelState<IDX>* embeddi
                           const int64_t line_size, const void* num_unique_ptr,
                           const void* unique_ids, const void* table_ids, T* values_ptr,
                           void* tmp_buffer_ptr, uint32_t* return_num_unique,
-                          const bool put_to_kv_store) {
+                          const bool put_to_kv_store, const bool count_stats) {
   const auto& generator = embedding_state->generator();
   CHECK_NOTNULL(generator);
   std::shared_ptr<one::CUDAGeneratorImpl> cuda_generator =
@@ -389,7 +206,12 @@ void LookupAndInitMissing(ep::Stream* stream, EmbeddingKernelState<IDX>* embeddi
       buffer_manager.template Ptr<uint32_t>(EmbeddingBufferType::kMissingIndices);
   T* store_values =
       need_value_buffer ? buffer_manager.template Ptr<T>(EmbeddingBufferType::kValues) : values_ptr;
-  store->Get(stream, num_unique, unique_ids, store_values, num_missing_ptr, missing_indices);
+  if (count_stats) {
+    store->Get(stream, num_unique, unique_ids, store_values, num_missing_ptr, missing_indices);
+  } else {
+    store->GetUncounted(stream, num_unique, unique_ids, store_values, num_missing_ptr,
+                        missing_indices);
+  }
   CHECK_GE(sizeof(IDX), sizeof(uint32_t));  // host_num_keys's buffer size is sizeof(IDX)
   OF_CUDA_CHECK(cudaMemcpyAsync(host_num_keys, num_missing_ptr, sizeof(uint32_t), cudaMemcpyDefault,
                                 stream->As<ep::CudaStream>()->cuda_stream()));
@@ -491,25 +313,11 @@ class EmbeddingPrefetchKernel final : public user_op::OpKernel {
     LookupAndInitMissing<T, U, IDX>(ctx->stream(), embedding_state, unique_ids->shape().elem_cnt(),
                                     embedding_size, line_size, num_unique_ids->dptr(),
                                     unique_ids->dptr(), table_ids->dptr(), values_ptr,
-                                    tmp_buffer->mut_dptr(), &num_unique, true);
+                                    tmp_buffer->mut_dptr(), &num_unique, true, true);
   }
   bool AlwaysComputeWhenAllOutputsEmpty() const override { return false; }
 };
 
-#define EMBEDDING_DATA_TYPE_SEQ OF_PP_MAKE_TUPLE_SEQ(float, DataType::kFloat)
-
-#define TABLE_ID_DATA_TYPE_SEQ                      \
-  OF_PP_MAKE_TUPLE_SEQ(uint8_t, DataType::kUInt8)   \
-  OF_PP_MAKE_TUPLE_SEQ(uint32_t, DataType::kUInt32) \
-  OF_PP_MAKE_TUPLE_SEQ(uint64_t, DataType::kUInt64) \
-  OF_PP_MAKE_TUPLE_SEQ(int8_t, DataType::kInt8)     \
-  OF_PP_MAKE_TUPLE_SEQ(int32_t, DataType::kInt32)   \
-  OF_PP_MAKE_TUPLE_SEQ(int64_t, DataType::kInt64)
-
-#define IDX_DATA_TYPE_SEQ                           \
-  OF_PP_MAKE_TUPLE_SEQ(uint32_t, DataType::kUInt32) \
-  OF_PP_MAKE_TUPLE_SEQ(int32_t, DataType::kInt32)
-
 #define REGISTER_CUDA_EMBEDDING_PREFETCH_KERNEL(t_dtype_pair, table_dtype_pair, idx_dtype_pair) \
   REGISTER_USER_KERNEL("embedding_prefetch")                                                    \
       .SetCreateFn<EmbeddingPrefetchKernel<OF_PP_PAIR_FIRST(t_dtype_pair),                      \
@@ -554,11 +362,14 @@ class EmbeddingLookupKernel final : public user_op::OpKernel {
     user_op::Tensor* tmp_buffer = ctx->Tensor4ArgNameAndIndex("tmp_buffer", 0);
     const int64_t embedding_size = ctx->Attr<int64_t>("embedding_size");
     const int64_t line_size = ctx->Attr<int64_t>("line_size");
+    // the embedding_prefetch op that feeds the context has already counted the ids in the stats
+    const bool has_prefetch = ctx->has_input("context", 0);
     uint32_t num_unique;
     LookupAndInitMissing<T, U, IDX>(
         ctx->stream(), embedding_state, unique_ids->shape().elem_cnt(), embedding_size, line_size,
         num_unique_ids->dptr(), unique_ids->dptr(), table_ids->dptr(), unique_values->mut_dptr<T>(),
-        tmp_buffer->mut_dptr(), &num_unique, false);
+        tmp_buffer->mut_dptr(), &num_unique, false, !has_prefetch);
+    embedding_state->EmbeddingStats()->AddBatch(num_unique);
     if (ctx->has_output("embeddings", 0)) {
       user_op::Tensor* embeddings = ctx->Tensor4ArgNameAndIndex("embeddings", 0);
       CopyValuesToEmbeddings<T>(ctx->stream(), num_unique, embedding_size, line_size,
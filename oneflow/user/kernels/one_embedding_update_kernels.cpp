@@ -0,0 +1,340 @@
+/*
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+*/
+#include "oneflow/core/framework/framework.h"
+#include "oneflow/core/ep/cpu/cpu_stream.h"
+#include "oneflow/user/kernels/model_update_kernel_util.h"
+
+namespace oneflow {
+
+namespace {
+
+constexpr int64_t kUpdateGrainSize = 4096;
+
+struct EmbeddingUpdateInputs {
+  int64_t num_unique;
+  float learning_rate;
+  bool skip;
+};
+
+template<typename T, typename IDX>
+EmbeddingUpdateInputs GetUpdateInputs(user_op::KernelComputeContext* ctx, double* scale,
+                                      bool has_scale_by_tensor) {
+  EmbeddingUpdateInputs inputs{};
+  inputs.num_unique = *ctx->Tensor4ArgNameAndIndex("num_unique_ids", 0)->dptr<IDX>();
+  inputs.learning_rate = *ctx->Tensor4ArgNameAndIndex("learning_rate", 0)->dptr<float>();
+  inputs.skip = false;
+  if (ctx->has_input("skip_if", 0)) {
+    const user_op::Tensor* skip_if = ctx->Tensor4ArgNameAndIndex("skip_if", 0);
+    CHECK_EQ(skip_if->shape().elem_cnt(), 1);
+    inputs.skip = *skip_if->dptr<int64_t>() != 0;
+  }
+  const DataType data_type = ctx->Tensor4ArgNameAndIndex("unique_embeddings", 0)->data_type();
+  if (has_scale_by_tensor && ctx->has_input("scale_by_tensor", 0)) {
+    const user_op::Tensor* scale_by_tensor = ctx->Tensor4ArgNameAndIndex("scale_by_tensor", 0);
+    CHECK_EQ(scale_by_tensor->data_type(), data_type);
+    CHECK_EQ(scale_by_tensor->shape().elem_cnt(), 1);
+    *scale *= *scale_by_tensor->dptr<T>();
+  }
+  if (ctx->has_input("down_scale_by_tensor", 0)) {
+    const user_op::Tensor* down_scale_by_tensor =
+        ctx->Tensor4ArgNameAndIndex("down_scale_by_tensor", 0);
+    CHECK_EQ(down_scale_by_tensor->data_type(), data_type);
+    CHECK_EQ(down_scale_by_tensor->shape().elem_cnt(), 1);
+    *scale /= *down_scale_by_tensor->dptr<T>();
+  }
+  return inputs;
+}
+
+// Runs `update(model_diff_offset, model_offset)` for every element of the embedding grad, the
+// whole line (embedding and optimizer states) is copied to the output first so that the functors
+// can update it in place.
+template<typename T, typename F>
+void ForEachUpdateElement(ep::Stream* stream, int64_t num_unique, int64_t line_size,
+                          int64_t embedding_size, bool skip, const T* unique_values,
+                          T* updated_unique_values, const F& update) {
+  if (num_unique == 0) { return; }
+  std::copy(unique_values, unique_values + num_unique * line_size, updated_unique_values);
+  if (skip) { return; }
+  stream->As<ep::CpuStream>()->ParallelFor(
+      0, num_unique * embedding_size,
+      [&](int64_t start, int64_t end) {
+        for (int64_t i = start; i < end; ++i) {
+          const int64_t row = i / embedding_size;
+          const int64_t col = i - row * embedding_size;
+          update(i, row * line_size + col);
+        }
+      },
+      kUpdateGrainSize);
+}
+
+}  // namespace
+
+template<typename T, typename G, typename IDX>
+class CpuSgdEmbeddingUpdateKernel final : public user_op::OpKernel {
+ public:
+  CpuSgdEmbeddingUpdateKernel() = default;
+  ~CpuSgdEmbeddingUpdateKernel() override = default;
+
+ private:
+  using user_op::OpKernel::Compute;
+  void Compute(user_op::KernelComputeContext* ctx) const override {
+    const user_op::Tensor* unique_embeddings = ctx->Tensor4ArgNameAndIndex("unique_embeddings", 0);
+    const user_op::Tensor* embedding_grad = ctx->Tensor4ArgNameAndIndex("embedding_grad", 0);
+    user_op::Tensor* updated_unique_embeddings =
+        ctx->Tensor4ArgNameAndIndex("updated_unique_embeddings", 0);
+    CHECK_EQ(unique_embeddings->shape().NumAxes(), 2);
+    CHECK_EQ(embedding_grad->shape().NumAxes(), 2);
+    const int64_t line_size = unique_embeddings->shape().At(1);
+    const int64_t embedding_size = embedding_grad->shape().At(1);
+    CHECK_EQ(line_size, embedding_size);
+    double scale = ctx->Attr<double>("scale");
+    const float l1 = ctx->Attr<float>("l1");
+    const float l2 = ctx->Attr<float>("l2");
+    const auto weight_decay = ctx->Attr<float>("weight_decay");
+    const EmbeddingUpdateInputs inputs = GetUpdateInputs<T, IDX>(ctx, &scale, true);
+    const G* model_diff = embedding_grad->dptr<G>();
+    T* updated = updated_unique_embeddings->mut_dptr<T>();
+    ForEachUpdateElement<T>(
+        ctx->stream(), inputs.num_unique, line_size, embedding_size, inputs.skip,
+        unique_embeddings->dptr<T>(), updated, [&](int64_t i, int64_t model_offset) {
+          SGDUpdateFunctor<T, G>()(model_diff + i, updated + model_offset, static_cast<T>(scale),
+                                   l1, l2, weight_decay, inputs.learning_rate);
+        });
+  }
+  bool AlwaysComputeWhenAllOutputsEmpty() const override { return false; }
+};
+
+template<typename T, typename G, typename IDX>
+class CpuMomentumEmbeddingUpdateKernel final : public user_op::OpKernel {
+ public:
+  CpuMomentumEmbeddingUpdateKernel() = default;
+  ~CpuMomentumEmbeddingUpdateKernel() override = default;
+
+ private:
+  using user_op::OpKernel::Compute;
+  void Compute(user_op::KernelComputeContext* ctx) const override {
+    const user_op::Tensor* unique_embeddings = ctx->Tensor4ArgNameAndIndex("unique_embeddings", 0);
+    const user_op::Tensor* embedding_grad = ctx->Tensor4ArgNameAndIndex("embedding_grad", 0);
+    user_op::Tensor* updated_unique_embeddings =
+        ctx->Tensor4ArgNameAndIndex("updated_unique_embeddings", 0);
+    CHECK_EQ(unique_embeddings->shape().NumAxes(), 2);
+    CHECK_EQ(embedding_grad->shape().NumAxes(), 2);
+    const int64_t line_size = unique_embeddings->shape().At(1);
+    const int64_t embedding_size = embedding_grad->shape().At(1);
+    CHECK_EQ(line_size, embedding_size * 2);
+    double scale = ctx->Attr<double>("scale");
+    const float l1 = ctx->Attr<float>("l1");
+    const float l2 = ctx->Attr<float>("l2");
+    const auto weight_decay = ctx->Attr<float>("weight_decay");
+    const auto beta = ctx->Attr<float>("beta");
+    const EmbeddingUpdateInputs inputs = GetUpdateInputs<T, IDX>(ctx, &scale, true);
+    const G* model_diff = embedding_grad->dptr<G>();
+    T* updated = updated_unique_embeddings->mut_dptr<T>();
+    ForEachUpdateElement<T>(
+        ctx->stream(), inputs.num_unique, line_size, embedding_size, inputs.skip,
+        unique_embeddings->dptr<T>(), updated, [&](int64_t i, int64_t model_offset) {
+          MomentumUpdateFunctor<T, G>()(model_diff + i, updated + model_offset,
+                                        updated + model_offset + embedding_size,
+                                        static_cast<T>(scale), l1, l2, beta, weight_decay,
+                                        inputs.learning_rate);
+        });
+  }
+  bool AlwaysComputeWhenAllOutputsEmpty() const override { return false; }
+};
+
+template<typename T, typename G, typename IDX>
+class CpuAdamEmbeddingUpdateKernel final : public user_op::OpKernel {
+ public:
+  CpuAdamEmbeddingUpdateKernel() = default;
+  ~CpuAdamEmbeddingUpdateKernel() override = default;
+
+ private:
+  using user_op::OpKernel::Compute;
+  void Compute(user_op::KernelComputeContext* ctx) const override {
+    const user_op::Tensor* unique_embeddings = ctx->Tensor4ArgNameAndIndex("unique_embeddings", 0);
+    const user_op::Tensor* embedding_grad = ctx->Tensor4ArgNameAndIndex("embedding_grad", 0);
+    user_op::Tensor* updated_unique_embeddings =
+        ctx->Tensor4ArgNameAndIndex("updated_unique_embeddings", 0);
+    CHECK_EQ(unique_embeddings->shape().NumAxes(), 2);
+    CHECK_EQ(embedding_grad->shape().NumAxes(), 2);
+    const int64_t line_size = unique_embeddings->shape().At(1);
+    const int64_t embedding_size = embedding_grad->shape().At(1);
+    CHECK_EQ(line_size, embedding_size * 3);
+    double scale = ctx->Attr<double>("scale");
+    const float l1 = ctx->Attr<float>("l1");
+    const float l2 = ctx->Attr<float>("l2");
+    const auto weight_decay = ctx->Attr<float>("weight_decay");
+    const auto beta1 = ctx->Attr<float>("beta1");
+    const auto beta2 = ctx->Attr<float>("beta2");
+    const auto epsilon = ctx->Attr<float>("epsilon");
+    const EmbeddingUpdateInputs inputs = GetUpdateInputs<T, IDX>(ctx, &scale, true);
+    float bias_correction1 = 1.0;
+    float bias_correction2 = 1.0;
+    if (ctx->has_input("bias_correction1", 0)) {
+      bias_correction1 = *ctx->Tensor4ArgNameAndIndex("bias_correction1", 0)->dptr<float>();
+    }
+    if (ctx->has_input("bias_correction2", 0)) {
+      bias_correction2 = *ctx->Tensor4ArgNameAndIndex("bias_correction2", 0)->dptr<float>();
+    }
+    const G* model_diff = embedding_grad->dptr<G>();
+    T* updated = updated_unique_embeddings->mut_dptr<T>();
+    ForEachUpdateElement<T>(
+        ctx->stream(), inputs.num_unique, line_size, embedding_size, inputs.skip,
+        unique_embeddings->dptr<T>(), updated, [&](int64_t i, int64_t model_offset) {
+          AdamUpdateFunctor<T, G>()(model_diff + i, updated + model_offset,
+                                    updated + model_offset + embedding_size,
+                                    updated + model_offset + 2 * embedding_size, nullptr,
+                                    static_cast<T>(scale), l1, l2, beta1, beta2, epsilon,
+                                    weight_decay, false, bias_correction1, bias_correction2,
+                                    inputs.learning_rate);
+        });
+  }
+  bool AlwaysComputeWhenAllOutputsEmpty() const override { return false; }
+};
+
+template<typename T, typename G, typename IDX>
+class CpuAdagradEmbeddingUpdateKernel final : public user_op::OpKernel {
+ public:
+  CpuAdagradEmbeddingUpdateKernel() = default;
+  ~CpuAdagradEmbeddingUpdateKernel() override = default;
+
+ private:
+  using user_op::OpKernel::Compute;
+  void Compute(user_op::KernelComputeContext* ctx) const override {
+    const user_op::Tensor* unique_embeddings = ctx->Tensor4ArgNameAndIndex("unique_embeddings", 0);
+    const user_op::Tensor* embedding_grad = ctx->Tensor4ArgNameAndIndex("embedding_grad", 0);
+    user_op::Tensor* updated_unique_embeddings =
+        ctx->Tensor4ArgNameAndIndex("updated_unique_embeddings", 0);
+    CHECK_EQ(unique_embeddings->shape().NumAxes(), 2);
+    CHECK_EQ(embedding_grad->shape().NumAxes(), 2);
+    const int64_t line_size = unique_embeddings->shape().At(1);
+    const int64_t embedding_size = embedding_grad->shape().At(1);
+    CHECK_EQ(line_size, embedding_size * 2);
+    double scale = ctx->Attr<double>("scale");
+    const float l1 = ctx->Attr<float>("l1");
+    const float l2 = ctx->Attr<float>("l2");
+    const auto weight_decay = ctx->Attr<float>("weight_decay");
+    const auto lr_decay = ctx->Attr<float>("lr_decay");
+    const auto epsilon = ctx->Attr<float>("epsilon");
+    const EmbeddingUpdateInputs inputs = GetUpdateInputs<T, IDX>(ctx, &scale, true);
+    const int64_t train_step = *ctx->Tensor4ArgNameAndIndex("train_step", 0)->dptr<int64_t>() + 1;
+    const float learning_rate = inputs.learning_rate / (1 + (train_step - 1) * lr_decay);
+    const G* model_diff = embedding_grad->dptr<G>();
+    T* updated = updated_unique_embeddings->mut_dptr<T>();
+    ForEachUpdateElement<T>(
+        ctx->stream(), inputs.num_unique, line_size, embedding_size, inputs.skip,
+        unique_embeddings->dptr<T>(), updated, [&](int64_t i, int64_t model_offset) {
+          AdagradUpdateFunctor<T, G>()(model_diff + i, updated + model_offset,
+                                       updated + model_offset + embedding_size,
+                                       static_cast<T>(scale), l1, l2, epsilon, weight_decay,
+                                       learning_rate);
+        });
+  }
+  bool AlwaysComputeWhenAllOutputsEmpty() const override { return false; }
+};
+
+template<typename T, typename G, typename IDX>
+class CpuFtrlEmbeddingUpdateKernel final : public user_op::OpKernel {
+ public:
+  CpuFtrlEmbeddingUpdateKernel() = default;
+  ~CpuFtrlEmbeddingUpdateKernel() override = default;
+
+ private:
+  using user_op::OpKernel::Compute;
+  void Compute(user_op::KernelComputeContext* ctx) const override {
+    const user_op::Tensor* unique_embeddings = ctx->Tensor4ArgNameAndIndex("unique_embeddings", 0);
+    const user_op::Tensor* embedding_grad = ctx->Tensor4ArgNameAndIndex("embedding_grad", 0);
+    user_op::Tensor* updated_unique_embeddings =
+        ctx->Tensor4ArgNameAndIndex("updated_unique_embeddings", 0);
+    CHECK_EQ(unique_embeddings->shape().NumAxes(), 2)
+        << "The NumAxes of unique_embedding should be equal to 2. ";
+    CHECK_EQ(embedding_grad->shape().NumAxes(), 2)
+        << "The NumAxes of embedding_grad should be equal to 2. ";
+    const int64_t line_size = unique_embeddings->shape().At(1);
+    const int64_t embedding_size = embedding_grad->shape().At(1);
+    CHECK_EQ(line_size, embedding_size * 3)
+        << "The line_size should be equal to 3 x embedding_size. ";
+    const float l1 = 0.0;
+    const float l2 = 0.0;
+    const float weight_decay = ctx->Attr<float>("weight_decay");
+    CHECK_EQ(weight_decay, static_cast<float>(0.0))
+        << "Currently not support for setting weight decay. ";
+    const float lr_power = ctx->Attr<float>("lr_power");
+    const float lambda1 = ctx->Attr<float>("lambda1");
+    const float lambda2 = ctx->Attr<float>("lambda2");
+    const float beta = ctx->Attr<float>("beta");
+    double scale = ctx->Attr<double>("scale");
+    const EmbeddingUpdateInputs inputs = GetUpdateInputs<T, IDX>(ctx, &scale, false);
+    const G* model_diff = embedding_grad->dptr<G>();
+    T* updated = updated_unique_embeddings->mut_dptr<T>();
+    ForEachUpdateElement<T>(
+        ctx->stream(), inputs.num_unique, line_size, embedding_size, inputs.skip,
+        unique_embeddings->dptr<T>(), updated, [&](int64_t i, int64_t model_offset) {
+          FtrlUpdateFunctor<T, G>()(model_diff + i, updated + model_offset,
+                                    updated + model_offset + embedding_size,
+                                    updated + model_offset + 2 * embedding_size,
+                                    static_cast<T>(scale), l1, l2, lr_power, lambda1, lambda2,
+                                    beta, weight_decay, inputs.learning_rate);
+        });
+  }
+  bool AlwaysComputeWhenAllOutputsEmpty() const override { return false; }
+};
+
+#define IDX_DATA_TYPE_SEQ                           \
+  OF_PP_MAKE_TUPLE_SEQ(uint32_t, DataType::kUInt32) \
+  OF_PP_MAKE_TUPLE_SEQ(int32_t, DataType::kInt32)
+
+#define REGISTER_CPU_EMBEDDING_UPDATE_KERNEL(op_type_name, kernel, t_dtype_pair, g_type_pair,   \
+                                             idx_dtype_pair)                                    \
+  REGISTER_USER_KERNEL(op_type_name)                                                            \
+      .SetCreateFn<kernel<OF_PP_PAIR_FIRST(t_dtype_pair), OF_PP_PAIR_FIRST(g_type_pair),        \
+                          OF_PP_PAIR_FIRST(idx_dtype_pair)>>()                                  \
+      .SetIsMatchedHob(                                                                         \
+          (user_op::HobDeviceType() == DeviceType::kCPU)                                        \
+          && (user_op::HobDataType("num_unique_ids", 0) == OF_PP_PAIR_SECOND(idx_dtype_pair))   \
+          && (user_op::HobDataType("embedding_grad", 0) == OF_PP_PAIR_SECOND(g_type_pair))      \
+          && (user_op::HobDataType("unique_embeddings", 0) == OF_PP_PAIR_SECOND(t_dtype_pair)));
+
+#define REGISTER_CPU_SGD_EMBEDDING_UPDATE_KERNEL(t_dtype_pair, g_type_pair, idx_dtype_pair)      \
+  REGISTER_CPU_EMBEDDING_UPDATE_KERNEL("sgd_embedding_update", CpuSgdEmbeddingUpdateKernel,     \
+                                       t_dtype_pair, g_type_pair, idx_dtype_pair)
+#define REGISTER_CPU_MOMENTUM_EMBEDDING_UPDATE_KERNEL(t_dtype_pair, g_type_pair, idx_dtype_pair) \
+  REGISTER_CPU_EMBEDDING_UPDATE_KERNEL("momentum_embedding_update",                             \
+                                       CpuMomentumEmbeddingUpdateKernel, t_dtype_pair,          \
+                                       g_type_pair, idx_dtype_pair)
+#define REGISTER_CPU_ADAM_EMBEDDING_UPDATE_KERNEL(t_dtype_pair, g_type_pair, idx_dtype_pair)     \
+  REGISTER_CPU_EMBEDDING_UPDATE_KERNEL("adam_embedding_update", CpuAdamEmbeddingUpdateKernel,   \
+                                       t_dtype_pair, g_type_pair, idx_dtype_pair)
+#define REGISTER_CPU_ADAGRAD_EMBEDDING_UPDATE_KERNEL(t_dtype_pair, g_type_pair, idx_dtype_pair)  \
+  REGISTER_CPU_EMBEDDING_UPDATE_KERNEL("adagrad_embedding_update",                              \
+                                       CpuAdagradEmbeddingUpdateKernel, t_dtype_pair,           \
+                                       g_type_pair, idx_dtype_pair)
+#define REGISTER_CPU_FTRL_EMBEDDING_UPDATE_KERNEL(t_dtype_pair, g_type_pair, idx_dtype_pair)     \
+  REGISTER_CPU_EMBEDDING_UPDATE_KERNEL("ftrl_embedding_update", CpuFtrlEmbeddingUpdateKernel,   \
+                                       t_dtype_pair, g_type_pair, idx_dtype_pair)
+
+OF_PP_SEQ_PRODUCT_FOR_EACH_TUPLE(REGISTER_CPU_SGD_EMBEDDING_UPDATE_KERNEL, FLOATING_DATA_TYPE_SEQ,
+                                 FLOATING_DATA_TYPE_SEQ, IDX_DATA_TYPE_SEQ)
+OF_PP_SEQ_PRODUCT_FOR_EACH_TUPLE(REGISTER_CPU_MOMENTUM_EMBEDDING_UPDATE_KERNEL,
+                                 FLOATING_DATA_TYPE_SEQ, FLOATING_DATA_TYPE_SEQ, IDX_DATA_TYPE_SEQ)
+OF_PP_SEQ_PRODUCT_FOR_EACH_TUPLE(REGISTER_CPU_ADAM_EMBEDDING_UPDATE_KERNEL, FLOATING_DATA_TYPE_SEQ,
+                                 FLOATING_DATA_TYPE_SEQ, IDX_DATA_TYPE_SEQ)
+OF_PP_SEQ_PRODUCT_FOR_EACH_TUPLE(REGISTER_CPU_ADAGRAD_EMBEDDING_UPDATE_KERNEL,
+                                 FLOATING_DATA_TYPE_SEQ, FLOATING_DATA_TYPE_SEQ, IDX_DATA_TYPE_SEQ)
+OF_PP_SEQ_PRODUCT_FOR_EACH_TUPLE(REGISTER_CPU_FTRL_EMBEDDING_UPDATE_KERNEL, FLOATING_DATA_TYPE_SEQ,
+                                 FLOATING_DATA_TYPE_SEQ, IDX_DATA_TYPE_SEQ)
+
+}  // namespace oneflow
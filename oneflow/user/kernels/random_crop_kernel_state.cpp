@@ -19,7 +19,7 @@ limitations under the License.
 namespace oneflow {
 
 std::shared_ptr<RandomCropKernelState> CreateRandomCropKernelState(
-    user_op::KernelInitContext* ctx) {
+    user_op::KernelInitContext* ctx, const std::string& batch_arg_name) {
   int32_t num_attempts = ctx->Attr<int32_t>("num_attempts");
   CHECK(num_attempts >= 1);
   const std::vector<float>& random_aspect_ratio =
@@ -28,9 +28,10 @@ std::shared_ptr<RandomCropKernelState> CreateRandomCropKernelState(
         && random_aspect_ratio.at(0) <= random_aspect_ratio.at(1));
   const std::vector<float>& random_area = ctx->Attr<std::vector<float>>("random_area");
   CHECK(random_area.size() == 2 && 0 < random_area.at(0) && random_area.at(0) <= random_area.at(1));
-  const user_op::TensorDesc* out_tensor_desc = ctx->TensorDesc4ArgNameAndIndex("out", 0);
+  const user_op::TensorDesc* batch_tensor_desc =
+      ctx->TensorDesc4ArgNameAndIndex(batch_arg_name, 0);
   return std::shared_ptr<RandomCropKernelState>(new RandomCropKernelState(
-      out_tensor_desc->shape().elem_cnt(), CHECK_JUST(GetOpKernelRandomSeed(ctx)),
+      batch_tensor_desc->shape().elem_cnt(), CHECK_JUST(GetOpKernelRandomSeed(ctx)),
       {random_aspect_ratio.at(0), random_aspect_ratio.at(1)},
       {random_area.at(0), random_area.at(1)}, num_attempts));
 }
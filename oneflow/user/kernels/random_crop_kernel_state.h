@@ -42,7 +42,9 @@ class RandomCropKernelState final : public user_op::OpKernelState {
   std::vector<std::shared_ptr<RandomCropGenerator>> gens_;
 };
 
-std::shared_ptr<RandomCropKernelState> CreateRandomCropKernelState(user_op::KernelInitContext* ctx);
+// One generator is created per element of `batch_arg_name`.
+std::shared_ptr<RandomCropKernelState> CreateRandomCropKernelState(
+    user_op::KernelInitContext* ctx, const std::string& batch_arg_name = "out");
 
 }  // namespace oneflow
 
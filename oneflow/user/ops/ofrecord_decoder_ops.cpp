@@ -16,6 +16,7 @@ limitations under the License.
 #include "oneflow/core/framework/framework.h"
 #include "oneflow/core/common/balanced_splitter.h"
 #include "oneflow/core/framework/op_generated.h"
+#include "oneflow/user/image/image_util.h"
 
 namespace oneflow {
 
@@ -159,4 +160,79 @@ namespace oneflow {
   return Maybe<void>::Ok();
 }
 
+/* static */ Maybe<void> OfrecordImageDecoderRandomCropResizeNormalizeOp::InferLogicalTensorDesc(
+    user_op::InferContext* ctx) {
+  const user_op::TensorDesc& in_tensor = ctx->InputTensorDesc("in", 0);
+  user_op::TensorDesc* out_tensor = ctx->OutputTensorDesc("out", 0);
+  CHECK_OR_RETURN(in_tensor.shape().NumAxes() == 1 && in_tensor.shape().At(0) >= 1);
+  const int64_t batch_size = in_tensor.shape().At(0);
+  const int64_t target_width = ctx->Attr<int64_t>("target_width");
+  const int64_t target_height = ctx->Attr<int64_t>("target_height");
+  const int64_t channels = ImageUtil::IsColor(ctx->Attr<std::string>("color_space")) ? 3 : 1;
+  if (ctx->Attr<std::string>("output_layout") == "NCHW") {
+    *out_tensor->mut_shape() = Shape({batch_size, channels, target_height, target_width});
+  } else {
+    *out_tensor->mut_shape() = Shape({batch_size, target_height, target_width, channels});
+  }
+  return Maybe<void>::Ok();
+}
+
+/*static*/ Maybe<void> OfrecordImageDecoderRandomCropResizeNormalizeOp::InferPhysicalTensorDesc(
+    user_op::InferContext* ctx) {
+  return InferLogicalTensorDesc(ctx);
+}
+
+/* static */ Maybe<void> OfrecordImageDecoderRandomCropResizeNormalizeOp::GetSbp(
+    user_op::SbpContext* ctx) {
+  ctx->NewBuilder().Split(user_op::OpArg("in", 0), 0).Split(user_op::OpArg("out", 0), 0).Build();
+  return Maybe<void>::Ok();
+}
+
+/* static */ Maybe<void> OfrecordImageDecoderRandomCropResizeNormalizeOp::CheckAttr(
+    const user_op::UserOpDefWrapper& def, const user_op::UserOpConfWrapper& conf) {
+  bool check_failed = false;
+  std::ostringstream err;
+  err << "Illegal attr value for " << conf.op_type_name() << " op, op_name: " << conf.op_name();
+  int64_t target_width = conf.attr<int64_t>("target_width");
+  int64_t target_height = conf.attr<int64_t>("target_height");
+  if (target_width <= 0 || target_height <= 0) {
+    err << ", target_width: " << target_width << ", target_height: " << target_height;
+    check_failed = true;
+  }
+  const std::string& output_layout = conf.attr<std::string>("output_layout");
+  if (output_layout != "NCHW" && output_layout != "NHWC") {
+    err << ", output_layout: " << output_layout << " (only support NCHW and NHWC)";
+    check_failed = true;
+  }
+  const size_t channels = ImageUtil::IsColor(conf.attr<std::string>("color_space")) ? 3 : 1;
+  const size_t mean_size = conf.attr<std::vector<float>>("mean").size();
+  const size_t std_size = conf.attr<std::vector<float>>("std").size();
+  if ((mean_size != 1 && mean_size != channels) || (std_size != 1 && std_size != channels)) {
+    err << ", size of mean: " << mean_size << ", size of std: " << std_size
+        << " (should be 1 or the number of channels " << channels << ")";
+    check_failed = true;
+  }
+  const std::string& interp_type = conf.attr<std::string>("interpolation_type");
+  if (!CheckInterpolationValid(interp_type, err)) { check_failed = true; }
+  if (check_failed) { return oneflow::Error::CheckFailedError() << err.str(); }
+  return Maybe<void>::Ok();
+}
+
+/* static */ Maybe<void> OfrecordImageDecoderRandomCropResizeNormalizeOp::ModifyInputArg(
+    const GetInputArgModifier& GetInputArgModifierFn, const user_op::UserOpConfWrapper& conf) {
+  user_op::InputArgModifier* in_modifier = GetInputArgModifierFn("in", 0);
+  CHECK_NOTNULL_OR_RETURN(in_modifier);
+  in_modifier->set_requires_grad(false);
+  return Maybe<void>::Ok();
+}
+
+/* static */ Maybe<void> OfrecordImageDecoderRandomCropResizeNormalizeOp::InferDataType(
+    user_op::InferContext* ctx) {
+  const user_op::TensorDesc& in_tensor = ctx->InputTensorDesc("in", 0);
+  user_op::TensorDesc* out_tensor = ctx->OutputTensorDesc("out", 0);
+  CHECK_OR_RETURN(in_tensor.data_type() == DataType::kOFRecord);
+  *out_tensor->mut_data_type() = DataType::kFloat;
+  return Maybe<void>::Ok();
+}
+
 }  // namespace oneflow
@@ -0,0 +1,589 @@
+"""
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+"""Benchmarks of the data readers, decoders and image ops in ``oneflow.nn``.
+
+Synthetic OFRecord, OneRec, GPT indexed-bin and COCO fixtures are generated
+locally, every case reports samples/sec and bytes/sec, and the results are
+written as JSON so that they can be compared across releases::
+
+    python3 -m oneflow.benchmarks.data_pipeline --output data_pipeline.json
+
+Each thread count runs in a fresh process pinned to that many cores.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+import oneflow as flow
+from oneflow.experimental.ofrecord_writer import OFRecordWriter
+from oneflow.experimental.gpt_indexed_bin import write_gpt_indexed_bin
+from oneflow.experimental.onerec_chunk import compress_onerec, write_onerec
+
+_MEAN = [123.68, 116.779, 103.939]
+_STD = [58.393, 57.12, 57.375]
+_CROP_SIZE = 224
+
+_CASES = []
+
+
+def _case(name: str, kind: str, fixture: Optional[str] = None):
+    def register(build):
+        _CASES.append(dict(name=name, kind=kind, fixture=fixture, build=build))
+        return build
+
+    return register
+
+
+def _encode_jpeg(image: np.ndarray) -> Optional[bytes]:
+    try:
+        import cv2
+
+        return cv2.imencode(".jpg", image)[1].tobytes()
+    except ImportError:
+        pass
+    try:
+        import io
+
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.fromarray(image).save(buffer, format="JPEG")
+        return buffer.getvalue()
+    except ImportError:
+        return None
+
+
+def _synthetic_images(num_images: int, image_size: int, rng) -> List[bytes]:
+    images = []
+    for _ in range(num_images):
+        # smooth gradients plus noise compress like natural photos, unlike pure noise
+        h = image_size + int(rng.randint(0, image_size // 4))
+        w = image_size + int(rng.randint(0, image_size // 4))
+        gradient = np.add.outer(np.arange(h), np.arange(w))[:, :, None] * [1, 2, 3]
+        noise = rng.randint(0, 32, size=(h, w, 3))
+        encoded = _encode_jpeg(((gradient + noise) % 256).astype(np.uint8))
+        if encoded is None:
+            return []
+        images.append(encoded)
+    return images
+
+
+def _gpt_docs(num_docs: int, rng) -> List[np.ndarray]:
+    sizes = rng.randint(16, 512, size=num_docs)
+    tokens = rng.randint(0, 50000, size=int(sizes.sum())).astype(np.int32)
+    return np.split(tokens, np.cumsum(sizes)[:-1])
+
+
+def _write_coco(root: str, images: Sequence[bytes], image_size: int, rng) -> None:
+    image_dir = os.path.join(root, "images")
+    os.makedirs(image_dir, exist_ok=True)
+    annotation = dict(images=[], annotations=[], categories=[])
+    annotation["categories"] = [dict(id=i + 1, name=str(i)) for i in range(80)]
+    for image_id, encoded in enumerate(images):
+        file_name = "{:012d}.jpg".format(image_id)
+        with open(os.path.join(image_dir, file_name), "wb") as f:
+            f.write(encoded)
+        annotation["images"].append(
+            dict(id=image_id, file_name=file_name, height=image_size, width=image_size)
+        )
+        for _ in range(int(rng.randint(1, 8))):
+            x, y = rng.uniform(0, image_size / 2, size=2).tolist()
+            w, h = rng.uniform(8, image_size / 2, size=2).tolist()
+            polygon = [x, y, x + w, y, x + w, y + h, x, y + h]
+            annotation["annotations"].append(
+                dict(
+                    id=len(annotation["annotations"]),
+                    image_id=image_id,
+                    category_id=int(rng.randint(1, 81)),
+                    iscrowd=0,
+                    bbox=[x, y, w, h],
+                    area=w * h,
+                    segmentation=[polygon],
+                )
+            )
+    with open(os.path.join(root, "annotations.json"), "w") as f:
+        json.dump(annotation, f)
+
+
+def prepare_fixtures(
+    root: str, num_samples: int = 512, image_size: int = 256, seed: int = 0
+) -> Dict[str, object]:
+    """Generates the synthetic datasets under ``root`` and returns their description.
+
+    Image fixtures need OpenCV or Pillow to encode JPEGs and are skipped otherwise.
+    """
+    rng = np.random.RandomState(seed)
+    fixtures = dict(root=root, num_samples=num_samples, image_size=image_size)
+
+    images = _synthetic_images(num_samples, image_size, rng)
+    labels = rng.randint(0, 1000, size=num_samples).astype(np.int32)
+    ofrecord_dir = os.path.join(root, "ofrecord")
+    with OFRecordWriter(ofrecord_dir, num_shards=1, worker_mode="thread") as writer:
+        if images:
+            writer.write({"encoded": images, "class/label": labels})
+        else:
+            writer.write({"class/label": labels})
+    fixtures["ofrecord"] = dict(
+        path=ofrecord_dir,
+        has_images=bool(images),
+        bytes_per_sample=os.path.getsize(os.path.join(ofrecord_dir, "part-00000"))
+        / num_samples,
+    )
+
+    onerec_file = os.path.join(root, "data.onerec")
+    payloads = [(b"%08d" % i) * int(rng.randint(16, 128)) for i in range(num_samples)]
+    write_onerec(onerec_file, payloads)
+    fixtures["onerec"] = dict(
+        path=onerec_file, bytes_per_sample=os.path.getsize(onerec_file) / num_samples
+    )
+    try:
+        compressed_file = os.path.join(root, "data.lz4.onerec")
+        compress_onerec(onerec_file, compressed_file, chunk_size=256 << 10)
+        fixtures["onerec_lz4"] = dict(
+            path=compressed_file,
+            bytes_per_sample=os.path.getsize(compressed_file) / num_samples,
+        )
+    except ImportError:
+        pass
+
+    gpt_prefix = os.path.join(root, "gpt_text_document")
+    write_gpt_indexed_bin(gpt_prefix, _gpt_docs(max(num_samples, 64), rng))
+    fixtures["gpt"] = dict(prefix=gpt_prefix, seq_length=1024)
+
+    if images:
+        coco_root = os.path.join(root, "coco")
+        _write_coco(coco_root, images, image_size, rng)
+        fixtures["coco"] = dict(
+            annotation_file=os.path.join(coco_root, "annotations.json"),
+            image_dir=os.path.join(coco_root, "images"),
+            bytes_per_sample=sum(len(image) for image in images) / num_samples,
+        )
+    return fixtures
+
+
+def _ofrecord_reader(fixtures, batch_size):
+    return flow.nn.OFRecordReader(
+        fixtures["ofrecord"]["path"],
+        batch_size=batch_size,
+        part_name_suffix_length=5,
+        random_shuffle=True,
+        shuffle_after_epoch=True,
+    )
+
+
+def _decoded_bytes(fixtures):
+    return fixtures["image_size"] ** 2 * 3
+
+
+@_case("ofrecord_reader", "reader", "ofrecord")
+def _build_ofrecord_reader(fixtures, batch_size):
+    reader = _ofrecord_reader(fixtures, batch_size)
+    return reader, fixtures["ofrecord"]["bytes_per_sample"]
+
+
+@_case("ofrecord_raw_decoder", "decoder", "ofrecord")
+def _build_ofrecord_raw_decoder(fixtures, batch_size):
+    record = _ofrecord_reader(fixtures, batch_size)()
+    decoder = flow.nn.OFRecordRawDecoder("class/label", shape=(), dtype=flow.int32)
+    return lambda: decoder(record), 4
+
+
+@_case("ofrecord_image_decoder", "decoder", "ofrecord_images")
+def _build_ofrecord_image_decoder(fixtures, batch_size):
+    record = _ofrecord_reader(fixtures, batch_size)()
+    decoder = flow.nn.OFRecordImageDecoder("encoded", color_space="RGB")
+    return lambda: decoder(record), fixtures["ofrecord"]["bytes_per_sample"]
+
+
+@_case("ofrecord_image_decoder_random_crop", "decoder", "ofrecord_images")
+def _build_ofrecord_image_decoder_random_crop(fixtures, batch_size):
+    record = _ofrecord_reader(fixtures, batch_size)()
+    decoder = flow.nn.OFRecordImageDecoderRandomCrop("encoded", color_space="RGB")
+    return lambda: decoder(record), fixtures["ofrecord"]["bytes_per_sample"]
+
+
+@_case("image_resize", "image_op", "ofrecord_images")
+def _build_image_resize(fixtures, batch_size):
+    record = _ofrecord_reader(fixtures, batch_size)()
+    image = flow.nn.OFRecordImageDecoder("encoded", color_space="RGB")(record)
+    resize = flow.nn.image.Resize(target_size=[_CROP_SIZE, _CROP_SIZE])
+    return lambda: resize(image)[0], _decoded_bytes(fixtures)
+
+
+@_case("crop_mirror_normalize", "image_op", "ofrecord_images")
+def _build_crop_mirror_normalize(fixtures, batch_size):
+    record = _ofrecord_reader(fixtures, batch_size)()
+    image = flow.nn.OFRecordImageDecoder("encoded", color_space="RGB")(record)
+    image = flow.nn.image.Resize(target_size=[_CROP_SIZE, _CROP_SIZE])(image)[0]
+    mirror = flow.nn.CoinFlip(batch_size=batch_size)()
+    normalize = flow.nn.CropMirrorNormalize(
+        color_space="RGB", mean=_MEAN, std=_STD, output_dtype=flow.float
+    )
+    return lambda: normalize(image, mirror), _CROP_SIZE * _CROP_SIZE * 3
+
+
+@_case("image_normalize", "image_op", "ofrecord_images")
+def _build_image_normalize(fixtures, batch_size):
+    record = _ofrecord_reader(fixtures, batch_size)()
+    image = flow.nn.OFRecordImageDecoder("encoded", color_space="RGB")(record)
+    resize = flow.nn.image.Resize(
+        target_size=[_CROP_SIZE, _CROP_SIZE], dtype=flow.float32
+    )
+    image = resize(image)[0]
+    normalize = flow.nn.image.normalize(std=_STD, mean=_MEAN)
+    return lambda: normalize(image), _CROP_SIZE * _CROP_SIZE * 3
+
+
+@_case("onerec_reader", "reader", "onerec")
+def _build_onerec_reader(fixtures, batch_size):
+    reader = flow.nn.OneRecReader(
+        [fixtures["onerec"]["path"]],
+        batch_size,
+        shuffle=True,
+        shuffle_mode="instance",
+        verify_example=False,
+    )
+    return reader, fixtures["onerec"]["bytes_per_sample"]
+
+
+@_case("onerec_lz4_reader", "reader", "onerec_lz4")
+def _build_onerec_lz4_reader(fixtures, batch_size):
+    reader = flow.nn.OneRecReader(
+        [fixtures["onerec_lz4"]["path"]],
+        batch_size,
+        shuffle=True,
+        shuffle_mode="instance",
+        verify_example=False,
+    )
+    return reader, fixtures["onerec_lz4"]["bytes_per_sample"]
+
+
+@_case("gpt_indexed_bin_reader", "reader", "gpt")
+def _build_gpt_reader(fixtures, batch_size):
+    seq_length = fixtures["gpt"]["seq_length"]
+    reader = flow.nn.GPTIndexedBinDataReader(
+        fixtures["gpt"]["prefix"],
+        seq_length=seq_length,
+        num_samples=fixtures["num_samples"] * 4,
+        batch_size=batch_size,
+        dtype=flow.int64,
+        random_seed=1,
+    )
+    return reader, (seq_length + 1) * 4
+
+
+@_case("coco_reader", "reader", "coco")
+def _build_coco_reader(fixtures, batch_size):
+    reader = flow.nn.COCOReader(
+        annotation_file=fixtures["coco"]["annotation_file"],
+        image_dir=fixtures["coco"]["image_dir"],
+        batch_size=batch_size,
+        shuffle=True,
+        random_seed=1,
+        group_by_aspect_ratio=False,
+    )
+    return reader, fixtures["coco"]["bytes_per_sample"]
+
+
+@_case("ofrecord_imagenet_pipeline", "pipeline", "ofrecord_images")
+def _build_ofrecord_pipeline(fixtures, batch_size):
+    reader = _ofrecord_reader(fixtures, batch_size)
+    label_decoder = flow.nn.OFRecordRawDecoder(
+        "class/label", shape=(), dtype=flow.int32
+    )
+    image_decoder = flow.nn.OFRecordImageDecoderRandomCrop("encoded", color_space="RGB")
+    resize = flow.nn.image.Resize(target_size=[_CROP_SIZE, _CROP_SIZE])
+    flip = flow.nn.CoinFlip(batch_size=batch_size)
+    normalize = flow.nn.CropMirrorNormalize(
+        color_space="RGB", mean=_MEAN, std=_STD, output_dtype=flow.float
+    )
+
+    def step():
+        record = reader()
+        image = resize(image_decoder(record))[0]
+        return normalize(image, flip()), label_decoder(record)
+
+    return step, fixtures["ofrecord"]["bytes_per_sample"]
+
+
+@_case("ofrecord_imagenet_fused_pipeline", "pipeline", "ofrecord_images")
+def _build_ofrecord_fused_pipeline(fixtures, batch_size):
+    reader = _ofrecord_reader(fixtures, batch_size)
+    label_decoder = flow.nn.OFRecordRawDecoder(
+        "class/label", shape=(), dtype=flow.int32
+    )
+    fused = flow.nn.OFRecordImageDecoderRandomCropResizeNormalize(
+        "encoded",
+        target_width=_CROP_SIZE,
+        target_height=_CROP_SIZE,
+        color_space="RGB",
+        mean=_MEAN,
+        std=_STD,
+    )
+
+    def step():
+        record = reader()
+        return fused(record), label_decoder(record)
+
+    return step, fixtures["ofrecord"]["bytes_per_sample"]
+
+
+@_case("coco_detection_pipeline", "pipeline", "coco")
+def _build_coco_pipeline(fixtures, batch_size):
+    reader, bytes_per_sample = _build_coco_reader(fixtures, batch_size)
+    decode = flow.nn.image.decode(dtype=flow.float32, color_space="RGB")
+    resize = flow.nn.image.Resize(
+        resize_side="shorter",
+        keep_aspect_ratio=True,
+        target_size=_CROP_SIZE,
+        dtype=flow.float32,
+    )
+    normalize = flow.nn.image.normalize(std=_STD, mean=_MEAN)
+    align = flow.nn.image.batch_align(
+        shape=(_CROP_SIZE * 2, _CROP_SIZE * 2, 3), dtype=flow.float, alignment=32
+    )
+
+    def step():
+        outputs = reader()
+        image = normalize(resize(decode(outputs[0]))[0])
+        return align(image), outputs[3], outputs[4]
+
+    return step, bytes_per_sample
+
+
+class _SyntheticImageDataset(flow.utils.data.Dataset):
+    def __init__(self, num_samples, image_size):
+        self.num_samples = num_samples
+        self.image_size = image_size
+
+    def __len__(self):
+        return self.num_samples
+
+    def __getitem__(self, index):
+        rng = np.random.RandomState(index)
+        image = rng.randint(0, 256, size=(self.image_size, self.image_size, 3))
+        image = (image.astype(np.float32) - _MEAN) / _STD
+        return image.transpose(2, 0, 1).astype(np.float32), index % 1000
+
+
+def _build_dataloader(num_workers, worker_mode):
+    def build(fixtures, batch_size):
+        dataset = _SyntheticImageDataset(1 << 30, _CROP_SIZE)
+        loader = flow.utils.data.DataLoader(
+            dataset,
+            batch_size=batch_size,
+            num_workers=num_workers,
+            worker_mode=worker_mode,
+        )
+        iterator = iter(loader)
+        return lambda: next(iterator), _CROP_SIZE * _CROP_SIZE * 3 * 4
+
+    return build
+
+
+for _num_workers, _worker_mode in [
+    (0, "process"),
+    (2, "process"),
+    (4, "process"),
+    (2, "thread"),
+    (4, "thread"),
+]:
+    _case(
+        "dataloader_{}_{}_workers".format(_worker_mode, _num_workers)
+        if _num_workers > 0
+        else "dataloader_no_workers",
+        "dataloader",
+    )(_build_dataloader(_num_workers, _worker_mode))
+
+
+def _fixture_available(fixtures, fixture):
+    if fixture is None:
+        return True
+    if fixture == "ofrecord_images":
+        return fixtures["ofrecord"]["has_images"]
+    return fixture in fixtures
+
+
+def _measure(step: Callable, iterations: int, warmup: int):
+    for _ in range(warmup):
+        step()
+    flow._oneflow_internal.eager.Sync()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        step()
+    # eager ops run asynchronously, so wait for the queued work before stopping the clock
+    flow._oneflow_internal.eager.Sync()
+    return time.perf_counter() - start
+
+
+def run_cases(
+    fixtures: Dict[str, object],
+    batch_sizes: Sequence[int] = (32, 128),
+    iterations: int = 20,
+    warmup: int = 3,
+    cases: Optional[Sequence[str]] = None,
+    num_threads: Optional[int] = None,
+) -> List[Dict[str, object]]:
+    """Runs the selected cases in this process and returns one result per case and
+    batch size. Cases whose fixture is unavailable are reported as skipped.
+    """
+    results = []
+    for case in _CASES:
+        if cases is not None and case["name"] not in cases:
+            continue
+        for batch_size in batch_sizes:
+            result = dict(
+                name=case["name"],
+                kind=case["kind"],
+                batch_size=batch_size,
+                num_threads=num_threads,
+            )
+            if not _fixture_available(fixtures, case["fixture"]):
+                result["skipped"] = "fixture {} is unavailable".format(case["fixture"])
+                results.append(result)
+                continue
+            step, bytes_per_sample = case["build"](fixtures, batch_size)
+            seconds = _measure(step, iterations, warmup)
+            num_samples = batch_size * iterations
+            result.update(
+                iterations=iterations,
+                seconds=seconds,
+                samples_per_sec=num_samples / seconds,
+                bytes_per_sec=num_samples * bytes_per_sample / seconds,
+            )
+            results.append(result)
+    return results
+
+
+def _run_in_subprocess(num_threads, fixtures, args):
+    cmd = [
+        sys.executable,
+        "-m",
+        "oneflow.benchmarks.data_pipeline",
+        "--fixtures-json",
+        json.dumps(fixtures),
+        "--num-threads",
+        str(num_threads),
+        "--batch-sizes",
+        ",".join(str(b) for b in args.batch_sizes),
+        "--iterations",
+        str(args.iterations),
+        "--warmup",
+        str(args.warmup),
+    ]
+    if args.cases:
+        cmd += ["--cases", ",".join(args.cases)]
+    output = subprocess.run(cmd, stdout=subprocess.PIPE, check=True).stdout
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def _pin_threads(num_threads):
+    # the CPU thread pool of OneFlow is sized at start up, so the core set is limited too
+    if hasattr(os, "sched_setaffinity"):
+        cores = sorted(os.sched_getaffinity(0))[:num_threads]
+        os.sched_setaffinity(0, cores)
+    flow.set_num_threads(num_threads)
+
+
+def _parse_ints(text):
+    return [int(x) for x in text.split(",") if x]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--output", default=None, help="JSON file, stdout if unset")
+    parser.add_argument("--data-dir", default=None, help="where fixtures are generated")
+    parser.add_argument("--num-samples", type=int, default=512)
+    parser.add_argument("--image-size", type=int, default=256)
+    parser.add_argument("--batch-sizes", type=_parse_ints, default=[32, 128])
+    parser.add_argument(
+        "--num-threads",
+        type=_parse_ints,
+        default=sorted({1, os.cpu_count() or 1}),
+        help="comma separated thread counts, each runs in its own process",
+    )
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument(
+        "--cases", type=lambda s: s.split(","), default=None, help="subset to run"
+    )
+    parser.add_argument("--list", action="store_true", help="list the cases")
+    parser.add_argument("--fixtures-json", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for case in _CASES:
+            print("{:<40}{}".format(case["name"], case["kind"]))
+        return
+    if args.fixtures_json is not None:
+        # child process of a thread count sweep
+        (num_threads,) = args.num_threads
+        _pin_threads(num_threads)
+        results = run_cases(
+            json.loads(args.fixtures_json),
+            args.batch_sizes,
+            args.iterations,
+            args.warmup,
+            args.cases,
+            num_threads,
+        )
+        print(json.dumps(results))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_dir = args.data_dir or tmp_dir
+        fixtures = prepare_fixtures(data_dir, args.num_samples, args.image_size)
+        results = []
+        for num_threads in args.num_threads:
+            results.extend(_run_in_subprocess(num_threads, fixtures, args))
+    report = dict(
+        suite="data_pipeline",
+        oneflow_version=flow.__version__,
+        oneflow_git_commit=flow.__git_commit__,
+        timestamp=time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        host=dict(
+            platform=platform.platform(),
+            python=platform.python_version(),
+            cpu_count=os.cpu_count(),
+        ),
+        config=dict(
+            num_samples=args.num_samples,
+            image_size=args.image_size,
+            batch_sizes=args.batch_sizes,
+            num_threads=args.num_threads,
+            iterations=args.iterations,
+            warmup=args.warmup,
+        ),
+        results=results,
+    )
+    text = json.dumps(report, indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+"""Benchmark of the throughput and the latency of CPU serving versus instances.
+
+A synthetic MLP is exported from nn.Graph, served by a
+``oneflow.serving.MultiInstanceSession`` of every instance count, and loaded by
+closed-loop clients. The results are written as JSON::
+
+    python3 -m oneflow.benchmarks.serving --num-instances 1,2,4 --output serving.json
+
+Each instance runs in its own process pinned to a core set of a NUMA node.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import tempfile
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+import oneflow as flow
+from oneflow.saved_model import ModelBuilder
+from oneflow.serving.multi_instance import MultiInstanceSession, plan_cpu_instances
+
+
+class _MlpGraph(flow.nn.Graph):
+    def __init__(self, model, output_sum):
+        super().__init__()
+        self.model = model
+        self.output_sum = output_sum
+
+    def build(self, x):
+        out = self.model(x)
+        if self.output_sum:
+            return out, out.sum(dim=1)
+        return out
+
+
+def export_mlp(
+    save_dir: str,
+    batch_size: int,
+    in_features: int = 256,
+    hidden_features: int = 1024,
+    num_layers: int = 4,
+    out_features: int = 16,
+    version: int = 1,
+    device: str = "cpu",
+    output_sum: bool = False,
+) -> flow.nn.Module:
+    """Exports an MLP of ``num_layers`` hidden layers as ``version`` of
+    ``save_dir`` and returns it. The graph "mlp" has the input "x" and the output
+    "y", followed by "y_sum", the sum of every row of "y", if ``output_sum``.
+    """
+    layers = []
+    features = in_features
+    for _ in range(num_layers):
+        layers += [flow.nn.Linear(features, hidden_features), flow.nn.ReLU()]
+        features = hidden_features
+    layers.append(flow.nn.Linear(features, out_features))
+    model = flow.nn.Sequential(*layers).to(device)
+    model.eval()
+    graph = _MlpGraph(model, output_sum)
+    graph(flow.randn(batch_size, in_features, device=device))
+    output_names = ["y", "y_sum"] if output_sum else ["y"]
+    builder = ModelBuilder(save_dir).ModelName("mlp").Version(version)
+    builder.AddGraph(graph, "mlp", input_names=["x"], output_names=output_names)
+    builder.Save()
+    return model
+
+
+async def _closed_loop(sess, x, num_requests, concurrency):
+    # every client sends its next request as soon as the last one returns
+    latencies = []
+    remaining = [num_requests]
+
+    async def client():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            start = time.perf_counter()
+            await sess.async_run(x=x)
+            latencies.append((time.perf_counter() - start) * 1000.0)
+
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    return latencies
+
+
+def run_case(
+    save_dir: str,
+    num_instances: int,
+    batch_size: int,
+    in_features: int,
+    num_requests: int = 200,
+    concurrency: Optional[int] = None,
+    warmup: int = 10,
+) -> Dict[str, object]:
+    """Serves the model of ``save_dir`` by ``num_instances`` instances and returns
+    the throughput and the latency percentiles of ``num_requests`` requests. The
+    instance counts that the NUMA nodes have too few CPUs for are skipped.
+    """
+    concurrency = concurrency or 2 * num_instances
+    result = dict(num_instances=num_instances, batch_size=batch_size)
+    try:
+        configs = plan_cpu_instances(num_instances)
+    except ValueError as e:
+        result["skipped"] = str(e)
+        return result
+    sess = MultiInstanceSession(save_dir, instance_configs=configs)
+    try:
+        x = np.random.randn(batch_size, in_features).astype(np.float32)
+        sess.event_loop_.run_until_complete(_closed_loop(sess, x, warmup, concurrency))
+        start = time.perf_counter()
+        latencies = sess.event_loop_.run_until_complete(
+            _closed_loop(sess, x, num_requests, concurrency)
+        )
+        seconds = time.perf_counter() - start
+    finally:
+        sess.close()
+    result.update(
+        instances=[config.as_dict() for config in configs],
+        concurrency=concurrency,
+        requests=num_requests,
+        seconds=seconds,
+        requests_per_sec=num_requests / seconds,
+        samples_per_sec=num_requests * batch_size / seconds,
+        latency_ms=dict(
+            mean=float(np.mean(latencies)),
+            p50=float(np.percentile(latencies, 50)),
+            p99=float(np.percentile(latencies, 99)),
+            max=float(np.max(latencies)),
+        ),
+    )
+    return result
+
+
+def run_cases(
+    save_dir: str,
+    num_instances: Sequence[int],
+    batch_size: int,
+    in_features: int,
+    num_requests: int = 200,
+    concurrency: Optional[int] = None,
+    warmup: int = 10,
+) -> List[Dict[str, object]]:
+    return [
+        run_case(
+            save_dir, n, batch_size, in_features, num_requests, concurrency, warmup
+        )
+        for n in num_instances
+    ]
+
+
+def _parse_ints(text):
+    return [int(x) for x in text.split(",") if x]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--output", default=None, help="JSON file, stdout if unset")
+    parser.add_argument(
+        "--num-instances",
+        type=_parse_ints,
+        default=[1, 2, 4],
+        help="comma separated instance counts",
+    )
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--in-features", type=int, default=256)
+    parser.add_argument("--hidden-features", type=int, default=1024)
+    parser.add_argument("--num-layers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        help="closed-loop clients, twice the instances if unset",
+    )
+    parser.add_argument("--warmup", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as save_dir:
+        export_mlp(
+            save_dir,
+            args.batch_size,
+            args.in_features,
+            args.hidden_features,
+            args.num_layers,
+        )
+        results = run_cases(
+            save_dir,
+            args.num_instances,
+            args.batch_size,
+            args.in_features,
+            args.requests,
+            args.concurrency,
+            args.warmup,
+        )
+    report = dict(
+        suite="serving",
+        oneflow_version=flow.__version__,
+        oneflow_git_commit=flow.__git_commit__,
+        timestamp=time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        host=dict(
+            platform=platform.platform(),
+            python=platform.python_version(),
+            cpu_count=os.cpu_count(),
+        ),
+        config=dict(
+            num_instances=args.num_instances,
+            batch_size=args.batch_size,
+            in_features=args.in_features,
+            hidden_features=args.hidden_features,
+            num_layers=args.num_layers,
+            requests=args.requests,
+            concurrency=args.concurrency,
+            warmup=args.warmup,
+        ),
+        results=results,
+    )
+    text = json.dumps(report, indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,4 +13,12 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
+from oneflow.experimental.gpt_indexed_bin import write_gpt_indexed_bin
 from oneflow.experimental.load_mnist import load_mnist
+from oneflow.experimental.ofrecord_index import build_ofrecord_index
+from oneflow.experimental.ofrecord_writer import OFRecordWriter, encode_ofrecord
+from oneflow.experimental.onerec_chunk import (
+    benchmark_onerec_decode,
+    compress_onerec,
+    write_onerec,
+)
@@ -0,0 +1,63 @@
+"""
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import struct
+from typing import Sequence
+
+import numpy as np
+
+# Layout of oneflow/user/data/gpt_dataset.h, the mmap indexed dataset of Megatron-LM
+_INDEX_MAGIC = b"MMIDIDX\x00\x00"
+_INDEX_VERSION = 1
+_DTYPE_CODES = {
+    np.dtype(np.uint8): 1,
+    np.dtype(np.int8): 2,
+    np.dtype(np.int16): 3,
+    np.dtype(np.int32): 4,
+    np.dtype(np.int64): 5,
+    np.dtype(np.float32): 6,
+    np.dtype(np.float64): 7,
+    np.dtype(np.uint16): 8,
+}
+
+
+def write_gpt_indexed_bin(
+    prefix: str, docs: Sequence[np.ndarray], dtype=np.int32
+) -> None:
+    """Writes token documents as ``prefix.idx`` and ``prefix.bin``, the corpus format
+    read by :class:`oneflow.nn.GPTIndexedBinDataReader`.
+
+    Every document is one sentence, as in the ``_text_document`` files of Megatron-LM.
+
+    Args:
+        prefix (str): path of the corpus without the ``.idx``/``.bin`` extension
+        docs (sequence of arrays): the tokens of each document
+        dtype: numpy dtype the tokens are stored as. Default: ``np.int32``
+    """
+    dtype = np.dtype(dtype)
+    if dtype not in _DTYPE_CODES:
+        raise ValueError("unsupported token dtype {}".format(dtype))
+    sizes = np.array([len(doc) for doc in docs], dtype=np.int32)
+    addresses = np.zeros(len(docs), dtype=np.int64)
+    addresses[1:] = np.cumsum(sizes[:-1], dtype=np.int64) * dtype.itemsize
+    doc_offsets = np.arange(len(docs) + 1, dtype=np.int64)
+    with open(prefix + ".idx", "wb") as f:
+        f.write(_INDEX_MAGIC)
+        f.write(struct.pack("<QB", _INDEX_VERSION, _DTYPE_CODES[dtype]))
+        f.write(struct.pack("<QQ", len(docs), doc_offsets.size))
+        f.write(sizes.tobytes() + addresses.tobytes() + doc_offsets.tobytes())
+    with open(prefix + ".bin", "wb") as f:
+        for doc in docs:
+            f.write(np.asarray(doc).astype(dtype, copy=False).tobytes())
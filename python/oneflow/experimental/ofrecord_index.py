@@ -0,0 +1,120 @@
+"""
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+import struct
+from typing import List
+
+import numpy as np
+
+# Keep in sync with oneflow/user/data/ofrecord_index.h
+_MAGIC_CODE = b"OFRIDX\x00\x00"
+_VERSION = 1
+_HEADER = struct.Struct("<8sQQ")
+
+
+def ofrecord_index_path(part_file: str) -> str:
+    return part_file + ".idx"
+
+
+def scan_ofrecord_offsets(part_file: str) -> np.ndarray:
+    """Returns the offsets of all records in an OFRecord part file.
+
+    The result has one more entry than there are records, the last one being the size
+    of the part file, so record ``i`` occupies ``[offsets[i], offsets[i + 1])``.
+    """
+    file_size = os.path.getsize(part_file)
+    offsets = []
+    offset = 0
+    with open(part_file, "rb") as f:
+        while offset < file_size:
+            header = f.read(8)
+            if len(header) != 8:
+                raise ValueError(
+                    f"truncated OFRecord size header in {part_file} at offset {offset}"
+                )
+            (record_size,) = struct.unpack("<q", header)
+            if record_size <= 0 or offset + 8 + record_size > file_size:
+                raise ValueError(
+                    f"invalid OFRecord size {record_size} in {part_file} at offset {offset}"
+                )
+            offsets.append(offset)
+            offset += 8 + record_size
+            f.seek(offset)
+    offsets.append(offset)
+    return np.array(offsets, dtype=np.int64)
+
+
+def write_ofrecord_index(part_file: str, offsets) -> str:
+    offsets = np.ascontiguousarray(offsets, dtype="<i8")
+    index_file = ofrecord_index_path(part_file)
+    tmp_file = index_file + ".tmp"
+    with open(tmp_file, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC_CODE, _VERSION, offsets.size - 1))
+        f.write(offsets.tobytes())
+    os.replace(tmp_file, index_file)
+    return index_file
+
+
+def read_ofrecord_index(part_file: str) -> np.ndarray:
+    """Reads the offsets stored in the index file of ``part_file``."""
+    index_file = ofrecord_index_path(part_file)
+    with open(index_file, "rb") as f:
+        magic_code, version, num_records = _HEADER.unpack(f.read(_HEADER.size))
+        if magic_code != _MAGIC_CODE or version != _VERSION:
+            raise ValueError(f"{index_file} is not an OFRecord index file")
+        offsets = np.frombuffer(f.read(), dtype="<i8")
+    if offsets.size != num_records + 1:
+        raise ValueError(f"{index_file} is truncated")
+    return offsets.astype(np.int64)
+
+
+def build_ofrecord_index(
+    path: str, part_name_prefix: str = "part-", overwrite: bool = False
+) -> List[str]:
+    """Builds index files for OFRecord part files.
+
+    The index of ``part-00000`` is written next to it as ``part-00000.idx`` and holds
+    the byte offset of every record, which lets ``flow.nn.OFRecordReader(...,
+    use_index=True)`` read records in any order. The reader builds missing indices in
+    memory on its own; prebuilding them saves a scan of the part files every time a
+    reader is created.
+
+    Args:
+        path (str): a part file, or a directory whose files starting with
+            ``part_name_prefix`` are indexed
+        part_name_prefix (str): prefix of the part files when ``path`` is a directory
+        overwrite (bool): rebuild index files that already exist
+
+    Returns:
+        the paths of the index files that were written
+    """
+    if os.path.isdir(path):
+        part_files = sorted(
+            os.path.join(path, name)
+            for name in os.listdir(path)
+            if name.startswith(part_name_prefix)
+            and not name.endswith((".idx", ".idx.tmp"))
+        )
+    else:
+        part_files = [path]
+    written = []
+    for part_file in part_files:
+        if not overwrite and os.path.exists(ofrecord_index_path(part_file)):
+            continue
+        written.append(
+            write_ofrecord_index(part_file, scan_ofrecord_offsets(part_file))
+        )
+    return written
@@ -0,0 +1,424 @@
+"""
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import logging
+import multiprocessing
+import os
+import queue
+import struct
+import threading
+import time
+import traceback
+from typing import Dict, Sequence, Union
+
+import numpy as np
+
+from oneflow.experimental.ofrecord_index import write_ofrecord_index
+
+logger = logging.getLogger("oneflow.data")
+
+# Field numbers of oneflow/core/record/record.proto
+_BYTES_LIST = 1
+_FLOAT_LIST = 2
+_DOUBLE_LIST = 3
+_INT32_LIST = 4
+_INT64_LIST = 5
+
+_LIST_KIND_OF_DTYPE = {
+    np.dtype(np.float16): _FLOAT_LIST,
+    np.dtype(np.float32): _FLOAT_LIST,
+    np.dtype(np.float64): _DOUBLE_LIST,
+    np.dtype(np.bool_): _INT32_LIST,
+    np.dtype(np.int16): _INT32_LIST,
+    np.dtype(np.uint16): _INT32_LIST,
+    np.dtype(np.int32): _INT32_LIST,
+    np.dtype(np.uint32): _INT64_LIST,
+    np.dtype(np.int64): _INT64_LIST,
+}
+
+# seconds between checks that the writer workers are still alive while waiting on
+# their queues
+_STATUS_CHECK_INTERVAL = 1.0
+
+_VARINT_SHIFTS = np.arange(10, dtype=np.uint64) * np.uint64(7)
+_VARINT_THRESHOLDS = np.uint64(1) << _VARINT_SHIFTS[1:]
+
+
+def _varint(n: int) -> bytes:
+    out = bytearray()
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def _varints(values: np.ndarray) -> bytes:
+    # protobuf encodes negative int32/int64 as 10-byte two's complement varints
+    values = values.astype(np.int64, copy=False).view(np.uint64).reshape(-1, 1)
+    num_groups = 1 + (values >= _VARINT_THRESHOLDS).sum(axis=1, keepdims=True)
+    groups = (values >> _VARINT_SHIFTS) & np.uint64(0x7F)
+    positions = np.arange(10)
+    groups[positions < num_groups - 1] |= np.uint64(0x80)
+    return groups.astype(np.uint8)[positions < num_groups].tobytes()
+
+
+def _length_delimited(field: int, payload: bytes) -> bytes:
+    return _varint(field << 3 | 2) + _varint(len(payload)) + payload
+
+
+def _encode_feature(value) -> bytes:
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        kind, payload = _BYTES_LIST, _length_delimited(1, bytes(value))
+    elif isinstance(value, str):
+        kind, payload = _BYTES_LIST, _length_delimited(1, value.encode())
+    else:
+        array = np.asarray(value)
+        if array.dtype in (np.int8, np.uint8):
+            # OFRecordRawDecoder reads int8/uint8 data from a single bytes value
+            kind = _BYTES_LIST
+            payload = _length_delimited(1, np.ascontiguousarray(array).tobytes())
+        elif array.dtype in _LIST_KIND_OF_DTYPE:
+            kind = _LIST_KIND_OF_DTYPE[array.dtype]
+            if kind == _FLOAT_LIST:
+                data = array.astype("<f4", copy=False).tobytes()
+            elif kind == _DOUBLE_LIST:
+                data = array.astype("<f8", copy=False).tobytes()
+            else:
+                data = _varints(array.ravel())
+            payload = _length_delimited(1, data) if data else b""
+        else:
+            raise TypeError(f"unsupported feature dtype {array.dtype}")
+    return _length_delimited(kind, payload)
+
+
+def encode_ofrecord(features: Dict[str, object]) -> bytes:
+    """Serializes one sample to the wire format of ``oneflow.OFRecord``.
+
+    Each value is ``bytes``/``str`` (stored as a ``bytes_list``) or anything
+    :func:`numpy.asarray` accepts. Arrays are flattened and stored by dtype: int8/uint8
+    as a single ``bytes_list`` value, float16/float32 as ``float_list``, float64 as
+    ``double_list``, bool and 16/32-bit integers as ``int32_list`` and uint32/int64 as
+    ``int64_list``.
+    """
+    record = bytearray()
+    for key, value in features.items():
+        entry = _length_delimited(1, key.encode()) + _length_delimited(
+            2, _encode_feature(value)
+        )
+        record += _length_delimited(1, entry)
+    return bytes(record)
+
+
+class _ShardWriter(object):
+    def __init__(self, path, write_index):
+        self.path = path
+        self.write_index = write_index
+        self.file = open(path, "wb")
+        self.offsets = [0]
+
+    def write(self, columns, num_records):
+        names = list(columns.keys())
+        chunks = []
+        offset = self.offsets[-1]
+        for i in range(num_records):
+            record = encode_ofrecord({name: columns[name][i] for name in names})
+            chunks.append(struct.pack("<q", len(record)))
+            chunks.append(record)
+            offset += 8 + len(record)
+            self.offsets.append(offset)
+        self.file.write(b"".join(chunks))
+
+    def close(self):
+        self.file.close()
+        if self.write_index:
+            write_ofrecord_index(self.path, self.offsets)
+        return len(self.offsets) - 1, self.offsets[-1]
+
+
+def _writer_loop(worker_id, task_queue, result_queue, shard_paths, write_index):
+    writers = {}
+    encode_time = 0.0
+    error = None
+    try:
+        for shard_id, path in shard_paths.items():
+            writers[shard_id] = _ShardWriter(path, write_index)
+    except Exception:
+        error = traceback.format_exc()
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        if error is not None:
+            # keep draining so that the main process never blocks on a full queue
+            continue
+        shard_id, columns, num_records = task
+        start = time.perf_counter()
+        try:
+            writers[shard_id].write(columns, num_records)
+        except Exception:
+            error = traceback.format_exc()
+        encode_time += time.perf_counter() - start
+    shards = {}
+    if error is None:
+        try:
+            shards = {shard_id: w.close() for shard_id, w in writers.items()}
+        except Exception:
+            error = traceback.format_exc()
+    result_queue.put((worker_id, shards, encode_time, error))
+
+
+class OFRecordWriter(object):
+    """Writes samples to balanced OFRecord part files in parallel.
+
+    Records are dealt to ``num_shards`` part files round robin, so shard sizes differ
+    by at most one record. Each shard is owned by one of ``num_workers`` workers,
+    which encode records and append them to their files, and an index file (see
+    :func:`oneflow.data.build_ofrecord_index`) is written next to each part file on
+    :meth:`close`.
+
+    The output can be read with ``flow.nn.OFRecordReader(output_dir,
+    data_part_num=num_shards, part_name_prefix=part_name_prefix,
+    part_name_suffix_length=part_name_suffix_length)``.
+
+    Args:
+        output_dir (str): directory of the part files, created if it does not exist
+        num_shards (int): number of part files
+        num_workers (int, optional): number of writer processes or threads. Defaults
+            to ``min(num_shards, os.cpu_count())``
+        part_name_prefix (str): prefix of the part file names
+        part_name_suffix_length (int): zero padded length of the part numbers
+        worker_mode (str): ``"process"`` or ``"thread"``
+        write_index (bool): whether to write index files
+
+    For example:
+
+    .. code-block:: python
+
+        >>> with flow.data.OFRecordWriter("/tmp/ofrecord", num_shards=4) as writer:  # doctest: +SKIP
+        ...     writer.write({"image": images, "label": labels})
+        >>> writer.stats()["records_per_sec"]  # doctest: +SKIP
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        num_shards: int = 1,
+        num_workers: int = None,
+        part_name_prefix: str = "part-",
+        part_name_suffix_length: int = 5,
+        worker_mode: str = "process",
+        write_index: bool = True,
+    ):
+        if num_shards <= 0:
+            raise ValueError(f"num_shards should be positive, but got {num_shards}")
+        if num_workers is None:
+            num_workers = min(num_shards, os.cpu_count() or 1)
+        if not 0 < num_workers <= num_shards:
+            raise ValueError(
+                f"num_workers should be in [1, num_shards], but got {num_workers}"
+            )
+        if worker_mode not in ("process", "thread"):
+            raise ValueError(
+                f"worker_mode should be 'process' or 'thread', but got {worker_mode!r}"
+            )
+        os.makedirs(output_dir, exist_ok=True)
+        self.output_dir = output_dir
+        self.num_shards = num_shards
+        self.num_workers = num_workers
+        self.shard_paths = []
+        for i in range(num_shards):
+            num = str(i)
+            self.shard_paths.append(
+                os.path.join(
+                    output_dir,
+                    part_name_prefix
+                    + "0" * max(part_name_suffix_length - len(num), 0)
+                    + num,
+                )
+            )
+
+        if worker_mode == "process":
+            queue_cls, worker_cls = multiprocessing.Queue, multiprocessing.Process
+        else:
+            queue_cls, worker_cls = queue.Queue, threading.Thread
+        self._result_queue = queue_cls()
+        self._task_queues = []
+        self._workers = []
+        for worker_id in range(num_workers):
+            task_queue = queue_cls(maxsize=4)
+            shard_paths = {
+                shard_id: self.shard_paths[shard_id]
+                for shard_id in range(worker_id, num_shards, num_workers)
+            }
+            worker = worker_cls(
+                target=_writer_loop,
+                args=(
+                    worker_id,
+                    task_queue,
+                    self._result_queue,
+                    shard_paths,
+                    write_index,
+                ),
+                daemon=True,
+            )
+            worker.start()
+            self._task_queues.append(task_queue)
+            self._workers.append(worker)
+
+        self._next_shard = 0
+        self._num_records = 0
+        self._shard_stats = None
+        self._encode_time = 0.0
+        self._start_time = time.perf_counter()
+        self._elapsed_time = None
+
+    def write(self, features: Dict[str, Union[np.ndarray, Sequence]]) -> None:
+        """Writes a batch of samples.
+
+        Args:
+            features: maps each feature name to a batch of values, either an array
+                whose first dimension is the batch, or a sequence of ``bytes`` or
+                arrays (which may differ in length). All features must have the
+                same batch size.
+        """
+        if self._elapsed_time is not None:
+            raise RuntimeError("OFRecordWriter is closed")
+        if len(features) == 0:
+            raise ValueError("features should not be empty")
+        batch_sizes = {len(values) for values in features.values()}
+        if len(batch_sizes) != 1:
+            raise ValueError(
+                f"all features should have the same batch size, but got {batch_sizes}"
+            )
+        (batch_size,) = batch_sizes
+        for shard_id in range(self.num_shards):
+            first = (shard_id - self._next_shard) % self.num_shards
+            if first >= batch_size:
+                continue
+            columns = {
+                name: values[first :: self.num_shards]
+                for name, values in features.items()
+            }
+            num_records = len(range(first, batch_size, self.num_shards))
+            self._put_task(
+                shard_id % self.num_workers, (shard_id, columns, num_records)
+            )
+        self._next_shard = (self._next_shard + batch_size) % self.num_shards
+        self._num_records += batch_size
+
+    def close(self) -> Dict[str, object]:
+        """Flushes all shards, writes the index files and returns :meth:`stats`."""
+        if self._elapsed_time is not None:
+            return self.stats()
+        for worker_id in range(self.num_workers):
+            self._put_task(worker_id, None)
+        shard_stats = {}
+        errors = []
+        pending = set(range(self.num_workers))
+        while pending:
+            try:
+                worker_id, shards, encode_time, error = self._result_queue.get(
+                    timeout=_STATUS_CHECK_INTERVAL
+                )
+            except queue.Empty:
+                # a worker that died has put its result before exiting or never will
+                self._check_workers(pending)
+                continue
+            pending.discard(worker_id)
+            shard_stats.update(shards)
+            self._encode_time += encode_time
+            if error is not None:
+                errors.append(error)
+        for worker in self._workers:
+            worker.join()
+        self._elapsed_time = time.perf_counter() - self._start_time
+        if errors:
+            raise RuntimeError("OFRecordWriter worker failed:\n" + "\n".join(errors))
+        self._shard_stats = [shard_stats[i] for i in range(self.num_shards)]
+        stats = self.stats()
+        logger.info(
+            "OFRecordWriter wrote %d records (%.1f MB) to %d shards in %.2fs: "
+            "%.1f records/s, %.1f MB/s",
+            stats["num_records"],
+            stats["num_bytes"] / 2 ** 20,
+            self.num_shards,
+            stats["elapsed_time"],
+            stats["records_per_sec"],
+            stats["bytes_per_sec"] / 2 ** 20,
+        )
+        return stats
+
+    def _put_task(self, worker_id, task):
+        while True:
+            try:
+                self._task_queues[worker_id].put(task, timeout=_STATUS_CHECK_INTERVAL)
+                return
+            except queue.Full:
+                self._check_workers([worker_id])
+
+    def _check_workers(self, worker_ids):
+        # Raises if any of the workers exited without reporting, e.g. killed by the
+        # OOM killer, instead of waiting on their queues forever.
+        failed = [i for i in sorted(worker_ids) if not self._workers[i].is_alive()]
+        if not failed:
+            return
+        if not self._result_queue.empty():
+            return
+        self._elapsed_time = time.perf_counter() - self._start_time
+        for worker in self._workers:
+            if isinstance(worker, multiprocessing.Process) and worker.is_alive():
+                worker.terminate()
+                worker.join()
+        exitcodes = ", ".join(
+            f"{i} (exitcode {getattr(self._workers[i], 'exitcode', None)})"
+            for i in failed
+        )
+        raise RuntimeError(f"OFRecordWriter worker(s) {exitcodes} exited unexpectedly")
+
+    def stats(self) -> Dict[str, object]:
+        """Returns throughput counters.
+
+        ``num_bytes``, ``encode_time`` (summed over workers) and ``records_per_shard``
+        are only known after :meth:`close`; before that the rates are based on the
+        records submitted so far.
+        """
+        elapsed_time = (
+            self._elapsed_time
+            if self._elapsed_time is not None
+            else time.perf_counter() - self._start_time
+        )
+        num_bytes = (
+            sum(size for _, size in self._shard_stats) if self._shard_stats else 0
+        )
+        return {
+            "num_records": self._num_records,
+            "num_bytes": num_bytes,
+            "elapsed_time": elapsed_time,
+            "encode_time": self._encode_time,
+            "records_per_sec": self._num_records / elapsed_time
+            if elapsed_time
+            else 0.0,
+            "bytes_per_sec": num_bytes / elapsed_time if elapsed_time else 0.0,
+            "records_per_shard": [n for n, _ in self._shard_stats]
+            if self._shard_stats
+            else None,
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
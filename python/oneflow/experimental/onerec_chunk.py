@@ -0,0 +1,273 @@
+"""
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+import struct
+import time
+from typing import Dict, Iterable, Iterator
+
+# Layout of oneflow/user/data/onerec_dataset.h
+_FRAME_MAGIC = 0x24434552454E4F5E  # '^ONEREC$'
+_CHUNK_MAGIC = 0x244B4352454E4F5E  # '^ONERCK$'
+_CHUNK_CODEC_LZ4 = 1
+_FRAME_HEADER = struct.Struct("<qii")
+_FRAME_HEADER_SIZE = _FRAME_HEADER.size + 8
+_CHUNK_HEADER = struct.Struct("<qiiqq")
+_DIGEST = struct.Struct(">Q")
+_ALIGNMENT = 8
+_LZ4_MAX_INPUT_SIZE = 0x7E000000
+
+_PRIME64_1 = 0x9E3779B185EBCA87
+_PRIME64_2 = 0xC2B2AE3D27D4EB4F
+_PRIME64_3 = 0x165667B19E3779F9
+_PRIME64_4 = 0x85EBCA77C2B2AE63
+_PRIME64_5 = 0x27D4EB2F165667C5
+_MASK64 = (1 << 64) - 1
+
+
+def _rotl64(x: int, r: int) -> int:
+    return ((x << r) | (x >> (64 - r))) & _MASK64
+
+
+def _xxh64_round(acc: int, lane: int) -> int:
+    acc = (acc + lane * _PRIME64_2) & _MASK64
+    return (_rotl64(acc, 31) * _PRIME64_1) & _MASK64
+
+
+def _xxh64_merge_round(acc: int, val: int) -> int:
+    acc ^= _xxh64_round(0, val)
+    return (acc * _PRIME64_1 + _PRIME64_4) & _MASK64
+
+
+def _xxh64(data: bytes, seed: int = 0) -> int:
+    # only used for the small chunk header, so a pure python XXH64 is fast enough
+    n = len(data)
+    p = 0
+    if n >= 32:
+        v = [
+            (seed + _PRIME64_1 + _PRIME64_2) & _MASK64,
+            (seed + _PRIME64_2) & _MASK64,
+            seed,
+            (seed - _PRIME64_1) & _MASK64,
+        ]
+        while p + 32 <= n:
+            lanes = struct.unpack_from("<4Q", data, p)
+            v = [_xxh64_round(acc, lane) for acc, lane in zip(v, lanes)]
+            p += 32
+        h = (
+            _rotl64(v[0], 1) + _rotl64(v[1], 7) + _rotl64(v[2], 12) + _rotl64(v[3], 18)
+        ) & _MASK64
+        for acc in v:
+            h = _xxh64_merge_round(h, acc)
+    else:
+        h = (seed + _PRIME64_5) & _MASK64
+    h = (h + n) & _MASK64
+    while p + 8 <= n:
+        (lane,) = struct.unpack_from("<Q", data, p)
+        h ^= _xxh64_round(0, lane)
+        h = (_rotl64(h, 27) * _PRIME64_1 + _PRIME64_4) & _MASK64
+        p += 8
+    if p + 4 <= n:
+        (lane,) = struct.unpack_from("<I", data, p)
+        h ^= (lane * _PRIME64_1) & _MASK64
+        h = (_rotl64(h, 23) * _PRIME64_2 + _PRIME64_3) & _MASK64
+        p += 4
+    while p < n:
+        h ^= (data[p] * _PRIME64_5) & _MASK64
+        h = (_rotl64(h, 11) * _PRIME64_1) & _MASK64
+        p += 1
+    h ^= h >> 33
+    h = (h * _PRIME64_2) & _MASK64
+    h ^= h >> 29
+    h = (h * _PRIME64_3) & _MASK64
+    h ^= h >> 32
+    return h
+
+
+def _import_lz4_block():
+    try:
+        import lz4.block
+    except ImportError:
+        raise ImportError(
+            "compressed OneRec chunks require the lz4 package, install it by `pip install lz4`"
+        )
+    return lz4.block
+
+
+def _padded(size: int) -> int:
+    return (size + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def _iter_frames(path: str) -> Iterator[bytes]:
+    # yields every plain OneRec frame of the file as is, header and footer included
+    with open(path, "rb") as f:
+        while True:
+            header = f.read(_FRAME_HEADER_SIZE)
+            if not header:
+                return
+            if len(header) != _FRAME_HEADER_SIZE:
+                raise ValueError("{} is truncated".format(path))
+            magic, _, payload_size = _FRAME_HEADER.unpack_from(header)
+            if magic == _CHUNK_MAGIC:
+                raise ValueError("{} is already compressed".format(path))
+            if magic != _FRAME_MAGIC:
+                raise ValueError("{} is not a OneRec file".format(path))
+            rest = f.read(_padded(payload_size) + 8)
+            if len(rest) != _padded(payload_size) + 8:
+                raise ValueError("{} is truncated".format(path))
+            yield header + rest
+
+
+def _iter_chunks(path: str) -> Iterator[tuple]:
+    with open(path, "rb") as f:
+        while True:
+            header = f.read(_CHUNK_HEADER.size + 8)
+            if not header:
+                return
+            (
+                magic,
+                codec,
+                num_records,
+                compressed_size,
+                uncompressed_size,
+            ) = _CHUNK_HEADER.unpack_from(header)
+            if magic != _CHUNK_MAGIC:
+                raise ValueError("{} is not a compressed OneRec file".format(path))
+            if codec != _CHUNK_CODEC_LZ4:
+                raise ValueError("unsupported OneRec chunk codec {}".format(codec))
+            compressed = f.read(_padded(compressed_size))[:compressed_size]
+            if len(compressed) != compressed_size:
+                raise ValueError("{} is truncated".format(path))
+            yield num_records, uncompressed_size, compressed
+
+
+def _chunk_header(num_records: int, compressed_size: int, uncompressed_size: int):
+    header = _CHUNK_HEADER.pack(
+        _CHUNK_MAGIC, _CHUNK_CODEC_LZ4, num_records, compressed_size, uncompressed_size
+    )
+    return header + _DIGEST.pack(_xxh64(header))
+
+
+def write_onerec(path: str, records: Iterable[bytes]) -> None:
+    """Writes ``records`` as a plain (uncompressed) OneRec file at ``path``.
+
+    Records are stored as is, :class:`oneflow.nn.OneRecReader` returns them in order.
+    """
+    with open(path, "wb") as f:
+        for record in records:
+            header = _FRAME_HEADER.pack(_FRAME_MAGIC, 0, len(record))
+            f.write(header + _DIGEST.pack(_xxh64(header)))
+            f.write(record + b"\0" * (_padded(len(record)) - len(record)))
+            f.write(_DIGEST.pack(_xxh64(record)))
+
+
+def compress_onerec(
+    src: str, dst: str, chunk_size: int = 4 << 20, level: int = 0
+) -> Dict[str, object]:
+    """Rewrites the plain OneRec file ``src`` into LZ4 compressed chunks at ``dst``.
+
+    Consecutive records are packed into chunks of about ``chunk_size`` uncompressed
+    bytes. :class:`oneflow.nn.OneRecReader` reads the result like the original file, in
+    the same record order, and decompresses the chunks on a reader-side thread pool.
+
+    Args:
+        src (str): path of the plain OneRec file
+        dst (str): path of the compressed file, written through a temporary file
+        chunk_size (int): target uncompressed size of a chunk in bytes. Default: 4 MiB
+        level (int): 0 uses the fast LZ4 codec, 1 to 12 use LZ4 HC with that level, which
+            compresses better and decodes as fast. Default: 0
+
+    Returns:
+        A dict with ``num_records``, ``num_chunks``, ``uncompressed_bytes``,
+        ``compressed_bytes`` and ``ratio``.
+    """
+    lz4_block = _import_lz4_block()
+    if not 0 < chunk_size <= _LZ4_MAX_INPUT_SIZE:
+        raise ValueError("chunk_size should be in (0, {}]".format(_LZ4_MAX_INPUT_SIZE))
+    if not 0 <= level <= 12:
+        raise ValueError("level should be in [0, 12]")
+    if level == 0:
+        compress_kwargs = dict(mode="default")
+    else:
+        compress_kwargs = dict(mode="high_compression", compression=level)
+
+    stats = dict(num_records=0, num_chunks=0, uncompressed_bytes=0, compressed_bytes=0)
+    tmp_path = "{}.tmp.{}".format(dst, os.getpid())
+    with open(tmp_path, "wb") as f:
+
+        def flush(frames):
+            data = b"".join(frames)
+            compressed = lz4_block.compress(data, store_size=False, **compress_kwargs)
+            f.write(_chunk_header(len(frames), len(compressed), len(data)))
+            f.write(compressed)
+            f.write(b"\0" * (_padded(len(compressed)) - len(compressed)))
+            stats["num_records"] += len(frames)
+            stats["num_chunks"] += 1
+            stats["uncompressed_bytes"] += len(data)
+            stats["compressed_bytes"] += len(compressed)
+
+        frames, size = [], 0
+        for frame in _iter_frames(src):
+            if frames and size + len(frame) > chunk_size:
+                flush(frames)
+                frames, size = [], 0
+            if len(frame) > _LZ4_MAX_INPUT_SIZE:
+                raise ValueError("a record of {} is too large to compress".format(src))
+            frames.append(frame)
+            size += len(frame)
+        if frames:
+            flush(frames)
+    os.replace(tmp_path, dst)
+    stats["ratio"] = stats["uncompressed_bytes"] / max(stats["compressed_bytes"], 1)
+    return stats
+
+
+def benchmark_onerec_decode(path: str, repeat: int = 1) -> Dict[str, object]:
+    """Measures the single core LZ4 decode throughput of a compressed OneRec file.
+
+    The readers log the same figure measured on their decoding threads, this helper
+    allows comparing chunk sizes and codec levels offline.
+
+    Args:
+        path (str): path of a file written by :func:`compress_onerec`
+        repeat (int): number of passes over the file. Default: 1
+
+    Returns:
+        A dict with ``num_chunks``, ``compressed_bytes``, ``uncompressed_bytes``,
+        ``ratio``, ``seconds`` and ``mb_per_second_per_core`` (uncompressed MiB/s).
+    """
+    lz4_block = _import_lz4_block()
+    chunks = list(_iter_chunks(path))
+    seconds = 0.0
+    for _ in range(repeat):
+        for _, uncompressed_size, compressed in chunks:
+            start = time.perf_counter()
+            data = lz4_block.decompress(compressed, uncompressed_size=uncompressed_size)
+            seconds += time.perf_counter() - start
+            if len(data) != uncompressed_size:
+                raise ValueError("{} has a corrupted chunk".format(path))
+    compressed_bytes = sum(len(c) for _, _, c in chunks)
+    uncompressed_bytes = sum(s for _, s, _ in chunks)
+    return dict(
+        num_chunks=len(chunks),
+        compressed_bytes=compressed_bytes,
+        uncompressed_bytes=uncompressed_bytes,
+        ratio=uncompressed_bytes / max(compressed_bytes, 1),
+        seconds=seconds,
+        mb_per_second_per_core=uncompressed_bytes
+        * repeat
+        / (1024 * 1024)
+        / max(seconds, 1e-9),
+    )
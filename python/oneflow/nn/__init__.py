@@ -83,6 +83,7 @@ from oneflow.nn.modules.dataset import (
     CropMirrorNormalize,
     OFRecordImageDecoder,
     OFRecordImageDecoderRandomCrop,
+    OFRecordImageDecoderRandomCropResizeNormalize,
     OFRecordImageGpuDecoderRandomCropResize,
     OFRecordRawDecoder,
     OFRecordRawDecoder as OfrecordRawDecoder,
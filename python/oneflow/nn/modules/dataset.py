@@ -55,11 +55,19 @@ class OFRecordReader(Module):
         placement: flow.placement = None,
         sbp: Union[flow.sbp.sbp, List[flow.sbp.sbp]] = None,
         name: Optional[str] = None,
+        use_index: bool = False,
+        start_sample_offset: int = 0,
     ):
         super().__init__()
 
         if name is not None:
             print("WARNING: name has been deprecated and has NO effect.\n")
+        if start_sample_offset < 0:
+            raise ValueError(
+                f"start_sample_offset should be non-negative, but got {start_sample_offset}"
+            )
+        if start_sample_offset > 0 and not use_index:
+            raise ValueError("start_sample_offset requires use_index=True")
         self.ofrecord_dir = ofrecord_dir
         self.batch_size = batch_size
         self.data_part_num = data_part_num
@@ -68,6 +76,8 @@ class OFRecordReader(Module):
         self.random_shuffle = random_shuffle
         self.shuffle_buffer_size = shuffle_buffer_size
         self.shuffle_after_epoch = shuffle_after_epoch
+        self.use_index = use_index
+        self.start_sample_offset = start_sample_offset
 
         self.placement = placement
         if placement is None:
@@ -104,6 +114,8 @@ class OFRecordReader(Module):
                 random_shuffle=self.random_shuffle,
                 shuffle_after_epoch=self.shuffle_after_epoch,
                 seed=self.seed,
+                use_index=self.use_index,
+                start_sample_offset=self.start_sample_offset,
                 sbp=self.sbp,
                 placement=self.placement,
             )
@@ -119,6 +131,8 @@ class OFRecordReader(Module):
                 random_shuffle=self.random_shuffle,
                 shuffle_after_epoch=self.shuffle_after_epoch,
                 seed=self.seed,
+                use_index=self.use_index,
+                start_sample_offset=self.start_sample_offset,
                 device=self.device,
             )
         return res
@@ -415,6 +429,80 @@ class OFRecordImageDecoder(Module):
         return res
 
 
+class OFRecordImageDecoderRandomCropResizeNormalize(Module):
+    """Decodes, randomly crops, resizes and normalizes images of OFRecords on CPU.
+
+    It is equivalent to ``OFRecordImageDecoderRandomCrop`` -> ``ImageResize`` ->
+    ``CropMirrorNormalize`` without materialising the intermediate images. JPEG images
+    are downscaled by libjpeg while decoding whenever the crop is larger than the
+    target size, and the batch is processed in parallel. The output is a float tensor
+    of shape (N, C, target_height, target_width), or (N, target_height, target_width, C)
+    when the environment variable ``ONEFLOW_ENABLE_NHWC`` is 1.
+
+    Set ``random_crop=False`` to resize the whole image, e.g. for evaluation.
+    """
+
+    def __init__(
+        self,
+        blob_name: str,
+        target_width: int,
+        target_height: int,
+        color_space: str = "BGR",
+        random_crop: bool = True,
+        num_attempts: int = 10,
+        random_seed: Optional[int] = None,
+        random_area: Sequence[float] = [0.08, 1.0],
+        random_aspect_ratio: Sequence[float] = [0.75, 1.333333],
+        interpolation_type: str = "bilinear",
+        mean: Sequence[float] = [0.0],
+        std: Sequence[float] = [1.0],
+    ):
+        super().__init__()
+        self.blob_name = blob_name
+        self.target_width = target_width
+        self.target_height = target_height
+        self.color_space = color_space
+        self.random_crop = random_crop
+        self.num_attempts = num_attempts
+        self.random_area = random_area
+        self.random_aspect_ratio = random_aspect_ratio
+        self.interpolation_type = interpolation_type
+        self.mean = mean
+        self.std = std
+        if os.getenv("ONEFLOW_ENABLE_NHWC") == "1":
+            self.output_layout = "NHWC"
+        else:
+            self.output_layout = "NCHW"
+        (self.seed, self.has_seed) = mirrored_gen_random_seed(random_seed)
+        self._op = (
+            flow.stateful_op("ofrecord_image_decoder_random_crop_resize_normalize")
+            .Input("in")
+            .Output("out")
+            .Build()
+        )
+
+    def forward(self, input):
+        res = _C.dispatch_ofrecord_image_decoder_random_crop_resize_normalize(
+            self._op,
+            input,
+            name=self.blob_name,
+            target_width=self.target_width,
+            target_height=self.target_height,
+            color_space=self.color_space,
+            random_crop=self.random_crop,
+            random_area=self.random_area,
+            random_aspect_ratio=self.random_aspect_ratio,
+            num_attempts=self.num_attempts,
+            seed=self.seed,
+            has_seed=self.has_seed,
+            interpolation_type=self.interpolation_type,
+            mean=self.mean,
+            std=self.std,
+            output_layout=self.output_layout,
+        )
+        return res
+
+
 class OFRecordImageGpuDecoderRandomCropResize(Module):
     def __init__(
         self,
@@ -959,6 +1047,8 @@ class OneRecReader(Module):
     r"""
     nn.OneRecReader read from OneRec format files into a Tensor carrying TensorBuffer which can be decoded by decode_onerec API afterwards.
 
+    Files may also hold LZ4 compressed chunks written by :func:`oneflow.data.compress_onerec`. The chunks are decompressed on a reader-side thread pool, whose size is set by the ``ONEFLOW_ONEREC_DECODE_THREADS`` environment variable (at most 4 by default), and yield the same records in the same order, so both shuffle modes behave as with plain files. The decode throughput per core is logged when the reader is destroyed.
+
     Parameters:
         files (List[str]): The file list to be read from filesystem
         batch_size (int): batch size
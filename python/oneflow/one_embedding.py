@@ -18,11 +18,13 @@ import oneflow as flow
 from oneflow.nn.module import Module
 from oneflow.nn.optimizer.optimizer import Optimizer
 from oneflow.nn.parameter import Parameter
+import copy
 import json
 import datetime
 from oneflow._oneflow_internal import OneEmbeddingHandler
 from oneflow._oneflow_internal import PersistentTableReader
 from oneflow._oneflow_internal import PersistentTableWriter
+from oneflow._oneflow_internal import ReshardPersistentTables
 import numpy as np
 import traceback
 
@@ -42,10 +44,20 @@ def _check_initializer(initializer):
         raise NotImplementedError("unsupported initializer_type")
 
 
+def _check_admission(admission):
+    assert isinstance(admission, dict)
+    assert admission.__contains__("type")
+    if admission["type"] == "frequency":
+        assert admission.__contains__("min_frequency")
+        assert admission["min_frequency"] >= 1
+    else:
+        raise NotImplementedError("unsupported admission type")
+
+
 def _check_cache(cache):
     assert isinstance(cache, dict)
     assert cache.__contains__("policy")
-    assert cache["policy"] in ["lru", "full"]
+    assert cache["policy"] in ["lru", "lfu", "full"]
     cache_memory_budget_mb = 0
     if cache.__contains__("cache_memory_budget_mb"):
         cache_memory_budget_mb = cache["cache_memory_budget_mb"]
@@ -57,9 +69,15 @@ def _check_cache(cache):
     assert cache["value_memory_kind"] in ["device", "host"]
 
 
+_storage_dtypes = ["float32", "float16", "bfloat16", "int8"]
+
+
 def _init(
     name, embedding_dims, dtype, key_type, tables, store_options, default_initializer
 ):
+    # the options are filled in and rescaled below, keep the ones of the caller intact
+    store_options = copy.deepcopy(store_options)
+    tables = copy.deepcopy(tables)
     default_initializer = default_initializer or {
         "type": "normal",
         "mean": 0,
@@ -89,10 +107,24 @@ def _init(
     key_value_store_options["value_type_size"] = value_type_size
     scale_factor = store_options["size_factor"]
     key_value_store_options["storage_dim"] = scale_factor * embedding_dim
+    key_value_store_options["size_factor"] = scale_factor
     # kv store
     assert store_options.__contains__("kv_store")
     kv_store = store_options["kv_store"]
     assert isinstance(kv_store, dict)
+    if kv_store.__contains__("device"):
+        assert kv_store["device"] in ["cuda", "cpu"]
+    else:
+        kv_store["device"] = "cuda" if flow.cuda.is_available() else "cpu"
+    if kv_store.__contains__("storage_dtype"):
+        assert kv_store["storage_dtype"] in _storage_dtypes
+        if kv_store["storage_dtype"] != "float32":
+            assert (
+                kv_store["device"] == "cpu"
+            ), "storage_dtype is only supported by the cpu kv_store"
+            assert dtype == flow.float, "storage_dtype requires float32 embeddings"
+    # caches of a cpu store always keep their values in host memory, whatever their
+    # value_memory_kind is
     if kv_store.__contains__("caches"):
         caches = kv_store["caches"]
         assert isinstance(caches, (dict, list, tuple))
@@ -124,12 +156,23 @@ def _init(
         persistent_table["capacity_hint"] = (
             persistent_table["capacity_hint"] // parallel_num
         )
+    if persistent_table.__contains__("compaction_threshold"):
+        assert 0 <= persistent_table["compaction_threshold"] < 1
+    if persistent_table.__contains__("max_incremental_snapshots"):
+        assert persistent_table["max_incremental_snapshots"] >= 0
     key_value_store_options["kv_store"] = kv_store
     # initializer
     if tables is not None:
         assert isinstance(tables, (list, tuple))
         for i in range(len(tables)):
             table = tables[i]
+            if table.__contains__("admission"):
+                _check_admission(table["admission"])
+                assert (
+                    kv_store["device"] == "cpu"
+                ), "admission is only supported by the cpu kv_store"
+            if table.__contains__("ttl_seconds"):
+                assert table["ttl_seconds"] > 0
             if table.__contains__("columns"):
                 assert not table.__contains__("initializer")
                 columns = table["columns"]
@@ -148,6 +191,20 @@ def _init(
                 table["columns"] = columns
                 del table["initializer"]
         embedding_tables["tables"] = tables
+        if any(table.__contains__("admission") for table in tables):
+            key_value_store_options["admission"] = store_options.get("admission", {})
+        # the rows of all the tables are in the same persistent table, so the keys expire after
+        # the largest ttl_seconds of the tables
+        ttls = [
+            table["ttl_seconds"]
+            for table in tables
+            if table.__contains__("ttl_seconds")
+        ]
+        if len(ttls) > 0:
+            assert len(ttls) == len(
+                tables
+            ), "ttl_seconds must be set for all the tables or for none of them"
+            persistent_table["ttl_seconds"] = max(ttls)
     else:
         assert default_initializer is not None
         _check_initializer(default_initializer)
@@ -184,6 +241,7 @@ class Embedding(Module):
             store_options,
             default_initializer,
         )
+        self.device = key_value_store_options["kv_store"]["device"]
         self.key_value_store_options = json.dumps(key_value_store_options)
         self.embedding_tables = json.dumps(embedding_tables)
         self.num_tables = len(embedding_tables["tables"])
@@ -197,7 +255,7 @@ class Embedding(Module):
 
     def _save_to_state_dict(self, destination, prefix, keep_vars):
         snapshot_timestamp_tensor = flow.tensor(
-            datetime.datetime.now().timestamp(), dtype=flow.float64, device="cuda"
+            datetime.datetime.now().timestamp(), dtype=flow.float64, device=self.device,
         )
         # Broadcast timestamp tensor from master rank.
         flow.comm.broadcast(snapshot_timestamp_tensor, src=0)
@@ -238,7 +296,9 @@ class Embedding(Module):
 
         Args:
             snapshot_name (str): the snapshot_name, snapshot will be saved in the snapshots dir under your_configed_persistent_path
-    
+
+        Set ``store_options["kv_store"]["persistent_table"]["max_incremental_snapshots"] = n`` to save incremental snapshots. An incremental snapshot only records the ids written since the last snapshot that was saved or loaded, and refers to that snapshot as its base. After n incremental snapshots in a row, or after ids expired because of the ttl_seconds of the tables, a full snapshot is saved. load_snapshot merges the chain of an incremental snapshot with its bases, so the base snapshots must be kept. The caches in host memory only write back the ids updated since the last snapshot. Defaults to 0, which saves full snapshots only.
+
         For example:
 
         .. code-block:: python
@@ -268,6 +328,43 @@ class Embedding(Module):
         """
         self.handler.LoadSnapshot(snapshot_name)
 
+    def stats(self):
+        """get the counters of the embedding on the current rank, counted since it was created or since the last call of reset_stats.
+
+        Returns:
+            dict: the counters, with keys:
+
+            - "batches": the number of lookup batches.
+            - "unique_ids": the total number of unique ids of all batches.
+            - "avg_unique_ids_per_batch" and "max_unique_ids_per_batch": the number of unique ids per batch.
+            - "rejected_ids": the number of times an id of a batch is not admitted by the admission policy of its table.
+            - "caches": a list with one dict per cache level, the first one is the level queried first. Each dict has "lookups", "hits", "misses", "hit_rate", "evictions" and "write_backs", where "write_backs" counts the values written to the next level when they are evicted or when a snapshot is saved.
+            - "persistent_table": a dict with "read_keys", "read_bytes", "read_ops", "write_keys", "write_bytes" and "write_ops" of the persistent table. It also has "keys", the number of ids stored in the table, "disk_rows", the number of value rows in the files on disk, "disk_amplification", the ratio of "disk_rows" to "keys", "compacted_chunks", the number of chunk files removed by the compaction, and "expired_keys", the number of ids removed because of the ttl_seconds of the tables. "keys", "disk_rows" and "disk_amplification" are not reset by reset_stats.
+
+        For example:
+
+        .. code-block:: python
+
+            >>> import oneflow as flow
+            >>> # use embedding create by flow.one_embedding.MultiTableEmbedding
+            >>> stats = embedding.stats()
+            >>> print(stats["caches"][0]["hit_rate"], stats["persistent_table"]["read_bytes"])
+        """
+        stats = self.handler.GetStats()
+        stats["avg_unique_ids_per_batch"] = (
+            stats["unique_ids"] / stats["batches"] if stats["batches"] > 0 else 0.0
+        )
+        for cache in stats["caches"]:
+            cache["hit_rate"] = (
+                cache["hits"] / cache["lookups"] if cache["lookups"] > 0 else 0.0
+            )
+        return stats
+
+    def reset_stats(self):
+        """reset all the counters returned by stats to zero.
+        """
+        self.handler.ResetStats()
+
     def forward(self, ids, table_ids=None):
         """Embedding lookup operation
 
@@ -337,9 +434,15 @@ def make_cached_ssd_store_options(
     size_factor=1,
     physical_block_size=512,
     host_cache_budget_mb=0,
+    cache_policy="lru",
+    host_cache_policy="lru",
+    compaction_threshold=0.0,
+    storage_dtype=None,
 ):
     """make SSD use GPU and host as cache store_options param of MultiTableEmbedding. If cache_budget_mb > 0 and host_cache_budget_mb > 0, use GPU and host memory as multi-level cache.
 
+    Set ``store_options["kv_store"]["device"] = "cpu"`` to run the embedding on CPU, then all caches live in host memory. The device defaults to "cuda" when CUDA is available and to "cpu" otherwise.
+
     Args:
         cache_budget_mb (int): the MB budget of per GPU as cache.
         persistent_path (str, list): persistent storage path of Embedding, must use fast SSD because of frequently random disk access during training. If passed a str, current rank Embedding will be saved in path/rank_id-num_ranks path. If passed a list, the list length must equals num_ranks, each elem of list represent the path of rank_id Embedding.
@@ -347,6 +450,10 @@ def make_cached_ssd_store_options(
         size_factor (int, optional): store size factor of embedding_dim, if SGD update, and momentum = 0, should be 1, if momentum > 0, it should be 2. if Adam, should be 3. Defaults to 1.
         physical_block_size (int, optional): physical_block_size should be sector size. Defaults to 512.
         host_cache_budget_mb (int): the MB budget of host memory as cache per rank. Defaults to 0.
+        cache_policy (str, optional): eviction policy of the GPU cache, "lru" or "lfu". "lfu" evicts the least frequently used ids and periodically halves the frequencies, it keeps hot ids cached when the traffic has scans of ids that are seen only once. Defaults to "lru".
+        host_cache_policy (str, optional): eviction policy of the host memory cache, "lru" or "lfu". Defaults to "lru".
+        compaction_threshold (float, optional): updated values are appended to the persistent table, and the old rows are dead. When the ratio of live rows of a chunk file drops below compaction_threshold, a background thread moves the live rows to the end of the table and removes the chunk file. Chunks referenced by a saved snapshot are kept until the snapshot is removed. 0 disables the compaction. Defaults to 0.0.
+        storage_dtype (str, optional): data type of the values in the caches and the persistent table, one of "float32", "float16", "bfloat16" and "int8". The values are converted to float32 when they are read and converted back when they are written, so the model still trains in float32. "float16" and "bfloat16" halve the memory and the disk usage of the store, "bfloat16" keeps the range of float32 and is the safer choice for optimizer states such as the second moment of Adam, which can underflow in "float16". "int8" quantizes the embedding and each optimizer state of a row with a scale of its own, with a quarter of the size plus 4 bytes per state. The values of a state much smaller than its largest value in the row are often stored as 0, which makes "int8" a poor fit for the second moment of Adam, whose updates divide by its square root. Only the cpu kv_store supports it. The values are rounded stochastically when they are written, so the updates smaller than the precision of the storage_dtype are still kept on average. Defaults to None, which stores float32 values.
 
     Returns:
         dict: SSD use GPU and host as cache store_options param of MultiTableEmbedding
@@ -364,6 +471,10 @@ def make_cached_ssd_store_options(
     """
     assert isinstance(persistent_path, (str, list, tuple))
     assert cache_budget_mb > 0 or host_cache_budget_mb > 0
+    assert cache_policy in ["lru", "lfu"]
+    assert host_cache_policy in ["lru", "lfu"]
+    assert 0 <= compaction_threshold < 1
+    assert storage_dtype is None or storage_dtype in _storage_dtypes
     if capacity is not None:
         assert capacity > 0
     else:
@@ -373,7 +484,7 @@ def make_cached_ssd_store_options(
     if cache_budget_mb > 0:
         cache_list.append(
             {
-                "policy": "lru",
+                "policy": cache_policy,
                 "cache_memory_budget_mb": cache_budget_mb,
                 "value_memory_kind": "device",
             }
@@ -381,7 +492,7 @@ def make_cached_ssd_store_options(
     if host_cache_budget_mb > 0:
         cache_list.append(
             {
-                "policy": "lru",
+                "policy": host_cache_policy,
                 "cache_memory_budget_mb": host_cache_budget_mb,
                 "value_memory_kind": "host",
             }
@@ -394,24 +505,35 @@ def make_cached_ssd_store_options(
                 "path": persistent_path,
                 "physical_block_size": physical_block_size,
                 "capacity_hint": int(capacity),
+                "compaction_threshold": float(compaction_threshold),
             },
         },
         "size_factor": size_factor,
     }
+    if storage_dtype is not None:
+        options["kv_store"]["storage_dtype"] = storage_dtype
     return options
 
 
 def make_cached_host_mem_store_options(
-    cache_budget_mb, persistent_path, capacity, size_factor=1, physical_block_size=512,
+    cache_budget_mb,
+    persistent_path,
+    capacity,
+    size_factor=1,
+    physical_block_size=512,
+    storage_dtype=None,
 ):
     """make host use GPU as cache store_options param of MultiTableEmbedding
 
+    Set ``store_options["kv_store"]["device"] = "cpu"`` to run the embedding on CPU, then all caches live in host memory.
+
     Args:
         cache_budget_mb (int): the MB budget of per GPU as cache.
         persistent_path (str, list): persistent storage path of Embedding. If passed a str, current rank Embedding will be saved in path/rank_id-num_ranks path. If passed a list, the list length must equals num_ranks, each elem of list represent the path of rank_id Embedding.
         capacity (int): total capacity of Embedding
         size_factor (int, optional): store size factor of embedding_dim, if SGD update, and momentum = 0, should be 1, if momentum > 0, it should be 2. if Adam, should be 3. Defaults to 1.
         physical_block_size (int, optional): physical_block_size should be sector size. Defaults to 512.
+        storage_dtype (str, optional): data type of the values in the caches and the persistent table, see :func:`oneflow.one_embedding.make_cached_ssd_store_options`. Defaults to None, which stores float32 values.
 
     Returns:
         dict: host use GPU as cache store_options param of MultiTableEmbedding
@@ -421,6 +543,7 @@ def make_cached_host_mem_store_options(
     assert isinstance(persistent_path, (str, list, tuple))
     assert cache_budget_mb > 0
     assert capacity > 0
+    assert storage_dtype is None or storage_dtype in _storage_dtypes
     options = {
         "kv_store": {
             "caches": [
@@ -443,6 +566,8 @@ def make_cached_host_mem_store_options(
         },
         "size_factor": size_factor,
     }
+    if storage_dtype is not None:
+        options["kv_store"]["storage_dtype"] = storage_dtype
     return options
 
 
@@ -490,11 +615,40 @@ def make_normal_initializer(mean, std):
     return {"type": "normal", "mean": mean, "std": std}
 
 
-def make_table_options(param):
+def make_frequency_admission(min_frequency, default_value=0.0):
+    """make frequency admission param of make_table_options. An id of the table only gets a row in the store once it has been looked up min_frequency times, before that it is looked up as a vector filled with default_value and its updates are dropped. The lookups are counted with a count-min sketch per rank, its size can be set by the "admission" dict of store_options, with "sketch_width" (default 1048576) and "sketch_depth" (default 4). Only the cpu kv_store supports admission.
+
+    Args:
+        min_frequency (int): the number of lookups of an id before it gets a row.
+        default_value (float): the value of all the columns of the ids that are not admitted. Defaults to 0.0.
+
+    Returns:
+        dict: admission param of make_table_options
+
+    For example:
+
+    .. code-block:: python
+
+        >>> import oneflow as flow
+        >>> admission = flow.one_embedding.make_frequency_admission(min_frequency=3)
+        >>> # pass the admission to flow.one_embedding.make_table_options
+        >>> # ...
+    """
+    assert min_frequency >= 1
+    return {
+        "type": "frequency",
+        "min_frequency": min_frequency,
+        "default_value": default_value,
+    }
+
+
+def make_table_options(param, admission=None, ttl_seconds=None):
     """make table param of Embedding tables
 
     Args:
         param (dict or list): param can be initializer or list of column_option. initializer can be made by make_uniform_initializer or make_normal_initializer, column options can be made by make_column_options
+        admission (dict, optional): admission policy of the ids of the table, made by make_frequency_admission. Defaults to None, every id gets a row.
+        ttl_seconds (int, optional): the ids whose rows have not been written for ttl_seconds are removed from the persistent table when its chunks are compacted. Rows are aged by the chunk files they are in. All the tables share the persistent table, so ttl_seconds must be set for all the tables or for none, and the ids expire after the largest ttl_seconds of the tables. Defaults to None, the ids never expire.
 
     Returns:
         dict: table param of Embedding tables
@@ -518,6 +672,10 @@ def make_table_options(param):
         table = {"columns": param}
     else:
         raise ValueError("param must be initializer or columns")
+    if admission is not None:
+        table["admission"] = admission
+    if ttl_seconds is not None:
+        table["ttl_seconds"] = ttl_seconds
     return table
 
 
@@ -525,12 +683,12 @@ def make_column_options(initializer):
     return {"initializer": initializer}
 
 
-def make_table(param):
+def make_table(param, admission=None, ttl_seconds=None):
     """alias of `oneflow.one_embedding.make_table_options`
 
     See also :func:`oneflow.one_embedding.make_table_options`
     """
-    return make_table_options(param)
+    return make_table_options(param, admission, ttl_seconds)
 
 
 class MultiTableEmbedding(Embedding):
@@ -903,10 +1061,28 @@ class Ftrl(Optimizer):
         return False
 
 
+def _check_storage_dtype(storage_dim, storage_dtype, size_factor):
+    storage_dtype = storage_dtype or "float32"
+    assert storage_dtype in _storage_dtypes
+    assert size_factor > 0 and storage_dim % size_factor == 0
+    return storage_dtype
+
+
 def make_persistent_table_reader(
-    paths, snapshot_name, key_type, value_type, storage_dim, physical_block_size=512,
+    paths,
+    snapshot_name,
+    key_type,
+    value_type,
+    storage_dim,
+    physical_block_size=512,
+    batch_size=65536,
+    num_threads=0,
+    key_range=None,
+    shard=None,
+    storage_dtype=None,
+    size_factor=1,
 ):
-    r"""Creates a reader for reading persistent table.
+    r"""Creates a reader for reading persistent table. The reader is an iterator of (keys, values) numpy arrays, keys has the shape (n,) and values has the shape (n, storage_dim). The tables are read by a pool of threads, so the batches of different tables are interleaved in no particular order.
 
     Args:
         paths (list): paths of tables to read
@@ -915,7 +1091,31 @@ def make_persistent_table_reader(
         value_type (flow.dtype): the data type of value
         storage_dim (int): number of elements in each value
         physical_block_size (int, optional): physical_block_size should be sector size. Defaults to 512
+        batch_size (int, optional): the largest number of keys of a batch. Defaults to 65536
+        num_threads (int, optional): number of threads reading the tables, a table is read by one thread. 0 uses a thread per CPU core. Defaults to 0
+        key_range (tuple, optional): (begin, end), only read the keys in [begin, end). Defaults to None
+        shard (tuple, optional): (shard_id, num_shards), only read the keys of the shard, the keys are sharded by the same hash as the ranks of the embedding. Defaults to None
+        storage_dtype (str, optional): the storage_dtype of the kv_store that saved the tables, the values are converted to value_type. Defaults to None, which is "float32"
+        size_factor (int, optional): the size_factor of the store options that saved the tables, only needed by "int8". Defaults to 1
+
+    For example:
+
+    .. code-block:: python
+
+        >>> import oneflow as flow
+        >>> with flow.one_embedding.make_persistent_table_reader(
+        >>>     paths, "snapshot", flow.int64, flow.float, 128, shard=(0, 4)
+        >>> ) as reader:
+        >>>     for keys, values in reader:
+        >>>         # ...
     """
+    storage_dtype = _check_storage_dtype(storage_dim, storage_dtype, size_factor)
+    assert batch_size > 0
+    assert num_threads >= 0
+    if key_range is not None:
+        assert len(key_range) == 2 and key_range[0] <= key_range[1]
+    if shard is not None:
+        assert len(shard) == 2 and 0 <= shard[0] < shard[1]
     return PersistentTableReader(
         paths,
         snapshot_name,
@@ -924,13 +1124,27 @@ def make_persistent_table_reader(
         storage_dim,
         4 * 1024,
         physical_block_size,
+        num_threads,
+        batch_size,
+        key_range,
+        shard,
+        storage_dtype,
+        size_factor,
     )
 
 
 def make_persistent_table_writer(
-    paths, snapshot_name, key_type, value_type, storage_dim, physical_block_size=512,
+    paths,
+    snapshot_name,
+    key_type,
+    value_type,
+    storage_dim,
+    physical_block_size=512,
+    num_threads=0,
+    storage_dtype=None,
+    size_factor=1,
 ):
-    r"""Creates a writer for writing persistent table.
+    r"""Creates a writer for writing persistent table. The keys passed to ``write`` are sharded to the tables by the same hash as the ranks of the embedding, and the snapshot is saved on ``close``. Large batches of keys are sharded and written to the tables by a pool of threads.
 
     Args:
         paths (list): paths of tables to write
@@ -939,7 +1153,12 @@ def make_persistent_table_writer(
         value_type (flow.dtype): the data type of value
         storage_dim (int): number of elements in each value
         physical_block_size (int, optional): physical_block_size should be sector size. Defaults to 512
+        num_threads (int, optional): number of threads writing the tables. 0 uses a thread per CPU core. Defaults to 0
+        storage_dtype (str, optional): the storage_dtype of the kv_store that will load the tables, the values are converted from value_type. Defaults to None, which is "float32"
+        size_factor (int, optional): the size_factor of the store options that will load the tables, only needed by "int8". Defaults to 1
     """
+    storage_dtype = _check_storage_dtype(storage_dim, storage_dtype, size_factor)
+    assert num_threads >= 0
     return PersistentTableWriter(
         paths,
         snapshot_name,
@@ -948,4 +1167,69 @@ def make_persistent_table_writer(
         storage_dim,
         4 * 1024,
         physical_block_size,
+        num_threads,
+        storage_dtype,
+        size_factor,
+    )
+
+
+def reshard_persistent_tables(
+    src_paths,
+    src_snapshot_name,
+    dst_paths,
+    dst_snapshot_name,
+    key_type,
+    value_type,
+    storage_dim,
+    physical_block_size=512,
+    num_threads=0,
+    batch_size=65536,
+    storage_dtype=None,
+    size_factor=1,
+):
+    r"""Reshards the persistent tables of an embedding trained on len(src_paths) ranks into len(dst_paths) tables, so that the embedding can be loaded by len(dst_paths) ranks. The snapshot is read and written by a pool of threads, and the values are copied as they are stored, without being converted.
+
+    Args:
+        src_paths (list): paths of the tables to read
+        src_snapshot_name (str): name of the snapshot to read
+        dst_paths (list): paths of the tables to write, one per rank
+        dst_snapshot_name (str): name of the snapshot to write
+        key_type (flow.dtype): the data type of key
+        value_type (flow.dtype): the data type of value
+        storage_dim (int): number of elements in each value
+        physical_block_size (int, optional): physical_block_size should be sector size. Defaults to 512
+        num_threads (int, optional): number of threads reading and writing the tables. 0 uses a thread per CPU core. Defaults to 0
+        batch_size (int, optional): the largest number of keys read from a table at a time. Every thread reading a table holds up to two batches, so the batches take up to (2 * min(num_threads, len(src_paths)) + 2) * batch_size * (key size + value size) bytes of memory, where the value size is storage_dim * 4 bytes for "float32". Defaults to 65536
+        storage_dtype (str, optional): the storage_dtype of the kv_store that saved the tables. Defaults to None, which is "float32"
+        size_factor (int, optional): the size_factor of the store options that saved the tables, only needed by "int8". Defaults to 1
+
+    For example:
+
+    .. code-block:: python
+
+        >>> import oneflow as flow
+        >>> flow.one_embedding.reshard_persistent_tables(
+        >>>     ["/ssd/embedding/0-2", "/ssd/embedding/1-2"], "snapshot",
+        >>>     ["/ssd/resharded/0-4", "/ssd/resharded/1-4", "/ssd/resharded/2-4", "/ssd/resharded/3-4"],
+        >>>     "snapshot", flow.int64, flow.float, 128,
+        >>> )
+    """
+    storage_dtype = _check_storage_dtype(storage_dim, storage_dtype, size_factor)
+    assert len(src_paths) > 0 and len(dst_paths) > 0
+    assert batch_size > 0
+    assert num_threads >= 0
+    ReshardPersistentTables(
+        src_paths,
+        src_snapshot_name,
+        dst_paths,
+        dst_snapshot_name,
+        key_type,
+        value_type,
+        storage_dim,
+        4 * 1024,
+        physical_block_size,
+        num_threads,
+        batch_size,
+        storage_dtype,
+        size_factor,
     )
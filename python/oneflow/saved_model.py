@@ -16,5 +16,6 @@ limitations under the License.
 from oneflow.serving.saved_model_builder import (
     GraphBuilder,
     ModelBuilder,
+    NNGraphBuilder,
     SignatureBuilder,
 )
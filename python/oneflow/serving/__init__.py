@@ -14,8 +14,20 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+from oneflow.serving.dynamic_batching import (
+    DynamicBatcher,
+    DynamicBatchingOption,
+    Histogram,
+)
+from oneflow.serving.graph_inference_session import GraphInferenceSession
 from oneflow.serving.inference_session import (
     InferenceSession,
     ModelVersionPolicy,
     SessionOption,
 )
+from oneflow.serving.multi_instance import (
+    CpuInstanceConfig,
+    MultiInstanceSession,
+    numa_node_cpus,
+    plan_cpu_instances,
+)
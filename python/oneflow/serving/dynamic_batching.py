@@ -0,0 +1,375 @@
+"""
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import asyncio
+import bisect
+import collections
+import time
+
+import numpy as np
+
+
+_QUEUE_TIME_MS_BOUNDS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+class Histogram(object):
+    r"""Counts values in buckets, the i-th bucket counts the values in
+    (bounds[i - 1], bounds[i]] and the last bucket counts the values larger than
+    bounds[-1].
+    """
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        assert list(self.bounds) == sorted(self.bounds)
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def record(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q):
+        r"""The upper bound of the bucket of the q-th percentile, or the largest
+        value if it is in the last bucket.
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q / 100.0 * self.count
+        num_values = 0
+        for i, count in enumerate(self.counts):
+            num_values += count
+            if count > 0 and num_values >= rank:
+                return self.bounds[i] if i < len(self.bounds) else self.max
+        return self.max
+
+    def as_dict(self):
+        return {
+            "bounds": list(self.bounds),
+            "counts": list(self.counts),
+            "count": self.count,
+            "mean": self.sum / self.count if self.count > 0 else 0.0,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+        }
+
+
+class DynamicBatchingOption(object):
+    r"""Options of a :class:`DynamicBatcher`.
+
+    * ``max_batch_size``: the largest number of rows of a batch. A request can not
+      have more rows.
+    * ``max_queue_delay_ms``: the longest time the first request of a batch waits
+      for more requests before the batch is run.
+    * ``pad_to_batch_size``: if set, every batch is padded to this number of rows
+      by repeating its last row, for jobs compiled with a static batch size. The
+      rows of the padding are dropped from the outputs.
+    * ``max_inflight_batches``: the number of batches that run at the same time,
+      the requests that arrive meanwhile are queued for the next batch.
+    """
+
+    def __init__(
+        self,
+        max_batch_size,
+        max_queue_delay_ms=1.0,
+        pad_to_batch_size=None,
+        max_inflight_batches=1,
+    ):
+        assert max_batch_size > 0
+        assert max_queue_delay_ms >= 0
+        assert max_inflight_batches > 0
+        if pad_to_batch_size is not None:
+            assert pad_to_batch_size >= max_batch_size
+        self.max_batch_size = max_batch_size
+        self.max_queue_delay_ms = max_queue_delay_ms
+        self.pad_to_batch_size = pad_to_batch_size
+        self.max_inflight_batches = max_inflight_batches
+
+
+class _Request(object):
+    def __init__(self, inputs, num_rows, future):
+        self.inputs = inputs
+        self.num_rows = num_rows
+        self.future = future
+        self.enqueue_time = time.perf_counter()
+        # the requests of a batch have the same names, row shapes and dtypes
+        self.signature = tuple(
+            (name, x.shape[1:], x.dtype) for (name, x) in sorted(inputs.items())
+        )
+
+
+class DynamicBatcher(object):
+    r"""Queues the concurrent requests of a job and runs them as one batch.
+
+    The inputs of the requests are concatenated along their first axis, up to
+    ``max_batch_size`` rows or until the first request has waited
+    ``max_queue_delay_ms``, and ``run_fn`` is awaited once with the batch. The
+    outputs whose first axis is the batch are split back to the requests, the
+    other outputs are returned to every request as they are.
+
+    A request whose inputs do not match ``input_signature`` fails on its own in
+    :meth:`run`. Without ``input_signature``, only the requests with the same
+    input names, shapes of a row and dtypes as the first queued request are
+    batched together, the others wait in order for a later batch.
+
+    Args:
+        run_fn (coroutine function): called with the batched inputs as keyword
+            arguments of numpy.ndarray, returns a list of numpy.ndarray.
+        option (DynamicBatchingOption): the batching options.
+        event_loop (asyncio.AbstractEventLoop, optional): the event loop the
+            requests are awaited in. Defaults to ``asyncio.get_event_loop()``.
+        input_signature (dict, optional): the ``(shape, dtype)`` of every input by
+            name, where ``shape`` is the shape of a row, without the batch axis.
+            The inputs of another dtype of the same kind are cast to ``dtype``.
+    """
+
+    def __init__(self, run_fn, option, event_loop=None, input_signature=None):
+        assert isinstance(option, DynamicBatchingOption)
+        self.option_ = option
+        self.run_fn_ = run_fn
+        self.input_signature_ = None
+        if input_signature is not None:
+            self.input_signature_ = {
+                name: (tuple(shape), np.dtype(dtype))
+                for (name, (shape, dtype)) in input_signature.items()
+            }
+        self.event_loop_ = event_loop or asyncio.get_event_loop()
+        self.requests_ = collections.deque()
+        self.num_queued_rows_ = 0
+        self.new_request_ = None
+        self.inflight_ = None
+        self.batch_loop_task_ = None
+        self.batch_tasks_ = set()
+        self.queue_time_ms_ = Histogram(_QUEUE_TIME_MS_BOUNDS)
+        batch_size_bounds = []
+        bound = 1
+        while bound < option.max_batch_size:
+            batch_size_bounds.append(bound)
+            bound *= 2
+        batch_size_bounds.append(option.max_batch_size)
+        self.batch_size_ = Histogram(batch_size_bounds)
+        self.num_requests_ = 0
+        self.num_padded_rows_ = 0
+
+    @property
+    def option(self):
+        return self.option_
+
+    async def run(self, **inputs):
+        num_rows = self._check_inputs(inputs)
+        if self.batch_loop_task_ is None:
+            # created here so that they belong to the running event loop
+            self.new_request_ = asyncio.Event()
+            self.inflight_ = asyncio.Semaphore(self.option_.max_inflight_batches)
+            self.batch_loop_task_ = self.event_loop_.create_task(self._batch_loop())
+        future = self.event_loop_.create_future()
+        self.requests_.append(_Request(inputs, num_rows, future))
+        self.num_queued_rows_ += num_rows
+        self.new_request_.set()
+        return await future
+
+    def close(self):
+        r"""Stops batching, the queued requests are cancelled. The batches in
+        flight are awaited by :meth:`wait_for_all_batches_finished`.
+        """
+        if self.batch_loop_task_ is not None:
+            self.batch_loop_task_.cancel()
+            self.batch_tasks_.add(self.batch_loop_task_)
+            self.batch_loop_task_.add_done_callback(self.batch_tasks_.discard)
+            self.batch_loop_task_ = None
+        while len(self.requests_) > 0:
+            self.requests_.popleft().future.cancel()
+        self.num_queued_rows_ = 0
+
+    async def wait_for_all_batches_finished(self):
+        await asyncio.gather(*self.batch_tasks_, return_exceptions=True)
+
+    def stats(self):
+        r"""Returns a dict of the counters since the last :meth:`reset_stats`:
+        ``requests``, ``batches``, ``padded_rows``, the histogram of the time in
+        ms the requests waited in the queue, ``queue_time_ms``, and the histogram
+        of the number of rows of the batches without the padding, ``batch_size``.
+        """
+        return {
+            "requests": self.num_requests_,
+            "batches": self.batch_size_.count,
+            "padded_rows": self.num_padded_rows_,
+            "queue_time_ms": self.queue_time_ms_.as_dict(),
+            "batch_size": self.batch_size_.as_dict(),
+        }
+
+    def reset_stats(self):
+        self.queue_time_ms_.reset()
+        self.batch_size_.reset()
+        self.num_requests_ = 0
+        self.num_padded_rows_ = 0
+
+    def _check_inputs(self, inputs):
+        if len(inputs) == 0:
+            raise ValueError("a request of dynamic batching requires inputs")
+        num_rows = None
+        for (input_name, input_numpy) in inputs.items():
+            if not isinstance(input_numpy, np.ndarray):
+                raise ValueError('input "{}" requires numpy.ndarray'.format(input_name))
+            if input_numpy.ndim == 0:
+                raise ValueError(
+                    'input "{}" requires a batch axis for dynamic batching'.format(
+                        input_name
+                    )
+                )
+            if num_rows is None:
+                num_rows = input_numpy.shape[0]
+            elif input_numpy.shape[0] != num_rows:
+                raise ValueError(
+                    "all the inputs of a request must have the same batch size"
+                )
+        if num_rows == 0 or num_rows > self.option_.max_batch_size:
+            raise ValueError(
+                "the batch size of a request must be in [1, {}], got {}".format(
+                    self.option_.max_batch_size, num_rows
+                )
+            )
+        if self.input_signature_ is not None:
+            self._check_input_signature(inputs)
+        return num_rows
+
+    def _check_input_signature(self, inputs):
+        for input_name in inputs.keys():
+            if input_name not in self.input_signature_:
+                raise ValueError('input "{}" is unexpected'.format(input_name))
+        for (input_name, (shape, dtype)) in self.input_signature_.items():
+            if input_name not in inputs:
+                raise ValueError('input "{}" is absent'.format(input_name))
+            input_numpy = inputs[input_name]
+            if input_numpy.shape[1:] != shape:
+                raise ValueError(
+                    'the shape of a row of input "{}" is {}, but got {}'.format(
+                        input_name, shape, input_numpy.shape[1:]
+                    )
+                )
+            if input_numpy.dtype != dtype:
+                if not np.can_cast(input_numpy.dtype, dtype, casting="same_kind"):
+                    raise ValueError(
+                        'the dtype of input "{}" is {}, but got {}'.format(
+                            input_name, dtype, input_numpy.dtype
+                        )
+                    )
+                inputs[input_name] = input_numpy.astype(dtype)
+
+    async def _batch_loop(self):
+        max_queue_delay = self.option_.max_queue_delay_ms / 1000.0
+        while True:
+            if len(self.requests_) == 0:
+                self.new_request_.clear()
+                await self.new_request_.wait()
+                continue
+            deadline = self.requests_[0].enqueue_time + max_queue_delay
+            while self.num_queued_rows_ < self.option_.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                self.new_request_.clear()
+                try:
+                    await asyncio.wait_for(self.new_request_.wait(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            # the requests that arrive while the batches in flight run join this batch
+            await self.inflight_.acquire()
+            requests = self._take_batch()
+            task = self.event_loop_.create_task(self._run_batch(requests))
+            self.batch_tasks_.add(task)
+            task.add_done_callback(self.batch_tasks_.discard)
+
+    def _take_batch(self):
+        requests = [self.requests_.popleft()]
+        num_rows = requests[0].num_rows
+        skipped = []
+        while len(self.requests_) > 0:
+            request = self.requests_[0]
+            if request.signature != requests[0].signature:
+                # can not be concatenated with this batch, stays queued in order
+                skipped.append(self.requests_.popleft())
+                continue
+            if num_rows + request.num_rows > self.option_.max_batch_size:
+                break
+            requests.append(self.requests_.popleft())
+            num_rows += request.num_rows
+        self.requests_.extendleft(reversed(skipped))
+        self.num_queued_rows_ -= num_rows
+        return requests
+
+    async def _run_batch(self, requests):
+        try:
+            now = time.perf_counter()
+            num_rows = 0
+            for request in requests:
+                self.queue_time_ms_.record((now - request.enqueue_time) * 1000.0)
+                num_rows += request.num_rows
+            self.num_requests_ += len(requests)
+            self.batch_size_.record(num_rows)
+            batch_inputs = self._concat_inputs(requests, num_rows)
+            outputs = await self.run_fn_(**batch_inputs)
+            self._split_outputs(requests, num_rows, outputs)
+        except Exception as e:
+            for request in requests:
+                if not request.future.done():
+                    request.future.set_exception(e)
+        finally:
+            self.inflight_.release()
+
+    def _concat_inputs(self, requests, num_rows):
+        pad_to_batch_size = self.option_.pad_to_batch_size
+        num_padded_rows = 0
+        if pad_to_batch_size is not None:
+            num_padded_rows = pad_to_batch_size - num_rows
+            self.num_padded_rows_ += num_padded_rows
+        batch_inputs = {}
+        for input_name in requests[0].inputs.keys():
+            arrays = [request.inputs[input_name] for request in requests]
+            if num_padded_rows > 0:
+                # the last row is repeated rather than zeros, so the padding does not
+                # produce values like inf or nan that could slow the job down
+                last_row = arrays[-1][-1:]
+                arrays.append(np.repeat(last_row, num_padded_rows, axis=0))
+            if len(arrays) == 1:
+                batch_inputs[input_name] = arrays[0]
+            else:
+                batch_inputs[input_name] = np.concatenate(arrays, axis=0)
+        return batch_inputs
+
+    def _split_outputs(self, requests, num_rows, outputs):
+        batch_size = self.option_.pad_to_batch_size or num_rows
+        results = [[] for _ in requests]
+        for output in outputs:
+            is_batched = isinstance(output, np.ndarray) and (
+                output.ndim > 0 and output.shape[0] == batch_size
+            )
+            offset = 0
+            for (i, request) in enumerate(requests):
+                if is_batched:
+                    results[i].append(output[offset : offset + request.num_rows])
+                    offset += request.num_rows
+                else:
+                    results[i].append(output)
+        for (request, result) in zip(requests, results):
+            if not request.future.done():
+                request.future.set_result(result)
@@ -0,0 +1,823 @@
+"""
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+
+import google.protobuf.text_format as text_format
+import numpy as np
+
+import oneflow as flow
+import oneflow._oneflow_internal
+import oneflow.core.job.job_conf_pb2 as job_conf_proto
+import oneflow.core.operator.op_conf_pb2 as op_conf_proto
+import oneflow.framework.c_api_util as c_api_util
+import oneflow.framework.check_point_v2 as check_point_v2
+import oneflow.framework.dtype as dtype_util
+import oneflow.framework.graph_build_util as graph_build_util
+import oneflow.framework.id_util as id_util
+import oneflow.framework.session_context as session_ctx
+from oneflow.framework.tensor_tuple_util import convert_to_tensor_tuple
+from oneflow.serving.dynamic_batching import (
+    DynamicBatcher,
+    DynamicBatchingOption,
+    Histogram,
+)
+from oneflow.serving.inference_session import (
+    InferenceSession,
+    ModelVersionPolicy,
+    SessionOption,
+    _find_model_latest_version,
+    _load_saved_model_proto,
+)
+
+# The job build context and the variable tensor manager are global, only one
+# graph is built or freed at a time.
+_graph_build_lock = threading.Lock()
+
+_SWAP_DURATION_MS_BOUNDS = (100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+
+class CompiledGraph(object):
+    r"""A graph of a saved model exported from nn.Graph, built into a job with the
+    variables of the checkpoint and compiled to a plan, which runs like a compiled
+    nn.Graph.
+
+    Args:
+        graph_name (str): the name of the graph in the saved model.
+        graph_def (GraphDef): the graph, with the forward job of the nn.Graph.
+        signature (JobSignatureDef, optional): names the inputs and the outputs,
+            they are named by their op names if it is None.
+        checkpoint_path (str): the directory of the variables.
+        device (oneflow.device): the device the graph runs on.
+        batch_size (int, optional): replaces the first dim of the inputs.
+        version (int, optional): the version of the saved model.
+    """
+
+    def __init__(
+        self,
+        graph_name,
+        graph_def,
+        signature,
+        checkpoint_path,
+        device,
+        batch_size=None,
+        version=None,
+    ):
+        if not graph_def.HasField("job_conf"):
+            raise ValueError(
+                "graph {} is not exported from nn.Graph, please serve it by InferenceSession".format(
+                    graph_name
+                )
+            )
+        self.graph_name_ = graph_name
+        self.job_name_ = id_util.UniqueStr(graph_name + "_")
+        self.device_ = device
+        self.version_ = version
+        self.lock_ = threading.Lock()
+        self.idle_ = threading.Condition()
+        self.num_inflight_runs_ = 0
+        self.input_names_ = []
+        self.input_op_names_ = []
+        self.input_infos_ = []
+        self.output_names_ = []
+        self.output_op_names_ = []
+        self.output_infos_ = []
+        with _graph_build_lock:
+            self._build(graph_def, signature, checkpoint_path, batch_size)
+
+    @property
+    def name(self):
+        return self.graph_name_
+
+    @property
+    def version(self):
+        return self.version_
+
+    @property
+    def variable_bytes(self):
+        r"""The bytes of the variables of the graph, the plan and the buffers of
+        the runtime are not included.
+        """
+        return sum(
+            [
+                tensor.nelement() * tensor.element_size()
+                for tensor in self.state_tensor_tuple_
+            ]
+        )
+
+    @property
+    def input_names(self):
+        return tuple(self.input_names_)
+
+    @property
+    def output_names(self):
+        return tuple(self.output_names_)
+
+    def input_info(self, input_name):
+        return self.input_infos_[self.input_names_.index(input_name)]
+
+    def output_info(self, output_name):
+        return self.output_infos_[self.output_names_.index(output_name)]
+
+    def _build(self, graph_def, signature, checkpoint_path, batch_size):
+        lbn2input_name = {}
+        lbn2output_name = {}
+        if signature is not None:
+            for (input_name, input_def) in signature.inputs.items():
+                lbn = "{}/{}".format(input_def.lbi.op_name, input_def.lbi.blob_name)
+                lbn2input_name[lbn] = input_name
+            for (output_name, output_def) in signature.outputs.items():
+                lbn = "{}/{}".format(output_def.lbi.op_name, output_def.lbi.blob_name)
+                lbn2output_name[lbn] = output_name
+
+        job_conf = job_conf_proto.JobConfigProto()
+        job_conf.CopyFrom(graph_def.job_conf)
+        job_conf.job_name = self.job_name_
+        job_conf.predict_conf.SetInParent()
+        session = session_ctx.GetDefaultSession()
+        session.TryInit()
+        prev_scope = oneflow._oneflow_internal.GetCurrentScope()
+        scope = oneflow._oneflow_internal.MakeInitialScope(
+            text_format.MessageToString(job_conf),
+            flow.placement(self.device_.type, [0]),
+            False,  # is_mirrored
+        )
+
+        variable_op_names = []
+        variable_tensors = []
+        input_blob_confs = []
+        with graph_build_util.lazy_mode.guard(True):
+            with graph_build_util.JobBuildAndInferCtx(job_conf):
+                with graph_build_util.BlockScopeContext(prev_scope, scope):
+                    for saved_op_conf in graph_def.op_list:
+                        # the scopes of the saved job belong to the process saved it
+                        op_conf = op_conf_proto.OperatorConf()
+                        op_conf.CopyFrom(saved_op_conf)
+                        op_conf.scope_symbol_id = scope.symbol_id
+                        op_conf.device_tag = self.device_.type
+                        if op_conf.HasField("input_conf"):
+                            blob_conf = op_conf.input_conf.blob_conf
+                            if batch_size is not None:
+                                blob_conf.shape.dim[0] = batch_size
+                            lbn = "{}/{}".format(op_conf.name, op_conf.input_conf.out)
+                            self.input_names_.append(
+                                lbn2input_name.get(lbn, op_conf.name)
+                            )
+                            self.input_op_names_.append(op_conf.name)
+                            input_blob_confs.append(blob_conf)
+                        elif op_conf.HasField("output_conf"):
+                            lbn = "{}/{}".format(op_conf.name, op_conf.output_conf.out)
+                            self.output_names_.append(
+                                lbn2output_name.get(lbn, op_conf.name)
+                            )
+                            self.output_op_names_.append(op_conf.name)
+                        elif op_conf.HasField("variable_conf"):
+                            variable_op_names.append(op_conf.name)
+                            variable_tensors.append(
+                                self._load_variable(checkpoint_path, op_conf.name)
+                            )
+                        c_api_util.CurJobBuildAndInferCtx_AddAndInferConsistentOp(
+                            op_conf
+                        )
+                    oneflow._oneflow_internal.FillVariableTensorMgr(
+                        variable_op_names, convert_to_tensor_tuple(variable_tensors)
+                    )
+                    oneflow._oneflow_internal.CurJobBuildAndInferCtx_Complete()
+                    full_job = c_api_util.GetCurrentJob()
+                    job_id = (
+                        oneflow._oneflow_internal.JobBuildAndInferCtx_GetCurrentJobId()
+                    )
+                    self.c_nn_graph_ = oneflow._oneflow_internal.nn.graph.CNNGraph(
+                        self.job_name_,
+                        full_job.SerializeToString(),
+                        job_id,
+                        session._session_ctx,
+                    )
+                    self._register_tensors(full_job, input_blob_confs)
+
+        # Sync to make sure the variables have been loaded.
+        oneflow._oneflow_internal.eager.Sync()
+        self.c_nn_graph_.complie_and_init_runtime()
+
+    def _load_variable(self, checkpoint_path, op_name):
+        blob = check_point_v2.FileBackendVariableBlob(
+            os.path.join(checkpoint_path, op_name)
+        )
+        with graph_build_util.lazy_mode.guard(False):
+            return flow.tensor(blob.numpy(), device=self.device_)
+
+    def _register_tensors(self, full_job, input_blob_confs):
+        input_tensors = []
+        output_tensors = []
+        with graph_build_util.lazy_mode.guard(False):
+            for blob_conf in input_blob_confs:
+                shape = tuple(blob_conf.shape.dim)
+                dtype = dtype_util.convert_proto_dtype_to_oneflow_dtype(
+                    blob_conf.data_type
+                )
+                self.input_infos_.append(dict(shape=shape, dtype=dtype))
+                input_tensors.append(
+                    flow.empty(shape, dtype=dtype, device=self.device_)
+                )
+            for op_name in self.output_op_names_:
+                # the shape of the outputs is inferred by the complete job
+                blob_desc = full_job.helper.lbn2logical_blob_desc[op_name + "/out"]
+                shape = tuple(blob_desc.shape.dim)
+                dtype = dtype_util.convert_proto_dtype_to_oneflow_dtype(
+                    blob_desc.data_type
+                )
+                self.output_infos_.append(dict(shape=shape, dtype=dtype))
+                output_tensors.append(
+                    flow.empty(shape, dtype=dtype, device=self.device_)
+                )
+        self.c_nn_graph_.register_input_op_names_and_tensors(
+            self.input_op_names_, convert_to_tensor_tuple(input_tensors)
+        )
+        self.outputs_tensor_tuple_ = convert_to_tensor_tuple(output_tensors)
+        # tensors acting as buffer should be synced once upon created.
+        oneflow._oneflow_internal.nn.graph.SoftSyncNNGraphBuffers(
+            self.outputs_tensor_tuple_, self.c_nn_graph_
+        )
+        self.c_nn_graph_.register_output_op_names_and_tensors(
+            self.output_op_names_, self.outputs_tensor_tuple_
+        )
+        (
+            state_op_names,
+            state_tensors,
+        ) = oneflow._oneflow_internal.DumpVariableTensorMgr()
+        self.state_tensor_tuple_ = convert_to_tensor_tuple(state_tensors)
+        self.c_nn_graph_.register_variable_op_names_and_tensors(
+            state_op_names, self.state_tensor_tuple_
+        )
+
+    def run(self, inputs):
+        r"""Runs the graph with a dict of the inputs by name, returns a list of the
+        outputs as numpy.ndarray. The runs are serialized since they share the
+        output buffers.
+        """
+        input_tensors = []
+        for (input_name, info) in zip(self.input_names_, self.input_infos_):
+            if input_name not in inputs:
+                raise ValueError('input "{}" is absent'.format(input_name))
+            input_numpy = inputs[input_name]
+            if not isinstance(input_numpy, np.ndarray):
+                raise ValueError('input "{}" requires numpy.ndarray'.format(input_name))
+            if input_numpy.shape != info["shape"]:
+                raise ValueError(
+                    'the shape of input "{}" is {}, but got {}'.format(
+                        input_name, info["shape"], input_numpy.shape
+                    )
+                )
+            input_tensors.append(
+                flow.tensor(input_numpy, dtype=info["dtype"], device=self.device_)
+            )
+        with self.lock_:
+            oneflow._oneflow_internal.nn.graph.RunLazyNNGraph(
+                convert_to_tensor_tuple(input_tensors),
+                self.outputs_tensor_tuple_,
+                self.state_tensor_tuple_,
+                self.c_nn_graph_,
+            )
+            oneflow._oneflow_internal.nn.graph.SoftSyncNNGraphBuffers(
+                self.outputs_tensor_tuple_, self.c_nn_graph_
+            )
+            # copied out before the next run reuses the buffers
+            return [output.numpy() for output in self.outputs_tensor_tuple_]
+
+    def warmup(self, num_iters=1):
+        r"""Runs the graph with zeros, so the first requests do not pay for the
+        allocations and the initializations of the runtime.
+        """
+        inputs = {}
+        for (input_name, info) in zip(self.input_names_, self.input_infos_):
+            inputs[input_name] = np.zeros(
+                info["shape"],
+                dtype=dtype_util.convert_oneflow_dtype_to_numpy_dtype(info["dtype"]),
+            )
+        for _ in range(num_iters):
+            self.run(inputs)
+
+    def acquire(self):
+        r"""Marks a run in flight, :meth:`wait_until_idle` waits for it to
+        :meth:`release`.
+        """
+        with self.idle_:
+            self.num_inflight_runs_ += 1
+
+    def release(self):
+        with self.idle_:
+            self.num_inflight_runs_ -= 1
+            if self.num_inflight_runs_ == 0:
+                self.idle_.notify_all()
+
+    def wait_until_idle(self):
+        with self.idle_:
+            while self.num_inflight_runs_ > 0:
+                self.idle_.wait()
+
+    def close(self):
+        with _graph_build_lock:
+            # Ensure vm has finished running this graph.
+            oneflow._oneflow_internal.eager.Sync()
+            oneflow._oneflow_internal.ClearVariableTensorMgr()
+            self.c_nn_graph_ = None
+            self.outputs_tensor_tuple_ = None
+            self.state_tensor_tuple_ = None
+
+
+def _check_graph_signature(old_graph, new_graph):
+    # the requests and the dynamic batching of the old version must fit the new one
+    for (kind, old_names, new_names, old_info, new_info) in [
+        (
+            "input",
+            old_graph.input_names,
+            new_graph.input_names,
+            old_graph.input_info,
+            new_graph.input_info,
+        ),
+        (
+            "output",
+            old_graph.output_names,
+            new_graph.output_names,
+            old_graph.output_info,
+            new_graph.output_info,
+        ),
+    ]:
+        if new_names != old_names:
+            raise ValueError(
+                "the {}s of version {} are {}, but version {} has {}".format(
+                    kind, new_graph.version, new_names, old_graph.version, old_names
+                )
+            )
+        for name in old_names:
+            if new_info(name) != old_info(name):
+                raise ValueError(
+                    'the {} "{}" of version {} is {}, but version {} has {}'.format(
+                        kind,
+                        name,
+                        new_graph.version,
+                        new_info(name),
+                        old_graph.version,
+                        old_info(name),
+                    )
+                )
+
+
+class _ModelVersionWatcher(object):
+    r"""Swaps a graph of a :class:`GraphInferenceSession` to the latest version of
+    its saved model. The new version is built, compiled and warmed up while the
+    old one keeps serving, then the requests are switched to it at once, and the
+    old version is freed after its requests in flight finish.
+    """
+
+    def __init__(
+        self,
+        session,
+        graph_name,
+        saved_model_dir,
+        load_kwargs,
+        poll_interval_s=None,
+        num_warmup_iters=1,
+    ):
+        self.session_ = session
+        self.graph_name_ = graph_name
+        self.saved_model_dir_ = saved_model_dir
+        self.load_kwargs_ = load_kwargs
+        self.poll_interval_s_ = poll_interval_s
+        self.num_warmup_iters_ = num_warmup_iters
+        self.check_lock_ = threading.Lock()
+        self.failed_versions_ = set()
+        self.swap_duration_ms_ = Histogram(_SWAP_DURATION_MS_BOUNDS)
+        self.num_swaps_ = 0
+        self.last_swap_ = None
+        self.stopped_ = threading.Event()
+        self.thread_ = None
+        if poll_interval_s is not None:
+            self.thread_ = threading.Thread(target=self._poll_loop, daemon=True)
+            self.thread_.start()
+
+    def _poll_loop(self):
+        while not self.stopped_.wait(self.poll_interval_s_):
+            try:
+                self.check()
+            except Exception:
+                logging.exception(
+                    "checking the versions of graph {} got error".format(
+                        self.graph_name_
+                    )
+                )
+
+    def check(self):
+        r"""Swaps to the latest version if it is newer, returns whether it swapped.
+        A version failed to load, or whose inputs and outputs differ from the
+        current version, is not tried again. A version without its meta file yet
+        is tried again by the next check.
+        """
+        with self.check_lock_:
+            old_graph = self.session_._get_graph(self.graph_name_)
+            latest_version = int(_find_model_latest_version(self.saved_model_dir_))
+            if (
+                latest_version <= old_graph.version
+                or latest_version in self.failed_versions_
+            ):
+                return False
+            if not self._has_meta_file(latest_version):
+                # still being written by a saver that does not rename it into place
+                return False
+            start = time.perf_counter()
+            new_graph = None
+            try:
+                new_graph = self.session_._build_graph(
+                    self.saved_model_dir_, latest_version, **self.load_kwargs_
+                )
+                compiled = time.perf_counter()
+                _check_graph_signature(old_graph, new_graph)
+                new_graph.warmup(self.num_warmup_iters_)
+            except Exception:
+                self.failed_versions_.add(latest_version)
+                if new_graph is not None:
+                    new_graph.close()
+                logging.exception(
+                    "loading version {} of graph {} got error".format(
+                        latest_version, self.graph_name_
+                    )
+                )
+                return False
+            warmed_up = time.perf_counter()
+            old_graph = self.session_._swap_graph(self.graph_name_, new_graph)
+            swapped = time.perf_counter()
+            old_graph.wait_until_idle()
+            overlap_variable_bytes = old_graph.variable_bytes + new_graph.variable_bytes
+            old_graph.close()
+            freed = time.perf_counter()
+            swap_ms = (swapped - start) * 1000.0
+            self.swap_duration_ms_.record(swap_ms)
+            self.num_swaps_ += 1
+            self.last_swap_ = {
+                "from_version": old_graph.version,
+                "to_version": latest_version,
+                "compile_ms": (compiled - start) * 1000.0,
+                "warmup_ms": (warmed_up - compiled) * 1000.0,
+                "swap_ms": swap_ms,
+                "drain_ms": (freed - swapped) * 1000.0,
+                "overlap_ms": (freed - start) * 1000.0,
+                "overlap_variable_bytes": overlap_variable_bytes,
+            }
+            return True
+
+    def _has_meta_file(self, version):
+        basename = self.load_kwargs_["saved_model_meta_file_basename"]
+        version_dir = os.path.join(self.saved_model_dir_, str(version))
+        return any(
+            os.path.exists(os.path.join(version_dir, basename + ext))
+            for ext in (".pb", ".prototxt")
+        )
+
+    def stats(self):
+        return {
+            "version": self.session_._get_graph(self.graph_name_).version,
+            "swaps": self.num_swaps_,
+            "failed_versions": sorted(self.failed_versions_),
+            "last_swap": self.last_swap_,
+            "swap_duration_ms": self.swap_duration_ms_.as_dict(),
+        }
+
+    def stop(self):
+        self.stopped_.set()
+        if self.thread_ is not None:
+            self.thread_.join()
+            self.thread_ = None
+
+
+class GraphInferenceSession(object):
+    r"""Serves the saved models exported from nn.Graph by
+    :meth:`~oneflow.saved_model.ModelBuilder.AddGraph`.
+
+    The forward job of every graph is built and compiled to a plan, and it runs
+    with ``RunLazyNNGraph`` like a compiled nn.Graph, so the graph is served with
+    the same optimizations as it had in training.
+
+    For example:
+
+    .. code-block:: python
+
+        sess = flow.serving.GraphInferenceSession()
+        sess.load_saved_model("./saved_models", batch_size=8)
+        outputs = sess.run(sess.list_graphs()[0], x=np.ones((8, 4), np.float32))
+        sess.close()
+
+    Args:
+        option (SessionOption, optional): the device of the graphs, only one
+            device is supported. Defaults to the first cuda device.
+    """
+
+    SessionStatus = InferenceSession.SessionStatus
+
+    def __init__(self, option=None):
+        if option is None:
+            self.option_ = SessionOption()
+        else:
+            assert isinstance(option, SessionOption)
+            self.option_ = option
+        if self.option_.device_num != 1:
+            raise NotImplementedError(
+                "GraphInferenceSession only supports one device, got {}".format(
+                    self.option_.device_num
+                )
+            )
+        self.device_ = flow.device(self.option_.device_tag)
+        self.lock_ = threading.Lock()
+        self.graph_name2graph_ = {}
+        self.graph_name2batcher_ = {}
+        self.graph_name2watcher_ = {}
+        self.status_ = self.SessionStatus.OPEN
+        self._init_event_loop()
+
+    def __del__(self):
+        if self.status_ != self.SessionStatus.CLOSED:
+            self.close()
+
+    def _init_event_loop(self):
+        self.event_loop_ = asyncio.get_event_loop()
+        if self.event_loop_.is_closed():
+            asyncio.set_event_loop(asyncio.new_event_loop())
+            self.event_loop_ = asyncio.get_event_loop()
+
+    def close(self):
+        for watcher in self.graph_name2watcher_.values():
+            watcher.stop()
+        self.graph_name2watcher_ = {}
+        for batcher in self.graph_name2batcher_.values():
+            batcher.close()
+        self.event_loop_.run_until_complete(self.wait_for_all_jobs_finished())
+        self.event_loop_.close()
+        for graph in self.graph_name2graph_.values():
+            graph.close()
+        self.graph_name2graph_ = {}
+        self.status_ = self.SessionStatus.CLOSED
+
+    def _check_status(self, *status):
+        if self.status_ not in status:
+            raise ValueError(
+                "The calling is only allowed when status is {}, current status is {}".format(
+                    ",".join([str(stat) for stat in status]), self.status_
+                )
+            )
+
+    def load_saved_model(
+        self,
+        saved_model_dir,
+        model_version=ModelVersionPolicy.LATEST,
+        saved_model_meta_file_basename="saved_model",
+        graph_name=None,
+        signature_name=None,
+        batch_size=None,
+        watch_interval_s=None,
+        num_warmup_iters=1,
+    ):
+        r"""Builds and compiles a graph of the saved model, returns its name.
+
+        Args:
+            batch_size (int, optional): replaces the first dim of the inputs of
+                the graph. Defaults to the batch size the graph is compiled with.
+            watch_interval_s (float, optional): if set, the saved model dir is
+                checked every ``watch_interval_s`` seconds and the graph is swapped
+                to a newer version without dropping requests, see
+                :meth:`check_model_version`. Requires the ``LATEST`` version
+                policy. A new version must have the same inputs and outputs, with
+                the same shapes and dtypes, as the graph loaded. It should be
+                renamed into the saved model dir once written, as
+                :meth:`~oneflow.saved_model.ModelBuilder.Save` does, so that it is
+                never seen half written.
+            num_warmup_iters (int, optional): the runs of a new version before the
+                requests are swapped to it. Defaults to 1.
+        """
+        self._check_status(self.SessionStatus.OPEN, self.SessionStatus.RUNNING)
+        if watch_interval_s is not None and model_version != ModelVersionPolicy.LATEST:
+            raise ValueError("only the latest version of a saved model can be watched")
+        load_kwargs = dict(
+            saved_model_meta_file_basename=saved_model_meta_file_basename,
+            graph_name=graph_name,
+            signature_name=signature_name,
+            batch_size=batch_size,
+        )
+        graph = self._build_graph(saved_model_dir, model_version, **load_kwargs)
+        if graph.name in self.graph_name2graph_:
+            graph.close()
+            raise ValueError("graph {} is already loaded".format(graph.name))
+        with self.lock_:
+            self.graph_name2graph_[graph.name] = graph
+        # the versions swapped to are loaded as the same graph
+        load_kwargs["graph_name"] = graph.name
+        self.graph_name2watcher_[graph.name] = _ModelVersionWatcher(
+            self,
+            graph.name,
+            saved_model_dir,
+            load_kwargs,
+            watch_interval_s,
+            num_warmup_iters,
+        )
+        self.status_ = self.SessionStatus.RUNNING
+        return graph.name
+
+    def _build_graph(
+        self,
+        saved_model_dir,
+        model_version,
+        saved_model_meta_file_basename="saved_model",
+        graph_name=None,
+        signature_name=None,
+        batch_size=None,
+    ):
+        (saved_model_path, saved_model_proto) = _load_saved_model_proto(
+            saved_model_dir, model_version, saved_model_meta_file_basename
+        )
+        if graph_name is None:
+            graph_name = saved_model_proto.default_graph_name
+        elif graph_name not in saved_model_proto.graphs:
+            raise ValueError("graph {} do not exist".format(graph_name))
+        graph_def = saved_model_proto.graphs[graph_name]
+        signature = None
+        if signature_name is None and graph_def.HasField("default_signature_name"):
+            signature_name = graph_def.default_signature_name
+        if signature_name is not None:
+            if signature_name not in graph_def.signatures:
+                raise ValueError("signature {} do not exist".format(signature_name))
+            signature = graph_def.signatures[signature_name]
+        return CompiledGraph(
+            graph_name,
+            graph_def,
+            signature,
+            os.path.join(saved_model_path, saved_model_proto.checkpoint_dir),
+            self.device_,
+            batch_size,
+            # the version dirs are ordered by their names
+            int(os.path.basename(saved_model_path)),
+        )
+
+    def _swap_graph(self, graph_name, graph):
+        with self.lock_:
+            old_graph = self.graph_name2graph_[graph_name]
+            self.graph_name2graph_[graph_name] = graph
+        return old_graph
+
+    def _acquire_graph(self, graph_name):
+        with self.lock_:
+            graph = self._get_graph(graph_name)
+            graph.acquire()
+        return graph
+
+    def check_model_version(self, graph_name):
+        r"""Swaps the graph to the latest version of its saved model if it is
+        newer, returns whether it swapped. It is called every
+        ``watch_interval_s`` in the background if set on loading.
+
+        The new version is built, compiled and warmed up while the current one
+        keeps serving. Then the requests are switched to the new version at once,
+        and the old version is freed after its requests in flight finish.
+        """
+        self._check_status(self.SessionStatus.RUNNING)
+        self._get_graph(graph_name)
+        return self.graph_name2watcher_[graph_name].check()
+
+    def model_version_stats(self, graph_name):
+        r"""Returns a dict of the current ``version`` of the graph, the number of
+        ``swaps``, the ``failed_versions``, the histogram of the time in ms from
+        finding a new version to switching the requests to it,
+        ``swap_duration_ms``, and the ``last_swap``.
+
+        ``last_swap`` has the durations in ms to compile, to warm up, to swap and
+        to drain the old version, and ``overlap_ms``, how long both versions were
+        alive, with ``overlap_variable_bytes``, the bytes of the variables of both
+        versions meanwhile.
+        """
+        self._check_status(self.SessionStatus.RUNNING)
+        self._get_graph(graph_name)
+        return self.graph_name2watcher_[graph_name].stats()
+
+    def _get_graph(self, graph_name):
+        if graph_name not in self.graph_name2graph_:
+            raise ValueError("graph {} is not loaded".format(graph_name))
+        return self.graph_name2graph_[graph_name]
+
+    def list_graphs(self):
+        self._check_status(self.SessionStatus.RUNNING)
+        return tuple(self.graph_name2graph_.keys())
+
+    def list_inputs(self, graph_name):
+        self._check_status(self.SessionStatus.RUNNING)
+        return self._get_graph(graph_name).input_names
+
+    def list_outputs(self, graph_name):
+        self._check_status(self.SessionStatus.RUNNING)
+        return self._get_graph(graph_name).output_names
+
+    def input_info(self, input_name, graph_name):
+        self._check_status(self.SessionStatus.RUNNING)
+        return self._get_graph(graph_name).input_info(input_name)
+
+    def output_info(self, output_name, graph_name):
+        self._check_status(self.SessionStatus.RUNNING)
+        return self._get_graph(graph_name).output_info(output_name)
+
+    def enable_dynamic_batching(
+        self,
+        graph_name,
+        max_batch_size=None,
+        max_queue_delay_ms=1.0,
+        max_inflight_batches=1,
+    ):
+        r"""Batches the concurrent :meth:`async_run` calls of the graph, see
+        :class:`~oneflow.serving.DynamicBatcher`. Every batch is padded to the
+        static batch size of the graph.
+
+        Args:
+            graph_name (str): the graph to batch.
+            max_batch_size (int, optional): the largest number of rows of a batch.
+                Defaults to the batch size of the graph.
+            max_queue_delay_ms (float, optional): the longest time a call waits for
+                more calls before its batch runs. Defaults to 1.0.
+            max_inflight_batches (int, optional): the number of batches of the
+                graph that run at the same time. Defaults to 1.
+        """
+        self._check_status(self.SessionStatus.RUNNING)
+        graph = self._get_graph(graph_name)
+        if len(graph.input_names) == 0:
+            raise ValueError("graph {} has no inputs to batch".format(graph_name))
+        graph_batch_size = graph.input_info(graph.input_names[0])["shape"][0]
+        if max_batch_size is None:
+            max_batch_size = graph_batch_size
+        if graph_batch_size < max_batch_size:
+            raise ValueError(
+                "the batch size of graph {} is {}, can not pad batches of {} rows to it".format(
+                    graph_name, graph_batch_size, max_batch_size
+                )
+            )
+        option = DynamicBatchingOption(
+            max_batch_size,
+            max_queue_delay_ms=max_queue_delay_ms,
+            pad_to_batch_size=graph_batch_size,
+            max_inflight_batches=max_inflight_batches,
+        )
+
+        input_signature = {}
+        for input_name in graph.input_names:
+            info = graph.input_info(input_name)
+            input_signature[input_name] = (
+                info["shape"][1:],
+                dtype_util.convert_oneflow_dtype_to_numpy_dtype(info["dtype"]),
+            )
+
+        async def run_batch(**kwargs):
+            return await self._async_run_graph(graph_name, **kwargs)
+
+        if graph_name in self.graph_name2batcher_:
+            self.graph_name2batcher_[graph_name].close()
+        self.graph_name2batcher_[graph_name] = DynamicBatcher(
+            run_batch, option, self.event_loop_, input_signature
+        )
+
+    def dynamic_batching_stats(self, graph_name):
+        return self.graph_name2batcher_[graph_name].stats()
+
+    def reset_dynamic_batching_stats(self, graph_name):
+        self.graph_name2batcher_[graph_name].reset_stats()
+
+    def run(self, graph_name, **kwargs):
+        self._check_status(self.SessionStatus.RUNNING)
+        return self.event_loop_.run_until_complete(self.async_run(graph_name, **kwargs))
+
+    async def async_run(self, graph_name, **kwargs):
+        self._check_status(self.SessionStatus.RUNNING)
+        if graph_name in self.graph_name2batcher_:
+            return await self.graph_name2batcher_[graph_name].run(**kwargs)
+        return await self._async_run_graph(graph_name, **kwargs)
+
+    async def _async_run_graph(self, graph_name, **kwargs):
+        # the graph is not freed by a version swap until its run finishes
+        graph = self._acquire_graph(graph_name)
+        try:
+            # runs in the executor to keep the event loop batching meanwhile
+            return await self.event_loop_.run_in_executor(None, graph.run, kwargs)
+        finally:
+            graph.release()
+
+    async def wait_for_all_jobs_finished(self):
+        for batcher in self.graph_name2batcher_.values():
+            await batcher.wait_for_all_batches_finished()
@@ -35,6 +35,7 @@ import oneflow.framework.input_blob_def as input_blob_util
 import oneflow.framework.job_instance as job_instance_util
 import oneflow.framework.runtime_mode as runtime_mode
 import oneflow.framework.scope_util as scope_util
+from oneflow.serving.dynamic_batching import DynamicBatcher, DynamicBatchingOption
 
 
 def _is_int(val):
@@ -64,6 +65,51 @@ class ModelVersionPolicy(enum.Enum):
     LATEST = 1
 
 
+def _load_saved_model_proto(
+    saved_model_dir,
+    model_version=ModelVersionPolicy.LATEST,
+    saved_model_meta_file_basename="saved_model",
+):
+    if not os.path.isdir(saved_model_dir):
+        raise ValueError("{} is not a valid directory".format(saved_model_dir))
+    if isinstance(model_version, int):
+        pass
+    elif model_version == ModelVersionPolicy.LATEST:
+        model_version = _find_model_latest_version(saved_model_dir)
+    else:
+        raise NotImplementedError
+    saved_model_path = os.path.join(saved_model_dir, str(model_version))
+    if not os.path.isdir(saved_model_path):
+        raise ValueError(
+            "version {} of saved model in dir {} do not exist".format(
+                model_version, saved_model_dir
+            )
+        )
+    subfiles = list(os.listdir(saved_model_path))
+    saved_model_meta_pb_filename = saved_model_meta_file_basename + ".pb"
+    saved_model_meta_prototxt_filename = saved_model_meta_file_basename + ".prototxt"
+    saved_model_proto = saved_model_pb.SavedModel()
+    if saved_model_meta_pb_filename in subfiles:
+        saved_model_meta_file_path = os.path.join(
+            saved_model_path, saved_model_meta_pb_filename
+        )
+        with open(saved_model_meta_file_path, "rb") as f:
+            saved_model_proto.ParseFromString(f.read())
+    elif saved_model_meta_prototxt_filename in subfiles:
+        saved_model_meta_file_path = os.path.join(
+            saved_model_path, saved_model_meta_prototxt_filename
+        )
+        with open(saved_model_meta_file_path, "rt") as f:
+            text_format.Merge(f.read(), saved_model_proto)
+    else:
+        raise ValueError(
+            "saved model meta file {} do not exist in {}".format(
+                saved_model_meta_file_basename, saved_model_path
+            )
+        )
+    return (saved_model_path, saved_model_proto)
+
+
 class SessionOption(object):
     def __init__(self):
         self.device_tag = "cuda"
@@ -92,6 +138,7 @@ class InferenceSession(object):
         self.inferface_name2info_ = {}
         self.output_name2future_ = {}
         self.job_futures_ = []
+        self.job_name2batcher_ = {}
         self.status_ = None
         self._init_event_loop()
         self.init()
@@ -115,6 +162,8 @@ class InferenceSession(object):
         self.status_ = self.SessionStatus.OPEN
 
     def close(self):
+        for batcher in self.job_name2batcher_.values():
+            batcher.close()
         self.event_loop_.run_until_complete(self.wait_for_all_jobs_finished())
         self.event_loop_.close()
         if self.status_ == self.SessionStatus.RUNNING:
@@ -175,6 +224,99 @@ class InferenceSession(object):
             mut_shape = mut_input_def.blob_conf.shape
             mut_shape.dim[0] = batch_size
 
+    def _get_job_batch_size(self, job_name):
+        job_conf = self._get_job_conf(job_name)
+        for (_, input_def) in job_conf.signature.inputs.items():
+            return input_def.blob_conf.shape.dim[0]
+        return None
+
+    def enable_dynamic_batching(
+        self,
+        job_name,
+        max_batch_size=None,
+        max_queue_delay_ms=1.0,
+        pad_to_batch_size=True,
+        max_inflight_batches=1,
+    ):
+        r"""Batches the concurrent :meth:`async_run` calls of the job, see
+        :class:`~oneflow.serving.DynamicBatcher`. The inputs of the calls are
+        concatenated along their first axis, the job runs once and its outputs are
+        split back to the calls.
+
+        Args:
+            job_name (str): the job to batch.
+            max_batch_size (int, optional): the largest number of rows of a batch.
+                Defaults to the batch size of the job signature.
+            max_queue_delay_ms (float, optional): the longest time a call waits for
+                more calls before its batch runs. Defaults to 1.0.
+            pad_to_batch_size (bool, optional): pad every batch to the batch size
+                of the job signature, for jobs compiled with a static batch size.
+                Defaults to True.
+            max_inflight_batches (int, optional): the number of batches of the job
+                that run at the same time. Defaults to 1.
+        """
+        self._check_status(self.SessionStatus.OPEN, self.SessionStatus.RUNNING)
+        job_batch_size = self._get_job_batch_size(job_name)
+        if max_batch_size is None:
+            if job_batch_size is None:
+                raise ValueError(
+                    "please specify max_batch_size of job {}".format(job_name)
+                )
+            max_batch_size = job_batch_size
+        padded_batch_size = None
+        if pad_to_batch_size:
+            if job_batch_size is None or job_batch_size < max_batch_size:
+                raise ValueError(
+                    "the batch size of job {} is {}, can not pad batches of {} rows to it".format(
+                        job_name, job_batch_size, max_batch_size
+                    )
+                )
+            padded_batch_size = job_batch_size
+        option = DynamicBatchingOption(
+            max_batch_size,
+            max_queue_delay_ms=max_queue_delay_ms,
+            pad_to_batch_size=padded_batch_size,
+            max_inflight_batches=max_inflight_batches,
+        )
+
+        input_signature = self._get_job_input_signature(job_name)
+
+        async def run_batch(**kwargs):
+            return await self._async_run_job(job_name, **kwargs)
+
+        if job_name in self.job_name2batcher_:
+            self.job_name2batcher_[job_name].close()
+        self.job_name2batcher_[job_name] = DynamicBatcher(
+            run_batch, option, self.event_loop_, input_signature
+        )
+
+    def _get_job_input_signature(self, job_name):
+        # the shape of a row and the numpy dtype of every input of the signature,
+        # None if the signature is incomplete and the requests are batched by
+        # their own shapes and dtypes
+        job_conf = self._get_job_conf(job_name)
+        input_signature = {}
+        for (input_name, input_def) in job_conf.signature.inputs.items():
+            blob_conf = input_def.blob_conf
+            if not blob_conf.HasField("shape") or not blob_conf.HasField("data_type"):
+                return None
+            dtype = dtype_util.convert_proto_dtype_to_oneflow_dtype(blob_conf.data_type)
+            input_signature[input_name] = (
+                tuple(blob_conf.shape.dim[1:]),
+                dtype_util.convert_oneflow_dtype_to_numpy_dtype(dtype),
+            )
+        return input_signature or None
+
+    def dynamic_batching_stats(self, job_name):
+        r"""Returns the counters and the histograms of the queue time and the
+        batch size of the dynamic batching of the job, see
+        :meth:`~oneflow.serving.DynamicBatcher.stats`.
+        """
+        return self.job_name2batcher_[job_name].stats()
+
+    def reset_dynamic_batching_stats(self, job_name):
+        self.job_name2batcher_[job_name].reset_stats()
+
     def _get_job_conf(self, job_name):
         if job_name in self.job_name2job_conf_:
             return self.job_name2job_conf_[job_name]
@@ -241,45 +383,9 @@ class InferenceSession(object):
         graph_name=None,
         signature_name=None,
     ):
-        if not os.path.isdir(saved_model_dir):
-            raise ValueError("{} is not a valid directory".format(saved_model_dir))
-        if isinstance(model_version, int):
-            pass
-        elif model_version == ModelVersionPolicy.LATEST:
-            model_version = _find_model_latest_version(saved_model_dir)
-        else:
-            raise NotImplementedError
-        saved_model_path = os.path.join(saved_model_dir, str(model_version))
-        if not os.path.isdir(saved_model_path):
-            raise ValueError(
-                "version {} of saved model in dir {} do not exist".format(
-                    model_version, saved_model_dir
-                )
-            )
-        subfiles = list(os.listdir(saved_model_path))
-        saved_model_meta_pb_filename = saved_model_meta_file_basename + ".pb"
-        saved_model_meta_prototxt_filename = (
-            saved_model_meta_file_basename + ".prototxt"
+        (saved_model_path, saved_model_proto) = _load_saved_model_proto(
+            saved_model_dir, model_version, saved_model_meta_file_basename
         )
-        saved_model_proto = saved_model_pb.SavedModel()
-        if saved_model_meta_pb_filename in subfiles:
-            saved_model_meta_file_path = os.path.join(
-                saved_model_path, saved_model_meta_pb_filename
-            )
-            with open(saved_model_meta_file_path, "rb") as f:
-                saved_model_proto.ParseFromString(f.read())
-        elif saved_model_meta_prototxt_filename in subfiles:
-            saved_model_meta_file_path = os.path.join(
-                saved_model_path, saved_model_meta_prototxt_filename
-            )
-            with open(saved_model_meta_file_path, "rt") as f:
-                text_format.Merge(f.read(), saved_model_proto)
-        else:
-            raise ValueError(
-                "saved model meta file {} do not exist in {}".format(
-                    saved_model_meta_file_basename, saved_model_path
-                )
-            )
         self.set_checkpoint_path(
             os.path.join(saved_model_path, saved_model_proto.checkpoint_dir)
         )
@@ -360,6 +466,11 @@ class InferenceSession(object):
 
     async def async_run(self, job_name, **kwargs):
         self._check_status(self.SessionStatus.RUNNING)
+        if job_name in self.job_name2batcher_:
+            return await self.job_name2batcher_[job_name].run(**kwargs)
+        return await self._async_run_job(job_name, **kwargs)
+
+    async def _async_run_job(self, job_name, **kwargs):
         self._run_push_jobs(**kwargs)
         job_inst = job_instance_util.MakeUserJobInstance(job_name)
         self._run_job(job_inst)
@@ -437,5 +548,7 @@ class InferenceSession(object):
         self._run_job(load_checkpoint_job_inst)
 
     async def wait_for_all_jobs_finished(self):
+        for batcher in self.job_name2batcher_.values():
+            await batcher.wait_for_all_batches_finished()
         await asyncio.gather(*self.job_futures_)
         self.job_futures_ = []
@@ -0,0 +1,487 @@
+"""
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import asyncio
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import traceback
+
+from oneflow.serving.dynamic_batching import Histogram
+from oneflow.serving.inference_session import ModelVersionPolicy
+
+_LATENCY_MS_BOUNDS = (0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+_NUMA_NODE_ROOT = "/sys/devices/system/node"
+_CPU_ROOT = "/sys/devices/system/cpu"
+
+
+def _parse_cpu_list(text):
+    # the format of the cpulist files of sysfs, like "0-3,8-11"
+    cpus = []
+    for item in text.strip().split(","):
+        if item == "":
+            continue
+        if "-" in item:
+            (begin, end) = item.split("-")
+            cpus.extend(range(int(begin), int(end) + 1))
+        else:
+            cpus.append(int(item))
+    return cpus
+
+
+def _allowed_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def numa_node_cpus():
+    r"""Returns a dict of the NUMA nodes to the sorted CPUs of them that this
+    process is allowed to run on. All the CPUs are on node 0 if the NUMA topology
+    is unknown.
+    """
+    allowed = set(_allowed_cpus())
+    node2cpus = {}
+    if os.path.isdir(_NUMA_NODE_ROOT):
+        for entry in os.listdir(_NUMA_NODE_ROOT):
+            if not (entry.startswith("node") and entry[4:].isdigit()):
+                continue
+            with open(os.path.join(_NUMA_NODE_ROOT, entry, "cpulist")) as f:
+                cpus = [cpu for cpu in _parse_cpu_list(f.read()) if cpu in allowed]
+            if len(cpus) > 0:
+                node2cpus[int(entry[4:])] = sorted(cpus)
+    if len(node2cpus) == 0:
+        node2cpus[0] = sorted(allowed)
+    return node2cpus
+
+
+def _cpu_core_key(cpu):
+    # orders the hyper-threads of a physical core next to each other
+    topology_dir = os.path.join(_CPU_ROOT, "cpu{}".format(cpu), "topology")
+    try:
+        with open(os.path.join(topology_dir, "physical_package_id")) as f:
+            package_id = int(f.read())
+        with open(os.path.join(topology_dir, "core_id")) as f:
+            core_id = int(f.read())
+        return (package_id, core_id, cpu)
+    except (OSError, ValueError):
+        return (0, cpu, cpu)
+
+
+class CpuInstanceConfig(object):
+    r"""The CPUs an instance of :class:`MultiInstanceSession` is pinned to.
+
+    Args:
+        cpus (list of int): the CPUs the process of the instance runs on.
+        numa_node (int, optional): the NUMA node of the CPUs, for the stats only.
+        num_threads (int, optional): the number of threads of the CPU kernels of
+            the instance, see :func:`oneflow.set_num_threads`. Defaults to the
+            number of the CPUs.
+    """
+
+    def __init__(self, cpus, numa_node=None, num_threads=None):
+        assert len(cpus) > 0
+        self.cpus = sorted(cpus)
+        self.numa_node = numa_node
+        self.num_threads = num_threads or len(self.cpus)
+
+    def as_dict(self):
+        return dict(
+            cpus=list(self.cpus), numa_node=self.numa_node, num_threads=self.num_threads
+        )
+
+
+def plan_cpu_instances(num_instances=None, node2cpus=None):
+    r"""Splits the CPUs into the core sets of ``num_instances`` instances. The
+    instances are spread over the NUMA nodes and no instance spans two nodes, so
+    some nodes are left unused if there are fewer instances than nodes. The
+    hyper-threads of a physical core are given to the same instance.
+
+    Args:
+        num_instances (int, optional): defaults to an instance per NUMA node.
+        node2cpus (dict, optional): the CPUs of the NUMA nodes, defaults to
+            :func:`numa_node_cpus`.
+
+    Returns:
+        a list of :class:`CpuInstanceConfig`.
+    """
+    if node2cpus is None:
+        node2cpus = numa_node_cpus()
+    node_ids = sorted(node2cpus.keys())
+    if num_instances is None:
+        num_instances = len(node_ids)
+    assert num_instances > 0
+    configs = []
+    for (i, node_id) in enumerate(node_ids):
+        num_node_instances = num_instances // len(node_ids)
+        if i < num_instances % len(node_ids):
+            num_node_instances += 1
+        if num_node_instances == 0:
+            continue
+        cpus = sorted(node2cpus[node_id], key=_cpu_core_key)
+        if num_node_instances > len(cpus):
+            raise ValueError(
+                "NUMA node {} has {} CPUs, can not run {} instances".format(
+                    node_id, len(cpus), num_node_instances
+                )
+            )
+        for j in range(num_node_instances):
+            begin = len(cpus) * j // num_node_instances
+            end = len(cpus) * (j + 1) // num_node_instances
+            configs.append(CpuInstanceConfig(cpus[begin:end], numa_node=node_id))
+    return configs
+
+
+def _instance_main(request_conn, response_conn, config, saved_model_dir, load_kwargs):
+    # The process is started pinned to the CPUs of the instance, so the threads
+    # created by importing oneflow are pinned too, and the memory is allocated on
+    # the NUMA node of the CPUs as it is first touched from them.
+    try:
+        import oneflow as flow
+        from oneflow.serving.graph_inference_session import GraphInferenceSession
+        from oneflow.serving.inference_session import SessionOption
+
+        flow.set_num_threads(config.num_threads)
+        option = SessionOption()
+        option.device_tag = "cpu"
+        sess = GraphInferenceSession(option)
+        graph_name = sess.load_saved_model(saved_model_dir, **load_kwargs)
+        response_conn.send(("ready", graph_name))
+    except Exception:
+        response_conn.send(("error", traceback.format_exc()))
+        return
+    while True:
+        message = request_conn.recv()
+        if message is None:
+            break
+        (request_id, inputs) = message
+        try:
+            response_conn.send((request_id, sess.run(graph_name, **inputs), None))
+        except Exception:
+            response_conn.send((request_id, None, traceback.format_exc()))
+    sess.close()
+
+
+class _Instance(object):
+    def __init__(self, index, config, process, request_conn, response_conn):
+        self.index = index
+        self.config = config
+        self.process = process
+        self.request_conn = request_conn
+        self.response_conn = response_conn
+        self.request_queue = queue.Queue()
+        self.writer = None
+        self.alive = True
+        self.request_id2future = {}
+        self.latency_ms = Histogram(_LATENCY_MS_BOUNDS)
+
+    @property
+    def num_outstanding_requests(self):
+        return len(self.request_id2future)
+
+
+class MultiInstanceSession(object):
+    r"""Serves a saved model exported from nn.Graph by several instances on CPU,
+    each in its own process pinned to a core set of a NUMA node and with its own
+    number of CPU kernel threads. The requests go to the instance with the fewest
+    outstanding requests.
+
+    The CPU thread pool and the number of threads of the CPU device are per
+    process in OneFlow, so the instances are processes rather than sessions of
+    one process. The inputs and the outputs are pickled through pipes, the
+    requests are written by a thread of each instance and the responses are read
+    by the event loop.
+
+    The processes are started by the ``spawn`` method, so the main module of the
+    program must be guarded by ``if __name__ == "__main__":``.
+
+    For example:
+
+    .. code-block:: python
+
+        sess = flow.serving.MultiInstanceSession("./saved_models", num_instances=4)
+        outputs = sess.run(x=np.ones((8, 4), np.float32))
+        print(sess.stats())
+        sess.close()
+
+    Args:
+        saved_model_dir (str): the dir of the versions of the saved model.
+        num_instances (int, optional): the instances planned by
+            :func:`plan_cpu_instances`. Defaults to an instance per NUMA node.
+        instance_configs (list of CpuInstanceConfig, optional): the CPUs of the
+            instances, instead of ``num_instances``.
+        model_version, graph_name, signature_name, batch_size: see
+            :meth:`GraphInferenceSession.load_saved_model`.
+        ready_timeout_s (float, optional): how long to wait for the instances to
+            load the model. Defaults to 600.
+    """
+
+    def __init__(
+        self,
+        saved_model_dir,
+        num_instances=None,
+        instance_configs=None,
+        model_version=ModelVersionPolicy.LATEST,
+        graph_name=None,
+        signature_name=None,
+        batch_size=None,
+        ready_timeout_s=600,
+    ):
+        self.closed_ = True
+        if instance_configs is None:
+            instance_configs = plan_cpu_instances(num_instances)
+        elif num_instances is not None:
+            raise ValueError("num_instances and instance_configs are exclusive")
+        load_kwargs = dict(
+            model_version=model_version,
+            graph_name=graph_name,
+            signature_name=signature_name,
+            batch_size=batch_size,
+        )
+        self.event_loop_ = asyncio.get_event_loop()
+        if self.event_loop_.is_closed():
+            asyncio.set_event_loop(asyncio.new_event_loop())
+            self.event_loop_ = asyncio.get_event_loop()
+        self.instances_ = []
+        self.next_request_id_ = 0
+        self.next_instance_ = 0
+        try:
+            self._start_instances(instance_configs, saved_model_dir, load_kwargs)
+            self._wait_for_instances_ready(ready_timeout_s)
+        except:
+            self._stop_instances()
+            raise
+        self.closed_ = False
+
+    def __del__(self):
+        if not self.closed_:
+            self.close()
+
+    def _start_instances(self, instance_configs, saved_model_dir, load_kwargs):
+        context = multiprocessing.get_context("spawn")
+        saved_cpus = _allowed_cpus()
+        saved_omp_num_threads = os.environ.get("OMP_NUM_THREADS")
+        try:
+            for (index, config) in enumerate(instance_configs):
+                # the spawned process inherits the CPU affinity of this thread and
+                # the environment, before it starts any thread
+                if hasattr(os, "sched_setaffinity"):
+                    os.sched_setaffinity(0, config.cpus)
+                os.environ["OMP_NUM_THREADS"] = str(config.num_threads)
+                (request_reader, request_writer) = context.Pipe(duplex=False)
+                (response_reader, response_writer) = context.Pipe(duplex=False)
+                process = context.Process(
+                    target=_instance_main,
+                    args=(
+                        request_reader,
+                        response_writer,
+                        config,
+                        saved_model_dir,
+                        load_kwargs,
+                    ),
+                    daemon=True,
+                )
+                process.start()
+                request_reader.close()
+                response_writer.close()
+                instance = _Instance(
+                    index, config, process, request_writer, response_reader
+                )
+                instance.writer = threading.Thread(
+                    target=self._write_requests, args=(instance,), daemon=True
+                )
+                instance.writer.start()
+                self.instances_.append(instance)
+        finally:
+            if hasattr(os, "sched_setaffinity"):
+                os.sched_setaffinity(0, saved_cpus)
+            if saved_omp_num_threads is None:
+                os.environ.pop("OMP_NUM_THREADS", None)
+            else:
+                os.environ["OMP_NUM_THREADS"] = saved_omp_num_threads
+
+    def _wait_for_instances_ready(self, ready_timeout_s):
+        deadline = time.perf_counter() + ready_timeout_s
+        for instance in self.instances_:
+            timeout = max(deadline - time.perf_counter(), 0)
+            if not instance.response_conn.poll(timeout):
+                raise RuntimeError(
+                    "instance {} is not ready in {}s".format(
+                        instance.index, ready_timeout_s
+                    )
+                )
+            (status, message) = instance.response_conn.recv()
+            if status != "ready":
+                raise RuntimeError(
+                    "instance {} failed to load the model:\n{}".format(
+                        instance.index, message
+                    )
+                )
+            self.graph_name_ = message
+            self.event_loop_.add_reader(
+                instance.response_conn.fileno(), self._on_response, instance
+            )
+
+    @property
+    def graph_name(self):
+        return self.graph_name_
+
+    @property
+    def num_instances(self):
+        return len(self.instances_)
+
+    def _pick_instance(self):
+        # the fewest outstanding requests, and round robin among equals
+        best = None
+        for i in range(len(self.instances_)):
+            instance = self.instances_[(self.next_instance_ + i) % len(self.instances_)]
+            if not instance.alive:
+                continue
+            if (
+                best is None
+                or instance.num_outstanding_requests < best.num_outstanding_requests
+            ):
+                best = instance
+        if best is None:
+            raise RuntimeError("all the instances have exited")
+        self.next_instance_ = (best.index + 1) % len(self.instances_)
+        return best
+
+    def run(self, **kwargs):
+        return self.event_loop_.run_until_complete(self.async_run(**kwargs))
+
+    async def async_run(self, **kwargs):
+        if self.closed_:
+            raise RuntimeError("the session is closed")
+        instance = self._pick_instance()
+        request_id = self.next_request_id_
+        self.next_request_id_ += 1
+        future = self.event_loop_.create_future()
+        instance.request_id2future[request_id] = future
+        start = time.perf_counter()
+        instance.request_queue.put((request_id, kwargs))
+        try:
+            return await future
+        finally:
+            instance.latency_ms.record((time.perf_counter() - start) * 1000.0)
+
+    def _write_requests(self, instance):
+        # Runs in a thread of the instance. A send blocks while the pipe is full, if
+        # it blocked the event loop, the instance could block on sending a response
+        # that only the event loop reads, and neither would ever go on.
+        while True:
+            message = instance.request_queue.get()
+            try:
+                instance.request_conn.send(message)
+            except Exception as e:
+                if message is not None:
+                    self._call_soon_threadsafe(
+                        self._on_request_failed, instance, message[0], e
+                    )
+            if message is None:
+                break
+
+    def _call_soon_threadsafe(self, callback, *args):
+        try:
+            self.event_loop_.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            # the event loop is closed, nobody awaits the request anymore
+            pass
+
+    def _on_request_failed(self, instance, request_id, error):
+        future = instance.request_id2future.pop(request_id, None)
+        if future is not None and not future.done():
+            future.set_exception(error)
+
+    def _on_response(self, instance):
+        try:
+            (request_id, outputs, error) = instance.response_conn.recv()
+        except (EOFError, OSError):
+            self._on_instance_exited(instance)
+            return
+        future = instance.request_id2future.pop(request_id, None)
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(
+                RuntimeError(
+                    "instance {} failed to run:\n{}".format(instance.index, error)
+                )
+            )
+        else:
+            future.set_result(outputs)
+
+    def _on_instance_exited(self, instance):
+        instance.alive = False
+        self.event_loop_.remove_reader(instance.response_conn.fileno())
+        for future in instance.request_id2future.values():
+            if not future.done():
+                future.set_exception(
+                    RuntimeError("instance {} has exited".format(instance.index))
+                )
+        instance.request_id2future = {}
+
+    def stats(self):
+        r"""Returns a dict of the ``instances``, each has its CPUs, its NUMA node,
+        its number of threads, its number of ``outstanding_requests`` and the
+        histogram of the latency in ms of its requests, ``latency_ms``.
+        """
+        instances = []
+        for instance in self.instances_:
+            stat = instance.config.as_dict()
+            stat.update(
+                alive=instance.alive,
+                outstanding_requests=instance.num_outstanding_requests,
+                latency_ms=instance.latency_ms.as_dict(),
+            )
+            instances.append(stat)
+        return dict(instances=instances)
+
+    def reset_stats(self):
+        for instance in self.instances_:
+            instance.latency_ms.reset()
+
+    def _stop_instances(self):
+        for instance in self.instances_:
+            if instance.alive:
+                self.event_loop_.remove_reader(instance.response_conn.fileno())
+            instance.request_queue.put(None)
+        for instance in self.instances_:
+            instance.process.join(timeout=60)
+            if instance.process.is_alive():
+                instance.process.terminate()
+                instance.process.join()
+            # the send of a terminated instance fails, so the writer always exits
+            instance.writer.join()
+            instance.request_conn.close()
+            instance.response_conn.close()
+            instance.alive = False
+
+    def close(self):
+        r"""Stops the instances after they finish the requests sent to them."""
+        if self.closed_:
+            return
+        pending = []
+        for instance in self.instances_:
+            pending.extend(instance.request_id2future.values())
+        if len(pending) > 0:
+            self.event_loop_.run_until_complete(
+                asyncio.gather(*pending, return_exceptions=True)
+            )
+        self._stop_instances()
+        self.closed_ = True
@@ -14,7 +14,9 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 import os
+import shutil
 import typing
+import uuid
 
 from google.protobuf import text_format
 
@@ -26,6 +28,7 @@ import oneflow.core.operator.interface_blob_conf_pb2 as interface_blob_conf_pb
 import oneflow.core.register.logical_blob_id_pb2 as logical_blob_id_pb
 import oneflow.core.serving.saved_model_pb2 as saved_model_pb
 import oneflow.framework.c_api_util as c_api_util
+import oneflow.framework.check_point_v2 as check_point_v2
 import oneflow.framework.session_context as session_ctx
 
 
@@ -74,6 +77,31 @@ class ModelBuilder(object):
             self.proto.default_graph_name = func_name
         return graph_builder
 
+    def AddGraph(
+        self,
+        graph,
+        graph_name: typing.Optional[str] = None,
+        input_names: typing.Optional[typing.Sequence[str]] = None,
+        output_names: typing.Optional[typing.Sequence[str]] = None,
+    ):
+        r"""Adds a compiled nn.Graph, its forward job and its states are saved and
+        it can be served by :class:`~oneflow.serving.GraphInferenceSession`.
+
+        The graph has a signature of its inputs and outputs in order, named by
+        ``input_names`` and ``output_names`` or else by their op names.
+        """
+        if graph_name is None:
+            graph_name = graph.name
+        if graph_name in self.graph_builders_:
+            raise ValueError("graph with name {} already exists".format(graph_name))
+        graph_builder = NNGraphBuilder(
+            graph_name, graph, self, input_names, output_names
+        )
+        self.graph_builders_[graph_name] = graph_builder
+        if not self.proto.HasField("default_graph_name"):
+            self.proto.default_graph_name = graph_name
+        return graph_builder
+
     def _check_input_output_name_conflict(self):
         name_set = set()
         lbn_set = set()
@@ -104,6 +132,9 @@ class ModelBuilder(object):
                 graph_builder.Finish()
         sess = session_ctx.GetDefaultSession()
         for (graph_name, graph_def) in self.proto.graphs.items():
+            if isinstance(self.graph_builders_[graph_name], NNGraphBuilder):
+                # op_list is already the forward job of the nn.Graph
+                continue
             job = sess.Job(
                 graph_name
                 if save_model_before_graph_complete
@@ -121,10 +152,30 @@ class ModelBuilder(object):
                     self.saved_model_dir_, self.version_
                 )
             )
-        os.makedirs(version_dir)
+        # written to a temporary dir and renamed into place, so that the servers
+        # watching the saved model dir never see a half written version
+        tmp_dir = os.path.join(
+            self.saved_model_dir_, ".{}.{}".format(self.version_, uuid.uuid4().hex)
+        )
+        os.makedirs(tmp_dir)
+        try:
+            self._SaveVersion(tmp_dir)
+            os.rename(tmp_dir, version_dir)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+    def _SaveVersion(self, version_dir):
         self.proto.version = self.version_
         checkpoint_path = os.path.join(version_dir, self.checkpoint_dir_)
-        flow.checkpoint.save(checkpoint_path)
+        nn_graph_builders = []
+        for (_, graph_builder) in self.graph_builders_.items():
+            if isinstance(graph_builder, NNGraphBuilder):
+                nn_graph_builders.append(graph_builder)
+        if len(nn_graph_builders) < len(self.graph_builders_):
+            flow.checkpoint.save(checkpoint_path)
+        for graph_builder in nn_graph_builders:
+            graph_builder.SaveVariables(checkpoint_path)
         self.proto.checkpoint_dir = self.checkpoint_dir_
         saved_model_pb_path = os.path.join(version_dir, self.saved_model_pb_filename_)
         with open(saved_model_pb_path, "wb") as writer:
@@ -206,6 +257,62 @@ class GraphBuilder(object):
         return self
 
 
+class NNGraphBuilder(GraphBuilder):
+    DEFAULT_SIGNATURE_NAME = "default"
+
+    def __init__(
+        self,
+        name: str,
+        graph,
+        model_builder: typing.Optional[ModelBuilder] = None,
+        input_names: typing.Optional[typing.Sequence[str]] = None,
+        output_names: typing.Optional[typing.Sequence[str]] = None,
+    ):
+        if not graph._is_compiled:
+            raise RuntimeError("graph must be compiled first.")
+        super().__init__(name, model_builder)
+        self.graph_ = graph
+        job = graph._forward_job_proto
+        self.proto.op_list.extend(list(job.net.op))
+        self.proto.job_conf.CopyFrom(job.job_conf)
+        input_ops = [op for op in job.net.op if op.HasField("input_conf")]
+        output_ops = [op for op in job.net.op if op.HasField("output_conf")]
+        input_names = _GetInterfaceNames(input_names, input_ops, "input")
+        output_names = _GetInterfaceNames(output_names, output_ops, "output")
+        signature_builder = self.AddSignature(self.DEFAULT_SIGNATURE_NAME)
+        for (input_name, op_conf) in zip(input_names, input_ops):
+            signature_builder.Input(
+                input_name, "{}/{}".format(op_conf.name, op_conf.input_conf.out)
+            )
+            input_def = signature_builder.proto.inputs[input_name]
+            input_def.blob_conf.CopyFrom(op_conf.input_conf.blob_conf)
+        for (output_name, op_conf) in zip(output_names, output_ops):
+            signature_builder.Output(
+                output_name, "{}/{}".format(op_conf.name, op_conf.output_conf.out)
+            )
+
+    @property
+    def graph(self):
+        return self.graph_
+
+    def Finish(self):
+        # the signature is made of the ops of the compiled job, no need to check it
+        assert self.finished is False
+        self.finished_ = True
+
+    def SaveVariables(self, checkpoint_path: str):
+        saved_tensors = set()
+        for state_block in self.graph_._state():
+            state_tensor = state_block.origin
+            if state_tensor in saved_tensors:
+                continue
+            saved_tensors.add(state_tensor)
+            op_name = state_block.name_prefix + state_block.name
+            check_point_v2._save_tensor_to_disk(
+                state_tensor, os.path.join(checkpoint_path, op_name)
+            )
+
+
 class SignatureBuilder(object):
     def __init__(self, name: str, graph_builder: typing.Optional[GraphBuilder] = None):
         if not isinstance(name, str):
@@ -273,6 +380,19 @@ class SignatureBuilder(object):
         return self
 
 
+def _GetInterfaceNames(names, op_confs, interface_type):
+    if names is None:
+        return [op_conf.name for op_conf in op_confs]
+    names = list(names)
+    if len(names) != len(op_confs):
+        raise ValueError(
+            "the graph has {} {}s, but got {} names".format(
+                len(op_confs), interface_type, len(names)
+            )
+        )
+    return names
+
+
 def GetInterfaceBlobConf(job_name, lbn, blob_conf=None):
     assert isinstance(job_name, str)
     assert isinstance(lbn, str)
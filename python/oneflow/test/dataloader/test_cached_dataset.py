@@ -0,0 +1,116 @@
+"""
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+import oneflow as flow
+import oneflow.unittest
+
+
+class CountingDataset(flow.utils.data.Dataset):
+    def __init__(self, length=20):
+        self.length = length
+        self.reads = 0
+
+    def __getitem__(self, index):
+        self.reads += 1
+        return np.full((100,), index, dtype=np.uint8)
+
+    def __len__(self):
+        return self.length
+
+
+@flow.unittest.skip_unless_1n1d()
+class TestCachedDataset(flow.unittest.TestCase):
+    def test_memory_cache(test_case):
+        base = CountingDataset()
+        dataset = flow.utils.data.CachedDataset(
+            base, max_bytes=1 << 20, transform=lambda x: x + 1
+        )
+        for _ in range(3):
+            for i in range(len(dataset)):
+                test_case.assertEqual(dataset[i][0], i + 1)
+        test_case.assertEqual(base.reads, 20)
+        stats = dataset.stats()
+        test_case.assertEqual(stats["hits"], 40)
+        test_case.assertEqual(stats["misses"], 20)
+        test_case.assertEqual(stats["entries"], 20)
+
+    def test_eviction_policies(test_case):
+        for eviction_policy, expected_evictions in (("lru", 10), ("no_evict", 0)):
+            dataset = flow.utils.data.CachedDataset(
+                CountingDataset(), max_bytes=1000, eviction_policy=eviction_policy
+            )
+            for i in range(len(dataset)):
+                dataset[i]
+            stats = dataset.stats()
+            test_case.assertEqual(stats["entries"], 10)
+            test_case.assertLessEqual(stats["bytes"], 1000)
+            test_case.assertEqual(stats["evictions"], expected_evictions)
+
+    def test_shared_cache_across_workers(test_case):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            dataset = flow.utils.data.CachedDataset(
+                CountingDataset(),
+                max_bytes=1 << 20,
+                cache_path=os.path.join(tmpdir, "samples.cache"),
+            )
+            for _ in range(2):
+                dataloader = flow.utils.data.DataLoader(
+                    dataset, batch_size=4, num_workers=2
+                )
+                values = np.concatenate([x[:, 0].numpy() for x in dataloader])
+                test_case.assertTrue(np.array_equal(values, np.arange(20)))
+            stats = dataset.stats()
+            test_case.assertEqual(stats["misses"], 20)
+            test_case.assertEqual(stats["hits"], 20)
+            dataset.clear()
+            test_case.assertEqual(dataset.stats()["entries"], 0)
+
+    def test_shared_cache_hit_does_not_write(test_case):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache_path = os.path.join(tmpdir, "samples.cache")
+            dataset = flow.utils.data.CachedDataset(
+                CountingDataset(), max_bytes=1 << 20, cache_path=cache_path
+            )
+            for i in range(len(dataset)):
+                dataset[i]
+            # flushes the pending counts of this process
+            dataset.stats()
+            writer = sqlite3.connect(cache_path, isolation_level=None)
+            writer.execute("BEGIN IMMEDIATE")
+            values = []
+            reader = threading.Thread(
+                target=lambda: values.extend(dataset[i][0] for i in range(5))
+            )
+            reader.start()
+            reader.join(timeout=10)
+            writer.execute("COMMIT")
+            writer.close()
+            test_case.assertEqual(values, list(range(5)))
+            stats = dataset.stats()
+            test_case.assertEqual(stats["misses"], 20)
+            test_case.assertEqual(stats["hits"], 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+"""
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import unittest
+
+import numpy as np
+
+import oneflow as flow
+import oneflow.unittest
+
+
+class RecordingDataset(flow.utils.data.Dataset):
+    def __init__(self, length=50):
+        self.length = length
+        self.reads = []
+
+    def __getitem__(self, index):
+        self.reads.append(index)
+        return np.array([index], dtype=np.int64)
+
+    def __len__(self):
+        return self.length
+
+
+def _batches(dataloader_iter):
+    return [batch.numpy().flatten().tolist() for batch in dataloader_iter]
+
+
+def _make_dataloader(dataset, seed, **kwargs):
+    generator = flow.Generator()
+    generator.manual_seed(seed)
+    return flow.utils.data.DataLoader(
+        dataset, batch_size=4, generator=generator, **kwargs
+    )
+
+
+@flow.unittest.skip_unless_1n1d()
+class TestDataLoaderResume(flow.unittest.TestCase):
+    def _test_resume(test_case, **kwargs):
+        expected = _batches(_make_dataloader(RecordingDataset(), 7, **kwargs))
+
+        dataloader_iter = iter(_make_dataloader(RecordingDataset(), 7, **kwargs))
+        consumed = [next(dataloader_iter).numpy().flatten().tolist() for _ in range(5)]
+        state = dataloader_iter.state_dict()
+        del dataloader_iter
+
+        # A different seed, the resumed order must come from the saved state.
+        dataset = RecordingDataset()
+        dataloader = _make_dataloader(dataset, 123, **kwargs)
+        dataloader.load_state_dict(state)
+        rest = _batches(dataloader)
+        test_case.assertEqual(consumed + rest, expected)
+        if kwargs.get("worker_mode", "thread") == "thread":
+            # Batches before the checkpoint are not read again.
+            test_case.assertEqual(len(dataset.reads), sum(len(b) for b in rest))
+
+    def test_resume_sequential(test_case):
+        test_case._test_resume(shuffle=False)
+
+    def test_resume_shuffle(test_case):
+        test_case._test_resume(shuffle=True)
+
+    def test_resume_shuffle_thread_workers(test_case):
+        test_case._test_resume(shuffle=True, num_workers=2, worker_mode="thread")
+
+    def test_random_sampler_state(test_case):
+        generator = flow.Generator()
+        generator.manual_seed(0)
+        sampler = flow.utils.data.RandomSampler(range(20), generator=generator)
+        sampler_iter = iter(sampler)
+        head = [next(sampler_iter) for _ in range(8)]
+        tail = list(sampler_iter)
+        state = sampler.state_dict()
+        state["num_yielded"] = 8
+        resumed = flow.utils.data.RandomSampler(range(20), generator=flow.Generator())
+        resumed.load_state_dict(state)
+        test_case.assertEqual(list(resumed), tail)
+        test_case.assertEqual(sorted(head + tail), list(range(20)))
+
+    def test_distributed_sampler_state(test_case):
+        sampler = flow.utils.data.DistributedSampler(
+            range(20), num_replicas=2, rank=1, seed=3
+        )
+        sampler.set_epoch(2)
+        sampler_iter = iter(sampler)
+        head = [next(sampler_iter) for _ in range(4)]
+        state = sampler.state_dict()
+        tail = list(sampler_iter)
+        resumed = flow.utils.data.DistributedSampler(
+            range(20), num_replicas=2, rank=1, seed=3
+        )
+        resumed.load_state_dict(state)
+        test_case.assertEqual(list(resumed), tail)
+        test_case.assertEqual(resumed.epoch, 2)
+        test_case.assertEqual(len(head + tail), len(sampler))
+
+    def test_batch_sampler_state(test_case):
+        batch_sampler = flow.utils.data.BatchSampler(
+            flow.utils.data.SequentialSampler(range(10)), batch_size=3, drop_last=False
+        )
+        batch_iter = iter(batch_sampler)
+        next(batch_iter)
+        state = batch_sampler.state_dict()
+        test_case.assertEqual(state["num_yielded"], 1)
+        batch_sampler.load_state_dict(state)
+        test_case.assertEqual(list(batch_sampler), [[3, 4, 5], [6, 7, 8], [9]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+"""
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import unittest
+
+import numpy as np
+
+import oneflow as flow
+import oneflow.unittest
+
+
+class RangeDataset(flow.utils.data.Dataset):
+    def __getitem__(self, index):
+        return np.array([index], dtype=np.int64)
+
+    def __len__(self):
+        return 40
+
+
+@flow.unittest.skip_unless_1n1d()
+class TestDataLoaderStats(flow.unittest.TestCase):
+    def test_worker_stats(test_case):
+        for worker_mode in ("process", "thread"):
+            dataloader = flow.utils.data.DataLoader(
+                RangeDataset(),
+                batch_size=4,
+                num_workers=2,
+                worker_mode=worker_mode,
+                collect_stats=True,
+            )
+            values = np.concatenate([x.numpy() for x in dataloader])
+            test_case.assertTrue(np.array_equal(values.flatten(), np.arange(40)))
+            stats = dataloader.stats()
+            test_case.assertEqual(len(stats["workers"]), 2)
+            test_case.assertEqual(sum(w["num_batches"] for w in stats["workers"]), 10)
+            for w in stats["workers"]:
+                test_case.assertGreater(w["fetch_time"], 0)
+                test_case.assertGreaterEqual(w["transfer_time"], 0)
+            test_case.assertGreaterEqual(stats["main"]["max_out_of_order"], 0)
+            dataloader.reset_stats()
+            test_case.assertEqual(
+                sum(w["num_batches"] for w in dataloader.stats()["workers"]), 0
+            )
+
+    def test_single_process_stats(test_case):
+        dataloader = flow.utils.data.DataLoader(
+            RangeDataset(), batch_size=4, collect_stats=True
+        )
+        for _ in dataloader:
+            pass
+        stats = dataloader.stats()
+        test_case.assertEqual(stats["workers"], [])
+        test_case.assertGreater(stats["main"]["fetch_time"], 0)
+        test_case.assertGreater(stats["main"]["collate_time"], 0)
+
+    def test_stats_disabled(test_case):
+        dataloader = flow.utils.data.DataLoader(RangeDataset())
+        with test_case.assertRaises(RuntimeError):
+            dataloader.stats()
+        with test_case.assertRaises(ValueError):
+            flow.utils.data.DataLoader(RangeDataset(), stats_report_interval=1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
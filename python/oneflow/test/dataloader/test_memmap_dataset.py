@@ -0,0 +1,91 @@
+"""
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import pickle
+import tempfile
+import unittest
+
+import numpy as np
+
+import oneflow as flow
+import oneflow.unittest
+
+
+@flow.unittest.skip_unless_1n1d()
+class TestMemmapDataset(flow.unittest.TestCase):
+    def test_npy_file(test_case):
+        array = np.random.randn(20, 3).astype(np.float32)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "features.npy")
+            np.save(path, array)
+            dataset = flow.utils.data.MemmapDataset(path)
+            test_case.assertEqual(len(dataset), 20)
+            test_case.assertTrue(np.array_equal(dataset[7].numpy(), array[7]))
+            # The mapping itself is never pickled.
+            restored = pickle.loads(pickle.dumps(dataset))
+            test_case.assertIsNone(restored._array)
+            test_case.assertTrue(np.array_equal(restored[19].numpy(), array[19]))
+
+    def test_npy_format_versions(test_case):
+        array = np.random.randn(20, 3).astype(np.float32)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for version in [(1, 0), (2, 0), (3, 0)]:
+                path = os.path.join(tmpdir, "features_{}.npy".format(version[0]))
+                with open(path, "wb") as f:
+                    np.lib.format.write_array(f, array, version=version)
+                dataset = flow.utils.data.MemmapDataset(path)
+                test_case.assertEqual(len(dataset), 20)
+                test_case.assertTrue(np.array_equal(dataset[5].numpy(), array[5]))
+            with open(path, "r+b") as f:
+                f.seek(6)
+                f.write(bytes([4, 0]))
+            with test_case.assertRaises(ValueError):
+                flow.utils.data.MemmapDataset(path)
+
+    def test_raw_file(test_case):
+        array = np.arange(60, dtype=np.int64).reshape(20, 3)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "labels.bin")
+            with open(path, "wb") as f:
+                f.write(b"\0" * 16)
+                f.write(array.tobytes())
+            dataset = flow.utils.data.MemmapDataset(
+                path, dtype=np.int64, shape=(-1, 3), offset=16
+            )
+            test_case.assertEqual(len(dataset), 20)
+            test_case.assertTrue(np.array_equal(dataset[-1].numpy(), array[-1]))
+            with test_case.assertRaises(ValueError):
+                flow.utils.data.MemmapDataset(path, dtype=np.int64, shape=(-1, 7))
+
+    def test_dataloader(test_case):
+        array = np.random.randn(50, 4).astype(np.float32)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "features.npy")
+            np.save(path, array)
+            dataset = flow.utils.data.MemmapDataset(path)
+            for num_workers in (0, 2):
+                dataloader = flow.utils.data.DataLoader(
+                    dataset, batch_size=8, num_workers=num_workers
+                )
+                batches = [x.numpy() for x in dataloader]
+                test_case.assertTrue(np.array_equal(np.concatenate(batches), array))
+            with test_case.assertRaises(IndexError):
+                dataset.__getitems__([50])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+"""
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import threading
+import unittest
+
+import numpy as np
+
+import oneflow as flow
+import oneflow.unittest
+
+
+class RangeDataset(flow.utils.data.Dataset):
+    def __init__(self, length=103):
+        self.length = length
+
+    def __getitem__(self, index):
+        info = flow.utils.data.get_worker_info()
+        return np.array([index, info.id], dtype=np.int64)
+
+    def __len__(self):
+        return self.length
+
+
+class FailingDataset(RangeDataset):
+    def __getitem__(self, index):
+        raise KeyError(index)
+
+
+class ShardedIterableDataset(flow.utils.data.IterableDataset):
+    def __iter__(self):
+        info = flow.utils.data.get_worker_info()
+        return iter(range(info.id, 20, info.num_workers))
+
+
+@flow.unittest.skip_unless_1n1d()
+class TestThreadWorkerMode(flow.unittest.TestCase):
+    def test_keeps_sampler_order(test_case):
+        for persistent_workers in (False, True):
+            dataloader = flow.utils.data.DataLoader(
+                RangeDataset(),
+                batch_size=4,
+                num_workers=3,
+                prefetch_factor=3,
+                persistent_workers=persistent_workers,
+                worker_mode="thread",
+            )
+            for _ in range(2):
+                indices = [x[:, 0].numpy() for x in dataloader]
+                test_case.assertTrue(
+                    np.array_equal(np.concatenate(indices), np.arange(103))
+                )
+
+    def test_worker_init_fn(test_case):
+        init_calls = []
+        lock = threading.Lock()
+
+        def worker_init_fn(worker_id):
+            with lock:
+                init_calls.append((worker_id, threading.current_thread().name))
+
+        dataloader = flow.utils.data.DataLoader(
+            RangeDataset(16),
+            batch_size=4,
+            num_workers=2,
+            worker_init_fn=worker_init_fn,
+            worker_mode="thread",
+        )
+        worker_ids = np.concatenate([x[:, 1].numpy() for x in dataloader])
+        test_case.assertEqual(sorted(c[0] for c in init_calls), [0, 1])
+        test_case.assertTrue(
+            all(name != threading.main_thread().name for _, name in init_calls)
+        )
+        test_case.assertEqual(set(worker_ids.tolist()), {0, 1})
+        test_case.assertIsNone(flow.utils.data.get_worker_info())
+
+    def test_iterable_dataset(test_case):
+        dataloader = flow.utils.data.DataLoader(
+            ShardedIterableDataset(), batch_size=3, num_workers=2, worker_mode="thread"
+        )
+        values = np.concatenate([x.numpy() for x in dataloader])
+        test_case.assertEqual(sorted(values.tolist()), list(range(20)))
+
+    def test_reraise_worker_exception(test_case):
+        dataloader = flow.utils.data.DataLoader(
+            FailingDataset(), num_workers=2, worker_mode="thread"
+        )
+        with test_case.assertRaises(KeyError):
+            next(iter(dataloader))
+
+    def test_invalid_worker_mode(test_case):
+        with test_case.assertRaises(ValueError):
+            flow.utils.data.DataLoader(RangeDataset(), worker_mode="fiber")
+
+
+if __name__ == "__main__":
+    unittest.main()
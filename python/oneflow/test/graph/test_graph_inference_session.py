@@ -0,0 +1,181 @@
+"""
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+import oneflow as flow
+import oneflow.unittest
+from oneflow.benchmarks import serving as serving_benchmark
+from oneflow.serving import GraphInferenceSession, SessionOption
+
+
+def _export_mlp(save_dir, device, batch_size, version=1, in_features=4):
+    # two layers of 4 * 8 + 8 + 8 * 3 + 3 variables and the outputs "y" and "y_sum"
+    return serving_benchmark.export_mlp(
+        save_dir,
+        batch_size,
+        in_features=in_features,
+        hidden_features=8,
+        num_layers=1,
+        out_features=3,
+        version=version,
+        device=device,
+        output_sum=True,
+    )
+
+
+def _test_graph_inference_session(test_case, device):
+    with tempfile.TemporaryDirectory() as save_dir:
+        model = _export_mlp(save_dir, device, batch_size=4)
+        test_case.assertTrue(
+            os.path.exists(os.path.join(save_dir, "1", "saved_model.pb"))
+        )
+        option = SessionOption()
+        option.device_tag = device
+        sess = GraphInferenceSession(option)
+        graph_name = sess.load_saved_model(save_dir)
+        test_case.assertEqual(graph_name, "mlp")
+        test_case.assertEqual(sess.list_inputs(graph_name), ("x",))
+        test_case.assertEqual(sess.list_outputs(graph_name), ("y", "y_sum"))
+        test_case.assertEqual(sess.input_info("x", graph_name)["shape"], (4, 4))
+        test_case.assertEqual(sess.output_info("y", graph_name)["shape"], (4, 3))
+
+        x = np.random.randn(4, 4).astype(np.float32)
+        (y, y_sum) = sess.run(graph_name, x=x)
+        expected = model(flow.tensor(x, device=device)).numpy()
+        test_case.assertTrue(np.allclose(y, expected, rtol=1e-4, atol=1e-4))
+        test_case.assertTrue(
+            np.allclose(y_sum, expected.sum(axis=1), rtol=1e-4, atol=1e-4)
+        )
+        with test_case.assertRaises(ValueError):
+            sess.run(graph_name, x=np.zeros((3, 4), np.float32))
+
+        # requests of 1 to 3 rows are batched and padded to the 4 rows of the graph
+        sess.enable_dynamic_batching(graph_name, max_queue_delay_ms=20)
+        xs = [np.random.randn(n, 4).astype(np.float32) for n in (1, 3, 2)]
+
+        async def run_all():
+            return await asyncio.gather(
+                *[sess.async_run(graph_name, x=request_x) for request_x in xs]
+            )
+
+        results = sess.event_loop_.run_until_complete(run_all())
+        for (request_x, (request_y, _)) in zip(xs, results):
+            expected = model(flow.tensor(request_x, device=device)).numpy()
+            test_case.assertTrue(np.allclose(request_y, expected, rtol=1e-4, atol=1e-4))
+        test_case.assertEqual(sess.dynamic_batching_stats(graph_name)["requests"], 3)
+        sess.close()
+
+        # the batch size of the graph can be changed on loading
+        sess = GraphInferenceSession(option)
+        sess.load_saved_model(save_dir, model_version=1, batch_size=16)
+        test_case.assertEqual(sess.input_info("x", "mlp")["shape"], (16, 4))
+        x = np.random.randn(16, 4).astype(np.float32)
+        (y, _) = sess.run("mlp", x=x)
+        expected = model(flow.tensor(x, device=device)).numpy()
+        test_case.assertTrue(np.allclose(y, expected, rtol=1e-4, atol=1e-4))
+        sess.close()
+
+
+def _test_model_version_swap(test_case, device):
+    with tempfile.TemporaryDirectory() as save_dir:
+        _export_mlp(save_dir, device, batch_size=4)
+        option = SessionOption()
+        option.device_tag = device
+        sess = GraphInferenceSession(option)
+        graph_name = sess.load_saved_model(save_dir)
+        x = np.random.randn(4, 4).astype(np.float32)
+        test_case.assertFalse(sess.check_model_version(graph_name))
+
+        model_v2 = _export_mlp(save_dir, device, batch_size=4, version=2)
+        test_case.assertTrue(sess.check_model_version(graph_name))
+        test_case.assertFalse(sess.check_model_version(graph_name))
+        (y, _) = sess.run(graph_name, x=x)
+        expected = model_v2(flow.tensor(x, device=device)).numpy()
+        test_case.assertTrue(np.allclose(y, expected, rtol=1e-4, atol=1e-4))
+        stats = sess.model_version_stats(graph_name)
+        test_case.assertEqual(stats["version"], 2)
+        test_case.assertEqual(stats["swaps"], 1)
+        test_case.assertEqual(stats["swap_duration_ms"]["count"], 1)
+        last_swap = stats["last_swap"]
+        test_case.assertEqual(last_swap["from_version"], 1)
+        test_case.assertEqual(last_swap["to_version"], 2)
+        test_case.assertGreaterEqual(last_swap["overlap_ms"], last_swap["swap_ms"])
+        # two versions of (4 * 8 + 8 + 8 * 3 + 3) float32 variables
+        test_case.assertEqual(last_swap["overlap_variable_bytes"], 2 * 67 * 4)
+
+        # a version without its meta file yet is checked again later
+        os.makedirs(os.path.join(save_dir, "3"))
+        test_case.assertFalse(sess.check_model_version(graph_name))
+        test_case.assertEqual(
+            sess.model_version_stats(graph_name)["failed_versions"], []
+        )
+        os.rmdir(os.path.join(save_dir, "3"))
+
+        # a version of other input shapes is skipped and the current one keeps
+        # serving
+        _export_mlp(save_dir, device, batch_size=4, version=3, in_features=5)
+        test_case.assertFalse(sess.check_model_version(graph_name))
+        stats = sess.model_version_stats(graph_name)
+        test_case.assertEqual(stats["version"], 2)
+        test_case.assertEqual(stats["failed_versions"], [3])
+        sess.run(graph_name, x=x)
+        sess.close()
+
+        # the requests keep being served while the watcher swaps in background
+        shutil.rmtree(os.path.join(save_dir, "3"))
+        sess = GraphInferenceSession(option)
+        sess.load_saved_model(save_dir, watch_interval_s=0.05)
+        # saved to a temporary dir and renamed into place
+        model_v4 = _export_mlp(save_dir, device, batch_size=4, version=4)
+        test_case.assertEqual(sorted(os.listdir(save_dir)), ["1", "2", "4"])
+        deadline = time.perf_counter() + 120
+        while sess.model_version_stats(graph_name)["version"] != 4:
+            test_case.assertLess(time.perf_counter(), deadline)
+            (y, _) = sess.run(graph_name, x=x)
+            expected_v2 = model_v2(flow.tensor(x, device=device)).numpy()
+            expected_v4 = model_v4(flow.tensor(x, device=device)).numpy()
+            test_case.assertTrue(
+                np.allclose(y, expected_v2, rtol=1e-4, atol=1e-4)
+                or np.allclose(y, expected_v4, rtol=1e-4, atol=1e-4)
+            )
+        (y, _) = sess.run(graph_name, x=x)
+        expected = model_v4(flow.tensor(x, device=device)).numpy()
+        test_case.assertTrue(np.allclose(y, expected, rtol=1e-4, atol=1e-4))
+        sess.close()
+
+
+@flow.unittest.skip_unless_1n1d()
+class TestGraphInferenceSession(oneflow.unittest.TestCase):
+    def test_graph_inference_session_cpu(test_case):
+        _test_graph_inference_session(test_case, "cpu")
+
+    def test_model_version_swap_cpu(test_case):
+        _test_model_version_swap(test_case, "cpu")
+
+    @unittest.skipIf(os.getenv("ONEFLOW_TEST_CPU_ONLY"), "only test cpu cases")
+    def test_graph_inference_session_cuda(test_case):
+        _test_graph_inference_session(test_case, "cuda")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+"""
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import json
+import os
+import tempfile
+import unittest
+
+import oneflow as flow
+import oneflow.unittest
+from oneflow.benchmarks import data_pipeline
+
+
+@flow.unittest.skip_unless_1n1d()
+class TestDataPipelineBenchmark(flow.unittest.TestCase):
+    def test_run_cases(test_case):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fixtures = data_pipeline.prepare_fixtures(tmp_dir, num_samples=32)
+            results = data_pipeline.run_cases(
+                fixtures,
+                batch_sizes=[4],
+                iterations=2,
+                warmup=1,
+                cases=["onerec_reader", "gpt_indexed_bin_reader", "coco_reader"],
+            )
+        test_case.assertEqual(
+            [r["name"] for r in results],
+            ["onerec_reader", "gpt_indexed_bin_reader", "coco_reader"],
+        )
+        for result in results:
+            if "skipped" in result:
+                test_case.assertNotIn("coco", fixtures)
+                continue
+            test_case.assertEqual(result["batch_size"], 4)
+            test_case.assertGreater(result["samples_per_sec"], 0)
+            test_case.assertGreater(result["bytes_per_sec"], 0)
+
+    def test_main(test_case):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output = os.path.join(tmp_dir, "result.json")
+            data_pipeline.main(
+                [
+                    "--output",
+                    output,
+                    "--num-samples",
+                    "32",
+                    "--batch-sizes",
+                    "2,4",
+                    "--num-threads",
+                    "1",
+                    "--iterations",
+                    "2",
+                    "--cases",
+                    "ofrecord_raw_decoder,dataloader_no_workers",
+                ]
+            )
+            with open(output) as f:
+                report = json.load(f)
+        test_case.assertEqual(report["suite"], "data_pipeline")
+        test_case.assertEqual(report["oneflow_version"], flow.__version__)
+        test_case.assertEqual(len(report["results"]), 4)
+        for result in report["results"]:
+            test_case.assertEqual(result["num_threads"], 1)
+            test_case.assertGreater(result["samples_per_sec"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
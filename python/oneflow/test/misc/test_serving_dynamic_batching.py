@@ -0,0 +1,204 @@
+"""
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import asyncio
+import unittest
+
+import numpy as np
+
+import oneflow as flow
+import oneflow.unittest
+from oneflow.serving import DynamicBatcher, DynamicBatchingOption, Histogram
+
+
+class _FakeJob(object):
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.batch_sizes = []
+
+    async def __call__(self, x, y):
+        self.batch_sizes.append(x.shape[0])
+        await asyncio.sleep(self.delay)
+        return [x + y, np.array(x.shape[0])]
+
+
+def _run_requests(batcher, event_loop, batch_sizes):
+    async def run_all():
+        return await asyncio.gather(
+            *[
+                batcher.run(
+                    x=np.full((n, 2), i, dtype=np.float32),
+                    y=np.ones((n, 2), dtype=np.float32),
+                )
+                for (i, n) in enumerate(batch_sizes)
+            ]
+        )
+
+    return event_loop.run_until_complete(run_all())
+
+
+def _close(batcher, event_loop):
+    batcher.close()
+    event_loop.run_until_complete(batcher.wait_for_all_batches_finished())
+
+
+@flow.unittest.skip_unless_1n1d()
+class TestServingDynamicBatching(flow.unittest.TestCase):
+    def setUp(test_case):
+        test_case.event_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(test_case.event_loop)
+
+    def tearDown(test_case):
+        test_case.event_loop.close()
+
+    def test_concat_and_split(test_case):
+        job = _FakeJob()
+        option = DynamicBatchingOption(max_batch_size=8, max_queue_delay_ms=50)
+        batcher = DynamicBatcher(job, option, test_case.event_loop)
+        batch_sizes = [1, 3, 2, 2, 4]
+        results = _run_requests(batcher, test_case.event_loop, batch_sizes)
+        test_case.assertEqual(job.batch_sizes, [8, 4])
+        for (i, (result, n)) in enumerate(zip(results, batch_sizes)):
+            test_case.assertEqual(len(result), 2)
+            test_case.assertTrue(np.array_equal(result[0], np.full((n, 2), i + 1)))
+            # outputs without the batch axis are returned as they are
+            test_case.assertEqual(int(result[1]), 8 if i < 4 else 4)
+        stats = batcher.stats()
+        test_case.assertEqual(stats["requests"], 5)
+        test_case.assertEqual(stats["batches"], 2)
+        test_case.assertEqual(stats["batch_size"]["count"], 2)
+        test_case.assertEqual(stats["batch_size"]["max"], 8)
+        test_case.assertEqual(stats["queue_time_ms"]["count"], 5)
+        batcher.reset_stats()
+        test_case.assertEqual(batcher.stats()["requests"], 0)
+        _close(batcher, test_case.event_loop)
+
+    def test_padding(test_case):
+        job = _FakeJob()
+        option = DynamicBatchingOption(
+            max_batch_size=4, max_queue_delay_ms=10, pad_to_batch_size=6
+        )
+        batcher = DynamicBatcher(job, option, test_case.event_loop)
+        results = _run_requests(batcher, test_case.event_loop, [1, 2])
+        test_case.assertEqual(job.batch_sizes, [6])
+        test_case.assertTrue(np.array_equal(results[0][0], np.full((1, 2), 1)))
+        test_case.assertTrue(np.array_equal(results[1][0], np.full((2, 2), 2)))
+        test_case.assertEqual(batcher.stats()["padded_rows"], 3)
+        _close(batcher, test_case.event_loop)
+
+    def test_inflight_batches(test_case):
+        # the requests that arrive while a batch runs are batched together
+        job = _FakeJob(delay=0.05)
+        option = DynamicBatchingOption(max_batch_size=16, max_queue_delay_ms=0)
+        batcher = DynamicBatcher(job, option, test_case.event_loop)
+
+        async def run_all():
+            first = test_case.event_loop.create_task(
+                batcher.run(x=np.zeros((1, 2)), y=np.zeros((1, 2)))
+            )
+            await asyncio.sleep(0.01)
+            rest = [
+                batcher.run(x=np.zeros((1, 2)), y=np.zeros((1, 2))) for _ in range(5)
+            ]
+            return await asyncio.gather(first, *rest)
+
+        test_case.event_loop.run_until_complete(run_all())
+        test_case.assertEqual(job.batch_sizes, [1, 5])
+        _close(batcher, test_case.event_loop)
+
+    def test_errors(test_case):
+        async def failing_job(x):
+            raise RuntimeError("job failed")
+
+        option = DynamicBatchingOption(max_batch_size=4, max_queue_delay_ms=1)
+        batcher = DynamicBatcher(failing_job, option, test_case.event_loop)
+        with test_case.assertRaises(ValueError):
+            test_case.event_loop.run_until_complete(batcher.run(x=np.zeros((5, 2))))
+        with test_case.assertRaises(RuntimeError):
+            test_case.event_loop.run_until_complete(batcher.run(x=np.zeros((2, 2))))
+        _close(batcher, test_case.event_loop)
+
+    def _run_mismatched_requests(test_case, batcher):
+        good = dict(x=np.zeros((1, 2), np.float32), y=np.ones((1, 2), np.float32))
+        requests = [
+            good,
+            dict(x=np.zeros((1, 3), np.float32), y=np.ones((1, 3), np.float32)),
+            good,
+            dict(x=np.zeros((1, 2), np.float32)),
+            good,
+        ]
+
+        async def run_all():
+            return await asyncio.gather(
+                *[batcher.run(**inputs) for inputs in requests], return_exceptions=True
+            )
+
+        return test_case.event_loop.run_until_complete(run_all())
+
+    def test_input_signature(test_case):
+        # a request that does not match the signature fails on its own
+        job = _FakeJob()
+        option = DynamicBatchingOption(max_batch_size=8, max_queue_delay_ms=50)
+        input_signature = {"x": ((2,), np.float32), "y": ((2,), np.float32)}
+        batcher = DynamicBatcher(job, option, test_case.event_loop, input_signature)
+        results = test_case._run_mismatched_requests(batcher)
+        test_case.assertEqual(job.batch_sizes, [3])
+        for i in [0, 2, 4]:
+            test_case.assertTrue(np.array_equal(results[i][0], np.ones((1, 2))))
+        for i in [1, 3]:
+            test_case.assertIsInstance(results[i], ValueError)
+        with test_case.assertRaises(ValueError):
+            test_case.event_loop.run_until_complete(
+                batcher.run(
+                    x=np.zeros((1, 2), np.float32), y=np.ones((1, 2), np.complex64)
+                )
+            )
+        # the inputs of another float dtype are cast
+        result = test_case.event_loop.run_until_complete(
+            batcher.run(x=np.zeros((1, 2)), y=np.ones((1, 2), np.float16))
+        )
+        test_case.assertEqual(result[0].dtype, np.float32)
+        _close(batcher, test_case.event_loop)
+
+    def test_mismatched_requests(test_case):
+        # without a signature, the requests that can not be concatenated with the
+        # first queued request run in later batches
+        async def job(x, y=None):
+            batch_sizes.append(x.shape[0])
+            return [x + 1]
+
+        batch_sizes = []
+        option = DynamicBatchingOption(max_batch_size=8, max_queue_delay_ms=50)
+        batcher = DynamicBatcher(job, option, test_case.event_loop)
+        results = test_case._run_mismatched_requests(batcher)
+        test_case.assertEqual(batch_sizes, [3, 1, 1])
+        test_case.assertTrue(np.array_equal(results[0][0], np.ones((1, 2))))
+        test_case.assertTrue(np.array_equal(results[1][0], np.ones((1, 3))))
+        test_case.assertTrue(np.array_equal(results[3][0], np.ones((1, 2))))
+        _close(batcher, test_case.event_loop)
+
+    def test_histogram(test_case):
+        histogram = Histogram([1, 2, 4])
+        for value in [0.5, 1, 3, 3, 10]:
+            histogram.record(value)
+        stats = histogram.as_dict()
+        test_case.assertEqual(stats["counts"], [2, 0, 2, 1])
+        test_case.assertEqual(stats["p50"], 4)
+        test_case.assertEqual(stats["p99"], 10)
+        test_case.assertAlmostEqual(stats["mean"], 3.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+"""
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import oneflow as flow
+import oneflow.unittest
+from oneflow.benchmarks import serving as serving_benchmark
+from oneflow.serving import (
+    CpuInstanceConfig,
+    MultiInstanceSession,
+    numa_node_cpus,
+    plan_cpu_instances,
+)
+
+
+@flow.unittest.skip_unless_1n1d()
+class TestServingMultiInstance(flow.unittest.TestCase):
+    def test_plan_cpu_instances(test_case):
+        node2cpus = {0: list(range(0, 8)), 1: list(range(8, 16))}
+        configs = plan_cpu_instances(4, node2cpus)
+        test_case.assertEqual([c.numa_node for c in configs], [0, 0, 1, 1])
+        # no instance spans two NUMA nodes
+        for config in configs:
+            test_case.assertTrue(set(config.cpus) <= set(node2cpus[config.numa_node]))
+            test_case.assertEqual(config.num_threads, 4)
+        all_cpus = sorted(cpu for c in configs for cpu in c.cpus)
+        test_case.assertEqual(all_cpus, list(range(16)))
+
+        configs = plan_cpu_instances(3, node2cpus)
+        test_case.assertEqual([c.numa_node for c in configs], [0, 0, 1])
+        test_case.assertEqual([len(c.cpus) for c in configs], [4, 4, 8])
+        test_case.assertEqual(len(plan_cpu_instances(None, node2cpus)), 2)
+        with test_case.assertRaises(ValueError):
+            plan_cpu_instances(3, {0: [0, 1]})
+
+        allowed = numa_node_cpus()
+        test_case.assertGreater(len(allowed), 0)
+        if hasattr(os, "sched_getaffinity"):
+            test_case.assertEqual(
+                sorted(cpu for cpus in allowed.values() for cpu in cpus),
+                sorted(os.sched_getaffinity(0)),
+            )
+
+    def test_multi_instance_session(test_case):
+        cpus = sorted(numa_node_cpus().values(), key=len)[-1]
+        configs = [CpuInstanceConfig(cpus[: max(len(cpus) // 2, 1)], num_threads=1)]
+        if len(cpus) > 1:
+            configs.append(CpuInstanceConfig(cpus[len(cpus) // 2 :], num_threads=1))
+        with tempfile.TemporaryDirectory() as save_dir:
+            serving_benchmark.export_mlp(
+                save_dir, batch_size=2, in_features=4, hidden_features=8, num_layers=1
+            )
+            sess = MultiInstanceSession(save_dir, instance_configs=configs)
+            test_case.assertEqual(sess.graph_name, "mlp")
+            xs = [np.random.randn(2, 4).astype(np.float32) for _ in range(8)]
+
+            async def run_all():
+                return await asyncio.gather(*[sess.async_run(x=x) for x in xs])
+
+            results = sess.event_loop_.run_until_complete(run_all())
+            (expected,) = sess.run(x=xs[0])
+            test_case.assertTrue(np.allclose(results[0][0], expected))
+            for (result,) in results:
+                test_case.assertEqual(result.shape, (2, 16))
+            with test_case.assertRaises(RuntimeError):
+                sess.run(x=np.zeros((3, 4), np.float32))
+            stats = sess.stats()["instances"]
+            test_case.assertEqual(len(stats), len(configs))
+            test_case.assertEqual(
+                sum(stat["latency_ms"]["count"] for stat in stats), len(xs) + 2
+            )
+            for (stat, config) in zip(stats, configs):
+                test_case.assertTrue(stat["alive"])
+                test_case.assertEqual(stat["cpus"], config.cpus)
+                test_case.assertEqual(stat["outstanding_requests"], 0)
+            sess.close()
+
+    def test_large_concurrent_requests(test_case):
+        # requests and responses of 4 MB fill the pipes both ways, the requests are
+        # still sent while the instance waits to send its responses
+        with tempfile.TemporaryDirectory() as save_dir:
+            model = serving_benchmark.export_mlp(
+                save_dir, 1024, in_features=1024, num_layers=0, out_features=1024
+            )
+            cpus = sorted(numa_node_cpus().values(), key=len)[-1]
+            sess = MultiInstanceSession(
+                save_dir, instance_configs=[CpuInstanceConfig(cpus)]
+            )
+            xs = [np.random.randn(1024, 1024).astype(np.float32) for _ in range(6)]
+
+            async def run_all():
+                return await asyncio.wait_for(
+                    asyncio.gather(*[sess.async_run(x=x) for x in xs]), 300
+                )
+
+            results = sess.event_loop_.run_until_complete(run_all())
+            for (x, (y,)) in zip(xs, results):
+                expected = model(flow.tensor(x)).numpy()
+                test_case.assertTrue(np.allclose(y, expected, rtol=1e-4, atol=1e-4))
+            test_case.assertEqual(
+                sess.stats()["instances"][0]["outstanding_requests"], 0
+            )
+            sess.close()
+
+    def test_benchmark_main(test_case):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output = os.path.join(tmp_dir, "result.json")
+            serving_benchmark.main(
+                [
+                    "--output",
+                    output,
+                    "--num-instances",
+                    "1",
+                    "--batch-size",
+                    "2",
+                    "--in-features",
+                    "4",
+                    "--hidden-features",
+                    "8",
+                    "--num-layers",
+                    "1",
+                    "--requests",
+                    "8",
+                    "--warmup",
+                    "2",
+                ]
+            )
+            with open(output) as f:
+                report = json.load(f)
+        test_case.assertEqual(report["suite"], "serving")
+        (result,) = report["results"]
+        test_case.assertEqual(result["num_instances"], 1)
+        test_case.assertEqual(result["concurrency"], 2)
+        test_case.assertGreater(result["requests_per_sec"], 0)
+        test_case.assertGreaterEqual(
+            result["latency_ms"]["p99"], result["latency_ms"]["p50"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
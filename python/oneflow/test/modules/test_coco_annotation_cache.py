@@ -0,0 +1,177 @@
+"""
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import oneflow as flow
+import oneflow.unittest
+
+_CACHE_DIR_ENV = "ONEFLOW_COCO_ANNOTATION_CACHE_DIR"
+
+
+def _write_coco(root, num_images=6, seed=0):
+    rng = np.random.RandomState(seed)
+    image_dir = os.path.join(root, "images")
+    os.makedirs(image_dir)
+    # non-contiguous category ids are mapped to the contiguous labels 1, 2, 3
+    annotation = dict(
+        images=[], annotations=[], categories=[dict(id=i) for i in (7, 1, 3)]
+    )
+    for image_id in range(num_images):
+        file_name = "{:012d}.jpg".format(image_id)
+        # the reader returns the encoded bytes, so any content will do
+        with open(os.path.join(image_dir, file_name), "wb") as f:
+            f.write(rng.bytes(64 + image_id))
+        annotation["images"].append(
+            dict(id=image_id, file_name=file_name, height=96, width=128)
+        )
+        # the last image has no annotations and is removed
+        for _ in range(0 if image_id == num_images - 1 else image_id % 3 + 1):
+            polygons = [
+                rng.randint(1, 90, size=2 * rng.randint(4, 7)).tolist()
+                for _ in range(rng.randint(1, 3))
+            ]
+            annotation["annotations"].append(
+                dict(
+                    id=len(annotation["annotations"]),
+                    image_id=image_id,
+                    category_id=int(rng.choice([1, 3, 7])),
+                    iscrowd=0,
+                    bbox=[10.5, 20.5, 30.0 + image_id, 40.0],
+                    segmentation=polygons,
+                )
+            )
+    annotation_file = os.path.join(root, "annotations.json")
+    with open(annotation_file, "w") as f:
+        json.dump(annotation, f)
+    return annotation_file, image_dir, annotation
+
+
+def _read_all(annotation_file, image_dir, num_images):
+    reader = flow.nn.COCOReader(
+        annotation_file=annotation_file,
+        image_dir=image_dir,
+        batch_size=1,
+        shuffle=False,
+        group_by_aspect_ratio=False,
+    )
+    results = {}
+    for _ in range(num_images):
+        (image, image_id, image_size, bbox, label, segm, segm_index) = reader()
+        results[int(image_id.numpy()[0])] = [
+            image.numpy()[0],
+            image_size.numpy()[0],
+            bbox.numpy()[0],
+            label.numpy()[0],
+            segm.numpy()[0],
+            segm_index.numpy()[0],
+        ]
+    return results
+
+
+def _assert_same_results(test_case, results, expected_results):
+    test_case.assertEqual(sorted(results.keys()), sorted(expected_results.keys()))
+    for (image_id, result) in results.items():
+        for (actual, expected) in zip(result, expected_results[image_id]):
+            test_case.assertTrue(np.array_equal(actual, expected), image_id)
+
+
+@flow.unittest.skip_unless_1n1d()
+class TestCOCOAnnotationCache(oneflow.unittest.TestCase):
+    def setUp(test_case):
+        test_case.cache_dir_env = os.environ.get(_CACHE_DIR_ENV)
+
+    def tearDown(test_case):
+        if test_case.cache_dir_env is None:
+            os.environ.pop(_CACHE_DIR_ENV, None)
+        else:
+            os.environ[_CACHE_DIR_ENV] = test_case.cache_dir_env
+
+    def test_annotation_cache(test_case):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            (annotation_file, image_dir, annotation) = _write_coco(tmp_dir)
+            num_images = len(annotation["images"]) - 1
+            # an unwritable cache dir keeps the freshly parsed annotations in memory
+            os.environ[_CACHE_DIR_ENV] = os.path.join(tmp_dir, "missing")
+            parsed = _read_all(annotation_file, image_dir, num_images)
+            test_case.assertEqual(sorted(parsed.keys()), list(range(num_images)))
+            category_id2label = {1: 1, 3: 2, 7: 3}
+            for (image_id, (_, image_size, bbox, label, segm, _)) in parsed.items():
+                annos = [
+                    anno
+                    for anno in annotation["annotations"]
+                    if anno["image_id"] == image_id
+                ]
+                test_case.assertEqual(image_size.tolist(), [128, 96])
+                test_case.assertEqual(
+                    label.tolist(), [category_id2label[a["category_id"]] for a in annos]
+                )
+                test_case.assertTrue(
+                    np.allclose(bbox[:, :2], [a["bbox"][:2] for a in annos])
+                )
+                coords = [c for a in annos for poly in a["segmentation"] for c in poly]
+                test_case.assertTrue(np.allclose(segm.flatten(), coords))
+
+            cache_dir = os.path.join(tmp_dir, "cache")
+            os.makedirs(cache_dir)
+            os.environ[_CACHE_DIR_ENV] = cache_dir
+            cache_file = os.path.join(cache_dir, "annotations.json.ofcache")
+            # the first reader writes the cache, the second one maps it
+            _assert_same_results(
+                test_case, _read_all(annotation_file, image_dir, num_images), parsed
+            )
+            test_case.assertTrue(os.path.exists(cache_file))
+            stat = os.stat(cache_file)
+            _assert_same_results(
+                test_case, _read_all(annotation_file, image_dir, num_images), parsed
+            )
+            test_case.assertEqual(os.stat(cache_file).st_mtime_ns, stat.st_mtime_ns)
+            test_case.assertEqual(os.stat(cache_file).st_ino, stat.st_ino)
+
+            # a touched annotation file of the same content is matched by its hash,
+            # and the cache key is updated in place
+            annotation_stat = os.stat(annotation_file)
+            touched_ns = annotation_stat.st_mtime_ns + 10 ** 9
+            os.utime(annotation_file, ns=(touched_ns, touched_ns))
+            _assert_same_results(
+                test_case, _read_all(annotation_file, image_dir, num_images), parsed
+            )
+            test_case.assertEqual(os.stat(cache_file).st_ino, stat.st_ino)
+
+            # an edit of the same size invalidates the cache
+            with open(annotation_file) as f:
+                text = f.read()
+            test_case.assertIn("10.5, 20.5", text)
+            with open(annotation_file, "w") as f:
+                f.write(text.replace("10.5, 20.5", "12.5, 20.5"))
+            edited_ns = touched_ns + 10 ** 9
+            os.utime(annotation_file, ns=(edited_ns, edited_ns))
+            test_case.assertEqual(
+                os.path.getsize(annotation_file), annotation_stat.st_size
+            )
+            edited = _read_all(annotation_file, image_dir, num_images)
+            test_case.assertNotEqual(os.stat(cache_file).st_ino, stat.st_ino)
+            for (image_id, result) in edited.items():
+                test_case.assertTrue(np.allclose(result[2][:, 0], 12.5))
+                test_case.assertTrue(np.array_equal(result[3], parsed[image_id][3]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+"""
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import glob
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import oneflow as flow
+import oneflow.unittest
+from oneflow.experimental.gpt_indexed_bin import write_gpt_indexed_bin
+
+
+def _write_corpus(prefix, num_docs=64, seed=0):
+    rng = np.random.RandomState(seed)
+    sizes = rng.randint(8, 64, size=num_docs)
+    tokens = rng.randint(0, 50000, size=int(sizes.sum())).astype(np.int32)
+    write_gpt_indexed_bin(prefix, np.split(tokens, np.cumsum(sizes)[:-1]))
+
+
+def _read_index_cache(path):
+    # magic code | version | 8 key fields | 3 sizes | doc | sample pairs | shuffle
+    with open(path, "rb") as f:
+        data = f.read()
+    magic = data[:8]
+    fields = np.frombuffer(data, dtype=np.uint64, count=12, offset=8)
+    (num_doc, num_sample, num_shuffle) = [int(n) for n in fields[9:]]
+    offset = 8 + 12 * 8
+    doc = np.frombuffer(data, np.uint64, num_doc, offset)
+    offset += num_doc * 8
+    sample = np.frombuffer(data, np.uint64, num_sample * 2, offset).reshape(-1, 2)
+    offset += num_sample * 16
+    shuffle = np.frombuffer(data, np.uint64, num_shuffle, offset)
+    assert offset + num_shuffle * 8 == len(data)
+    return magic, doc, sample, shuffle
+
+
+def _read_tokens(prefix, iterations=4, **kwargs):
+    options = dict(seq_length=16, num_samples=40, batch_size=4, random_seed=7)
+    options.update(kwargs)
+    reader = flow.nn.GPTIndexedBinDataReader(
+        data_file_prefix=prefix, shuffle=True, **options
+    )
+    return [reader().numpy() for _ in range(iterations)]
+
+
+def _cache_files(prefix):
+    return set(glob.glob(prefix + "_*_indexmap.bin"))
+
+
+@flow.unittest.skip_unless_1n1d()
+class TestGPTIndexCache(oneflow.unittest.TestCase):
+    def test_index_cache(test_case):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            prefix = os.path.join(tmp_dir, "corpus_text_document")
+            _write_corpus(prefix)
+            tokens = _read_tokens(prefix)
+            cache_file = prefix + "_split0of1_40ns_16sl_7s_indexmap.bin"
+            test_case.assertEqual(_cache_files(prefix), {cache_file})
+            (magic, doc, sample, shuffle) = _read_index_cache(cache_file)
+            test_case.assertEqual(magic, b"GPTIXMAP")
+            test_case.assertGreaterEqual(len(sample), 40)
+            test_case.assertEqual(sorted(shuffle.tolist()), list(range(len(sample))))
+            test_case.assertEqual(sorted(set(doc.tolist())), list(range(64)))
+            stat = os.stat(cache_file)
+
+            # the second run maps the cache rather than rebuilding it
+            test_case.assertTrue(
+                all(
+                    np.array_equal(a, b) for (a, b) in zip(tokens, _read_tokens(prefix))
+                )
+            )
+            test_case.assertEqual(os.stat(cache_file).st_ino, stat.st_ino)
+            test_case.assertEqual(os.stat(cache_file).st_mtime_ns, stat.st_mtime_ns)
+
+            # a rebuilt cache holds the same indices
+            with open(cache_file, "rb") as f:
+                cached = f.read()
+            os.remove(cache_file)
+            rebuilt_tokens = _read_tokens(prefix)
+            with open(cache_file, "rb") as f:
+                test_case.assertEqual(f.read(), cached)
+            test_case.assertTrue(
+                all(np.array_equal(a, b) for (a, b) in zip(tokens, rebuilt_tokens))
+            )
+
+            # every input of the indices has its own cache file
+            for kwargs in [
+                dict(seq_length=8),
+                dict(num_samples=48),
+                dict(random_seed=8),
+                dict(split_sizes=[3, 1], split_index=0),
+                dict(split_sizes=[3, 1], split_index=1),
+            ]:
+                files = _cache_files(prefix)
+                _read_tokens(prefix, iterations=1, **kwargs)
+                new_files = _cache_files(prefix) - files
+                test_case.assertEqual(len(new_files), 1, kwargs)
+                with open(new_files.pop(), "rb") as f:
+                    test_case.assertNotEqual(f.read(), cached)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+"""
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+
+import oneflow as flow
+import oneflow.unittest
+
+
+def _make_jpeg(height, width, seed):
+    y, x = np.mgrid[0:height, 0:width]
+    image = np.stack(
+        [x * 255 // width, y * 255 // height, (x + y + seed * 10) % 256], axis=-1
+    ).astype(np.uint8)
+    ok, buf = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 95])
+    assert ok
+    return buf.tobytes()
+
+
+@unittest.skipIf(os.getenv("ONEFLOW_ENABLE_NHWC") == "1", "only test NCHW layout")
+@flow.unittest.skip_unless_1n1d()
+class TestOFRecordImageDecoderRandomCropResizeNormalize(flow.unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.jpegs = [_make_jpeg(240 + 16 * i, 320 - 16 * i, i) for i in range(4)]
+        with flow.data.OFRecordWriter(self.tmp_dir.name, num_shards=1) as writer:
+            writer.write({"encoded": self.jpegs})
+        self.reader = flow.nn.OFRecordReader(
+            self.tmp_dir.name, batch_size=4, part_name_suffix_length=5
+        )
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_resize_normalize(test_case):
+        mean, std = [10.0, 20.0, 30.0], [50.0, 60.0, 70.0]
+        decoder = flow.nn.OFRecordImageDecoderRandomCropResizeNormalize(
+            "encoded", 64, 48, random_crop=False, mean=mean, std=std
+        )
+        out = decoder(test_case.reader()).numpy()
+        test_case.assertEqual(out.shape, (4, 3, 48, 64))
+        for image, jpeg in zip(out, test_case.jpegs):
+            expected = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+            expected = cv2.resize(expected, (64, 48), interpolation=cv2.INTER_AREA)
+            expected = (expected.astype(np.float32) - mean) / std
+            # libjpeg downscales in the DCT domain, so allow a small difference
+            diff = np.abs(image - expected.transpose(2, 0, 1)).mean()
+            test_case.assertLess(diff, 0.1)
+
+    def test_random_crop(test_case):
+        decoder = flow.nn.OFRecordImageDecoderRandomCropResizeNormalize(
+            "encoded", 32, 32, random_seed=1, std=[255.0]
+        )
+        out = decoder(test_case.reader()).numpy()
+        test_case.assertEqual(out.shape, (4, 3, 32, 32))
+        test_case.assertTrue(np.all(out >= 0) and np.all(out <= 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+"""
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+import struct
+import tempfile
+import unittest
+
+import numpy as np
+
+import oneflow as flow
+import oneflow.unittest
+import oneflow.core.record.record_pb2 as record_pb
+from oneflow.experimental.ofrecord_index import (
+    build_ofrecord_index,
+    read_ofrecord_index,
+)
+
+
+def _write_part(path, labels):
+    with open(path, "wb") as f:
+        for label in labels:
+            record = record_pb.OFRecord()
+            record.feature["label"].int32_list.value.append(label)
+            buf = record.SerializeToString()
+            f.write(struct.pack("<q", len(buf)))
+            f.write(buf)
+
+
+def _read_labels(reader, num_batches):
+    decoder = flow.nn.OFRecordRawDecoder("label", shape=(), dtype=flow.int32)
+    labels = []
+    for _ in range(num_batches):
+        labels.extend(decoder(reader()).numpy().tolist())
+    return labels
+
+
+@flow.unittest.skip_unless_1n1d()
+class TestOFRecordIndex(flow.unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.data_dir = self.tmp_dir.name
+        _write_part(os.path.join(self.data_dir, "part-0"), range(0, 7))
+        _write_part(os.path.join(self.data_dir, "part-1"), range(7, 12))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_build_index(test_case):
+        written = build_ofrecord_index(test_case.data_dir)
+        test_case.assertEqual(len(written), 2)
+        part_file = os.path.join(test_case.data_dir, "part-0")
+        offsets = read_ofrecord_index(part_file)
+        test_case.assertEqual(offsets.size, 8)
+        test_case.assertEqual(offsets[0], 0)
+        test_case.assertEqual(offsets[-1], os.path.getsize(part_file))
+        test_case.assertEqual(build_ofrecord_index(test_case.data_dir), [])
+
+    def _make_reader(test_case, **kwargs):
+        return flow.nn.OFRecordReader(
+            test_case.data_dir, batch_size=4, data_part_num=2, use_index=True, **kwargs,
+        )
+
+    def test_global_shuffle(test_case):
+        build_ofrecord_index(test_case.data_dir)
+        labels = _read_labels(test_case._make_reader(random_shuffle=True), 6)
+        # every epoch is a permutation of all records across part files
+        test_case.assertEqual(sorted(labels[:12]), list(range(12)))
+        test_case.assertEqual(sorted(labels[12:]), list(range(12)))
+        test_case.assertNotEqual(labels[:12], labels[12:])
+
+    def test_lazy_index_and_resume(test_case):
+        labels = _read_labels(
+            test_case._make_reader(random_shuffle=True, random_seed=3), 6
+        )
+        resumed = _read_labels(
+            test_case._make_reader(
+                random_shuffle=True, random_seed=3, start_sample_offset=8
+            ),
+            4,
+        )
+        test_case.assertEqual(resumed, labels[8:])
+
+    def test_start_sample_offset_requires_index(test_case):
+        with test_case.assertRaises(ValueError):
+            flow.nn.OFRecordReader(test_case.data_dir, start_sample_offset=4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+"""
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+import signal
+import tempfile
+import unittest
+
+import numpy as np
+
+import oneflow as flow
+import oneflow.unittest
+import oneflow.core.record.record_pb2 as record_pb
+from oneflow.experimental.ofrecord_index import read_ofrecord_index
+
+
+@flow.unittest.skip_unless_1n1d()
+class TestOFRecordWriter(flow.unittest.TestCase):
+    def test_encode(test_case):
+        record = record_pb.OFRecord()
+        record.ParseFromString(
+            flow.data.encode_ofrecord(
+                {
+                    "label": np.array(-3, dtype=np.int32),
+                    "ids": np.array([2 ** 40, -1], dtype=np.int64),
+                    "score": np.array([0.5, 2.0], dtype=np.float32),
+                    "image": np.arange(4, dtype=np.uint8),
+                    "name": b"abc",
+                }
+            )
+        )
+        test_case.assertEqual(list(record.feature["label"].int32_list.value), [-3])
+        test_case.assertEqual(
+            list(record.feature["ids"].int64_list.value), [2 ** 40, -1]
+        )
+        test_case.assertEqual(list(record.feature["score"].float_list.value), [0.5, 2])
+        test_case.assertEqual(
+            record.feature["image"].bytes_list.value[0], bytes([0, 1, 2, 3])
+        )
+        test_case.assertEqual(record.feature["name"].bytes_list.value[0], b"abc")
+
+    def _test_write_and_read(test_case, worker_mode):
+        with tempfile.TemporaryDirectory() as data_dir:
+            with flow.data.OFRecordWriter(
+                data_dir, num_shards=3, num_workers=2, worker_mode=worker_mode
+            ) as writer:
+                for i in range(4):
+                    writer.write(
+                        {
+                            "label": np.arange(i * 5, i * 5 + 5, dtype=np.int32),
+                            "feature": np.random.rand(5, 3).astype(np.float32),
+                        }
+                    )
+            stats = writer.stats()
+            test_case.assertEqual(stats["num_records"], 20)
+            test_case.assertEqual(stats["records_per_shard"], [7, 7, 6])
+            part_file = os.path.join(data_dir, "part-00002")
+            test_case.assertEqual(read_ofrecord_index(part_file).size, 7)
+
+            reader = flow.nn.OFRecordReader(
+                data_dir,
+                batch_size=5,
+                data_part_num=3,
+                part_name_suffix_length=5,
+                use_index=True,
+            )
+            decoder = flow.nn.OFRecordRawDecoder("label", shape=(), dtype=flow.int32)
+            labels = []
+            for _ in range(4):
+                labels.extend(decoder(reader()).numpy().tolist())
+            test_case.assertEqual(sorted(labels), list(range(20)))
+
+    def test_process_mode(test_case):
+        test_case._test_write_and_read("process")
+
+    def test_thread_mode(test_case):
+        test_case._test_write_and_read("thread")
+
+    def test_killed_worker(test_case):
+        with tempfile.TemporaryDirectory() as data_dir:
+            writer = flow.data.OFRecordWriter(data_dir, num_shards=2, num_workers=2)
+            writer.write({"label": np.arange(4, dtype=np.int32)})
+            worker = writer._workers[1]
+            os.kill(worker.pid, signal.SIGKILL)
+            worker.join()
+            with test_case.assertRaisesRegex(RuntimeError, "exited unexpectedly"):
+                writer.close()
+            test_case.assertFalse(writer._workers[0].is_alive())
+
+
+if __name__ == "__main__":
+    unittest.main()
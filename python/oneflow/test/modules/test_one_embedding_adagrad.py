@@ -28,7 +28,7 @@ from oneflow.nn.parameter import Parameter
 
 
 def compare_with_numpy_adagrad(
-    test_case, weight_decay, lr_decay, scale, learning_rate, train_iters,
+    test_case, device, weight_decay, lr_decay, scale, learning_rate, train_iters,
 ):
 
     num_rows = 500
@@ -50,14 +50,14 @@ def compare_with_numpy_adagrad(
 
     def adagrad_by_oneflow():
         unique_embeddings_tensor = flow.tensor(init_value, requires_grad=False).to(
-            "cuda"
+            device
         )
         lr_tensor = flow.tensor(
             np.array(learning_rate).reshape(1,).astype(np.float32)
-        ).to("cuda")
+        ).to(device)
         down_scale_by_tensor = flow.tensor(
             np.array(down_scale_by).astype(np.float32)
-        ).to("cuda")
+        ).to(device)
 
         def train_one_iter(
             num_valid, unique_embeddings, embedding_grad, skip_if, train_step
@@ -79,13 +79,13 @@ def compare_with_numpy_adagrad(
         for i in range(1, train_iters):
             num_valid_tensor = flow.tensor(
                 np.array(num_valid_seq[i]).reshape(1,).astype(np.int32)
-            ).to("cuda")
-            grad_tensor = flow.tensor(random_grad_seq[i]).to("cuda")
+            ).to(device)
+            grad_tensor = flow.tensor(random_grad_seq[i]).to(device)
             skip_if_tensor = flow.tensor(
                 np.array(skip_if_seq[i]).reshape(1,).astype(np.int64)
-            ).to("cuda")
+            ).to(device)
             step_tensor = flow.tensor(np.array(i).reshape(1,).astype(np.int64)).to(
-                "cuda"
+                device
             )
             updated_tensor = train_one_iter(
                 num_valid_tensor,
@@ -138,11 +138,13 @@ def compare_with_numpy_adagrad(
     )
 
 
-@unittest.skipIf(os.getenv("ONEFLOW_TEST_CPU_ONLY"), "only test cpu cases")
 @flow.unittest.skip_unless_1n1d()
 class TestOptimizers(flow.unittest.TestCase):
     def test_one_embedding_adagrad(test_case):
         arg_dict = OrderedDict()
+        arg_dict["device"] = (
+            ["cpu"] if os.getenv("ONEFLOW_TEST_CPU_ONLY") else ["cpu", "cuda"]
+        )
         arg_dict["weight_decay"] = [0, 0.1]
         arg_dict["lr_decay"] = [0, 0.1]
         arg_dict["scale"] = [1, 0.1]
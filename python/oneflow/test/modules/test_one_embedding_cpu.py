@@ -0,0 +1,167 @@
+"""
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import copy
+import tempfile
+import unittest
+
+import numpy as np
+
+import oneflow as flow
+import oneflow.unittest
+
+_EMBEDDING_DIM = 4
+_NUM_IDS = 64
+
+
+def _make_store_options(persistent_path, **kwargs):
+    store_options = flow.one_embedding.make_cached_host_mem_store_options(
+        cache_budget_mb=16, persistent_path=persistent_path, capacity=1024, **kwargs
+    )
+    store_options["kv_store"]["device"] = "cpu"
+    return store_options
+
+
+def _make_embedding(name, store_options, tables=None):
+    if tables is None:
+        tables = [
+            flow.one_embedding.make_table_options(
+                flow.one_embedding.make_uniform_initializer(low=-0.1, high=0.1)
+            )
+        ]
+    return flow.one_embedding.MultiTableEmbedding(
+        name=name,
+        embedding_dim=_EMBEDDING_DIM,
+        dtype=flow.float,
+        key_type=flow.int64,
+        tables=tables,
+        store_options=store_options,
+    )
+
+
+class _LookupGraph(flow.nn.Graph):
+    def __init__(self, embedding):
+        super().__init__()
+        self.embedding = embedding
+
+    def build(self, ids):
+        return self.embedding(ids)
+
+
+class _TrainGraph(flow.nn.Graph):
+    def __init__(self, embedding, lr):
+        super().__init__()
+        self.embedding = embedding
+        self.add_optimizer(flow.optim.SGD(embedding.parameters(), lr=lr))
+
+    def build(self, ids):
+        loss = self.embedding(ids).sum()
+        loss.backward()
+        return loss
+
+
+def _lookup(graph, ids):
+    return graph(flow.tensor(ids, dtype=flow.int64)).numpy()
+
+
+@flow.unittest.skip_unless_1n1d()
+class TestOneEmbeddingCPU(flow.unittest.TestCase):
+    def test_train(test_case):
+        with tempfile.TemporaryDirectory() as persistent_path:
+            store_options = _make_store_options(persistent_path)
+            options_before = copy.deepcopy(store_options)
+            embedding = _make_embedding("cpu_train", store_options)
+            # the options of the caller are left untouched
+            test_case.assertEqual(store_options, options_before)
+            test_case.assertEqual(embedding.device, "cpu")
+
+            lr = 0.1
+            all_ids = np.arange(_NUM_IDS, dtype=np.int64).reshape(-1, 1)
+            lookup_graph = _LookupGraph(embedding)
+            train_graph = _TrainGraph(embedding, lr)
+            initial = _lookup(lookup_graph, all_ids)
+            test_case.assertEqual(initial.shape, (_NUM_IDS, 1, _EMBEDDING_DIM))
+            test_case.assertTrue(np.all(np.abs(initial) <= 0.1))
+
+            # the gradient of a sum is the number of occurrences of each id
+            rng = np.random.RandomState(0)
+            counts = np.zeros(_NUM_IDS)
+            for _ in range(5):
+                ids = rng.randint(0, _NUM_IDS, size=(32, 1)).astype(np.int64)
+                train_graph(flow.tensor(ids))
+                counts += np.bincount(ids.ravel(), minlength=_NUM_IDS)
+            trained = _lookup(lookup_graph, all_ids)
+            expected = initial - lr * counts.reshape(-1, 1, 1)
+            test_case.assertTrue(np.allclose(trained, expected, atol=1e-5))
+
+    def test_stats(test_case):
+        with tempfile.TemporaryDirectory() as persistent_path:
+            embedding = _make_embedding(
+                "cpu_stats", _make_store_options(persistent_path)
+            )
+            # the first cache is an lru cache, so the train graph prefetches the
+            # ids before it looks them up, and each id must be counted once
+            train_graph = _TrainGraph(embedding, 0.1)
+            ids = flow.tensor(np.arange(16, dtype=np.int64).reshape(-1, 1))
+            train_graph(ids)
+            stats = embedding.stats()
+            test_case.assertEqual(stats["batches"], 1)
+            test_case.assertEqual(stats["unique_ids"], 16)
+            test_case.assertEqual(stats["caches"][0]["lookups"], 16)
+            test_case.assertEqual(stats["caches"][0]["hits"], 0)
+
+            train_graph(ids)
+            stats = embedding.stats()
+            test_case.assertEqual(stats["batches"], 2)
+            test_case.assertEqual(stats["caches"][0]["lookups"], 32)
+            test_case.assertEqual(stats["caches"][0]["hits"], 16)
+            test_case.assertAlmostEqual(stats["caches"][0]["hit_rate"], 0.5)
+
+            embedding.reset_stats()
+            stats = embedding.stats()
+            test_case.assertEqual(stats["batches"], 0)
+            test_case.assertEqual(stats["caches"][0]["lookups"], 0)
+            test_case.assertEqual(stats["caches"][0]["hit_rate"], 0.0)
+
+            train_graph(ids)
+            stats = embedding.stats()
+            test_case.assertEqual(stats["batches"], 1)
+            test_case.assertEqual(stats["caches"][0]["lookups"], 16)
+            test_case.assertEqual(stats["caches"][0]["misses"], 0)
+            test_case.assertAlmostEqual(stats["caches"][0]["hit_rate"], 1.0)
+
+    def test_storage_dtype_small_updates(test_case):
+        with tempfile.TemporaryDirectory() as persistent_path:
+            embedding = _make_embedding(
+                "cpu_bfloat16",
+                _make_store_options(persistent_path, storage_dtype="bfloat16"),
+            )
+            # the updates are smaller than half of the precision of bfloat16 for most
+            # of the values, rounded to the nearest they would be lost
+            lr = 1e-4
+            num_steps = 100
+            all_ids = np.arange(_NUM_IDS, dtype=np.int64).reshape(-1, 1)
+            lookup_graph = _LookupGraph(embedding)
+            train_graph = _TrainGraph(embedding, lr)
+            initial = _lookup(lookup_graph, all_ids)
+            for _ in range(num_steps):
+                train_graph(flow.tensor(all_ids))
+            trained = _lookup(lookup_graph, all_ids)
+            movement = np.mean(initial - trained) / (lr * num_steps)
+            test_case.assertTrue(abs(movement - 1) < 0.1, movement)
+
+
+if __name__ == "__main__":
+    unittest.main()
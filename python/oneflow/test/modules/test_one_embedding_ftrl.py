@@ -28,6 +28,7 @@ from oneflow.nn.parameter import Parameter
 
 def compare_with_numpy_ftrl(
     test_case,
+    device,
     weight_decay,
     lr_power,
     lambda1,
@@ -54,14 +55,14 @@ def compare_with_numpy_ftrl(
 
     def ftrl_by_oneflow():
         unique_embeddings_tensor = flow.tensor(init_value, requires_grad=False).to(
-            "cuda"
+            device
         )
         lr_tensor = flow.tensor(
             np.array(learning_rate).reshape(1,).astype(np.float32)
-        ).to("cuda")
+        ).to(device)
         down_scale_by_tensor = flow.tensor(
             np.array(down_scale_by).astype(np.float32)
-        ).to("cuda")
+        ).to(device)
 
         def train_one_iter(num_valid, unique_embeddings, embedding_grad, skip_if):
             return flow._C.one_embedding_ftrl_update(
@@ -82,11 +83,11 @@ def compare_with_numpy_ftrl(
         for i in range(1, train_iters):
             num_valid_tensor = flow.tensor(
                 np.array(num_valid_seq[i]).reshape(1,).astype(np.int32)
-            ).to("cuda")
-            grad_tensor = flow.tensor(random_grad_seq[i]).to("cuda")
+            ).to(device)
+            grad_tensor = flow.tensor(random_grad_seq[i]).to(device)
             skip_if_tensor = flow.tensor(
                 np.array(skip_if_seq[i]).reshape(1,).astype(np.int64)
-            ).to("cuda")
+            ).to(device)
 
             updated_tensor = train_one_iter(
                 num_valid_tensor, unique_embeddings_tensor, grad_tensor, skip_if_tensor,
@@ -151,11 +152,13 @@ def compare_with_numpy_ftrl(
     )
 
 
-@unittest.skipIf(os.getenv("ONEFLOW_TEST_CPU_ONLY"), "only test cpu cases")
 @flow.unittest.skip_unless_1n1d()
 class TestOptimizers(flow.unittest.TestCase):
     def test_ftrl(test_case):
         arg_dict = OrderedDict()
+        arg_dict["device"] = (
+            ["cpu"] if os.getenv("ONEFLOW_TEST_CPU_ONLY") else ["cpu", "cuda"]
+        )
         arg_dict["weight_decay"] = [
             0.0
         ]  # TODO(zzk): Currently Only support weight_decay = 0.0.
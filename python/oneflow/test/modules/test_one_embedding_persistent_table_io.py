@@ -0,0 +1,153 @@
+"""
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import oneflow as flow
+import oneflow.unittest
+
+_STORAGE_DIM = 8
+_NUM_KEYS = 10000
+
+
+def _paths(root, name, num_tables):
+    return [os.path.join(root, name, str(i)) for i in range(num_tables)]
+
+
+def _values(keys):
+    # small integers, exactly representable by every storage_dtype but int8
+    return (keys.reshape(-1, 1) % 1000 + np.arange(_STORAGE_DIM)).astype(np.float32)
+
+
+def _write(paths, keys, storage_dtype):
+    with flow.one_embedding.make_persistent_table_writer(
+        paths,
+        "snapshot",
+        flow.int64,
+        flow.float,
+        _STORAGE_DIM,
+        num_threads=2,
+        storage_dtype=storage_dtype,
+    ) as writer:
+        half = len(keys) // 2
+        writer.write(keys[:half], _values(keys[:half]))
+        writer.write(keys[half:], _values(keys[half:]))
+
+
+def _read(test_case, paths, storage_dtype, batch_size=65536, **kwargs):
+    all_keys = []
+    with flow.one_embedding.make_persistent_table_reader(
+        paths,
+        "snapshot",
+        flow.int64,
+        flow.float,
+        _STORAGE_DIM,
+        batch_size=batch_size,
+        num_threads=2,
+        storage_dtype=storage_dtype,
+        **kwargs,
+    ) as reader:
+        for keys, values in reader:
+            test_case.assertLessEqual(len(keys), batch_size)
+            test_case.assertEqual(values.shape, (len(keys), _STORAGE_DIM))
+            test_case.assertTrue(np.array_equal(values, _values(keys)))
+            all_keys.append(keys)
+    if len(all_keys) == 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.sort(np.concatenate(all_keys))
+
+
+@flow.unittest.skip_unless_1n1d()
+class TestOneEmbeddingPersistentTableIO(flow.unittest.TestCase):
+    def _test_write_read(test_case, storage_dtype):
+        with tempfile.TemporaryDirectory() as root:
+            keys = np.arange(-_NUM_KEYS // 2, _NUM_KEYS // 2, dtype=np.int64)
+            np.random.RandomState(0).shuffle(keys)
+            src_paths = _paths(root, "src", 3)
+            _write(src_paths, keys, storage_dtype)
+            all_keys = np.sort(keys)
+            test_case.assertTrue(
+                np.array_equal(_read(test_case, src_paths, storage_dtype), all_keys)
+            )
+            test_case.assertTrue(
+                np.array_equal(
+                    _read(test_case, src_paths, storage_dtype, batch_size=100),
+                    all_keys,
+                )
+            )
+
+            # the key range is compared as int64, the negative keys come first
+            range_keys = _read(
+                test_case, src_paths, storage_dtype, key_range=(-100, 200)
+            )
+            test_case.assertTrue(
+                np.array_equal(range_keys, np.arange(-100, 200, dtype=np.int64))
+            )
+
+            # the shards split the keys
+            num_shards = 4
+            shard_keys = [
+                _read(test_case, src_paths, storage_dtype, shard=(i, num_shards))
+                for i in range(num_shards)
+            ]
+            test_case.assertEqual(sum(len(k) for k in shard_keys), _NUM_KEYS)
+            test_case.assertTrue(
+                np.array_equal(np.sort(np.concatenate(shard_keys)), all_keys)
+            )
+
+            # every resharded table has the keys of the shard of its rank
+            for num_dst_tables in [2, 5]:
+                dst_paths = _paths(root, "dst{}".format(num_dst_tables), num_dst_tables)
+                flow.one_embedding.reshard_persistent_tables(
+                    src_paths,
+                    "snapshot",
+                    dst_paths,
+                    "snapshot",
+                    flow.int64,
+                    flow.float,
+                    _STORAGE_DIM,
+                    num_threads=2,
+                    batch_size=1000,
+                    storage_dtype=storage_dtype,
+                )
+                test_case.assertTrue(
+                    np.array_equal(_read(test_case, dst_paths, storage_dtype), all_keys)
+                )
+                for i, path in enumerate(dst_paths):
+                    test_case.assertTrue(
+                        np.array_equal(
+                            _read(test_case, [path], storage_dtype),
+                            _read(
+                                test_case,
+                                src_paths,
+                                storage_dtype,
+                                shard=(i, num_dst_tables),
+                            ),
+                        )
+                    )
+
+    def test_write_read_float32(test_case):
+        test_case._test_write_read(None)
+
+    def test_write_read_float16(test_case):
+        test_case._test_write_read("float16")
+
+
+if __name__ == "__main__":
+    unittest.main()
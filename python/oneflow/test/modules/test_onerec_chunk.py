@@ -0,0 +1,87 @@
+"""
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+import tempfile
+import unittest
+
+import oneflow as flow
+import oneflow.unittest
+from oneflow.experimental.onerec_chunk import (
+    benchmark_onerec_decode,
+    compress_onerec,
+    write_onerec,
+)
+
+_RECORD_SIZE = 16
+
+
+def _read_records(files, num_batches, batch_size=8):
+    reader = flow.nn.OneRecReader(
+        files, batch_size, shuffle=False, shuffle_mode="instance", verify_example=False
+    )
+    records = []
+    for _ in range(num_batches):
+        out = flow.tensor_buffer_to_tensor(
+            reader(), dtype=flow.int8, instance_shape=(_RECORD_SIZE,)
+        )
+        records.extend(row.tobytes() for row in out.numpy())
+    return records
+
+
+@flow.unittest.skip_unless_1n1d()
+class TestOneRecChunk(flow.unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.records = [
+            ("record-{:09d}".format(i)).encode()[:_RECORD_SIZE] for i in range(100)
+        ]
+        self.plain_file = os.path.join(self.tmp_dir.name, "plain.onerec")
+        self.compressed_file = os.path.join(self.tmp_dir.name, "compressed.onerec")
+        write_onerec(self.plain_file, self.records)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_compress(test_case):
+        stats = compress_onerec(
+            test_case.plain_file, test_case.compressed_file, chunk_size=256, level=9
+        )
+        test_case.assertEqual(stats["num_records"], 100)
+        test_case.assertGreater(stats["num_chunks"], 1)
+        test_case.assertLess(
+            os.path.getsize(test_case.compressed_file),
+            os.path.getsize(test_case.plain_file),
+        )
+        report = benchmark_onerec_decode(test_case.compressed_file)
+        test_case.assertEqual(report["num_chunks"], stats["num_chunks"])
+        test_case.assertGreater(report["mb_per_second_per_core"], 0)
+        with test_case.assertRaises(ValueError):
+            compress_onerec(test_case.compressed_file, test_case.plain_file)
+
+    def test_read_compressed(test_case):
+        compress_onerec(test_case.plain_file, test_case.compressed_file, chunk_size=256)
+        # records keep their order across chunks and epochs
+        records = _read_records([test_case.compressed_file], 25)
+        test_case.assertEqual(records, test_case.records * 2)
+
+    def test_read_mixed(test_case):
+        compress_onerec(test_case.plain_file, test_case.compressed_file, chunk_size=256)
+        records = _read_records([test_case.plain_file, test_case.compressed_file], 25)
+        test_case.assertEqual(records, test_case.records * 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
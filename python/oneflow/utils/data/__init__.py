@@ -24,12 +24,14 @@ from oneflow.utils.data.dataset import (
     Dataset,
     IterableDataset,
     TensorDataset,
+    MemmapDataset,
+    CachedDataset,
     ConcatDataset,
     Subset,
     random_split,
 )
 from oneflow.utils.data.dataset import IterableDataset as IterDataPipe
-from oneflow.utils.data.dataloader import DataLoader, _DatasetKind
+from oneflow.utils.data.dataloader import DataLoader, _DatasetKind, get_worker_info
 from oneflow.utils.data.decorator import (
     functional_datapipe,
     guaranteed_datapipes_determinism,
@@ -47,11 +49,14 @@ __all__ = [
     "Dataset",
     "IterableDataset",
     "TensorDataset",
+    "MemmapDataset",
+    "CachedDataset",
     "ConcatDataset",
     "Subset",
     "random_split",
     "DataLoader",
     "_DatasetKind",
+    "get_worker_info",
     "IterDataPipe",
     "functional_datapipe",
     "guaranteed_datapipes_determinism",
@@ -0,0 +1,304 @@
+"""
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+r""""Sample caches used by :class:`~oneflow.utils.data.CachedDataset`.
+
+`_MemoryCache` keeps samples as Python objects in the current process, so it is
+shared by DataLoader worker threads but copied into each worker process.
+`_SqliteCache` keeps pickled samples in a SQLite database file, which every
+process opening the same path shares. Putting the file on a tmpfs such as
+``/dev/shm`` gives a shared-memory cache, putting it on a local disk gives a
+cache that also survives restarts. Its hit and miss counters and the access
+times used by LRU eviction are kept per process and written in batches, so a
+cache hit only reads the database.
+"""
+import collections
+import multiprocessing.util
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+import weakref
+
+import oneflow as flow
+
+
+EVICTION_POLICIES = ("lru", "no_evict")
+
+# `_SqliteCache` writes the counters and the access times of a process after
+# this many accesses or this many seconds, whichever comes first.
+_FLUSH_EVERY_ACCESSES = 1024
+_FLUSH_EVERY_SECONDS = 1.0
+
+
+def _sizeof(sample):
+    # Approximate number of bytes held by a sample, only used for the budget of
+    # `_MemoryCache`.
+    if isinstance(sample, flow.Tensor):
+        return sample.nelement() * sample.element_size()
+    if hasattr(sample, "nbytes"):
+        return int(sample.nbytes)
+    if isinstance(sample, (bytes, bytearray, str)):
+        return len(sample)
+    if isinstance(sample, dict):
+        return sum(_sizeof(k) + _sizeof(v) for k, v in sample.items())
+    if isinstance(sample, (list, tuple)):
+        return sum(_sizeof(x) for x in sample)
+    return sys.getsizeof(sample)
+
+
+def _flush_at_exit(cache_ref):
+    cache = cache_ref()
+    if cache is not None:
+        cache._flush()
+
+
+class _MemoryCache(object):
+    def __init__(self, max_bytes, eviction_policy):
+        self.max_bytes = max_bytes
+        self.eviction_policy = eviction_policy
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()  # index => (sample, nbytes)
+        self._nbytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def __getstate__(self):
+        # Worker processes get a copy of the samples cached so far.
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def get(self, index):
+        with self._lock:
+            entry = self._entries.get(index)
+            if entry is None:
+                self._misses += 1
+                return False, None
+            self._hits += 1
+            if self.eviction_policy == "lru":
+                self._entries.move_to_end(index)
+            return True, entry[0]
+
+    def put(self, index, sample):
+        nbytes = _sizeof(sample)
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if index in self._entries:
+                return
+            if self._nbytes + nbytes > self.max_bytes:
+                if self.eviction_policy != "lru":
+                    return
+                while self._nbytes + nbytes > self.max_bytes:
+                    _, (_, evicted_nbytes) = self._entries.popitem(last=False)
+                    self._nbytes -= evicted_nbytes
+                    self._evictions += 1
+            self._entries[index] = (sample, nbytes)
+            self._nbytes += nbytes
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "entries": len(self._entries),
+                "bytes": self._nbytes,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+            self._hits = self._misses = self._evictions = 0
+
+
+class _SqliteCache(object):
+    def __init__(self, path, max_bytes, eviction_policy):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.eviction_policy = eviction_policy
+        self._local = None
+        self._pid = None
+        with self._connect() as conn:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS samples (
+                    idx INTEGER PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    nbytes INTEGER NOT NULL,
+                    last_access INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS samples_last_access
+                    ON samples(last_access);
+                CREATE TABLE IF NOT EXISTS counters (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+                INSERT OR IGNORE INTO counters VALUES
+                    ('hits', 0), ('misses', 0), ('evictions', 0), ('bytes', 0);
+                """
+            )
+
+    def __getstate__(self):
+        # Connections and pending counts can not cross processes, each process
+        # sets up its own.
+        state = self.__dict__.copy()
+        state["_local"] = None
+        state["_pid"] = None
+        for name in ("_pending_lock", "_pending", "_pending_accesses", "_last_flush"):
+            state.pop(name, None)
+        return state
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # It is a cache, losing the last transactions on a crash is fine.
+        conn.execute("PRAGMA synchronous=OFF")
+        return conn
+
+    def _init_process(self):
+        # A forked worker inherits the pending counts of its parent, which the
+        # parent flushes itself.
+        self._local = threading.local()
+        self._pid = os.getpid()
+        self._pending_lock = threading.Lock()
+        self._pending = {"hits": 0, "misses": 0}
+        self._pending_accesses = {}  # index => last access time in ns
+        self._last_flush = time.monotonic()
+        # DataLoader worker processes return from their loop, so the exit
+        # hooks of multiprocessing run and nothing counted is lost.
+        multiprocessing.util.Finalize(
+            self, _flush_at_exit, args=(weakref.ref(self),), exitpriority=10
+        )
+
+    def _conn(self):
+        # One connection per thread and per process.
+        if self._pid != os.getpid():
+            self._init_process()
+        if not hasattr(self._local, "conn"):
+            self._local.conn = self._connect()
+        return self._local.conn
+
+    def _record(self, counter, index=None):
+        with self._pending_lock:
+            self._pending[counter] += 1
+            if index is not None and self.eviction_policy == "lru":
+                self._pending_accesses[index] = time.time_ns()
+            due = (
+                self._pending["hits"] + self._pending["misses"] >= _FLUSH_EVERY_ACCESSES
+                or time.monotonic() - self._last_flush >= _FLUSH_EVERY_SECONDS
+            )
+        if due:
+            self._flush()
+
+    def _flush(self):
+        if self._pid != os.getpid():
+            return
+        with self._pending_lock:
+            pending = self._pending
+            accesses = self._pending_accesses
+            self._pending = {"hits": 0, "misses": 0}
+            self._pending_accesses = {}
+            self._last_flush = time.monotonic()
+        if not (pending["hits"] or pending["misses"] or accesses):
+            return
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        with conn:
+            conn.executemany(
+                "UPDATE counters SET value = value + ? WHERE name = ?",
+                [(n, name) for name, n in pending.items() if n],
+            )
+            conn.executemany(
+                "UPDATE samples SET last_access = ? WHERE idx = ?",
+                [(t, index) for index, t in accesses.items()],
+            )
+
+    def get(self, index):
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT value FROM samples WHERE idx = ?", (index,)
+        ).fetchone()
+        if row is None:
+            self._record("misses")
+            return False, None
+        self._record("hits", index)
+        return True, pickle.loads(row[0])
+
+    def put(self, index, sample):
+        value = pickle.dumps(sample, protocol=pickle.HIGHEST_PROTOCOL)
+        nbytes = len(value)
+        if nbytes > self.max_bytes:
+            return
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        # Commits on return, rolls back on error.
+        with conn:
+            if conn.execute("SELECT 1 FROM samples WHERE idx = ?", (index,)).fetchone():
+                return
+            (total,) = conn.execute(
+                "SELECT value FROM counters WHERE name = 'bytes'"
+            ).fetchone()
+            if total + nbytes > self.max_bytes:
+                if self.eviction_policy != "lru":
+                    return
+                evicted_nbytes = 0
+                evicted = []
+                for evicted_idx, entry_nbytes in conn.execute(
+                    "SELECT idx, nbytes FROM samples ORDER BY last_access"
+                ):
+                    evicted.append((evicted_idx,))
+                    evicted_nbytes += entry_nbytes
+                    if total - evicted_nbytes + nbytes <= self.max_bytes:
+                        break
+                conn.executemany("DELETE FROM samples WHERE idx = ?", evicted)
+                conn.execute(
+                    "UPDATE counters SET value = value + ? WHERE name = 'evictions'",
+                    (len(evicted),),
+                )
+                total -= evicted_nbytes
+            conn.execute(
+                "INSERT INTO samples VALUES (?, ?, ?, ?)",
+                (index, value, nbytes, time.time_ns()),
+            )
+            conn.execute(
+                "UPDATE counters SET value = ? WHERE name = 'bytes'", (total + nbytes,)
+            )
+
+    def stats(self):
+        conn = self._conn()
+        self._flush()
+        stats = dict(conn.execute("SELECT name, value FROM counters"))
+        (stats["entries"],) = conn.execute("SELECT COUNT(*) FROM samples").fetchone()
+        return stats
+
+    def clear(self):
+        conn = self._conn()
+        with self._pending_lock:
+            self._pending = {"hits": 0, "misses": 0}
+            self._pending_accesses = {}
+        conn.execute("BEGIN IMMEDIATE")
+        with conn:
+            conn.execute("DELETE FROM samples")
+            conn.execute("UPDATE counters SET value = 0")
@@ -17,6 +17,7 @@ limitations under the License.
 data from an iterable-style or map-style dataset. This logic is shared in both
 single- and multi-processing data loading.
 """
+import time
 
 
 class _BaseDatasetFetcher(object):
@@ -25,6 +26,16 @@ class _BaseDatasetFetcher(object):
         self.auto_collation = auto_collation
         self.collate_fn = collate_fn
         self.drop_last = drop_last
+        # Timings of the last `fetch` call, read when `collect_stats=True`.
+        self.fetch_time = 0.0
+        self.collate_time = 0.0
+
+    def _collate(self, data, start):
+        collate_start = time.perf_counter()
+        data = self.collate_fn(data)
+        self.fetch_time = collate_start - start
+        self.collate_time = time.perf_counter() - collate_start
+        return data
 
     def fetch(self, possibly_batched_index):
         raise NotImplementedError()
@@ -38,6 +49,7 @@ class _IterableDatasetFetcher(_BaseDatasetFetcher):
         self.dataset_iter = iter(dataset)
 
     def fetch(self, possibly_batched_index):
+        start = time.perf_counter()
         if self.auto_collation:
             data = []
             for _ in possibly_batched_index:
@@ -51,7 +63,7 @@ class _IterableDatasetFetcher(_BaseDatasetFetcher):
                 raise StopIteration
         else:
             data = next(self.dataset_iter)
-        return self.collate_fn(data)
+        return self._collate(data, start)
 
 
 class _MapDatasetFetcher(_BaseDatasetFetcher):
@@ -61,8 +73,13 @@ class _MapDatasetFetcher(_BaseDatasetFetcher):
         )
 
     def fetch(self, possibly_batched_index):
+        start = time.perf_counter()
         if self.auto_collation:
-            data = [self.dataset[idx] for idx in possibly_batched_index]
+            if hasattr(self.dataset, "__getitems__"):
+                # Datasets may fetch a whole batch of samples in one call.
+                data = self.dataset.__getitems__(possibly_batched_index)
+            else:
+                data = [self.dataset[idx] for idx in possibly_batched_index]
         else:
             data = self.dataset[possibly_batched_index]
-        return self.collate_fn(data)
+        return self._collate(data, start)
@@ -45,7 +45,9 @@ def _pin_memory_loop(in_queue, out_queue, device_id, done_event):
             r = in_queue.get(timeout=MP_STATUS_CHECK_INTERVAL)
         except queue.Empty:
             continue
-        idx, data = r
+        # Batches sent with `collect_stats=True` carry a third `_TaskStats` item,
+        # which is passed through untouched.
+        idx, data = r[0], r[1]
         if not done_event.is_set() and not isinstance(data, ExceptionWrapper):
             try:
                 data = pin_memory(data)
@@ -53,7 +55,7 @@ def _pin_memory_loop(in_queue, out_queue, device_id, done_event):
                 data = ExceptionWrapper(
                     where="in pin memory thread for device {}".format(device_id)
                 )
-            r = (idx, data)
+            r = (idx, data) + tuple(r[2:])
         while not done_event.is_set():
             try:
                 out_queue.put(r, timeout=MP_STATUS_CHECK_INTERVAL)
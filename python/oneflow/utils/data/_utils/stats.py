@@ -0,0 +1,182 @@
+"""
+Copyright 2020 The OneFlow Authors. All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+r""""Counters collected by the _BaseDataLoaderIter when ``collect_stats=True``.
+
+Workers only measure their own fetch and collate time and stamp each batch with
+the moment it was handed to the result queue; all accounting happens in the main
+process, so no state has to be shared between processes.
+"""
+import logging
+import time
+from dataclasses import dataclass
+
+
+logger = logging.getLogger("oneflow.utils.data")
+
+
+@dataclass(frozen=True)
+class _TaskStats(object):
+    r"""Timings of one task, sent from a worker along with the fetched data"""
+    worker_id: int
+    fetch_time: float
+    collate_time: float
+    sent_time: float
+
+
+class _WorkerCounters(object):
+    def __init__(self):
+        self.num_batches = 0
+        self.fetch_time = 0.0
+        self.collate_time = 0.0
+        self.transfer_time = 0.0
+
+    def as_dict(self):
+        return {
+            "num_batches": self.num_batches,
+            "fetch_time": self.fetch_time,
+            "collate_time": self.collate_time,
+            "transfer_time": self.transfer_time,
+        }
+
+
+class DataLoaderStats(object):
+    r"""Pipeline counters of a :class:`~oneflow.utils.data.DataLoader`.
+
+    All times are in seconds and accumulate across epochs until :meth:`reset`.
+
+    Per worker:
+
+    * ``fetch_time``: time spent reading samples from the dataset.
+    * ``collate_time``: time spent in ``collate_fn``.
+    * ``transfer_time``: time between a worker putting a batch into the result
+      queue and the main process receiving it, which covers pickling, IPC and
+      the time the batch waited in the queue.
+
+    In the main process:
+
+    * ``wait_time``/``max_wait_time``: time the main process was blocked waiting
+      for a worker to deliver the next batch.
+    * ``queue_size``: number of batches ready in the result queue, sampled each
+      time the main process has to wait.
+    * ``tasks_outstanding``: number of batches requested but not yet delivered.
+    * ``out_of_order``: number of batches received before an earlier one and
+      buffered to keep the sampler order.
+    * ``fetch_time``/``collate_time``: only used when ``num_workers=0``.
+    """
+
+    def __init__(self, num_workers, report_interval=None):
+        self.num_workers = num_workers
+        self.report_interval = report_interval
+        self.reset()
+
+    def reset(self):
+        self._workers = [_WorkerCounters() for _ in range(self.num_workers)]
+        self._fetch_time = 0.0
+        self._collate_time = 0.0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._num_waits = 0
+        self._queue_size_sum = 0
+        self._max_queue_size = 0
+        self._tasks_outstanding_sum = 0
+        self._out_of_order_sum = 0
+        self._max_out_of_order = 0
+        self._last_report = time.perf_counter()
+
+    def record_fetch(self, fetch_time, collate_time):
+        self._fetch_time += fetch_time
+        self._collate_time += collate_time
+
+    def record_task(self, task_stats):
+        counters = self._workers[task_stats.worker_id]
+        counters.num_batches += 1
+        counters.fetch_time += task_stats.fetch_time
+        counters.collate_time += task_stats.collate_time
+        counters.transfer_time += max(time.time() - task_stats.sent_time, 0.0)
+
+    def record_wait(self, wait_time, queue_size, tasks_outstanding, out_of_order):
+        self._wait_time += wait_time
+        self._max_wait_time = max(self._max_wait_time, wait_time)
+        self._num_waits += 1
+        if queue_size is not None:
+            self._queue_size_sum += queue_size
+            self._max_queue_size = max(self._max_queue_size, queue_size)
+        self._tasks_outstanding_sum += tasks_outstanding
+        self._out_of_order_sum += out_of_order
+        self._max_out_of_order = max(self._max_out_of_order, out_of_order)
+
+    def as_dict(self):
+        num_waits = max(self._num_waits, 1)
+        main = {
+            "wait_time": self._wait_time,
+            "max_wait_time": self._max_wait_time,
+            "num_waits": self._num_waits,
+            "mean_queue_size": self._queue_size_sum / num_waits,
+            "max_queue_size": self._max_queue_size,
+            "mean_tasks_outstanding": self._tasks_outstanding_sum / num_waits,
+            "mean_out_of_order": self._out_of_order_sum / num_waits,
+            "max_out_of_order": self._max_out_of_order,
+            "fetch_time": self._fetch_time,
+            "collate_time": self._collate_time,
+        }
+        return {
+            "main": main,
+            "workers": [w.as_dict() for w in self._workers],
+        }
+
+    def format(self):
+        stats = self.as_dict()
+        main = stats["main"]
+        lines = [
+            "DataLoader stats: main process waited {:.3f}s (max {:.3f}s) in {} waits, "
+            "queue size mean {:.2f} max {}, outstanding tasks mean {:.2f}, "
+            "out-of-order buffered mean {:.2f} max {}".format(
+                main["wait_time"],
+                main["max_wait_time"],
+                main["num_waits"],
+                main["mean_queue_size"],
+                main["max_queue_size"],
+                main["mean_tasks_outstanding"],
+                main["mean_out_of_order"],
+                main["max_out_of_order"],
+            )
+        ]
+        if self.num_workers == 0:
+            lines.append(
+                "  main process: fetch {:.3f}s, collate {:.3f}s".format(
+                    main["fetch_time"], main["collate_time"]
+                )
+            )
+        for worker_id, w in enumerate(stats["workers"]):
+            lines.append(
+                "  worker {}: {} batches, fetch {:.3f}s, collate {:.3f}s, "
+                "transfer {:.3f}s".format(
+                    worker_id,
+                    w["num_batches"],
+                    w["fetch_time"],
+                    w["collate_time"],
+                    w["transfer_time"],
+                )
+            )
+        return "\n".join(lines)
+
+    def maybe_report(self):
+        if self.report_interval is None:
+            return
+        now = time.perf_counter()
+        if now - self._last_report >= self.report_interval:
+            self._last_report = now
+            logger.info(self.format())
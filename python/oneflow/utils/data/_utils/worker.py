@@ -22,6 +22,8 @@ import os
 import sys
 import traceback
 import queue
+import threading
+import time
 from dataclasses import dataclass
 from typing import Union
 from oneflow.multiprocessing import _prctl_pr_set_pdeathsig  # type: ignore[attr-defined]
@@ -30,6 +32,7 @@ import signal
 
 import oneflow as flow
 from . import signal_handling, MP_STATUS_CHECK_INTERVAL, IS_WINDOWS, HAS_NUMPY
+from .stats import _TaskStats
 
 
 class KeyErrorMessage(str):
@@ -123,6 +126,10 @@ else:
 
 _worker_info = None
 
+# Workers running in ``worker_mode="thread"`` share the interpreter with the
+# main process, so their `WorkerInfo` can not live in the module global above.
+_thread_worker_info = threading.local()
+
 
 class WorkerInfo(object):
     __initialized = False
@@ -168,8 +175,11 @@ def get_worker_info():
        to configure the ``dataset`` object to only read a specific fraction of a
        sharded dataset, or use ``seed`` to seed other libraries used in dataset
        code.
+    .. note::
+       With ``worker_mode="thread"``, the returned ``dataset`` is the very
+       object held by the main process rather than a copy.
     """
-    return _worker_info
+    return getattr(_thread_worker_info, "info", _worker_info)
 
 
 r"""Dummy class used to signal the end of an IterableDataset"""
@@ -269,6 +279,20 @@ def _generate_state(base_seed, worker_id):
     return state
 
 
+def _make_result(idx, data, fetcher, worker_id, collect_stats):
+    # Normal results are `(idx, data)`. With `collect_stats`, fetched batches get
+    # a `_TaskStats` appended, which the main process strips off on receipt.
+    if not collect_stats or isinstance(
+        data, (ExceptionWrapper, _IterableDatasetStopIteration)
+    ):
+        return (idx, data)
+    return (
+        idx,
+        data,
+        _TaskStats(worker_id, fetcher.fetch_time, fetcher.collate_time, time.time()),
+    )
+
+
 def _worker_loop(
     dataset_kind,
     dataset,
@@ -284,6 +308,7 @@ def _worker_loop(
     worker_id,
     num_workers,
     persistent_workers,
+    collect_stats=False,
 ):
     # See NOTE [ Data Loader Multiprocessing Shutdown Logic ] for details on the
     # logic of this function.
@@ -323,6 +348,7 @@ def _worker_loop(
         from oneflow.utils.data import _DatasetKind
 
         init_exception = None
+        fetcher = None
 
         try:
             if init_fn is not None:
@@ -401,7 +427,7 @@ def _worker_loop(
                         data = ExceptionWrapper(
                             where="in DataLoader worker process {}".format(worker_id)
                         )
-            data_queue.put((idx, data))
+            data_queue.put(_make_result(idx, data, fetcher, worker_id, collect_stats))
             del data, idx, index, r  # save memory
     except KeyboardInterrupt:
         # Main process will raise KeyboardInterrupt anyways.
@@ -413,3 +439,93 @@ def _worker_loop(
     # Python subprocess will be exited by os._exit(), which skips destructors of
     # C++ objects, so we should explicitly call unlink_all_shared_memory() here
     unlink_all_shared_memory()
+
+
+def _thread_worker_loop(
+    dataset_kind,
+    dataset,
+    index_queue,
+    data_queue,
+    done_event,
+    auto_collation,
+    collate_fn,
+    drop_last,
+    base_seed,
+    init_fn,
+    worker_id,
+    num_workers,
+    collect_stats=False,
+):
+    # Counterpart of `_worker_loop` for `worker_mode="thread"`. The protocol on
+    # `index_queue` and `data_queue` is the same, but everything that only makes
+    # sense in a child process is left out: signal handlers, the manager
+    # watchdog, shared memory cleanup, and reseeding of the global `random`,
+    # `numpy.random` and OneFlow generators, which are shared with the main
+    # process here.
+    seed = base_seed + worker_id
+    _thread_worker_info.info = WorkerInfo(
+        id=worker_id, num_workers=num_workers, seed=seed, dataset=dataset
+    )
+
+    from oneflow.utils.data import _DatasetKind
+
+    init_exception = None
+    fetcher = None
+
+    try:
+        if init_fn is not None:
+            init_fn(worker_id)
+
+        fetcher = _DatasetKind.create_fetcher(
+            dataset_kind, dataset, auto_collation, collate_fn, drop_last
+        )
+    except Exception:
+        init_exception = ExceptionWrapper(
+            where="in DataLoader worker thread {}".format(worker_id)
+        )
+
+    # See `_worker_loop` for the meaning of `iteration_end`.
+    iteration_end = False
+
+    while True:
+        try:
+            r = index_queue.get(timeout=MP_STATUS_CHECK_INTERVAL)
+        except queue.Empty:
+            continue
+        if isinstance(r, _ResumeIteration):
+            # Acknowledge the main process
+            data_queue.put((r, None))
+            iteration_end = False
+            # Recreate the fetcher for worker-reuse policy
+            fetcher = _DatasetKind.create_fetcher(
+                dataset_kind, dataset, auto_collation, collate_fn, drop_last
+            )
+            continue
+        elif r is None:
+            # Received the final signal
+            assert done_event.is_set() or iteration_end
+            break
+        elif done_event.is_set() or iteration_end:
+            continue
+        idx, index = r
+        data: Union[_IterableDatasetStopIteration, ExceptionWrapper]
+
+        if init_exception is not None:
+            data = init_exception
+            init_exception = None
+        else:
+            try:
+                data = fetcher.fetch(index)
+            except Exception as e:
+                if (
+                    isinstance(e, StopIteration)
+                    and dataset_kind == _DatasetKind.Iterable
+                ):
+                    data = _IterableDatasetStopIteration(worker_id)
+                    iteration_end = True
+                else:
+                    data = ExceptionWrapper(
+                        where="in DataLoader worker thread {}".format(worker_id)
+                    )
+        data_queue.put(_make_result(idx, data, fetcher, worker_id, collect_stats))
+        del data, idx, index, r  # save memory
@@ -14,6 +14,7 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 import sys
+import time
 import traceback
 import warnings
 import os
@@ -174,6 +175,22 @@ class DataLoader(Generic[T_co]):
         persistent_workers (bool, optional): If ``True``, the data loader will not shutdown
             the worker processes after a dataset has been consumed once. This allows to
             maintain the workers `Dataset` instances alive. (default: ``False``)
+        worker_mode (str, optional, keyword-only arg): ``"process"`` loads data in
+            :attr:`num_workers` subprocesses, ``"thread"`` loads data in a pool of
+            :attr:`num_workers` threads of the main process instead. Thread workers
+            share the dataset object with the main process, so no sample is pickled
+            or sent through a pipe; this pays off when :attr:`dataset` is dominated
+            by I/O or by OneFlow ops which release the GIL. In thread mode the
+            global ``random``/``numpy`` seeds are left untouched. (default: ``"process"``)
+        collect_stats (bool, optional, keyword-only arg): If ``True``, the data loader
+            records per-worker fetch, collate and transfer times together with the
+            time the main process is blocked waiting for data, see :meth:`stats`.
+            When the profiler is enabled, each ``__next__`` is also recorded as a
+            profiler range. (default: ``False``)
+        stats_report_interval (float, optional, keyword-only arg): If set, the
+            collected stats are logged to the ``oneflow.utils.data`` logger at
+            ``INFO`` level at most once every ``stats_report_interval`` seconds.
+            Requires :attr:`collect_stats`. (default: ``None``)
 
 
     .. warning:: If the ``spawn`` start method is used, :attr:`worker_init_fn`
@@ -202,6 +219,7 @@ class DataLoader(Generic[T_co]):
     timeout: float
     sampler: Sampler
     prefetch_factor: int
+    worker_mode: str
     _iterator: Optional["_BaseDataLoaderIter"]
     __initialized = False
 
@@ -222,7 +240,10 @@ class DataLoader(Generic[T_co]):
         generator=flow.Generator("cpu"),
         *,
         prefetch_factor: int = 2,
-        persistent_workers: bool = False
+        persistent_workers: bool = False,
+        worker_mode: str = "process",
+        collect_stats: bool = False,
+        stats_report_interval: Optional[float] = None
     ):
 
         if num_workers < 0:
@@ -246,12 +267,27 @@ class DataLoader(Generic[T_co]):
         if persistent_workers and num_workers == 0:
             raise ValueError("persistent_workers option needs num_workers > 0")
 
+        if worker_mode not in ("process", "thread"):
+            raise ValueError(
+                "worker_mode option should be 'process' or 'thread', "
+                "but got worker_mode={}".format(worker_mode)
+            )
+
+        if stats_report_interval is not None and not collect_stats:
+            raise ValueError("stats_report_interval option needs collect_stats=True")
+
         self.dataset = dataset
         self.prefetch_factor = prefetch_factor
         self.pin_memory = pin_memory
         self.timeout = timeout
         self.worker_init_fn = worker_init_fn
         self.multiprocessing_context = multiprocessing_context
+        self.worker_mode = worker_mode
+        self._stats = (
+            _utils.stats.DataLoaderStats(num_workers, stats_report_interval)
+            if collect_stats
+            else None
+        )
 
         # Arg-check dataset related before checking samplers because we want to
         # tell users that iterable-style datasets are incompatible with custom
@@ -364,12 +400,15 @@ class DataLoader(Generic[T_co]):
         )
 
         self._iterator = None
+        self._resume_state = None
 
     def _get_iterator(self) -> "_BaseDataLoaderIter":
         if self.num_workers == 0:
             return _SingleProcessDataLoaderIter(self)
         else:
             self.check_worker_number_rationality()
+            if self.worker_mode == "thread":
+                return _ThreadPoolDataLoaderIter(self)
             return _MultiProcessingDataLoaderIter(self)
 
     def __setattr__(self, attr, val):
@@ -380,6 +419,7 @@ class DataLoader(Generic[T_co]):
             "drop_last",
             "dataset",
             "persistent_workers",
+            "worker_mode",
         ):
             raise ValueError(
                 "{} attribute should not be set after {} is "
@@ -409,6 +449,47 @@ class DataLoader(Generic[T_co]):
     def _auto_collation(self):
         return self.batch_sampler is not None
 
+    def stats(self) -> dict:
+        r"""Returns the counters collected since the DataLoader was created or
+        :meth:`reset_stats` was last called. Requires ``collect_stats=True``.
+
+        See :class:`~oneflow.utils.data._utils.stats.DataLoaderStats` for the
+        meaning of each counter.
+        """
+        if self._stats is None:
+            raise RuntimeError("DataLoader stats need collect_stats=True")
+        return self._stats.as_dict()
+
+    def reset_stats(self) -> None:
+        r"""Clears the counters returned by :meth:`stats`."""
+        if self._stats is None:
+            raise RuntimeError("DataLoader stats need collect_stats=True")
+        self._stats.reset()
+
+    def load_state_dict(self, state_dict: dict) -> None:
+        r"""Makes the next iterator of this DataLoader resume from ``state_dict``,
+        as returned by ``state_dict()`` of a previous iterator.
+
+        For example:
+
+        .. code-block:: python
+
+            >>> it = iter(loader)
+            >>> for step, batch in enumerate(it):
+            ...     if step % 1000 == 0:
+            ...         flow.save({"loader": it.state_dict()}, path)
+            >>> # after a restart
+            >>> loader.load_state_dict(flow.load(path)["loader"])
+            >>> for batch in loader:  # starts at the next unseen batch
+            ...     pass
+
+        The samplers must be created with the same arguments as in the run the
+        state was taken from.
+        """
+        if self._dataset_kind == _DatasetKind.Iterable:
+            raise TypeError("DataLoader with IterableDataset can not be resumed")
+        self._resume_state = state_dict
+
     @property
     def _index_sampler(self):
         # The actual sampler used for generating indices for `_DatasetFetcher`
@@ -477,7 +558,7 @@ class DataLoader(Generic[T_co]):
             )
 
             warn_msg = (
-                "This DataLoader will create {} worker processes in total. {} "
+                "This DataLoader will create {} workers in total. {} "
                 "Please be aware that excessive worker creation might get DataLoader running slow or even freeze, "
                 "lower the worker number to avoid potential slowness/freeze if necessary."
             ).format(num_worker_created, suggested_max_worker_msg)
@@ -531,12 +612,12 @@ class _BaseDataLoaderIter(object):
         self._pin_memory = loader.pin_memory and flow.cuda.is_available()
         self._timeout = loader.timeout
         self._collate_fn = loader.collate_fn
-        self._sampler_iter = iter(self._index_sampler)
+        self._sampler_iter = self._iter_index_sampler(loader)
         self._generator = loader.generator
         self._base_seed = flow.tensor([0], dtype=flow.int64).uniform_().numpy().item()
         # self._base_seed = flow.empty((), dtype=flow.int64).random_(generator=loader.generator).item()
         self._persistent_workers = loader.persistent_workers
-        self._num_yielded = 0
+        self._stats = loader._stats
         self._profile_name = "enumerate(DataLoader)#{}.__next__".format(
             self.__class__.__name__
         )
@@ -545,10 +626,47 @@ class _BaseDataLoaderIter(object):
         return self
 
     def _reset(self, loader, first_iter=False):
-        self._sampler_iter = iter(self._index_sampler)
-        self._num_yielded = 0
+        if not first_iter:
+            # The first pass over the sampler is started in `__init__`.
+            self._sampler_iter = self._iter_index_sampler(loader)
         self._IterableDataset_len_called = loader._IterableDataset_len_called
 
+    def _iter_index_sampler(self, loader):
+        # Starts a pass over the index sampler, resuming from the state given to
+        # `DataLoader.load_state_dict` if any.
+        state = loader._resume_state
+        loader._resume_state = None
+        if state is None:
+            self._num_yielded = 0
+            return iter(self._index_sampler)
+        self._num_yielded = state["num_yielded"]
+        if state["index_sampler"] is None:
+            # The sampler keeps no state, assume it yields the same order again.
+            return itertools.islice(self._index_sampler, self._num_yielded, None)
+        self._index_sampler.load_state_dict(state["index_sampler"])
+        return iter(self._index_sampler)
+
+    def state_dict(self) -> dict:
+        r"""Returns the position of this iterator, i.e. the number of batches
+        returned so far and the state of the sampler the current pass started
+        from. Pass it to :meth:`DataLoader.load_state_dict` so that the next
+        iterator of the DataLoader continues with the next unseen batch, without
+        reading the batches before it.
+
+        Batches prefetched by workers but not returned yet are not counted, so
+        they are fetched again after resuming.
+        """
+        if self._dataset_kind == _DatasetKind.Iterable:
+            raise TypeError("DataLoader with IterableDataset can not be resumed")
+        if hasattr(self._index_sampler, "state_dict"):
+            index_sampler_state = self._index_sampler.state_dict()
+            # The sampler may run ahead of the batches returned because of
+            # prefetching, only the latter count.
+            index_sampler_state["num_yielded"] = self._num_yielded
+        else:
+            index_sampler_state = None
+        return {"num_yielded": self._num_yielded, "index_sampler": index_sampler_state}
+
     def _next_index(self):
         return next(self._sampler_iter)  # may raise StopIteration
 
@@ -558,7 +676,12 @@ class _BaseDataLoaderIter(object):
     def __next__(self) -> Any:
         if self._sampler_iter is None:
             self._reset()
-        data = self._next_data()
+        if self._stats is None:
+            data = self._next_data()
+        else:
+            with flow.profiler.record_function(self._profile_name):
+                data = self._next_data()
+            self._stats.maybe_report()
         self._num_yielded += 1
         if (
             self._dataset_kind == _DatasetKind.Iterable
@@ -600,6 +723,10 @@ class _SingleProcessDataLoaderIter(_BaseDataLoaderIter):
     def _next_data(self):
         index = self._next_index()  # may raise StopIteration
         data = self._dataset_fetcher.fetch(index)  # may raise StopIteration
+        if self._stats is not None:
+            self._stats.record_fetch(
+                self._dataset_fetcher.fetch_time, self._dataset_fetcher.collate_time
+            )
         if self._pin_memory:
             data = _utils.pin_memory.pin_memory(data)
         return data
@@ -960,6 +1087,7 @@ class _MultiProcessingDataLoaderIter(_BaseDataLoaderIter):
                     i,
                     self._num_workers,
                     self._persistent_workers,
+                    self._stats is not None,
                 ),
             )
             w.daemon = True
@@ -1048,7 +1176,7 @@ class _MultiProcessingDataLoaderIter(_BaseDataLoaderIter):
         #   (bool: whether successfully get data, any: data if successful else None)
         try:
             data = self._data_queue.get(timeout=timeout)
-            return (True, data)
+            return (True, self._strip_task_stats(data))
         except Exception as e:
             # At timeout and error, we manually check whether any worker has
             # failed. Note that this is the only mechanism for Windows to detect
@@ -1087,6 +1215,30 @@ class _MultiProcessingDataLoaderIter(_BaseDataLoaderIter):
                     ) from None
             raise
 
+    def _strip_task_stats(self, data):
+        # See `_utils.worker._make_result`.
+        if len(data) == 3:
+            self._stats.record_task(data[2])
+            return data[:2]
+        return data
+
+    def _get_data_and_record_stats(self):
+        try:
+            queue_size = self._data_queue.qsize()
+        except NotImplementedError:
+            # `multiprocessing.Queue.qsize` is not available on macOS.
+            queue_size = None
+        tasks_outstanding = self._tasks_outstanding
+        start = time.perf_counter()
+        data = self._get_data()
+        self._stats.record_wait(
+            time.perf_counter() - start,
+            queue_size,
+            tasks_outstanding,
+            len(self._task_info) - tasks_outstanding,
+        )
+        return data
+
     def _get_data(self):
         # Fetches data from `self._data_queue`.
         #
@@ -1154,7 +1306,10 @@ class _MultiProcessingDataLoaderIter(_BaseDataLoaderIter):
                 return self._process_data(data)
 
             assert not self._shutdown and self._tasks_outstanding > 0
-            idx, data = self._get_data()
+            if self._stats is None:
+                idx, data = self._get_data()
+            else:
+                idx, data = self._get_data_and_record_stats()
             self._tasks_outstanding -= 1
             if self._dataset_kind == _DatasetKind.Iterable:
                 # Check for _IterableDatasetStopIteration
@@ -1196,7 +1351,8 @@ class _MultiProcessingDataLoaderIter(_BaseDataLoaderIter):
     def _process_data(self, data):
         self._rcvd_idx += 1
         self._try_put_index()
-        if isinstance(data, ExceptionWrapper):
+        # Workers wrap their exceptions with `_utils.worker.ExceptionWrapper`.
+        if isinstance(data, (ExceptionWrapper, _utils.worker.ExceptionWrapper)):
             data.reraise()
         return data
 
@@ -1299,3 +1455,119 @@ class _MultiProcessingDataLoaderIter(_BaseDataLoaderIter):
 
     def __del__(self):
         self._shutdown_workers()
+
+
+class _ThreadPoolDataLoaderIter(_MultiProcessingDataLoaderIter):
+    r"""Iterates once over the DataLoader's dataset with a pool of worker threads.
+
+    Tasks are scheduled, prefetched and reordered exactly as in
+    :class:`_MultiProcessingDataLoaderIter`, only the workers are threads of the
+    current process talking through ``queue.Queue`` objects, so fetched batches
+    are handed over by reference instead of being pickled.
+    """
+
+    def __init__(self, loader):
+        # Skip `_MultiProcessingDataLoaderIter.__init__`, which spawns processes.
+        _BaseDataLoaderIter.__init__(self, loader)
+
+        assert self._num_workers > 0
+        assert self._prefetch_factor > 0
+
+        self._worker_init_fn = loader.worker_init_fn
+        self._worker_queue_idx_cycle = itertools.cycle(range(self._num_workers))
+        self._worker_result_queue = queue.Queue()  # type: ignore[var-annotated]
+        # No pids are registered to the SIGCHLD handler for threads.
+        self._worker_pids_set = False
+        self._shutdown = False
+        self._workers_done_event = threading.Event()
+
+        self._index_queues = []
+        self._workers = []
+        for i in range(self._num_workers):
+            index_queue = queue.Queue()  # type: ignore[var-annotated]
+            w = threading.Thread(
+                target=_utils.worker._thread_worker_loop,
+                args=(
+                    self._dataset_kind,
+                    self._dataset,
+                    index_queue,
+                    self._worker_result_queue,
+                    self._workers_done_event,
+                    self._auto_collation,
+                    self._collate_fn,
+                    self._drop_last,
+                    self._base_seed,
+                    self._worker_init_fn,
+                    i,
+                    self._num_workers,
+                    self._stats is not None,
+                ),
+                name="DataLoaderWorker-{}".format(i),
+            )
+            w.daemon = True
+            w.start()
+            self._index_queues.append(index_queue)
+            self._workers.append(w)
+
+        if self._pin_memory:
+            self._pin_memory_thread_done_event = threading.Event()
+            self._data_queue = queue.Queue()  # type: ignore[var-annotated]
+            pin_memory_thread = threading.Thread(
+                target=_utils.pin_memory._pin_memory_loop,
+                args=(
+                    self._worker_result_queue,
+                    self._data_queue,
+                    flow.cuda.current_device(),
+                    self._pin_memory_thread_done_event,
+                ),
+            )
+            pin_memory_thread.daemon = True
+            pin_memory_thread.start()
+            self._pin_memory_thread = pin_memory_thread
+        else:
+            self._data_queue = self._worker_result_queue
+
+        self._reset(loader, first_iter=True)
+
+    def _try_get_data(self, timeout=_utils.MP_STATUS_CHECK_INTERVAL):
+        # Same contract as `_MultiProcessingDataLoaderIter._try_get_data`. Worker
+        # threads wrap every exception they meet, so a dead thread here means
+        # something went badly wrong inside the worker loop itself.
+        try:
+            data = self._data_queue.get(timeout=timeout)
+            return (True, self._strip_task_stats(data))
+        except queue.Empty:
+            failed_workers = []
+            for worker_id, w in enumerate(self._workers):
+                if self._workers_status[worker_id] and not w.is_alive():
+                    failed_workers.append(w)
+                    self._mark_worker_as_unavailable(worker_id)
+            if len(failed_workers) > 0:
+                names_str = ", ".join(w.name for w in failed_workers)
+                raise RuntimeError(
+                    "DataLoader worker thread(s) {} exited unexpectedly".format(
+                        names_str
+                    )
+                )
+            return (False, None)
+
+    def _shutdown_workers(self):
+        python_exit_status = _utils.python_exit_status
+        if python_exit_status is True or python_exit_status is None:
+            # Worker threads are daemonic, let the interpreter reap them.
+            return
+        if not self._shutdown:
+            self._shutdown = True
+            if hasattr(self, "_pin_memory_thread"):
+                self._pin_memory_thread_done_event.set()
+                self._worker_result_queue.put((None, None))
+                self._pin_memory_thread.join()
+
+            self._workers_done_event.set()
+            for worker_id in range(len(self._workers)):
+                if self._persistent_workers or self._workers_status[worker_id]:
+                    self._mark_worker_as_unavailable(worker_id, shutdown=True)
+            for w in self._workers:
+                # Threads can not be killed, a worker stuck in user code is
+                # left behind as a daemon.
+                w.join(timeout=_utils.MP_STATUS_CHECK_INTERVAL)
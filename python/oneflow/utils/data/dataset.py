@@ -13,8 +13,11 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
+import ast
 import bisect
 import functools
+import os
+import struct
 from typing import (
     TypeVar,
     Generic,
@@ -28,6 +31,8 @@ from typing import (
     Callable,
 )
 
+import numpy as np
+
 import oneflow as flow
 from oneflow.framework.tensor import Tensor
 
@@ -209,6 +214,270 @@ class TensorDataset(Dataset[Tuple[Tensor, ...]]):
         return self.tensors[0].size(0)
 
 
+def _read_npy_array_header_3_0(f):
+    # the 3.0 header is the 2.0 one encoded in utf8 rather than latin1, for field
+    # names that latin1 can not encode, numpy has no public reader of it
+    (header_len,) = struct.unpack("<I", f.read(4))
+    header = ast.literal_eval(f.read(header_len).decode("utf8"))
+    dtype = np.lib.format.descr_to_dtype(header["descr"])
+    return tuple(header["shape"]), header["fortran_order"], dtype
+
+
+class MemmapDataset(Dataset[Tensor]):
+    r"""Dataset of the rows of an array stored in a NumPy ``.npy`` file or in a raw
+    binary file, indexed along the first dimension.
+
+    The file is memory-mapped lazily, on the first access in each process, and is
+    never pickled, so DataLoader workers do not duplicate the array: samples are
+    returned as :func:`oneflow.from_numpy` views of the mapping and random access
+    only costs page faults. The mapping is copy-on-write, modifying a sample never
+    writes back to the file.
+
+    Args:
+        path (str): path of the ``.npy`` file, or of the raw binary file.
+        dtype (numpy.dtype, optional): element type of a raw binary file. Must be
+            ``None`` for a ``.npy`` file, whose header already records it.
+        shape (tuple of ints, optional): shape of a raw binary file. The first
+            dimension may be ``-1`` to infer it from the file size.
+        offset (int, optional): number of header bytes to skip in a raw binary
+            file. (default: ``0``)
+
+    For example:
+
+    .. code-block:: python
+
+        >>> np.save("features.npy", np.random.randn(1000, 64).astype(np.float32))
+        >>> dataset = flow.utils.data.MemmapDataset("features.npy")
+        >>> dataset[3].shape
+        oneflow.Size([64])
+        >>> raw = flow.utils.data.MemmapDataset("labels.bin", dtype=np.int64, shape=(-1,))
+    """
+
+    def __init__(
+        self,
+        path: str,
+        dtype=None,
+        shape: Optional[Tuple[int, ...]] = None,
+        offset: int = 0,
+    ) -> None:
+        self.path = path
+        if dtype is None:
+            if shape is not None or offset != 0:
+                raise ValueError(
+                    "shape and offset options are only used with dtype, for raw "
+                    "binary files"
+                )
+            self.dtype, self.shape, self.offset = self._read_npy_header(path)
+        else:
+            if shape is None:
+                raise ValueError("raw binary files need both dtype and shape")
+            self.dtype = np.dtype(dtype)
+            self.offset = offset
+            self.shape = self._infer_shape(path, self.dtype, tuple(shape), offset)
+        if len(self.shape) == 0:
+            raise ValueError("MemmapDataset needs an array with at least 1 dimension")
+        self._array = None
+
+    @staticmethod
+    def _read_npy_header(path):
+        with open(path, "rb") as f:
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            elif version == (2, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            elif version == (3, 0):
+                shape, fortran_order, dtype = _read_npy_array_header_3_0(f)
+            else:
+                raise ValueError(
+                    "unsupported .npy format version {}.{}: {}".format(
+                        version[0], version[1], path
+                    )
+                )
+            if fortran_order:
+                raise ValueError(
+                    "MemmapDataset does not support Fortran-ordered arrays: "
+                    "{}".format(path)
+                )
+            if dtype.hasobject:
+                raise ValueError(
+                    "MemmapDataset does not support object arrays: {}".format(path)
+                )
+            return dtype, shape, f.tell()
+
+    @staticmethod
+    def _infer_shape(path, dtype, shape, offset):
+        num_bytes = os.path.getsize(path) - offset
+        if shape.count(-1) > 1 or -1 in shape[1:]:
+            raise ValueError("only the first dimension of shape can be -1")
+        if shape[0] == -1:
+            row_bytes = int(np.prod(shape[1:], dtype=np.int64)) * dtype.itemsize
+            if row_bytes == 0 or num_bytes % row_bytes != 0:
+                raise ValueError(
+                    "size of {} ({} bytes after offset) is not a multiple of the row "
+                    "size {}".format(path, num_bytes, row_bytes)
+                )
+            return (num_bytes // row_bytes,) + shape[1:]
+        if int(np.prod(shape, dtype=np.int64)) * dtype.itemsize > num_bytes:
+            raise ValueError(
+                "{} is too small for an array of shape {} and dtype {}".format(
+                    path, shape, dtype
+                )
+            )
+        return shape
+
+    @property
+    def array(self) -> np.ndarray:
+        r"""The memory-mapped array, opened on first use in this process."""
+        if self._array is None:
+            self._array = np.memmap(
+                self.path,
+                dtype=self.dtype,
+                mode="c",
+                offset=self.offset,
+                shape=self.shape,
+            )
+        return self._array
+
+    def __getstate__(self):
+        # Never pickle the mapping (np.memmap would be pickled as a full copy),
+        # workers map the file again on first access.
+        state = self.__dict__.copy()
+        state["_array"] = None
+        return state
+
+    def __getitem__(self, index):
+        return flow.from_numpy(np.asarray(self.array[index]))
+
+    def __getitems__(self, indices):
+        # Batched fetch path, see `_utils.fetch._MapDatasetFetcher`. Checks all
+        # indices at once and returns zero-copy views, the only copy is the one
+        # made by `collate_fn` when stacking the batch.
+        array = self.array
+        indices = np.asarray(indices, dtype=np.int64)
+        if indices.size > 0 and (
+            indices.min() < -len(array) or indices.max() >= len(array)
+        ):
+            raise IndexError(
+                "index out of range for MemmapDataset of length {}".format(len(array))
+            )
+        return [flow.from_numpy(np.asarray(array[i])) for i in indices.tolist()]
+
+    def __len__(self):
+        return self.shape[0]
+
+
+class CachedDataset(Dataset[T_co]):
+    r"""Caches the samples of a map-style dataset across epochs.
+
+    Samples are looked up by index. On a miss, the sample is read from
+    :attr:`dataset` and stored if it fits in :attr:`max_bytes`, so expensive
+    decoding or tokenization runs once per sample instead of once per epoch.
+    Random augmentation must not be part of :attr:`dataset`, otherwise the same
+    augmented sample is returned every epoch; pass it as :attr:`transform`, which
+    runs on every access, after the cache.
+
+    Without :attr:`cache_path`, samples are kept in the memory of the current
+    process: they are shared by DataLoader workers with ``worker_mode="thread"``,
+    but each worker process holds its own cache, which is lost when the worker
+    exits. Worker processes exit at the end of every epoch unless the DataLoader
+    has ``persistent_workers=True``, so without it the cache is rebuilt each
+    epoch. With :attr:`cache_path`, samples are pickled into a SQLite database
+    file shared by every process on the node opening the same path. Use a path
+    on a tmpfs such as ``/dev/shm`` for a shared-memory cache, or on a local disk
+    for a cache that also survives restarts. The file is not invalidated when the
+    dataset changes, use a different path or call :meth:`clear`. A hit only reads
+    the database: the counters and the access times of the LRU policy are
+    written by each process in batches, so the eviction order is approximate.
+
+    Args:
+        dataset (Dataset): dataset whose samples are cached.
+        max_bytes (int): budget of the cache. Samples are measured pickled with a
+            database, or approximately in memory otherwise.
+        cache_path (str, optional): path of the database file shared by all
+            processes, see above. (default: ``None``)
+        eviction_policy (str, optional): ``"lru"`` evicts the least recently used
+            samples to make room, ``"no_evict"`` stops caching once the budget is
+            reached, which avoids thrashing when the dataset does not fit.
+            (default: ``"lru"``)
+        transform (callable, optional): applied to every sample returned, cached
+            or not. (default: ``None``)
+
+    For example:
+
+    .. code-block:: python
+
+        >>> dataset = flow.utils.data.CachedDataset(
+        ...     DecodedImages(root),
+        ...     max_bytes=32 << 30,
+        ...     cache_path="/dev/shm/decoded_images.cache",
+        ...     transform=random_crop_and_flip,
+        ... )
+        >>> loader = flow.utils.data.DataLoader(dataset, batch_size=256, num_workers=8)
+        >>> dataset.stats()
+        {'hits': ..., 'misses': ..., 'evictions': ..., 'bytes': ..., 'entries': ...}
+    """
+
+    def __init__(
+        self,
+        dataset: Dataset[T_co],
+        max_bytes: int,
+        cache_path: Optional[str] = None,
+        eviction_policy: str = "lru",
+        transform: Optional[Callable] = None,
+    ) -> None:
+        from oneflow.utils.data._utils import cache
+
+        if isinstance(dataset, IterableDataset):
+            raise ValueError("CachedDataset does not support IterableDataset")
+        if max_bytes <= 0:
+            raise ValueError(
+                "max_bytes should be a positive integer, but got max_bytes={}".format(
+                    max_bytes
+                )
+            )
+        if eviction_policy not in cache.EVICTION_POLICIES:
+            raise ValueError(
+                "eviction_policy should be one of {}, but got {}".format(
+                    cache.EVICTION_POLICIES, eviction_policy
+                )
+            )
+        self.dataset = dataset
+        self.transform = transform
+        if cache_path is None:
+            self._cache = cache._MemoryCache(max_bytes, eviction_policy)
+        else:
+            self._cache = cache._SqliteCache(cache_path, max_bytes, eviction_policy)
+
+    def __getitem__(self, index):
+        index = int(index)
+        if index < 0:
+            index += len(self)
+        hit, sample = self._cache.get(index)
+        if not hit:
+            sample = self.dataset[index]
+            self._cache.put(index, sample)
+        if self.transform is not None:
+            sample = self.transform(sample)
+        return sample
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def stats(self) -> Dict[str, int]:
+        r"""Returns the number of hits, misses and evictions, and the number of
+        samples and bytes cached. With :attr:`cache_path`, the counts cover all
+        the processes sharing the cache, except up to a second of accesses that
+        the other processes still running have not written yet; otherwise only
+        the current process.
+        """
+        return self._cache.stats()
+
+    def clear(self) -> None:
+        r"""Removes every cached sample and resets the counters."""
+        self._cache.clear()
+
+
 class ConcatDataset(Dataset[T_co]):
     r"""Dataset as a concatenation of multiple datasets.
 
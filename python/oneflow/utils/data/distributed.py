@@ -117,8 +117,19 @@ class DistributedSampler(Sampler[T_co]):
         self.total_size = self.num_samples * self.num_replicas
         self.shuffle = shuffle
         self.seed = seed
+        self._iter_epoch = self.epoch
+        self._num_yielded = 0
+        self._resume_state = None
 
     def __iter__(self) -> Iterator[T_co]:
+        num_skipped = 0
+        if self._resume_state is not None:
+            self.seed = self._resume_state["seed"]
+            self.epoch = self._resume_state["epoch"]
+            num_skipped = self._resume_state["num_yielded"]
+            self._resume_state = None
+        self._iter_epoch = self.epoch
+
         if self.shuffle:
             # deterministically shuffle based on epoch and seed
             g = flow.Generator("cpu")
@@ -145,11 +156,33 @@ class DistributedSampler(Sampler[T_co]):
         indices = indices[self.rank : self.total_size : self.num_replicas]
         assert len(indices) == self.num_samples
 
-        return iter(indices)
+        self._num_yielded = num_skipped
+        return self._count_yielded(indices[num_skipped:])
+
+    def _count_yielded(self, indices):
+        for index in indices:
+            self._num_yielded += 1
+            yield index
 
     def __len__(self) -> int:
         return self.num_samples
 
+    def state_dict(self) -> dict:
+        r"""Returns the seed and epoch of the current iteration and the number of
+        indices it has yielded so far.
+        """
+        return {
+            "seed": self.seed,
+            "epoch": self._iter_epoch,
+            "num_yielded": self._num_yielded,
+        }
+
+    def load_state_dict(self, state_dict: dict) -> None:
+        r"""Makes the next iteration replay the epoch ``state_dict`` was taken
+        from, starting after the first ``state_dict["num_yielded"]`` indices.
+        """
+        self._resume_state = dict(state_dict)
+
     def set_epoch(self, epoch: int) -> None:
         """Sets the epoch for this sampler. 
         When :attr:`shuffle=True`, this ensures all replicas use a different random 
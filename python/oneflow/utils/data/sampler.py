@@ -13,6 +13,7 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
+import itertools
 from typing import Iterator, Optional, Sequence, List, TypeVar, Generic, Sized
 import numpy as np
 
@@ -111,6 +112,11 @@ class RandomSampler(Sampler[int]):
         self.replacement = replacement
         self._num_samples = num_samples
         self.generator = generator
+        # The generator state the current iteration started from and how many
+        # indices it has yielded, see `state_dict`.
+        self._iter_generator_state = None
+        self._num_yielded = 0
+        self._resume_state = None
 
         if not isinstance(self.replacement, bool):
             raise TypeError(
@@ -148,6 +154,21 @@ class RandomSampler(Sampler[int]):
             # )
         else:
             generator = self.generator
+        num_skipped = 0
+        if self._resume_state is not None:
+            if self._resume_state["generator_state"] is not None:
+                generator.set_state(self._resume_state["generator_state"])
+            num_skipped = self._resume_state["num_yielded"]
+            self._resume_state = None
+        self._iter_generator_state = generator.get_state()
+        self._num_yielded = num_skipped
+        # Skipped indices are still drawn so that the generator ends up in the
+        # same state as in an uninterrupted iteration.
+        for index in itertools.islice(self._sample(n, generator), num_skipped, None):
+            self._num_yielded += 1
+            yield index
+
+    def _sample(self, n, generator):
         if self.replacement:
             for _ in range(self.num_samples // 32):
                 yield from flow._C.randint(
@@ -165,6 +186,22 @@ class RandomSampler(Sampler[int]):
     def __len__(self):
         return self.num_samples
 
+    def state_dict(self) -> dict:
+        r"""Returns the state of the current iteration: the generator state it
+        started from and the number of indices yielded so far.
+        """
+        return {
+            "generator_state": self._iter_generator_state,
+            "num_yielded": self._num_yielded,
+        }
+
+    def load_state_dict(self, state_dict: dict) -> None:
+        r"""Makes the next iteration replay the permutation of the iteration
+        ``state_dict`` was taken from, starting after the first
+        ``state_dict["num_yielded"]`` indices.
+        """
+        self._resume_state = dict(state_dict)
+
 
 class SubsetRandomSampler(Sampler[int]):
     r"""Samples elements randomly from a given list of indices, without replacement.
@@ -226,17 +263,40 @@ class BatchSampler(Sampler[List[int]]):
         self.sampler = sampler
         self.batch_size = batch_size
         self.drop_last = drop_last
+        self._num_yielded = 0
+        self._resume_state = None
 
     def __iter__(self):
+        sampler_iter = self._resume_sampler_iter()
         batch = []
-        for idx in self.sampler:
+        for idx in sampler_iter:
             batch.append(idx)
             if len(batch) == self.batch_size:
+                self._num_yielded += 1
                 yield batch
                 batch = []
         if len(batch) > 0 and not self.drop_last:
+            self._num_yielded += 1
             yield batch
 
+    def _resume_sampler_iter(self):
+        if self._resume_state is None:
+            self._num_yielded = 0
+            return iter(self.sampler)
+        self._num_yielded = self._resume_state["num_yielded"]
+        sampler_state = self._resume_state["sampler"]
+        self._resume_state = None
+        num_skipped = self._num_yielded * self.batch_size
+        if sampler_state is not None and hasattr(self.sampler, "load_state_dict"):
+            # The batch count is authoritative, the base sampler may have been
+            # iterated ahead of the consumer when `state_dict` was taken.
+            sampler_state = dict(sampler_state, num_yielded=num_skipped)
+            self.sampler.load_state_dict(sampler_state)
+            return iter(self.sampler)
+        # Without a stateful base sampler, the same order is only reproduced if
+        # the base sampler is deterministic.
+        return itertools.islice(self.sampler, num_skipped, None)
+
     def __len__(self):
         # Can only be called if self.sampler has __len__ implemented
         # We cannot enforce this condition, so we turn off typechecking for the
@@ -246,3 +306,21 @@ class BatchSampler(Sampler[List[int]]):
             return len(self.sampler) // self.batch_size  # type: ignore
         else:
             return (len(self.sampler) + self.batch_size - 1) // self.batch_size  # type: ignore
+
+    def state_dict(self) -> dict:
+        r"""Returns the number of batches yielded by the current iteration and
+        the state of the base sampler, if it has a ``state_dict`` method.
+        """
+        return {
+            "num_yielded": self._num_yielded,
+            "sampler": self.sampler.state_dict()
+            if hasattr(self.sampler, "state_dict")
+            else None,
+        }
+
+    def load_state_dict(self, state_dict: dict) -> None:
+        r"""Makes the next iteration start after the first
+        ``state_dict["num_yielded"]`` batches of the iteration ``state_dict``
+        was taken from.
+        """
+        self._resume_state = dict(state_dict)